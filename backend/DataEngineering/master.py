@@ -29,7 +29,7 @@ CAFE_FILE = os.path.join(DATA_DIR, "cafes.csv")
 MASTER_OUT = os.path.join(DATA_DIR, "master_cafes_metrics.csv")
 
 ROADWAY_GEOJSON = os.path.join(os.path.dirname(__file__), "Roadway.geojson")
-ROAD_GRAPH_CACHE = os.path.join(os.path.dirname(__file__), "road_graph_cache.pkl")
+ROAD_GRAPH_CACHE = os.path.join(os.path.dirname(__file__), "road_graph_cache")
 ROAD_SNAP_TOLERANCE_M = 120.0
 MASTER_DECAY_M = 1000.0
 
@@ -389,14 +389,20 @@ def compute_poi_metrics_for_cafes(
 
     use_network = bool(road_network) and getattr(road_network, "node_count", 0) > 0
     node_to_poi: Dict[int, List[int]] = defaultdict(list)
-    poi_snap_offsets: List[float] = []
+    poi_snap_offsets: np.ndarray = np.empty(0, dtype=float)
     if use_network:
-        poi_nodes, poi_snap_offsets = road_network.snap_points(poi_lats, poi_lons, max_snap_m=snap_tolerance_m)
-        for idx, node_id in enumerate(poi_nodes):
-            if node_id is not None and math.isfinite(poi_snap_offsets[idx]):
-                node_to_poi[int(node_id)].append(idx)
+        poi_nodes, poi_snap_offsets, _ = road_network.snap_points_tiered(
+            poi_lats, poi_lons, (snap_tolerance_m,)
+        )
+        for idx in np.flatnonzero(poi_nodes >= 0).tolist():
+            node_to_poi[int(poi_nodes[idx])].append(idx)
         if not node_to_poi:
             use_network = False
+    if use_network:
+        # Snap every cafe in one vectorized query instead of once per loop iteration.
+        cafe_nodes, cafe_snap_offsets, _ = road_network.snap_points_tiered(
+            cafe_lats, cafe_lons, (snap_tolerance_m,)
+        )
 
     def _network_stats(cafe_node: int, cafe_offset: float) -> Optional[Tuple[int, float, float]]:
         if not use_network:
@@ -412,7 +418,7 @@ def compute_poi_metrics_for_cafes(
             if not poi_indices:
                 continue
             for poi_idx in poi_indices:
-                total_dist = path_dist + cafe_offset + poi_snap_offsets[poi_idx]
+                total_dist = path_dist + cafe_offset + float(poi_snap_offsets[poi_idx])
                 if total_dist <= radius_m:
                     total_count += 1
                     try:
@@ -436,9 +442,9 @@ def compute_poi_metrics_for_cafes(
             min_dists.append(float(np.nan))
             continue
         if use_network:
-            cafe_node, cafe_offset = road_network.snap_point(lat, lon, max_snap_m=snap_tolerance_m)
-            if cafe_node is not None:
-                cafe_offset = float(cafe_offset or 0.0)
+            cafe_node = int(cafe_nodes[i])
+            if cafe_node >= 0:
+                cafe_offset = float(cafe_snap_offsets[i])
                 net_stats = _network_stats(cafe_node, cafe_offset)
                 if net_stats is not None:
                     cnt, wsum, mind = net_stats
@@ -970,7 +976,7 @@ def main():
     parser.add_argument(
         "--road-cache",
         default=ROAD_GRAPH_CACHE,
-        help="Optional cache file for serialized road graph",
+        help="Optional cache directory for the memory-mapped road graph arrays",
     )
     parser.add_argument(
         "--disable-road-network",
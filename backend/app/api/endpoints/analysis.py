@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Literal, Optional, Sequence
-
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Literal, Optional, Sequence
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 
+from app.api.response_cache import ResponseCache, cache_point, cached_json, response_cache_stats
+from app.lib.isochrone import DEFAULT_BUFFER_M, isochrones_available
+from app.lib.suitability_surface import grid_cell_count, to_png
 from app.services.prediction_service import PredictionService
+from app.services.registry import data_version, get_site_analysis_service
+from app.services.result_builder import ResultFormat
 from app.services.site_analysis_service import SiteAnalysisService
 
 
 router = APIRouter(prefix="/analysis")
 
+# Serialized GET responses (nearby, summary, competition, report).
+_RESPONSE_CACHE = ResponseCache("analysis")
+
 
 def _parse_float_param(value: Any, name: str) -> float:
     if isinstance(value, bool):
@@ -38,6 +51,10 @@ def _parse_categories(raw: Optional[str]) -> Optional[List[str]]:
     return parts or None
 
 
+def _cats_key(cats: Optional[List[str]]) -> Optional[tuple]:
+    return tuple(cats) if cats is not None else None
+
+
 def _parse_radii(raw: Optional[str], default: Sequence[float] = (0.25, 0.5, 1.0)) -> List[float]:
     if not raw:
         return list(default)
@@ -64,6 +81,50 @@ class RankRequest(BaseModel):
     locations: List[RankLocation] = Field(default_factory=list)
 
 
+# Largest isochrone budget accepted by /isochrone (metres).
+MAX_ISOCHRONE_BUDGET_M = 10_000.0
+
+# Largest number of cells rendered by one /surface request.
+MAX_SURFACE_CELLS = 1_000_000
+
+# Upper bound on sources x targets for one distance-matrix request.
+MAX_DISTANCE_MATRIX_CELLS = 1_000_000
+
+# Upper bound on network searches (unique nodes on the smaller side) for one
+# distance-matrix request; searches bounded by a cutoff of at most
+# MAX_BOUNDED_MATRIX_CUTOFF_M only settle a neighbourhood, so more are allowed.
+MAX_DISTANCE_MATRIX_SEARCHES = 500
+MAX_BOUNDED_MATRIX_SEARCHES = 5_000
+MAX_BOUNDED_MATRIX_CUTOFF_M = 10_000.0
+
+
+# Largest number of centers accepted by one /batch request, and its default pool size.
+MAX_BATCH_CENTERS = 2_000
+MAX_BATCH_WORKERS = min(8, os.cpu_count() or 1)
+
+
+class BatchRequest(BaseModel):
+    centers: List[RankLocation] = Field(default_factory=list)
+    radius_km: float = Field(1.0, gt=0, description="Radius for nearby/competition")
+    limit: int = Field(10, ge=1, le=200, description="Max nearby items per category")
+    radii_km: List[float] = Field(default_factory=lambda: [0.25, 0.5, 1.0], description="Radii for summaries")
+    categories: Optional[List[str]] = None
+    decay_scale_km: float = Field(1.0, gt=0, description="Decay scale (km)")
+    include_network: bool = True
+    sort_by: Literal["auto", "haversine", "network"] = "auto"
+    include_prediction: bool = Field(True, description="Score each center with the prediction model")
+    workers: Optional[int] = Field(None, ge=1, le=32, description="Worker threads; defaults to min(8, CPUs)")
+
+
+class DistanceMatrixRequest(BaseModel):
+    sources: List[RankLocation] = Field(default_factory=list)
+    targets: List[RankLocation] = Field(default_factory=list)
+    cutoff_m: Optional[float] = Field(None, gt=0, description="Drop pairs farther than this (metres)")
+    max_snap_m: Optional[float] = Field(None, ge=0, description="Snap tolerance (metres); default uses the network's")
+    snap: Literal["node", "edge"] = Field("node", description="Snap points to the nearest node or onto the nearest road segment")
+    format: Literal["dense", "sparse"] = "dense"
+
+
 @router.get("/nearby/")
 def nearby(
     lat: str = Query(..., description="Latitude of center", examples=["27.672782"]),
@@ -76,29 +137,49 @@ def nearby(
     sort_by: Literal["auto", "haversine", "network"] = Query(
         "auto", description="Sorting distance: auto prefers network when available"
     ),
+    format: ResultFormat = Query("records", description="records: item lists; columns: parallel arrays per category"),
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
+    request: Request = None,
 ) -> Any:
-    svc = SiteAnalysisService()
     try:
         lat_f = _parse_float_param(lat, "lat")
         lon_f = _parse_float_param(lon, "lon")
         cats = _parse_categories(categories)
-        data = svc.nearby(
-            lat_f,
-            lon_f,
-            radius_km=radius_km,
-            limit=limit,
-            categories=cats,
-            decay_scale_km=decay_scale_km,
-            include_network=include_network,
-            sort_by=sort_by,
+        point = cache_point(request, lat_f, lon_f)
+
+        def build() -> Dict[str, Any]:
+            data = svc.nearby(
+                point.at_lat,
+                point.at_lon,
+                radius_km=radius_km,
+                limit=limit,
+                categories=cats,
+                decay_scale_km=decay_scale_km,
+                include_network=include_network,
+                sort_by=sort_by,
+                fmt=format,
+            )
+            return {
+                "center": {"lat": point.at_lat, "lon": point.at_lon},
+                "radius_km": radius_km,
+                "limit": limit,
+                "categories": cats,
+                "format": format,
+                "nearby": data,
+            }
+
+        key = (
+            "nearby",
+            point.key,
+            radius_km,
+            limit,
+            _cats_key(cats),
+            decay_scale_km,
+            include_network,
+            sort_by,
+            format,
         )
-        return {
-            "center": {"lat": lat_f, "lon": lon_f},
-            "radius_km": radius_km,
-            "limit": limit,
-            "categories": cats,
-            "nearby": data,
-        }
+        return cached_json(_RESPONSE_CACHE, request, key, lambda: data_version(cats), build, [point])
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -114,25 +195,45 @@ def ring_summary(
     sort_by: Literal["auto", "haversine", "network"] = Query(
         "auto", description="Distance mode: auto prefers network when available"
     ),
+    catchment: Literal["distance", "isochrone"] = Query(
+        "distance", description="Ring membership: per-POI distance, or inside the network isochrone"
+    ),
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
+    request: Request = None,
 ) -> Any:
-    svc = SiteAnalysisService()
     try:
         lat_f = _parse_float_param(lat, "lat")
         lon_f = _parse_float_param(lon, "lon")
         cats = _parse_categories(categories)
         radii = _parse_radii(radii_km)
-        data = svc.ring_summary(
-            lat_f,
-            lon_f,
-            radii_km=radii,
-            categories=cats,
-            decay_scale_km=decay_scale_km,
-            include_network=include_network,
-            sort_by=sort_by,
+        point = cache_point(request, lat_f, lon_f)
+
+        def build() -> Dict[str, Any]:
+            data = svc.ring_summary(
+                point.at_lat,
+                point.at_lon,
+                radii_km=radii,
+                categories=cats,
+                decay_scale_km=decay_scale_km,
+                include_network=include_network,
+                sort_by=sort_by,
+                catchment=catchment,
+            )
+            data["radii_km"] = radii
+            data["categories_filter"] = cats
+            return data
+
+        key = (
+            "summary",
+            point.key,
+            tuple(radii),
+            _cats_key(cats),
+            decay_scale_km,
+            include_network,
+            sort_by,
+            catchment,
         )
-        data["radii_km"] = radii
-        data["categories_filter"] = cats
-        return data
+        return cached_json(_RESPONSE_CACHE, request, key, lambda: data_version(cats), build, [point])
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -147,18 +248,28 @@ def competition(
     sort_by: Literal["auto", "haversine", "network"] = Query(
         "auto", description="Distance mode: auto prefers network when available"
     ),
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
+    request: Request = None,
 ) -> Any:
-    svc = SiteAnalysisService()
     try:
         lat_f = _parse_float_param(lat, "lat")
         lon_f = _parse_float_param(lon, "lon")
-        return svc.competition_index(
-            lat_f,
-            lon_f,
-            radius_km=radius_km,
-            decay_scale_km=decay_scale_km,
-            include_network=include_network,
-            sort_by=sort_by,
+        point = cache_point(request, lat_f, lon_f)
+        key = ("competition", point.key, radius_km, decay_scale_km, include_network, sort_by)
+        return cached_json(
+            _RESPONSE_CACHE,
+            request,
+            key,
+            data_version,
+            lambda: svc.competition_index(
+                point.at_lat,
+                point.at_lon,
+                radius_km=radius_km,
+                decay_scale_km=decay_scale_km,
+                include_network=include_network,
+                sort_by=sort_by,
+            ),
+            [point],
         )
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
@@ -175,51 +286,120 @@ def report(
     decay_scale_km: float = Query(1.0, gt=0, description="Decay scale (km)"),
     include_network: bool = Query(True, description="If true, use road-network distance when available"),
     sort_by: Literal["auto", "haversine", "network"] = Query("auto"),
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
+    request: Request = None,
 ) -> Any:
-    svc = SiteAnalysisService()
     try:
         lat_f = _parse_float_param(lat, "lat")
         lon_f = _parse_float_param(lon, "lon")
-        cats = _parse_categories(categories)
         radii = _parse_radii(radii_km)
-        pred_svc = PredictionService.get_instance()
-        pred = pred_svc.predict(lat_f, lon_f)
-
-        nearby_data = svc.nearby(
-            lat_f,
-            lon_f,
-            radius_km=radius_km,
-            limit=limit,
-            categories=cats,
-            decay_scale_km=decay_scale_km,
-            include_network=include_network,
-            sort_by=sort_by,
-        )
-        summary_data = svc.ring_summary(
-            lat_f,
-            lon_f,
-            radii_km=radii,
-            categories=cats,
-            decay_scale_km=decay_scale_km,
-            include_network=include_network,
-            sort_by=sort_by,
+        cats = _parse_categories(categories)
+        point = cache_point(request, lat_f, lon_f)
+        key = (
+            "report",
+            point.key,
+            radius_km,
+            limit,
+            tuple(radii),
+            _cats_key(cats),
+            decay_scale_km,
+            include_network,
+            sort_by,
         )
-        comp = svc.competition_index(
-            lat_f,
-            lon_f,
-            radius_km=radius_km,
-            decay_scale_km=decay_scale_km,
-            include_network=include_network,
-            sort_by=sort_by,
+        return cached_json(
+            _RESPONSE_CACHE,
+            request,
+            key,
+            data_version,
+            lambda: _site_report(
+                svc,
+                point.at_lat,
+                point.at_lon,
+                radius_km=radius_km,
+                limit=limit,
+                radii=radii,
+                cats=cats,
+                decay_scale_km=decay_scale_km,
+                include_network=include_network,
+                sort_by=sort_by,
+            ),
+            [point],
         )
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
 
-        return {
-            "center": {"lat": lat_f, "lon": lon_f},
-            "prediction": {
-                "score": float(pred["predicted_score"]),
-                "risk_level": pred.get("risk_level"),
-            },
-            "estimated_features": pred.get("estimated_features"),
+
+def _site_report(
+    svc: SiteAnalysisService,
+    lat: float,
+    lon: float,
+    *,
+    radius_km: float,
+    limit: int,
+    radii: Sequence[float],
+    cats: Optional[List[str]],
+    decay_scale_km: float,
+    include_network: bool,
+    sort_by: Literal["auto", "haversine", "network"],
+    include_prediction: bool = True,
+    prediction: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """The /report/ payload for one center; shared by /report/ and /batch.
+
+    ``prediction`` passes a result already computed by ``predict_batch``.
+    """
+    pred: Optional[Dict[str, Any]] = None
+    if include_prediction:
+        pred = prediction or PredictionService.get_instance().predict_batch([lat], [lon])[0]
+
+    # One snap, one network search and one candidate pass serve all three sections.
+    # Competition always spans every category, so the context does too.
+    context = svc.site_context(
+        lat,
+        lon,
+        radius_km=max([float(radius_km), *radii]),
+        include_network=include_network,
+    )
+    nearby_data = svc.nearby(
+        lat,
+        lon,
+        radius_km=radius_km,
+        limit=limit,
+        categories=cats,
+        decay_scale_km=decay_scale_km,
+        include_network=include_network,
+        sort_by=sort_by,
+        context=context,
+    )
+    summary_data = svc.ring_summary(
+        lat,
+        lon,
+        radii_km=radii,
+        categories=cats,
+        decay_scale_km=decay_scale_km,
+        include_network=include_network,
+        sort_by=sort_by,
+        context=context,
+    )
+    comp = svc.competition_index(
+        lat,
+        lon,
+        radius_km=radius_km,
+        decay_scale_km=decay_scale_km,
+        include_network=include_network,
+        sort_by=sort_by,
+        context=context,
+    )
+
+    out: Dict[str, Any] = {"center": {"lat": lat, "lon": lon}}
+    if pred is not None:
+        out["prediction"] = {
+            "score": float(pred["predicted_score"]),
+            "risk_level": pred.get("risk_level"),
+        }
+        out["estimated_features"] = pred.get("estimated_features")
+    out.update(
+        {
             "nearby": {
                 "radius_km": radius_km,
                 "limit": limit,
@@ -234,8 +414,102 @@ def report(
                 "sort_by": sort_by,
             },
         }
+    )
+    return out
+
+
+@router.post("/batch")
+def batch(
+    request: BatchRequest,
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
+) -> StreamingResponse:
+    """Run the /report/ analysis for many centers and stream one NDJSON line per center.
+
+    Lines arrive in completion order; ``index`` refers to the request's ``centers``.
+    A failing center yields ``{"index", "center", "error"}`` instead of ``result``.
+    """
+    if not request.centers:
+        raise HTTPException(status_code=400, detail="No centers provided")
+    if len(request.centers) > MAX_BATCH_CENTERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_CENTERS} centers per batch; got {len(request.centers)}",
+        )
+    return StreamingResponse(_iter_batch_ndjson(svc, request), media_type="application/x-ndjson")
+
+
+def _batch_groups(svc: SiteAnalysisService, request: BatchRequest) -> List[List[int]]:
+    """Center indices grouped by snapped road node, so each group needs one network search.
+
+    Centers that do not snap (or run without the network) form groups of one.
+    """
+    lats = np.array([c.lat for c in request.centers], dtype=np.float64)
+    lons = np.array([c.lon for c in request.centers], dtype=np.float64)
+    road_net = svc.get_road_network() if request.include_network else None
+    nodes = np.full(lats.shape[0], -1, dtype=np.int64)
+    if road_net is not None:
+        nodes = np.asarray(road_net.snap_points_tiered(lats, lons, svc.snap_tiers_m)[0], dtype=np.int64)
+    groups: Dict[int, List[int]] = {}
+    for i, node in enumerate(nodes.tolist()):
+        groups.setdefault(node if node >= 0 else -1 - i, []).append(i)
+    return list(groups.values())
+
+
+def _iter_batch_ndjson(svc: SiteAnalysisService, request: BatchRequest) -> Iterator[bytes]:
+    radii = [float(r) for r in request.radii_km if r > 0] or [0.25, 0.5, 1.0]
+    cats = [c.strip().lower() for c in request.categories or [] if c.strip()] or None
+    predictions: List[Optional[Dict[str, Any]]] = [None] * len(request.centers)
+    if request.include_prediction:
+        try:
+            predictions = PredictionService.get_instance().predict_batch(
+                [c.lat for c in request.centers], [c.lon for c in request.centers]
+            )
+        except Exception as exc:
+            # Centers are then scored one by one, so only the failing ones report an error.
+            print(f"Warning: batch prediction failed: {exc}")
+
+    def run_group(indices: List[int]) -> List[Dict[str, Any]]:
+        lines = []
+        for i in indices:
+            center = request.centers[i]
+            line: Dict[str, Any] = {"index": i, "center": {"lat": center.lat, "lon": center.lon}}
+            try:
+                line["result"] = _site_report(
+                    svc,
+                    float(center.lat),
+                    float(center.lon),
+                    radius_km=request.radius_km,
+                    limit=request.limit,
+                    radii=radii,
+                    cats=cats,
+                    decay_scale_km=request.decay_scale_km,
+                    include_network=request.include_network,
+                    sort_by=request.sort_by,
+                    include_prediction=request.include_prediction,
+                    prediction=predictions[i],
+                )
+            except Exception as exc:
+                line["error"] = str(exc)
+            lines.append(line)
+        return lines
+
+    try:
+        groups = _batch_groups(svc, request)
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+        # Grouping only saves searches; fall back to one group per center.
+        print(f"Warning: batch snapping failed: {exc}")
+        groups = [[i] for i in range(len(request.centers))]
+
+    workers = max(1, min(len(groups), request.workers or MAX_BATCH_WORKERS))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sitex-batch")
+    try:
+        futures = [pool.submit(run_group, g) for g in groups]
+        for fut in as_completed(futures):
+            for line in fut.result():
+                yield (json.dumps(line, default=str) + "\n").encode()
+    finally:
+        # A client that disconnects stops the stream; drop the work it no longer needs.
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 @router.post("/rank/")
@@ -247,19 +521,30 @@ def rank_locations(request: RankRequest) -> Any:
     rows: List[Dict[str, Any]] = []
     errors: List[Dict[str, Any]] = []
 
-    for loc in request.locations:
-        try:
-            pred = svc.predict(loc.lat, loc.lon)
-            rows.append(
-                {
-                    "lat": float(loc.lat),
-                    "lon": float(loc.lon),
-                    "score": float(pred["predicted_score"]),
-                    "risk_level": pred.get("risk_level"),
-                }
-            )
-        except Exception as exc:
-            errors.append({"lat": float(loc.lat), "lon": float(loc.lon), "error": str(exc)})
+    locations = request.locations
+    try:
+        preds: List[Any] = svc.predict_batch([loc.lat for loc in locations], [loc.lon for loc in locations])
+    except Exception:
+        # Score one by one so a bad location only fails itself. This stays on the
+        # model (not the interpolated surface) so one ranking never mixes the two.
+        preds = []
+        for loc in locations:
+            try:
+                preds.append(svc.predict_batch([loc.lat], [loc.lon])[0])
+            except Exception as exc:
+                preds.append(exc)
+    for loc, pred in zip(locations, preds):
+        if isinstance(pred, Exception):
+            errors.append({"lat": float(loc.lat), "lon": float(loc.lon), "error": str(pred)})
+            continue
+        rows.append(
+            {
+                "lat": float(loc.lat),
+                "lon": float(loc.lon),
+                "score": float(pred["predicted_score"]),
+                "risk_level": pred.get("risk_level"),
+            }
+        )
 
     if not rows:
         raise HTTPException(status_code=500, detail={"message": "Ranking failed for all locations", "errors": errors})
@@ -286,14 +571,161 @@ def rank_locations_csv(request: RankRequest) -> Response:
     )
 
 
+@router.post("/distance-matrix")
+def distance_matrix(
+    request: DistanceMatrixRequest,
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
+) -> Any:
+    if not request.sources or not request.targets:
+        raise HTTPException(status_code=400, detail="Both sources and targets are required")
+    cells = len(request.sources) * len(request.targets)
+    if cells > MAX_DISTANCE_MATRIX_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Matrix too large ({cells} cells); limit is {MAX_DISTANCE_MATRIX_CELLS}",
+        )
+    road_net = svc.get_road_network()
+    if road_net is None:
+        raise HTTPException(status_code=503, detail="Road network is not available")
+
+    bounded = request.cutoff_m is not None and request.cutoff_m <= MAX_BOUNDED_MATRIX_CUTOFF_M
+    try:
+        matrix = road_net.distance_matrix(
+            [(loc.lat, loc.lon) for loc in request.sources],
+            [(loc.lat, loc.lon) for loc in request.targets],
+            cutoff=request.cutoff_m,
+            max_snap_m=request.max_snap_m,
+            snap=request.snap,
+            sparse=request.format == "sparse",
+            max_searches=MAX_BOUNDED_MATRIX_SEARCHES if bounded else MAX_DISTANCE_MATRIX_SEARCHES,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    out: Dict[str, Any] = {
+        "sources": len(request.sources),
+        "targets": len(request.targets),
+        "cutoff_m": request.cutoff_m,
+        "units": "m",
+        "format": request.format,
+    }
+    if request.format == "sparse":
+        coo = matrix.tocoo()
+        order = np.lexsort((coo.col, coo.row))
+        out["entries"] = [
+            [i, j, round(d, 3)]
+            for i, j, d in zip(coo.row[order].tolist(), coo.col[order].tolist(), coo.data[order].tolist())
+        ]
+    else:
+        out["distances_m"] = [
+            [round(d, 3) if math.isfinite(d) else None for d in row] for row in matrix.tolist()
+        ]
+    return out
+
+
+@router.get("/isochrone")
+def isochrone(
+    lat: str = Query(..., description="Latitude of center", examples=["27.672782"]),
+    lon: str = Query(..., description="Longitude of center", examples=["85.431941"]),
+    budgets_m: Optional[str] = Query("250,500,1000", description="Comma-separated distance budgets (metres)"),
+    buffer_m: float = Query(DEFAULT_BUFFER_M, gt=0, le=200, description="Road buffer / polygon resolution (metres)"),
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
+) -> Any:
+    lat_f = _parse_float_param(lat, "lat")
+    lon_f = _parse_float_param(lon, "lon")
+    budgets = _parse_radii(budgets_m, default=(250.0, 500.0, 1000.0))
+    if max(budgets) > MAX_ISOCHRONE_BUDGET_M:
+        raise HTTPException(status_code=400, detail=f"Budgets are limited to {MAX_ISOCHRONE_BUDGET_M:g} m")
+    if not isochrones_available():
+        raise HTTPException(status_code=503, detail="Isochrones need shapely")
+    if svc.get_road_network() is None:
+        raise HTTPException(status_code=503, detail="Road network is not available")
+    try:
+        return svc.isochrones(lat_f, lon_f, budgets_m=budgets, buffer_m=buffer_m)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+
+@router.get("/surface")
+def surface(
+    bbox: str = Query(..., description="south,west,north,east", examples=["27.66,85.41,27.69,85.44"]),
+    resolution_m: Optional[float] = Query(None, gt=0, description="Cell size (metres); default is the surface's"),
+    format: Literal["png", "array"] = Query("png", description="PNG image (north up) or JSON array (south up)"),
+    vmin: float = Query(0.0, description="Score drawn red in the PNG"),
+    vmax: float = Query(3.0, description="Score drawn green in the PNG"),
+) -> Any:
+    parts = [p for p in bbox.split(",") if p.strip()]
+    if len(parts) != 4:
+        raise HTTPException(status_code=422, detail="'bbox' must be south,west,north,east")
+    south, west, north, east = (_parse_float_param(p, "bbox") for p in parts)
+    if not (south <= north and west <= east):
+        raise HTTPException(status_code=422, detail="'bbox' must satisfy south <= north and west <= east")
+    raster = PredictionService.get_instance().surface
+    if raster is None:
+        raise HTTPException(status_code=503, detail="Suitability surface is not built yet")
+    resolution = float(resolution_m) if resolution_m else raster.cell_m
+    if grid_cell_count(south, west, north, east, resolution) > MAX_SURFACE_CELLS:
+        raise HTTPException(status_code=400, detail=f"Surfaces are limited to {MAX_SURFACE_CELLS} cells")
+
+    values, lat_axis, lon_axis = raster.resample(south, west, north, east, resolution)
+    # Cell-centre extent of the returned grid.
+    extent = [float(lat_axis[0]), float(lon_axis[0]), float(lat_axis[-1]), float(lon_axis[-1])]
+    if format == "png":
+        return Response(
+            content=to_png(values, vmin, vmax),
+            media_type="image/png",
+            headers={"X-Surface-Bounds": ",".join(f"{v:.7f}" for v in extent)},
+        )
+    return {
+        "bounds": extent,
+        "shape": list(values.shape),
+        "resolution_m": resolution,
+        "lats": lat_axis.tolist(),
+        "lons": lon_axis.tolist(),
+        "values": [[v if math.isfinite(v) else None for v in row] for row in values.tolist()],
+    }
+
+
+@router.get("/surface/score")
+def surface_score(
+    lat: str = Query(..., description="Latitude of the location", examples=["27.672782"]),
+    lon: str = Query(..., description="Longitude of the location", examples=["85.431941"]),
+) -> Any:
+    """Score one location from the suitability surface; points off the grid are scored by the model."""
+    lat_f = _parse_float_param(lat, "lat")
+    lon_f = _parse_float_param(lon, "lon")
+    try:
+        pred = PredictionService.get_instance().predict(lat_f, lon_f)
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    return {
+        "lat": lat_f,
+        "lon": lon_f,
+        "score": float(pred["predicted_score"]),
+        "risk_level": pred.get("risk_level"),
+        "interpolated": bool(pred["estimated_features"].get("interpolated", False)),
+    }
+
+
+@router.get("/cache-stats")
+def cache_stats(svc: SiteAnalysisService = Depends(get_site_analysis_service)) -> Any:
+    road_net = svc.get_road_network()
+    return {
+        "shortest_path_trees": road_net.tree_cache_stats() if road_net is not None else None,
+        "responses": response_cache_stats(),
+    }
+
+
 @router.get("/path/")
 def path(
     center_lat: float = Query(..., description="Center latitude"),
     center_lon: float = Query(..., description="Center longitude"),
     poi_lat: float = Query(..., description="POI latitude"),
     poi_lon: float = Query(..., description="POI longitude"),
+    svc: SiteAnalysisService = Depends(get_site_analysis_service),
 ) -> Any:
-    svc = SiteAnalysisService()
     try:
         coords = svc.path_between(
             center_lat=center_lat,
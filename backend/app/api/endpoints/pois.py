@@ -1,26 +1,36 @@
 from collections import defaultdict
-from functools import lru_cache
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
 
 import math
-from pathlib import Path
+import os
+import threading
 
 import pandas as pd
 import numpy as np
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request
 from fastapi.responses import StreamingResponse
 import json
-import networkx as nx
 
-from app.lib.road_network import RoadNetwork
+from app.api.response_cache import ResponseCache, cache_point, cached_json
+from app.lib.path_encoding import encode_delta_int32_many, encode_polylines, route_tree
+from app.lib.road_network import RoadNetwork, ShortestPathTree
+from app.services.poi_store import PoiCategory, PoiStore
+from app.services.registry import data_version, get_poi_store, get_road_network
+from app.services.result_builder import ResultFormat, decay_weights, render, rounded
 
 router = APIRouter(prefix="/pois")
 
-DATA_ROOT = Path(__file__).resolve().parents[3]
-ROAD_GEOJSON = DATA_ROOT / "Data" / "Roadway.geojson"
-ROAD_CACHE = ROAD_GEOJSON.with_suffix(".graph.pkl")
+PathEncoding = Literal["objects", "polyline", "delta-int32", "tree", "none"]
+
 ROAD_SNAP_TOLERANCE_M = 120.0
 SECONDARY_SNAP_TOLERANCE_M = 300.0
+SNAP_TIERS_M = (ROAD_SNAP_TOLERANCE_M, SECONDARY_SNAP_TOLERANCE_M, float("inf"))
+# Threads shared by all requests for per-category work.
+CATEGORY_WORKERS = max(2, min(8, (os.cpu_count() or 1) * 2))
+# Serialized non-streaming responses, keyed by center and query parameters.
+_RESPONSE_CACHE = ResponseCache("pois")
 
 
 def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -44,121 +54,224 @@ def _haversine_vec_km(center_lat: float, center_lon: float, lats: np.ndarray, lo
     return r * c
 
 
-@lru_cache(maxsize=1)
 def _get_road_network() -> Optional[RoadNetwork]:
-    if not ROAD_GEOJSON.exists():
+    return get_road_network()
+
+
+def _get_poi_store() -> PoiStore:
+    return get_poi_store()
+
+
+def _snap_center_and_pois(
+    road_net: RoadNetwork,
+    center_lat: float,
+    center_lon: float,
+    poi_lats: pd.Series,
+    poi_lons: pd.Series,
+    poi_snaps: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    center_snap: Optional[Tuple[int, float]] = None,
+) -> Optional[Tuple[int, float, np.ndarray, np.ndarray, Dict[int, List[int]]]]:
+    """Snap the center and every POI to the road graph.
+
+    Both use the tolerance cascade in ``SNAP_TIERS_M``; the last tier is a
+    nearest-node fallback so paths can be computed for as many POIs as possible.
+    ``poi_snaps`` (nodes, offsets) skips POI snapping, e.g. for ``PoiStore`` data,
+    and ``center_snap`` (node, offset) skips snapping the center.
+    Returns (center_node, center_offset_m, poi_nodes, poi_offsets_m, node_to_indices)
+    or None when the center or all POIs fail to snap.
+    """
+    if center_snap is not None:
+        center_node, center_offset = center_snap
+    else:
+        center_node, center_offset, center_tier = road_net.snap_point_tiered(center_lat, center_lon, SNAP_TIERS_M)
+        if center_node is None:
+            return None
+        if center_tier == len(SNAP_TIERS_M) - 1:
+            print("Info: using nearest-node fallback for center snapping to improve coverage")
+
+    if poi_snaps is not None:
+        poi_nodes, poi_offsets = poi_snaps
+    else:
+        lat_arr = pd.to_numeric(pd.Series(poi_lats), errors="coerce").to_numpy(dtype=np.float64)
+        lon_arr = pd.to_numeric(pd.Series(poi_lons), errors="coerce").to_numpy(dtype=np.float64)
+        poi_nodes, poi_offsets, poi_tiers = road_net.snap_points_tiered(lat_arr, lon_arr, SNAP_TIERS_M)
+        if np.any(poi_tiers == len(SNAP_TIERS_M) - 1):
+            print("Info: using nearest-node fallback for POI snapping to improve coverage")
+
+    node_to_indices: Dict[int, List[int]] = defaultdict(list)
+    for idx in np.flatnonzero(poi_nodes >= 0).tolist():
+        node_to_indices[int(poi_nodes[idx])].append(idx)
+    if not node_to_indices:
         return None
-    try:
-        return RoadNetwork.from_geojson(
-            ROAD_GEOJSON,
-            cache_path=ROAD_CACHE,
-            snap_tolerance_m=ROAD_SNAP_TOLERANCE_M,
-        )
-    except Exception as exc:
-        print(f"Warning: Failed to load road network for POI endpoint ({exc})")
+    return int(center_node), float(center_offset or 0.0), poi_nodes, poi_offsets, node_to_indices
+
+
+@dataclass(frozen=True)
+class CenterRoutes:
+    """The snapped center and its shortest-path tree, shared by every category of a request."""
+
+    node: int
+    offset_m: float
+    tree: ShortestPathTree
+
+
+def _center_routes(
+    road_net: RoadNetwork,
+    center_lat: float,
+    center_lon: float,
+    radius_m: float,
+    include_paths: bool = True,
+) -> Optional[CenterRoutes]:
+    center_node, center_offset, center_tier = road_net.snap_point_tiered(center_lat, center_lon, SNAP_TIERS_M)
+    if center_node is None:
+        return None
+    if center_tier == len(SNAP_TIERS_M) - 1:
+        print("Info: using nearest-node fallback for center snapping to improve coverage")
+    # Paths are wanted for POIs beyond the network radius too, so the tree is only
+    # bounded when geometry is not requested.
+    tree = road_net.shortest_path_tree(int(center_node), cutoff=None if include_paths else radius_m)
+    if tree is None or len(tree) == 0:
         return None
+    return CenterRoutes(int(center_node), float(center_offset or 0.0), tree)
 
 
-def _network_distance_map(
+def _network_routes(
     road_net: RoadNetwork,
     center_lat: float,
     center_lon: float,
     poi_lats: pd.Series,
     poi_lons: pd.Series,
     radius_m: float,
-) -> Dict[int, float]:
-    center_node, center_offset = road_net.snap_point(
-        center_lat,
-        center_lon,
-        max_snap_m=ROAD_SNAP_TOLERANCE_M,
-    )
-    # If center failed to snap at default tolerance, retry with a larger
-    # tolerance and finally with a nearest-node fallback so we can still
-    # compute paths where possible.
-    if center_node is None:
-        center_node, center_offset = road_net.snap_point(
-            center_lat, center_lon, max_snap_m=SECONDARY_SNAP_TOLERANCE_M
-        )
-    if center_node is None:
-        center_node, center_offset = road_net.snap_point(
-            center_lat, center_lon, max_snap_m=float("inf")
-        )
-        if center_node is not None:
-            print("Info: using nearest-node fallback for center snapping to improve coverage")
-    if center_node is None:
-        return {}
-    # coerce NaN/inf values to None so RoadNetwork.snap_points skips them
-    safe_lats: List[Optional[float]] = []
-    safe_lons: List[Optional[float]] = []
-    for a, b in zip(poi_lats, poi_lons):
-        try:
-            av = float(a)
-            bv = float(b)
-            if not math.isfinite(av) or not math.isfinite(bv):
-                safe_lats.append(None)
-                safe_lons.append(None)
-            else:
-                safe_lats.append(av)
-                safe_lons.append(bv)
-        except Exception:
-            safe_lats.append(None)
-            safe_lons.append(None)
-
-    poi_nodes, poi_offsets = road_net.snap_points(
-        safe_lats,
-        safe_lons,
-        max_snap_m=ROAD_SNAP_TOLERANCE_M,
+    include_paths: bool = True,
+    poi_snaps: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    center: Optional[CenterRoutes] = None,
+    path_encoding: PathEncoding = "objects",
+) -> Tuple[Dict[int, float], Dict[int, Any]]:
+    """Return (poi index -> network distance km, poi index -> path coordinates).
+
+    ``path_encoding`` picks the path value: a list of ``{"lat", "lon"}`` (objects), a
+    polyline string, a delta-int32 list, or (tree) the POI's end node id for building
+    a ``RouteTree``.
+
+    Distances only include POIs whose total route (center offset + road path + POI
+    offset) is within ``radius_m``. Paths are built for every snapped, reachable
+    POI and start at the center coordinate and end at the POI's own coordinate.
+    Both come from a single shortest-path tree rooted at the snapped center;
+    ``center`` passes one already computed (see ``_center_routes``).
+    """
+    if center is None:
+        center = _center_routes(road_net, center_lat, center_lon, radius_m, include_paths)
+    if center is None:
+        return {}, {}
+    snapped = _snap_center_and_pois(
+        road_net, center_lat, center_lon, poi_lats, poi_lons, poi_snaps, center_snap=(center.node, center.offset_m)
     )
-    # If some POIs failed to snap, retry with a larger tolerance to increase coverage.
-    # We run a secondary snap for all points and only replace the failed entries so
-    # that any already-good snaps are preserved.
-    if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-        sec_nodes, sec_offsets = road_net.snap_points(
-            safe_lats,
-            safe_lons,
-            max_snap_m=SECONDARY_SNAP_TOLERANCE_M,
-        )
-        for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-            if (n is None or not math.isfinite(o)) and (sec_nodes[i] is not None and math.isfinite(sec_offsets[i])):
-                poi_nodes[i] = sec_nodes[i]
-                poi_offsets[i] = sec_offsets[i]
-    node_to_indices: Dict[int, List[int]] = defaultdict(list)
-    for idx, node_id in enumerate(poi_nodes):
-        if node_id is not None and math.isfinite(poi_offsets[idx]):
-            node_to_indices[int(node_id)].append(idx)
-    # If still no valid snaps for some points, force a nearest-node fallback
-    # for remaining failed indices by snapping again with infinite tolerance.
-    if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-        inf_nodes, inf_offsets = road_net.snap_points(
-            safe_lats, safe_lons, max_snap_m=float("inf")
-        )
-        for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-            if (n is None or not math.isfinite(o)) and (inf_nodes[i] is not None and math.isfinite(inf_offsets[i])):
-                poi_nodes[i] = inf_nodes[i]
-                poi_offsets[i] = inf_offsets[i]
-        # rebuild node_to_indices from potentially-updated poi_nodes/poi_offsets
-        node_to_indices = defaultdict(list)
-        for idx, node_id in enumerate(poi_nodes):
-            if node_id is not None and math.isfinite(poi_offsets[idx]):
-                node_to_indices[int(node_id)].append(idx)
-        if node_to_indices:
-            print("Info: using nearest-node fallback for POI snapping to improve coverage")
-    if not node_to_indices:
-        return {}
-    lengths = road_net.shortest_paths_from(center_node, cutoff=radius_m)
-    if not lengths:
-        return {}
-    center_offset_val = float(center_offset or 0.0)
-    results: Dict[int, float] = {}
-    for node_id, path_dist in lengths.items():
-        poi_indices = node_to_indices.get(node_id)
-        if not poi_indices:
+    if snapped is None:
+        return {}, {}
+    _center_node, center_offset_val, _poi_nodes, poi_offsets, node_to_indices = snapped
+    tree = center.tree
+
+    target_nodes = np.fromiter(node_to_indices.keys(), dtype=np.int64, count=len(node_to_indices))
+    positions = tree.positions(target_nodes)
+
+    distances: Dict[int, float] = {}
+    for node_id, pos in zip(target_nodes.tolist(), positions.tolist()):
+        if pos < 0:
             continue
-        for poi_idx in poi_indices:
-            total_m = path_dist + center_offset_val + poi_offsets[poi_idx]
+        path_dist = float(tree.dists[pos])
+        for poi_idx in node_to_indices[node_id]:
+            total_m = path_dist + center_offset_val + float(poi_offsets[poi_idx])
             if total_m <= radius_m:
-                results[poi_idx] = total_m / 1000.0
-    return results
+                distances[poi_idx] = total_m / 1000.0
+
+    paths: Dict[int, Any] = {}
+    if include_paths and path_encoding != "none":
+        reached = target_nodes[positions >= 0]
+        if path_encoding == "tree":
+            for node_id in reached.tolist():
+                for poi_idx in node_to_indices[node_id]:
+                    paths[poi_idx] = node_id
+            return distances, paths
+        lat_arr = np.asarray(poi_lats, dtype=np.float64)
+        lon_arr = np.asarray(poi_lons, dtype=np.float64)
+        node_paths = tree.paths_to(reached)
+        if path_encoding != "objects":
+            paths.update(
+                _encoded_paths(road_net, center_lat, center_lon, lat_arr, lon_arr, node_paths, node_to_indices, path_encoding)
+            )
+            return distances, paths
+        center_point = {"lat": float(center_lat), "lon": float(center_lon)}
+        for node_id, node_path in node_paths.items():
+            road_coords = road_net.path_coords(node_path)
+            for poi_idx in node_to_indices[node_id]:
+                coords = [center_point]
+                coords.extend(road_coords)
+                # include original poi coordinate as final point
+                try:
+                    plat = float(lat_arr[poi_idx])
+                    plon = float(lon_arr[poi_idx])
+                    coords.append({"lat": plat, "lon": plon})
+                except Exception:
+                    pass
+                paths[poi_idx] = coords
+    return distances, paths
+
+
+def _encoded_paths(
+    road_net: RoadNetwork,
+    center_lat: float,
+    center_lon: float,
+    lat_arr: np.ndarray,
+    lon_arr: np.ndarray,
+    node_paths: Dict[int, List[int]],
+    node_to_indices: Dict[int, List[int]],
+    path_encoding: PathEncoding,
+) -> Dict[int, Any]:
+    """Polyline or delta-int32 paths (center, road nodes, POI) for every POI in one batch.
+
+    All paths are laid out back to back so the coordinates are gathered and encoded
+    with a handful of array operations rather than once per POI.
+    """
+    poi_order: List[int] = []
+    flat_nodes: List[int] = []
+    starts: List[int] = []
+    for node_id, node_path in node_paths.items():
+        for poi_idx in node_to_indices[node_id]:
+            poi_order.append(poi_idx)
+            starts.append(len(flat_nodes))
+            # The first and last slots are overwritten with the center and POI coordinates.
+            flat_nodes.append(node_id)
+            flat_nodes.extend(node_path)
+            flat_nodes.append(node_id)
+    if not poi_order:
+        return {}
+    coords = road_net.node_coords[np.asarray(flat_nodes, dtype=np.int64)]
+    lats = coords[:, 0].astype(np.float64)
+    lons = coords[:, 1].astype(np.float64)
+    first = np.asarray(starts, dtype=np.int64)
+    last = np.append(first[1:], len(flat_nodes)) - 1
+    order = np.asarray(poi_order, dtype=np.int64)
+    lats[first], lons[first] = center_lat, center_lon
+    lats[last], lons[last] = lat_arr[order], lon_arr[order]
+    if path_encoding == "polyline":
+        encoded = encode_polylines(lats, lons, first)
+    else:
+        encoded = encode_delta_int32_many(lats, lons, first)
+    return dict(zip(poi_order, encoded))
+
+
+def _network_distance_map(
+    road_net: RoadNetwork,
+    center_lat: float,
+    center_lon: float,
+    poi_lats: pd.Series,
+    poi_lons: pd.Series,
+    radius_m: float,
+) -> Dict[int, float]:
+    distances, _ = _network_routes(
+        road_net, center_lat, center_lon, poi_lats, poi_lons, radius_m, include_paths=False
+    )
+    return distances
 
 
 def _network_path_map(
@@ -172,126 +285,194 @@ def _network_path_map(
     """Return mapping of poi index -> path coordinate list (lat/lon) from center to POI.
 
     Paths include the provided center coordinate as the first point and the POI's
-    original coordinate as the last point. If a path cannot be determined or the
-    POI is outside the radius, it will not be present in the returned dict.
+    original coordinate as the last point. If a path cannot be determined, it will
+    not be present in the returned dict.
     """
-    center_node, center_offset = road_net.snap_point(
-        center_lat,
-        center_lon,
-        max_snap_m=ROAD_SNAP_TOLERANCE_M,
-    )
-    # If center failed to snap at default tolerance, retry with larger
-    # tolerances and finally use nearest-node fallback.
-    if center_node is None:
-        center_node, center_offset = road_net.snap_point(
-            center_lat, center_lon, max_snap_m=SECONDARY_SNAP_TOLERANCE_M
-        )
-    if center_node is None:
-        center_node, center_offset = road_net.snap_point(
-            center_lat, center_lon, max_snap_m=float("inf")
-        )
-        if center_node is not None:
-            print("Info: using nearest-node fallback for center snapping to improve coverage")
-    if center_node is None:
-        return {}
-    # coerce NaN/inf values to None so RoadNetwork.snap_points skips them
-    safe_lats: List[Optional[float]] = []
-    safe_lons: List[Optional[float]] = []
-    for a, b in zip(poi_lats, poi_lons):
+    _, paths = _network_routes(road_net, center_lat, center_lon, poi_lats, poi_lons, radius_m)
+    return paths
+
+
+def _category_columns(
+    pois: PoiCategory,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    effective_decay_km: float,
+    road_network: Optional[RoadNetwork],
+    center: Optional[CenterRoutes] = None,
+    path_encoding: PathEncoding = "objects",
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Columns (name, lat, lon, distance_km, weight, path) of one category within ``radius_km``.
+
+    Network distance replaces the haversine one when the POI is reachable within the
+    radius; road snaps come precomputed from the ``PoiStore``. ``path`` is None where
+    no route was found, and absent with ``path_encoding="none"``. With
+    ``path_encoding="tree"`` it is replaced by ``path_node``, a position in the
+    returned route tree (second element; None otherwise). Columns are None when
+    nothing is in range.
+    """
+    candidate_idx, candidate_dists = pois.within_km(lat, lon, radius_km)
+    if candidate_idx.size == 0:
+        return None, None
+    cand_lats = pois.lat[candidate_idx]
+    cand_lons = pois.lon[candidate_idx]
+
+    network_dist_map: Dict[int, float] = {}
+    paths_map: Dict[int, Any] = {}
+    if road_network is not None:
         try:
-            av = float(a)
-            bv = float(b)
-            if not math.isfinite(av) or not math.isfinite(bv):
-                safe_lats.append(None)
-                safe_lons.append(None)
-            else:
-                safe_lats.append(av)
-                safe_lons.append(bv)
-        except Exception:
-            safe_lats.append(None)
-            safe_lons.append(None)
-
-    poi_nodes, poi_offsets = road_net.snap_points(
-        safe_lats,
-        safe_lons,
-        max_snap_m=ROAD_SNAP_TOLERANCE_M,
+            if center is None:
+                center = _center_routes(road_network, lat, lon, radius_km * 1000.0, path_encoding != "none")
+            network_dist_map, paths_map = _network_routes(
+                road_network,
+                lat,
+                lon,
+                cand_lats,
+                cand_lons,
+                radius_km * 1000.0,
+                include_paths=path_encoding != "none",
+                poi_snaps=(pois.nodes[candidate_idx], pois.snap_offsets_m[candidate_idx]),
+                center=center,
+                path_encoding=path_encoding,
+            )
+        except Exception as exc:
+            print(f"Warning: road distance calculation failed for {pois.category}: {exc}")
+            network_dist_map = {}
+
+    dists = candidate_dists.copy()
+    if network_dist_map:
+        dists[np.fromiter(network_dist_map.keys(), dtype=np.int64)] = np.fromiter(
+            network_dist_map.values(), dtype=np.float64
+        )
+    keep = np.flatnonzero(dists <= radius_km)
+    if keep.size == 0:
+        return None, None
+    dists = dists[keep]
+    columns: Dict[str, Any] = {
+        "name": pois.names(candidate_idx[keep]),
+        "lat": cand_lats[keep],
+        "lon": cand_lons[keep],
+        "distance_km": rounded(dists),
+        "weight": rounded(decay_weights(dists, radius_km, effective_decay_km)),
+    }
+    tree_json: Optional[Dict[str, Any]] = None
+    if path_encoding == "tree":
+        ends = [paths_map.get(pos) for pos in keep.tolist()]
+        routes = route_tree(center.tree, [e for e in ends if e is not None]) if center is not None else None
+        columns["path_node"] = [
+            routes.index.get(e) if routes is not None and e is not None else None for e in ends
+        ]
+        if routes is not None and road_network is not None:
+            tree_json = routes.to_json(road_network.node_coords)
+    elif path_encoding != "none":
+        columns["path"] = [paths_map.get(pos) for pos in keep.tolist()]
+    return columns, tree_json
+
+
+def _category_items(
+    pois: PoiCategory,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    effective_decay_km: float,
+    road_network: Optional[RoadNetwork],
+    fmt: ResultFormat = "records",
+    center: Optional[CenterRoutes] = None,
+    path_encoding: PathEncoding = "objects",
+) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """(items, route tree) of one category; items are records (``path`` only where
+    found) or columns."""
+    columns, tree_json = _category_columns(
+        pois, lat, lon, radius_km, effective_decay_km, road_network, center, path_encoding
     )
-    # If some POIs failed to snap, retry with a larger tolerance and only
-    # replace the failed entries so previously good snaps remain.
-    if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-        sec_nodes, sec_offsets = road_net.snap_points(
-            safe_lats,
-            safe_lons,
-            max_snap_m=SECONDARY_SNAP_TOLERANCE_M,
+    if columns is None:
+        return ([] if fmt == "records" else None), None
+    return render(columns, fmt, sparse=("path", "path_node")), tree_json
+
+
+_category_pool_lock = threading.Lock()
+_category_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_category_pool() -> ThreadPoolExecutor:
+    """Process-wide pool for per-category work; the NumPy/SciPy kernels release the GIL."""
+    global _category_pool
+    with _category_pool_lock:
+        if _category_pool is None:
+            _category_pool = ThreadPoolExecutor(
+                max_workers=CATEGORY_WORKERS, thread_name_prefix="sitex-pois"
+            )
+        return _category_pool
+
+
+def _iter_category_items(
+    store: PoiStore,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    effective_decay_km: float,
+    road_network: Optional[RoadNetwork],
+    fmt: ResultFormat = "records",
+    path_encoding: PathEncoding = "objects",
+) -> Iterator[Tuple[str, Any, Optional[Dict[str, Any]]]]:
+    """Yield (category, items, route tree) for every category in completion order.
+
+    The center is snapped and its shortest-path tree searched once, up front; the
+    categories then run concurrently against that shared tree.
+    """
+    center: Optional[CenterRoutes] = None
+    if road_network is not None:
+        try:
+            center = _center_routes(road_network, lat, lon, radius_km * 1000.0, path_encoding != "none")
+        except Exception as exc:
+            print(f"Warning: road routing failed for the center: {exc}")
+        if center is None:
+            # Without a routable center no category can get network distances.
+            road_network = None
+
+    def run(typ: str) -> Tuple[str, Any, Optional[Dict[str, Any]]]:
+        items, tree_json = _category_items(
+            store.category(typ), lat, lon, radius_km, effective_decay_km, road_network, fmt, center, path_encoding
         )
-        for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-            if (n is None or not math.isfinite(o)) and (sec_nodes[i] is not None and math.isfinite(sec_offsets[i])):
-                poi_nodes[i] = sec_nodes[i]
-                poi_offsets[i] = sec_offsets[i]
-    node_to_indices: Dict[int, List[int]] = defaultdict(list)
-    for idx, node_id in enumerate(poi_nodes):
-        if node_id is not None and math.isfinite(poi_offsets[idx]):
-            node_to_indices[int(node_id)].append(idx)
-    # If some points still failed to snap, use an infinite tolerance nearest-node
-    # fallback for those remaining so we can build paths for as many POIs as
-    # possible.
-    if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-        inf_nodes, inf_offsets = road_net.snap_points(
-            safe_lats, safe_lons, max_snap_m=float("inf")
+        return typ, items, tree_json
+
+    futures = [_get_category_pool().submit(run, typ) for typ in store.categories]
+    try:
+        for fut in as_completed(futures):
+            yield fut.result()
+    finally:
+        for fut in futures:
+            fut.cancel()
+
+
+def _collect_categories(
+    store: PoiStore,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    effective_decay_km: float,
+    road_network: Optional[RoadNetwork],
+    fmt: ResultFormat = "records",
+    path_encoding: PathEncoding = "objects",
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Non-empty items and route trees per category, in configuration order."""
+    found = {
+        typ: (items, tree_json)
+        for typ, items, tree_json in _iter_category_items(
+            store, lat, lon, radius_km, effective_decay_km, road_network, fmt, path_encoding
         )
-        for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-            if (n is None or not math.isfinite(o)) and (inf_nodes[i] is not None and math.isfinite(inf_offsets[i])):
-                poi_nodes[i] = inf_nodes[i]
-                poi_offsets[i] = inf_offsets[i]
-        node_to_indices = defaultdict(list)
-        for idx, node_id in enumerate(poi_nodes):
-            if node_id is not None and math.isfinite(poi_offsets[idx]):
-                node_to_indices[int(node_id)].append(idx)
-        if node_to_indices:
-            print("Info: using nearest-node fallback for POI snapping to improve coverage")
-    if not node_to_indices:
-        return {}
-    # Build a path for every snapped POI node (no cutoff). This ensures that
-    # any POI which was snapped to the graph receives a path following the
-    # roadway geometry. We still catch graph exceptions and skip unreachable
-    # nodes, but we attempt nearest-node fallbacks above so coverage is high.
-    paths: Dict[int, List[Dict[str, float]]] = {}
-    for node_id, poi_indices in node_to_indices.items():
-        if not poi_indices:
-            continue
-        for poi_idx in poi_indices:
-            try:
-                if center_node == node_id:
-                    node_path = [center_node]
-                else:
-                    node_path = nx.shortest_path(road_net.graph, source=center_node, target=node_id, weight="weight")
-            except (nx.NetworkXNoPath, nx.NodeNotFound):
-                # skip this POI if no path exists in the graph
-                continue
-            coords = []
-            # include original center coordinate as first
-            coords.append({"lat": float(center_lat), "lon": float(center_lon)})
-            for n in node_path:
-                lat_val, lon_val = road_net.node_coords[int(n)]
-                coords.append({"lat": float(lat_val), "lon": float(lon_val)})
-            # include original poi coordinate as final point
-            try:
-                plat = float(poi_lats.iloc[poi_idx])
-                plon = float(poi_lons.iloc[poi_idx])
-                coords.append({"lat": plat, "lon": plon})
-            except Exception:
-                pass
-            # Ensure we return at least three coordinates (center, at least one
-            # node coordinate, poi). If node_path contained only center_node,
-            # the above still appends that node's coords so we produce three
-            # points rather than a bare two-point direct line.
-            if len(coords) >= 3:
-                paths[poi_idx] = coords
-            else:
-                # as a last resort, include the node coords even if duplicates
-                # to guarantee a path structure.
-                paths[poi_idx] = coords
-    return paths
+    }
+    results = {typ: found[typ][0] for typ in store.categories if found.get(typ, (None,))[0]}
+    trees = {typ: found[typ][1] for typ in results if found[typ][1] is not None}
+    return results, trees
+
+
+def _with_paths(payload: Dict[str, Any], path_encoding: PathEncoding, trees: Dict[str, Any]) -> Dict[str, Any]:
+    if path_encoding != "objects":
+        payload["path_encoding"] = path_encoding
+    if path_encoding == "tree":
+        payload["route_trees"] = trees
+    return payload
 
 
 def get_pois_with_paths(
@@ -299,117 +480,26 @@ def get_pois_with_paths(
     lon: float,
     radius_km: float = 0.3,
     decay_scale_km: Optional[float] = None,
+    path_encoding: PathEncoding = "objects",
 ) -> Dict[str, Any]:
     """Programmatic helper used by scripts/tests: return mapping of categories->items including path geometry.
 
     This mirrors the behavior of the / API route but is callable directly from Python code.
     """
-    # locate project CSV folder relative to this file
-    data_dir = Path(__file__).resolve().parents[3] / "Data" / "CSV"
-    if not data_dir.exists():
-        alt = Path(__file__).resolve().parents[3] / "Data" / "CSV_Reference" / "final"
-        if alt.exists():
-            data_dir = alt
-        else:
-            raise RuntimeError(f"Data folder not found at {data_dir} or {alt}")
-
+    store = _get_poi_store()
     road_network = _get_road_network()
-    radius_m = float(radius_km) * 1000.0
     effective_decay_km = radius_km if decay_scale_km is None else float(decay_scale_km)
+    results, _ = _collect_categories(
+        store, lat, lon, radius_km, effective_decay_km, road_network, path_encoding=path_encoding
+    )
+    return results
 
-    poi_files = {
-        "cafes": "cafes.csv",
-        "banks": "banks.csv",
-        "education": "education.csv",
-        "health": "health.csv",
-        "temples": "temples.csv",
-        "other": "other.csv",
-    }
-
-    results: Dict[str, Any] = {}
-    for typ, fname in poi_files.items():
-        fpath = data_dir / fname
-        if not fpath.exists():
-            continue
-        df = pd.read_csv(fpath).reset_index(drop=True)
-        lat_col = None
-        lon_col = None
-        for c in df.columns:
-            cl = c.lower()
-            if cl in ("lat", "latitude", "y"):
-                lat_col = c
-            if cl in ("lon", "lng", "longitude", "x"):
-                lon_col = c
-        if lat_col is None or lon_col is None:
-            continue
-
-        df[lat_col] = pd.to_numeric(df[lat_col], errors="coerce")
-        df[lon_col] = pd.to_numeric(df[lon_col], errors="coerce")
 
-        lat_arr = df[lat_col].to_numpy(dtype=np.float64, copy=False)
-        lon_arr = df[lon_col].to_numpy(dtype=np.float64, copy=False)
-        valid_mask = np.isfinite(lat_arr) & np.isfinite(lon_arr)
-        if not np.any(valid_mask):
-            continue
-        valid_idx = np.nonzero(valid_mask)[0]
-        dists_km = _haversine_vec_km(lat, lon, lat_arr[valid_mask], lon_arr[valid_mask])
-        within_mask = dists_km <= radius_km
-        if not np.any(within_mask):
-            continue
-        candidate_idx = valid_idx[within_mask]
-        candidate_dists = dists_km[within_mask]
-        subset = df.iloc[candidate_idx].copy()
-        orig_idx = subset.index.to_numpy()
-        subset = subset.reset_index(drop=True)
-
-        network_dist_map: Dict[int, float] = {}
-        paths_map: Dict[int, List[Dict[str, float]]] = {}
-        if road_network is not None:
-            try:
-                network_dist_map = _network_distance_map(
-                    road_network, lat, lon, subset[lat_col], subset[lon_col], radius_m
-                )
-                paths_map = _network_path_map(
-                    road_network, lat, lon, subset[lat_col], subset[lon_col], radius_m
-                )
-            except Exception:
-                network_dist_map = {}
-
-        items = []
-        for pos, row in subset.iterrows():
-            _ = orig_idx[pos]
-            try:
-                rlat = float(row[lat_col])
-                rlon = float(row[lon_col])
-            except Exception:
-                continue
-            if not math.isfinite(rlat) or not math.isfinite(rlon):
-                continue
-            d = network_dist_map.get(pos)
-            if d is None:
-                d = float(candidate_dists[pos])
-            if d <= radius_km:
-                name = None
-                for name_key in ("name", "Name", "NAME"):
-                    if name_key in row:
-                        name = row[name_key]
-                        break
-                try:
-                    base_weight = max(0.0, 1.0 - (d / radius_km))
-                except Exception:
-                    base_weight = 0.0
-                try:
-                    weight_val = base_weight * math.exp(-float(d) / float(effective_decay_km))
-                except Exception:
-                    weight_val = base_weight
-                item: Dict[str, Any] = {"name": name, "lat": rlat, "lon": rlon, "distance_km": round(d, 4), "weight": round(weight_val, 4)}
-                path = paths_map.get(pos)
-                if path:
-                    item["path"] = path
-                items.append(item)
-        if items:
-            results[typ] = items
-    return results
+PATH_ENCODING_HELP = (
+    "Path geometry: objects ({lat, lon} list), polyline (Google encoded string, precision 5), "
+    "delta-int32 (fixed-point 1e-6 deg deltas), tree (shared route tree per category; each item "
+    "gets path_node), or none"
+)
 
 
 @router.get("/")
@@ -419,152 +509,53 @@ def get_pois(
     radius_km: float = Query(0.3, gt=0, description="Search radius in kilometers (default 0.3 km). Use smaller radius for denser areas"),
     decay_scale_km: Optional[float] = Query(None, gt=0, description="Exponential decay scale in kilometers for distance weighting (defaults to radius_km)"),
     stream: bool = Query(False, description="If true, return a streaming (chunked) JSON response with categories as they become available"),
+    format: ResultFormat = Query("records", description="records: a list of items per category; columns: parallel arrays per category"),
+    path_encoding: PathEncoding = Query("objects", description=PATH_ENCODING_HELP),
+    request: Request = None,
 ) -> Any:
-    # locate project CSV folder relative to this file
-    data_dir = Path(__file__).resolve().parents[3] / "Data" / "CSV"
-    # fallback to CSV_Reference if CSV doesn't exist (some repos use that)
-    if not data_dir.exists():
-        alt = Path(__file__).resolve().parents[3] / "Data" / "CSV_Reference" / "final"
-        if alt.exists():
-            data_dir = alt
-        else:
-            raise HTTPException(status_code=500, detail=f"Data folder not found at {data_dir} or {alt}")
-
+    store = _get_poi_store()
+    try:
+        store.data_dir()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
     road_network = _get_road_network()
-    radius_m = radius_km * 1000.0
     effective_decay_km = radius_km if decay_scale_km is None else float(decay_scale_km)
 
-    poi_files = {
-        "cafes": "cafes.csv",
-        "banks": "banks.csv",
-        "education": "education.csv",
-        "health": "health.csv",
-        "temples": "temples.csv",
-        "other": "other.csv",
-    }
-
-    def process_one_category(typ: str, fname: str):
-        fpath = data_dir / fname
-        if not fpath.exists():
-            base = fname[:-4].lower()
-            alt_file = None
-            for p in data_dir.glob("*.csv"):
-                pn = p.name.lower()
-                if base in pn or (base.endswith("s") and base[:-1] in pn) or (base.endswith("es") and base[:-2] in pn):
-                    alt_file = p
-                    break
-            if alt_file is None:
-                return typ, []
-            fpath = alt_file
-        df = pd.read_csv(fpath).reset_index(drop=True)
-
-        lat_col = None
-        lon_col = None
-        for c in df.columns:
-            cl = c.lower()
-            if cl in ("lat", "latitude", "y"):
-                lat_col = c
-            if cl in ("lon", "lng", "longitude", "x"):
-                lon_col = c
-        if lat_col is None or lon_col is None:
-            num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-            if len(num_cols) >= 2:
-                lat_col, lon_col = num_cols[0], num_cols[1]
-            else:
-                return typ, []
-
-        df[lat_col] = pd.to_numeric(df[lat_col], errors="coerce")
-        df[lon_col] = pd.to_numeric(df[lon_col], errors="coerce")
-
-        lat_arr = df[lat_col].to_numpy(dtype=np.float64, copy=False)
-        lon_arr = df[lon_col].to_numpy(dtype=np.float64, copy=False)
-        valid_mask = np.isfinite(lat_arr) & np.isfinite(lon_arr)
-        if not np.any(valid_mask):
-            return typ, []
-        valid_idx = np.nonzero(valid_mask)[0]
-        dists_km = _haversine_vec_km(lat, lon, lat_arr[valid_mask], lon_arr[valid_mask])
-        within_mask = dists_km <= radius_km
-        if not np.any(within_mask):
-            return typ, []
-        candidate_idx = valid_idx[within_mask]
-        candidate_dists = dists_km[within_mask]
-        subset = df.iloc[candidate_idx].copy()
-        orig_idx = subset.index.to_numpy()
-        subset = subset.reset_index(drop=True)
-
-        network_dist_map: Dict[int, float] = {}
-        paths_map: Dict[int, List[Dict[str, float]]] = {}
-        if road_network is not None:
-            try:
-                network_dist_map = _network_distance_map(
-                    road_network, lat, lon, subset[lat_col], subset[lon_col], radius_m
-                )
-                paths_map = _network_path_map(
-                    road_network, lat, lon, subset[lat_col], subset[lon_col], radius_m
-                )
-            except Exception as exc:
-                print(f"Warning: road distance calculation failed for {typ}: {exc}")
-                network_dist_map = {}
-
-        items = []
-        for pos, row in subset.iterrows():
-            _ = orig_idx[pos]
-            try:
-                rlat = float(row[lat_col])
-                rlon = float(row[lon_col])
-            except Exception:
-                continue
-            if not math.isfinite(rlat) or not math.isfinite(rlon):
-                continue
-            d = network_dist_map.get(pos)
-            if d is None:
-                d = float(candidate_dists[pos])
-            if d <= radius_km:
-                name = None
-                for name_key in ("name", "Name", "NAME"):
-                    if name_key in row:
-                        name = row[name_key]
-                        break
-                item: Dict[str, Any] = {"name": name, "lat": rlat, "lon": rlon, "distance_km": round(d, 4)}
-                try:
-                    # base linear weight (keeps compatibility)
-                    base_weight = max(0.0, 1.0 - (d / radius_km))
-                except Exception:
-                    base_weight = 0.0
-                try:
-                    # apply exponential decay based on distance (km)
-                    decayed = base_weight * math.exp(-float(d) / float(effective_decay_km))
-                    weight_val = decayed
-                except Exception:
-                    weight_val = base_weight
-                item["weight"] = round(weight_val, 4)
-                path = paths_map.get(pos)
-                if path:
-                    item["path"] = path
-                items.append(item)
-        # ensure we always return a tuple (category, items)
-        return typ, items
     # determine streaming flag
     is_stream = isinstance(stream, bool) and stream
     if is_stream:
         def iter_response_ndjson():
-            for typ, fname in poi_files.items():
-                cat, items = process_one_category(typ, fname)
+            # Categories are written as soon as each finishes, not in configuration order.
+            for cat, items, tree_json in _iter_category_items(
+                store, lat, lon, radius_km, effective_decay_km, road_network, format, path_encoding
+            ):
                 if not items:
                     continue
-                obj = {"category": cat, "items": items}
+                obj = {"category": cat, "columns" if format == "columns" else "items": items}
+                if tree_json is not None:
+                    obj["route_tree"] = tree_json
                 yield (json.dumps(obj, default=str) + "\n").encode()
 
         return StreamingResponse(iter_response_ndjson(), media_type='application/x-ndjson')
 
     # Non-streaming (original) behavior: compute all categories and return
-    results: Dict[str, Any] = {}
-    for typ, fname in poi_files.items():
-        cat, items = process_one_category(typ, fname)
-        if items:
-            results[typ] = items
+    point = cache_point(request, lat, lon)
 
-    return {"center": {"lat": lat, "lon": lon}, "radius_km": radius_km, "pois": results}
+    def build() -> Dict[str, Any]:
+        results, trees = _collect_categories(
+            store, point.at_lat, point.at_lon, radius_km, effective_decay_km, road_network, format, path_encoding
+        )
+        payload: Dict[str, Any] = {
+            "center": {"lat": point.at_lat, "lon": point.at_lon},
+            "radius_km": radius_km,
+            "pois": results,
+        }
+        if format == "columns":
+            payload["format"] = "columns"
+        return _with_paths(payload, path_encoding, trees)
+
+    key = ("pois", point.key, radius_km, effective_decay_km, format, path_encoding)
+    return cached_json(_RESPONSE_CACHE, request, key, data_version, build, [point])
 
 
 @router.get("/detailed")
@@ -573,9 +564,28 @@ def get_pois_detailed(
     lon: float = Query(..., description="Longitude of center"),
     radius_km: float = Query(0.3, gt=0, description="Search radius in kilometers (default 0.3 km)."),
     decay_scale_km: Optional[float] = Query(None, gt=0, description="Exponential decay scale in kilometers for distance weighting (defaults to radius_km)"),
+    path_encoding: PathEncoding = Query("objects", description=PATH_ENCODING_HELP),
+    request: Request = None,
 ) -> Any:
+    point = cache_point(request, lat, lon)
+
+    def build() -> Dict[str, Any]:
+        store = _get_poi_store()
+        effective_decay_km = radius_km if decay_scale_km is None else float(decay_scale_km)
+        pois, trees = _collect_categories(
+            store,
+            point.at_lat,
+            point.at_lon,
+            radius_km,
+            effective_decay_km,
+            _get_road_network(),
+            path_encoding=path_encoding,
+        )
+        payload = {"center": {"lat": point.at_lat, "lon": point.at_lon}, "radius_km": radius_km, "pois": pois}
+        return _with_paths(payload, path_encoding, trees)
+
     try:
-        pois = get_pois_with_paths(lat=lat, lon=lon, radius_km=radius_km, decay_scale_km=decay_scale_km)
-        return {"center": {"lat": lat, "lon": lon}, "radius_km": radius_km, "pois": pois}
+        key = ("detailed", point.key, radius_km, decay_scale_km, path_encoding)
+        return cached_json(_RESPONSE_CACHE, request, key, data_version, build, [point])
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(exc))
@@ -1,10 +1,19 @@
-from fastapi import APIRouter, HTTPException
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from app.api.response_cache import ResponseCache, cache_points, cached_json
 from app.services.gnn_prediction_service import GNNPredictionService
 
 router = APIRouter()
 
+# Serialized responses keyed by the requested locations and the loaded graph and weights.
+_RESPONSE_CACHE = ResponseCache("predict")
+
+# Threads scoring the locations of one request (GNN inference leaves the shared graph untouched).
+PREDICT_WORKERS = min(4, os.cpu_count() or 1)
+
 class Location(BaseModel):
     lat: float
     lon: float
@@ -23,23 +32,48 @@ class PredictionResponse(BaseModel):
 
 
 @router.post("/predict/", response_model=PredictionResponse)
-def predict_score(request: PredictionRequest):
+def predict_score(request: PredictionRequest, http_request: Request = None):
     """
     Predict success scores for multiple new cafe locations using GNN.
     """
     service = GNNPredictionService.get_instance()
+    points = cache_points(http_request, [(loc.lat, loc.lon) for loc in request.locations])
+    computed = PredictionRequest(locations=[Location(lat=p.at_lat, lon=p.at_lon) for p in points])
+    return cached_json(
+        _RESPONSE_CACHE,
+        http_request,
+        tuple(p.key for p in points),
+        service.data_version,
+        lambda: _predict_locations(service, computed),
+        points,
+    )
+
+
+def _predict_one(service: GNNPredictionService, loc: Location) -> Tuple[Optional[Dict[str, Any]], Optional[Exception]]:
+    try:
+        return service.predict(loc.lat, loc.lon), None
+    except Exception as e:
+        return None, e
+
+
+def _predict_locations(service: GNNPredictionService, request: PredictionRequest) -> Dict[str, Any]:
     results = []
     errors = []
-    for loc in request.locations:
-        try:
-            prediction = service.predict(loc.lat, loc.lon)
+    workers = max(1, min(len(request.locations), PREDICT_WORKERS))
+    if workers == 1:
+        outcomes = [_predict_one(service, loc) for loc in request.locations]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sitex-predict") as pool:
+            outcomes = list(pool.map(lambda loc: _predict_one(service, loc), request.locations))
+    for loc, (prediction, e) in zip(request.locations, outcomes):
+        if e is None:
             results.append({
                 "lat": loc.lat,
                 "lon": loc.lon,
                 "score": prediction['predicted_score'],
                 "risk_level": prediction['risk_level']
             })
-        except Exception as e:
+        else:
             errors.append({
                 "lat": loc.lat,
                 "lon": loc.lon,
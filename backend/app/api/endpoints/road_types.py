@@ -1,32 +1,34 @@
-from functools import lru_cache
-from pathlib import Path
 from typing import Any, Dict, List
 
 import math
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 
+from app.api.response_cache import ResponseCache, cache_point, cached_json
 from app.lib.road_type_network import ROAD_TYPE_WEIGHTS, RoadTypeNetwork
+from app.services.registry import get_registry
 
 router = APIRouter(prefix="/road-types")
 
-DATA_ROOT = Path(__file__).resolve().parents[3]
-ROAD_GEOJSON = DATA_ROOT / "Data" / "Roadway.geojson"
-ROAD_CACHE = ROAD_GEOJSON.with_suffix(".roadtypes.pkl")
-ROAD_SNAP_TOLERANCE_M = 120.0
 SECONDARY_SNAP_TOLERANCE_M = 300.0
 DEFAULT_SNAP_WEIGHT_SHARE = 0.9
 
+# Serialized responses of both endpoints; they depend only on the road graph.
+_RESPONSE_CACHE = ResponseCache("road_types")
+
+
+def _road_version() -> int:
+    return get_registry().current().version
+
 
-@lru_cache(maxsize=1)
 def _get_road_type_network() -> RoadTypeNetwork:
-    if not ROAD_GEOJSON.exists():
-        raise FileNotFoundError(f"Roadway GeoJSON not found at {ROAD_GEOJSON}")
-    return RoadTypeNetwork.from_geojson(
-        ROAD_GEOJSON,
-        cache_path=ROAD_CACHE,
-        snap_tolerance_m=ROAD_SNAP_TOLERANCE_M,
-    )
+    registry = get_registry()
+    bundle = registry.current()
+    if bundle.road_type_network is not None:
+        return bundle.road_type_network
+    if not registry.road_geojson.exists():
+        raise FileNotFoundError(f"Roadway GeoJSON not found at {registry.road_geojson}")
+    raise RuntimeError(bundle.errors.get("road_type_network", "road type network unavailable"))
 
 
 @router.get("/")
@@ -35,6 +37,7 @@ def get_road_types(
     lon: float = Query(..., description="Longitude of center"),
     radius_km: float = Query(1.0, gt=0, description="Search radius in kilometers (default 1.0 km)."),
     decay_scale_km: float = Query(0.3, gt=0, description="Exponential decay scale in kilometers for weighting (default 0.3 km)."),
+    request: Request = None,
 ) -> Any:
     try:
         road_network = _get_road_type_network()
@@ -43,6 +46,19 @@ def get_road_types(
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to load road network: {exc}")
 
+    point = cache_point(request, lat, lon)
+    key = ("road_types", point.key, radius_km)
+    return cached_json(
+        _RESPONSE_CACHE,
+        request,
+        key,
+        _road_version,
+        lambda: _road_types_payload(road_network, point.at_lat, point.at_lon, radius_km),
+        [point],
+    )
+
+
+def _road_types_payload(road_network: RoadTypeNetwork, lat: float, lon: float, radius_km: float) -> Dict[str, Any]:
     decay_scale_km = float(radius_km)
     radius_m = float(radius_km) * 1000.0
     result = road_network.road_type_distance_map(
@@ -118,6 +134,7 @@ def get_summary_accessibility(
         le=1.0,
         description="Share of the final score driven by the initial snap road type.",
     ),
+    request: Request = None,
 ) -> Any:
     try:
         road_network = _get_road_type_network()
@@ -126,6 +143,25 @@ def get_summary_accessibility(
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to load road network: {exc}")
 
+    point = cache_point(request, lat, lon)
+    key = ("summary", point.key, radius_km, float(snap_weight_share))
+    return cached_json(
+        _RESPONSE_CACHE,
+        request,
+        key,
+        _road_version,
+        lambda: _summary_payload(road_network, point.at_lat, point.at_lon, radius_km, snap_weight_share),
+        [point],
+    )
+
+
+def _summary_payload(
+    road_network: RoadTypeNetwork,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    snap_weight_share: float,
+) -> Dict[str, Any]:
     decay_scale_km = float(radius_km)
     radius_m = float(radius_km) * 1000.0
     result = road_network.road_type_distance_map(
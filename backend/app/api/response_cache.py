@@ -0,0 +1,285 @@
+"""Server-side cache of serialized JSON responses for repeat views.
+
+The UI re-requests the same analyses for the same (or nearly the same) points as
+users toggle layers. Endpoints hand ``cached_json`` a key built from their
+parameters (coordinates via ``cache_point``), a data version and a function that
+builds the payload. The serialized body is kept in a byte-bounded LRU together
+with a strong ETag:
+
+* a hit returns the stored bytes without recomputing or re-serializing;
+* with ``SITEX_RESPONSE_CACHE_GRID_M`` > 0, requests in one grid cell share a body
+  computed at the cell centre, and each response has the centre's coordinates
+  replaced by the request's own (``CachePoint``);
+* a request whose ``If-None-Match`` matches gets ``304 Not Modified``;
+* a new data version (road graph reload, changed POI CSV) drops every entry of
+  that cache.
+
+Direct calls of the endpoint functions (no ``Request``) bypass the cache and get
+the plain payload, as before.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+DEFAULT_RESPONSE_CACHE_BYTES = int(float(os.getenv("SITEX_RESPONSE_CACHE_MB", "32")) * 1024 * 1024)
+# Cell size (metres) used to quantize coordinates in cache keys. Points in the same
+# cell share a response computed at the cell centre; 0 keys on the exact coordinates.
+COORD_GRID_M = float(os.getenv("SITEX_RESPONSE_CACHE_GRID_M", "0"))
+
+_METRES_PER_DEG_LAT = 111_320.0
+
+
+def coord_key(lat: float, lon: float, grid_m: Optional[float] = None) -> Tuple[float, float]:
+    """(lat, lon) for a cache key: unchanged, or grid cell indices when ``grid_m`` > 0."""
+    return _grid_cell(float(lat), float(lon), COORD_GRID_M if grid_m is None else float(grid_m))[0]
+
+
+def _grid_cell(lat: float, lon: float, grid_m: float) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """(cache key, cell centre) of a coordinate; both are the coordinate itself without a grid."""
+    if grid_m <= 0 or not (math.isfinite(lat) and math.isfinite(lon)):
+        return (lat, lon), (lat, lon)
+    step_lat = grid_m / _METRES_PER_DEG_LAT
+    row = math.floor(lat / step_lat)
+    centre_lat = (row + 0.5) * step_lat
+    # Column width follows the row's centre latitude, so a cell has one centre.
+    step_lon = step_lat / max(math.cos(math.radians(centre_lat)), 1e-6)
+    col = math.floor(lon / step_lon)
+    return (row, col), (centre_lat, (col + 0.5) * step_lon)
+
+
+@dataclass(frozen=True)
+class CachePoint:
+    """A requested coordinate, its cache key, and the coordinate the response is computed at.
+
+    Endpoints compute at ``at_lat, at_lon`` and pass the point to ``cached_json``,
+    which puts ``lat, lon`` back wherever the body echoes the computed coordinate.
+    """
+
+    lat: float
+    lon: float
+    key: Tuple[float, float]
+    at_lat: float
+    at_lon: float
+
+    @property
+    def moved(self) -> bool:
+        return (self.at_lat, self.at_lon) != (self.lat, self.lon)
+
+
+def cache_points(
+    request: Optional[Request],
+    coords: Sequence[Tuple[float, float]],
+    grid_m: Optional[float] = None,
+) -> List[CachePoint]:
+    """``CachePoint`` per ``(lat, lon)``; quantized only for HTTP requests with a grid.
+
+    A computed latitude or longitude shared by points that requested different
+    values could not be restamped unambiguously, so such requests key on the
+    exact coordinates instead.
+    """
+    grid = COORD_GRID_M if grid_m is None else float(grid_m)
+    exact = [CachePoint(float(a), float(b), (float(a), float(b)), float(a), float(b)) for a, b in coords]
+    if request is None or grid <= 0:
+        return exact
+    points = []
+    for p in exact:
+        key, (at_lat, at_lon) = _grid_cell(p.lat, p.lon, grid)
+        points.append(CachePoint(p.lat, p.lon, key, at_lat, at_lon))
+    swaps: Dict[float, float] = {}
+    for p in points:
+        for at, value in ((p.at_lat, p.lat), (p.at_lon, p.lon)):
+            if swaps.setdefault(at, value) != value:
+                return exact
+    return points
+
+
+def cache_point(request: Optional[Request], lat: float, lon: float, grid_m: Optional[float] = None) -> CachePoint:
+    """Single-coordinate ``cache_points``."""
+    return cache_points(request, [(lat, lon)], grid_m)[0]
+
+
+def restamp(body: bytes, points: Sequence[CachePoint]) -> bytes:
+    """Replace every JSON number equal to a point's computed coordinate with the requested one."""
+    swaps: Dict[bytes, bytes] = {}
+    for p in points:
+        if p.moved:
+            swaps[encode_json(p.at_lat)] = encode_json(p.lat)
+            swaps[encode_json(p.at_lon)] = encode_json(p.lon)
+    if not swaps:
+        return body
+    alternatives = b"|".join(re.escape(k) for k in sorted(swaps, key=len, reverse=True))
+    pattern = re.compile(rb"(?<![\w.+-])(" + alternatives + rb")(?![\w.])")
+    return pattern.sub(lambda m: swaps[m.group(1)], body)
+
+
+def encode_json(payload: Any) -> bytes:
+    """Serialize ``payload`` exactly as FastAPI's default ``JSONResponse`` would."""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header value matches ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    etag: str
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body)
+
+
+class ResponseCache:
+    """Thread-safe LRU of serialized responses, bounded in bytes and tied to one data version."""
+
+    def __init__(self, name: str, max_bytes: int = DEFAULT_RESPONSE_CACHE_BYTES) -> None:
+        self.name = name
+        self.max_bytes = max(int(max_bytes), 0)
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._bytes = 0
+        self._version: Hashable = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _CACHES[name] = self
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[CachedBody]:
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, version: Hashable, body: bytes) -> CachedBody:
+        entry = CachedBody(body, etag_for(body))
+        if entry.nbytes > self.max_bytes:
+            return entry
+        with self._lock:
+            self._check_version(version)
+            current = self._entries.pop(key, None)
+            if current is not None:
+                self._bytes -= current.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return entry
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _check_version(self, version: Hashable) -> None:
+        if version == self._version:
+            return
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+        self._version = version
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
+
+
+_CACHES: Dict[str, ResponseCache] = {}
+
+
+def response_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """``stats()`` of every response cache, by name."""
+    return {name: cache.stats() for name, cache in sorted(_CACHES.items())}
+
+
+def cached_json(
+    cache: ResponseCache,
+    request: Optional[Request],
+    key: Hashable,
+    version: Callable[[], Hashable],
+    build: Callable[[], Any],
+    points: Sequence[CachePoint] = (),
+) -> Any:
+    """Serve ``build()`` through ``cache``; see the module docstring.
+
+    ``version`` is only evaluated for HTTP requests. If it raises, the response is
+    built uncached so the endpoint reports its own error. ``points`` are the
+    coordinates ``build`` computes at (see ``cache_points``).
+    """
+    if request is None:
+        return build()
+    try:
+        data_version = version()
+    except Exception:
+        return build()
+    entry = cache.get(key, data_version)
+    state = "HIT"
+    if entry is None:
+        state = "MISS"
+        entry = cache.put(key, data_version, encode_json(build()))
+    body, etag = entry.body, entry.etag
+    if any(p.moved for p in points):
+        body = restamp(body, points)
+        etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Cache": state}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,235 @@
+import math
+from typing import Dict, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as _csgraph_dijkstra
+except ImportError:  # pragma: no cover
+    csr_matrix = None
+    _csgraph_dijkstra = None
+
+
+NO_PREDECESSOR = -9999
+
+
+def csr_routing_available() -> bool:
+    return _csgraph_dijkstra is not None
+
+
+class CSRGraph:
+    """Compressed-sparse-row adjacency for a road graph with integer node ids 0..n-1.
+
+    Every undirected edge is stored in both directions so searches can run as
+    directed graphs, which avoids scipy re-symmetrising the matrix per query.
+    ``codes`` optionally carries a small integer label per stored edge (e.g. road type).
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        weights: np.ndarray,
+        codes: Optional[np.ndarray] = None,
+    ) -> None:
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.codes = np.asarray(codes, dtype=np.int16) if codes is not None else None
+        self._matrix = None
+
+    @classmethod
+    def from_edges(
+        cls,
+        node_count: int,
+        src: np.ndarray,
+        dst: np.ndarray,
+        weights: np.ndarray,
+        directed: bool = False,
+        codes: Optional[np.ndarray] = None,
+    ) -> "CSRGraph":
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        if codes is not None:
+            codes = np.asarray(codes, dtype=np.int16)
+        if not directed:
+            src, dst = np.concatenate((src, dst)), np.concatenate((dst, src))
+            weights = np.concatenate((weights, weights))
+            if codes is not None:
+                codes = np.concatenate((codes, codes))
+        order = np.lexsort((dst, src))
+        src = src[order]
+        counts = np.bincount(src, minlength=node_count) if src.size else np.zeros(node_count, dtype=np.int64)
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(indptr, dst[order], weights[order], codes[order] if codes is not None else None)
+
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph, node_count: int, weight: str = "weight") -> Optional["CSRGraph"]:
+        """Pack ``graph`` into CSR arrays, or return None if its nodes are not 0..node_count-1."""
+        if graph.number_of_nodes() != node_count:
+            return None
+        for node in graph.nodes:
+            if not isinstance(node, (int, np.integer)) or not 0 <= int(node) < node_count:
+                return None
+        edge_count = graph.number_of_edges()
+        src = np.empty(edge_count, dtype=np.int64)
+        dst = np.empty(edge_count, dtype=np.int64)
+        weights = np.empty(edge_count, dtype=np.float32)
+        for i, (u, v, w) in enumerate(graph.edges(data=weight, default=0.0)):
+            src[i] = u
+            dst[i] = v
+            weights[i] = w
+        return cls.from_edges(node_count, src, dst, weights, directed=graph.is_directed())
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "CSRGraph":
+        return cls(arrays["indptr"], arrays["indices"], arrays["weights"], arrays.get("edge_codes"))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"indptr": self.indptr, "indices": self.indices, "weights": self.weights}
+        if self.codes is not None:
+            arrays["edge_codes"] = self.codes
+        return arrays
+
+    @property
+    def node_count(self) -> int:
+        return int(self.indptr.shape[0] - 1)
+
+    @property
+    def nnz(self) -> int:
+        return int(self.indices.shape[0])
+
+    def neighbors(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = int(self.indptr[node]), int(self.indptr[node + 1])
+        return self.indices[start:end], self.weights[start:end]
+
+    def with_weights(self, weights: np.ndarray) -> "CSRGraph":
+        """Return a graph sharing this adjacency but with different per-edge weights."""
+        return CSRGraph(self.indptr, self.indices, weights, self.codes)
+
+    def edge_sources(self) -> np.ndarray:
+        """Return the source node of every stored (directed) edge, aligned with ``indices``."""
+        return np.repeat(np.arange(self.node_count, dtype=np.int32), np.diff(self.indptr))
+
+    def to_networkx(self, directed: bool = False) -> nx.Graph:
+        graph = nx.DiGraph() if directed else nx.Graph()
+        graph.add_nodes_from(range(self.node_count))
+        graph.add_weighted_edges_from(
+            zip(self.edge_sources().tolist(), self.indices.tolist(), self.weights.astype(np.float64).tolist())
+        )
+        return graph
+
+    def matrix(self):
+        """Return a cached float64 scipy CSR matrix (scipy converts float32 input on every call)."""
+        if self._matrix is None:
+            if csr_matrix is None:
+                raise RuntimeError("scipy is required for CSR routing")
+            n = self.node_count
+            self._matrix = csr_matrix(
+                (self.weights.astype(np.float64), self.indices, self.indptr),
+                shape=(n, n),
+            )
+        return self._matrix
+
+    def dijkstra(
+        self,
+        source,
+        cutoff: Optional[float] = None,
+        return_predecessors: bool = False,
+    ):
+        """Run (bounded) Dijkstra from ``source`` (a node id or array of node ids).
+
+        Returns an array of distances in metres with ``inf`` for nodes farther than
+        ``cutoff`` or unreachable; with ``return_predecessors`` also returns the
+        predecessor array (``NO_PREDECESSOR`` for roots and unreached nodes).
+        """
+        if _csgraph_dijkstra is None:
+            raise RuntimeError("scipy is required for CSR routing")
+        limit = np.inf if cutoff is None or not math.isfinite(float(cutoff)) else float(cutoff)
+        return _csgraph_dijkstra(
+            self.matrix(),
+            directed=True,
+            indices=source,
+            return_predecessors=return_predecessors,
+            limit=limit,
+        )
+
+    def edge_lengths(self, u, v) -> np.ndarray:
+        """Weight of the edge from each ``u`` to the matching ``v`` (shortest if repeated, nan if absent)."""
+        u = np.asarray(u, dtype=np.int64).reshape(-1)
+        v = np.asarray(v, dtype=np.int64).reshape(-1)
+        out = np.full(u.shape[0], np.nan)
+        valid = (u >= 0) & (u < self.node_count)
+        rows = np.flatnonzero(valid)
+        if rows.size == 0:
+            return out
+        starts = self.indptr[u[rows]].astype(np.int64)
+        degree = self.indptr[u[rows] + 1].astype(np.int64) - starts
+        # Flatten every candidate row slice: owner is the query, slots the stored edge.
+        owner = np.repeat(np.arange(rows.size), degree)
+        first = np.cumsum(degree) - degree
+        slots = np.repeat(starts - first, degree) + np.arange(owner.size)
+        match = self.indices[slots] == v[rows][owner]
+        best = np.full(rows.size, np.inf)
+        np.minimum.at(best, owner[match], self.weights[slots[match]].astype(np.float64))
+        out[rows] = np.where(np.isfinite(best), best, np.nan)
+        return out
+
+    def dijkstra_from_edges(self, u, v, leg_u, leg_v, cutoff: Optional[float] = None) -> np.ndarray:
+        """Distances from points lying on edges to every node, one row per point.
+
+        Each point enters the graph as a virtual node with an edge of ``leg_u`` to
+        ``u`` and of ``leg_v`` to ``v``; virtual nodes have no incoming edges, so a
+        single multi-source search serves all points without routing through them.
+        """
+        if _csgraph_dijkstra is None:
+            raise RuntimeError("scipy is required for CSR routing")
+        u = np.asarray(u, dtype=np.int64).reshape(-1)
+        n = self.node_count
+        if u.size == 0:
+            return np.empty((0, n))
+        heads = np.column_stack((u, np.asarray(v, dtype=np.int64).reshape(-1))).reshape(-1)
+        legs = np.column_stack((
+            np.asarray(leg_u, dtype=np.float64).reshape(-1),
+            np.asarray(leg_v, dtype=np.float64).reshape(-1),
+        )).reshape(-1)
+        base = self.matrix()
+        size = n + u.size
+        graph = csr_matrix(
+            (
+                np.concatenate((base.data, legs)),
+                np.concatenate((base.indices, heads)),
+                np.concatenate((base.indptr, base.indptr[-1] + 2 * np.arange(1, u.size + 1))),
+            ),
+            shape=(size, size),
+        )
+        limit = np.inf if cutoff is None or not math.isfinite(float(cutoff)) else float(cutoff)
+        dist = _csgraph_dijkstra(graph, directed=True, indices=np.arange(n, size), limit=limit)
+        return np.atleast_2d(dist)[:, :n]
+
+    def nearest_source(self, sources, cutoff: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Distance from every node to its closest node in ``sources``, and that node.
+
+        One multi-source search; edges are stored in both directions, so this is also
+        the distance from that source. Nodes with no source within ``cutoff`` get
+        ``inf`` and -1.
+        """
+        if _csgraph_dijkstra is None:
+            raise RuntimeError("scipy is required for CSR routing")
+        sources = np.asarray(sources, dtype=np.int64)
+        if sources.size == 0:
+            return np.full(self.node_count, np.inf), np.full(self.node_count, -1, dtype=np.int64)
+        limit = np.inf if cutoff is None or not math.isfinite(float(cutoff)) else float(cutoff)
+        dist, _, nearest = _csgraph_dijkstra(
+            self.matrix(),
+            directed=True,
+            indices=sources,
+            return_predecessors=True,
+            limit=limit,
+            min_only=True,
+        )
+        return dist, np.where(nearest < 0, -1, nearest).astype(np.int64)
@@ -6,4 +6,6 @@ graph_builder   Build a heterogeneous graph from the OSMnx road network + POI CS
 node_features   Compute per-node feature vectors for each node type.
 edge_features   Compute per-edge feature vectors for each edge type.
 gnn_model       GraphSAGE / GAT model definition (requires torch + torch_geometric).
+overlay         Per-request virtual nodes and k-hop computation subgraphs for inference.
+embedding_cache Cached per-layer states of the static graph; only a new node's own layers are computed.
 """
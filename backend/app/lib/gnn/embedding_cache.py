@@ -0,0 +1,346 @@
+"""
+embedding_cache.py — Cached hidden states of the static graph for incremental GNN inference.
+
+The trained graph does not change between requests, so the layer-wise hidden
+states of its nodes, and per edge type the mean of the states each node
+aggregates, can be computed once. For a request's virtual nodes only the
+states that change are recomputed:
+
+  layer 0   the virtual nodes' input projections
+  layer l   nodes the seeds depend on whose in-neighbourhood changed at
+            layer l-1, with neighbour means updated from the cached ones
+
+For one new place in the 2-layer model that is the place plus its road and
+category neighbours: a few small matrix multiplies instead of a full pass.
+
+Applies to models shaped like the served ``HeteroGNN``: ``input_proj`` per
+node type, ``convs`` of sum-aggregated ``HeteroConv`` over mean-aggregating
+``SAGEConv`` (no projection / normalisation), an activation after every layer
+and ``bn`` / ``dropout`` / ``head`` on the output node type (see ``supports``).
+"""
+from __future__ import annotations
+
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch_geometric.nn import HeteroConv, SAGEConv
+
+from app.lib import graph_store
+from app.lib.gnn.overlay import AdjacencyIndex, EdgeType, GraphOverlay, VirtualNodes
+
+EMBEDDING_CACHE_KIND = "hetero_gnn_states"
+EMBEDDING_CACHE_SCHEMA_VERSION = 1
+
+# (sorted node ids, their states) per node type, for the nodes recomputed at one layer.
+Changed = Dict[str, Tuple[np.ndarray, torch.Tensor]]
+
+
+def _key(edge_type: EdgeType) -> str:
+    return ".".join(edge_type)
+
+
+class StaticEmbeddings:
+    """Per-layer states ``states[l][t]`` (input of layer l) of every base node, with
+    ``means[l][et]`` (mean source state over each node's incoming ``et`` edges) and
+    ``degrees[et]``."""
+
+    def __init__(
+        self,
+        overlay: GraphOverlay,
+        model: torch.nn.Module,
+        states: List[Dict[str, torch.Tensor]],
+        means: List[Dict[EdgeType, torch.Tensor]],
+        degrees: Dict[EdgeType, torch.Tensor],
+        activation: Callable[[torch.Tensor], torch.Tensor] = F.elu,
+        output_type: str = "place",
+    ) -> None:
+        self.overlay = overlay
+        self.model = model
+        self.states = states
+        self.means = means
+        self.degrees = degrees
+        self.activation = activation
+        self.output_type = output_type
+
+    @staticmethod
+    def supports(model: torch.nn.Module) -> bool:
+        if not all(hasattr(model, name) for name in ("input_proj", "convs", "bn", "dropout", "head")):
+            return False
+        for conv in model.convs:
+            if not isinstance(conv, HeteroConv) or conv.aggr != "sum":
+                return False
+            for sage in conv.convs.values():
+                if not isinstance(sage, SAGEConv) or sage.aggr != "mean":
+                    return False
+                if sage.project or sage.normalize or not sage.root_weight:
+                    return False
+        return True
+
+    @property
+    def num_layers(self) -> int:
+        return len(self.model.convs)
+
+    @property
+    def nbytes(self) -> int:
+        tensors = [t for layer in self.states for t in layer.values()]
+        tensors += [t for layer in self.means for t in layer.values()] + list(self.degrees.values())
+        return int(sum(t.element_size() * t.nelement() for t in tensors))
+
+    # ------------------------------------------------------------------ build
+
+    @classmethod
+    @torch.no_grad()
+    def build(
+        cls,
+        overlay: GraphOverlay,
+        model: torch.nn.Module,
+        activation: Callable[[torch.Tensor], torch.Tensor] = F.elu,
+        output_type: str = "place",
+    ) -> "StaticEmbeddings":
+        """One layer-by-layer pass over the whole base graph."""
+        emb = cls(overlay, model, [], [], {}, activation, output_type)
+        h = {t: emb._project(t, x.to(overlay.device)) for t, x in overlay.x.items()}
+        for et, index in overlay.incoming.items():
+            emb.degrees[et] = torch.from_numpy(np.diff(index.ptr)).to(torch.float32).to(overlay.device)
+        for layer in range(emb.num_layers):
+            means = {}
+            for et in emb._edge_types(layer, h):
+                index = overlay.incoming[et]
+                dst = torch.from_numpy(np.repeat(np.arange(index.ptr.shape[0] - 1), np.diff(index.ptr)))
+                src = torch.from_numpy(index.values)
+                sums = torch.zeros((index.ptr.shape[0] - 1, h[et[0]].shape[1]), dtype=h[et[0]].dtype)
+                sums = sums.to(overlay.device).index_add_(0, dst.to(overlay.device), h[et[0]][src.to(overlay.device)])
+                means[et] = sums / emb.degrees[et].clamp(min=1.0).unsqueeze(1)
+            emb.states.append(h)
+            emb.means.append(means)
+            h = emb._layer(layer, h, means)
+        return emb
+
+    def _project(self, node_type: str, x: torch.Tensor) -> torch.Tensor:
+        proj = self.model.input_proj
+        if node_type == "category":
+            return proj["category"](x.squeeze(-1))
+        if node_type in proj:
+            return proj[node_type](x)
+        return x
+
+    def _edge_types(self, layer: int, h: Dict[str, torch.Tensor]) -> List[EdgeType]:
+        """Edge types ``HeteroConv`` uses at ``layer``: both endpoint types have states."""
+        conv = self.model.convs[layer]
+        return [et for et in conv.convs.keys() if et[0] in h and et[2] in h and et in self.overlay.incoming]
+
+    def _layer(
+        self,
+        layer: int,
+        h_dst: Dict[str, torch.Tensor],
+        means: Dict[EdgeType, torch.Tensor],
+    ) -> Dict[str, torch.Tensor]:
+        """``activation(sum over edge types of lin_l(mean) + lin_r(h_dst))`` per destination type."""
+        conv = self.model.convs[layer]
+        out: Dict[str, torch.Tensor] = {}
+        for et, mean in means.items():
+            sage = conv.convs[et]
+            y = sage.lin_l(mean) + sage.lin_r(h_dst[et[2]])
+            out[et[2]] = out[et[2]] + y if et[2] in out else y
+        return {t: self.activation(v) for t, v in out.items()}
+
+    # ------------------------------------------------------------- inference
+
+    @torch.no_grad()
+    def predict(self, virtual: VirtualNodes, seeds: Dict[str, Sequence[int]]) -> torch.Tensor:
+        """Model outputs for the ``output_type`` seeds, base graph plus ``virtual``."""
+        overlay = self.overlay
+        n_base = overlay.num_nodes
+        n_virtual = {t: int(x.shape[0]) for t, x in virtual.x.items()}
+        virtual_in: Dict[EdgeType, AdjacencyIndex] = {}
+        virtual_out: Dict[EdgeType, AdjacencyIndex] = {}
+        for et, edges in virtual.edges.items():
+            edges = np.asarray(edges, dtype=np.int64).reshape(2, -1)
+            virtual_in[et] = AdjacencyIndex(edges[1], edges[0], n_base[et[2]] + n_virtual.get(et[2], 0))
+            virtual_out[et] = AdjacencyIndex(edges[0], edges[1], n_base[et[0]] + n_virtual.get(et[0], 0))
+
+        def sources(et: EdgeType, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            src, dst = overlay.incoming[et].lookup(nodes[nodes < n_base[et[2]]])
+            if et in virtual_in:
+                v_src, v_dst = virtual_in[et].lookup(nodes)
+                src, dst = np.concatenate((src, v_src)), np.concatenate((dst, v_dst))
+            return src, dst
+
+        def targets(et: EdgeType, nodes: np.ndarray) -> np.ndarray:
+            dst, _ = overlay.outgoing[et].lookup(nodes[nodes < n_base[et[0]]])
+            if et in virtual_out:
+                dst = np.concatenate((dst, virtual_out[et].lookup(nodes)[0]))
+            return dst
+
+        # Nodes the seeds depend on at each layer (needed[l]: states of layer l).
+        empty = np.empty(0, dtype=np.int64)
+        layers = self.num_layers
+        needed: List[Dict[str, np.ndarray]] = [{} for _ in range(layers + 1)]
+        needed[layers] = {t: np.unique(np.asarray(seeds.get(t, empty), dtype=np.int64)) for t in overlay.node_types}
+        for layer in range(layers - 1, 0, -1):
+            found = {t: [ids] for t, ids in needed[layer + 1].items()}
+            for et in overlay.incoming:
+                found[et[0]].append(sources(et, needed[layer + 1][et[2]])[0])
+            needed[layer] = {t: np.unique(np.concatenate(parts)) for t, parts in found.items()}
+
+        changed: Changed = {
+            t: (n_base[t] + np.arange(n, dtype=np.int64), self._project(t, virtual.x[t].to(overlay.device)))
+            for t, n in n_virtual.items()
+        }
+        for layer in range(layers):
+            # Recompute needed nodes that changed or have a changed in-neighbour; at the
+            # last layer every seed.
+            compute: Dict[str, np.ndarray] = {}
+            for t in overlay.node_types:
+                if layer + 1 == layers:
+                    compute[t] = needed[layers][t]
+                    continue
+                cand = [changed[t][0]] if t in changed else []
+                for et in overlay.incoming:
+                    if et[2] == t and et[0] in changed:
+                        cand.append(targets(et, changed[et[0]][0]))
+                compute[t] = np.intersect1d(needed[layer + 1][t], np.concatenate(cand)) if cand else empty
+            h_dst = {t: self._state(layer, t, ids, changed) for t, ids in compute.items() if ids.size}
+            means = {}
+            for et in self._edge_types(layer, self.states[layer]):
+                nodes = compute[et[2]]
+                if nodes.size:
+                    means[et] = self._mean(layer, et, nodes, changed, virtual_in.get(et))
+            out = self._layer(layer, h_dst, means)
+            changed = {t: (compute[t], out[t]) for t in out if compute[t].size}
+
+        ids, states = changed[self.output_type]
+        pos = torch.from_numpy(np.searchsorted(ids, np.asarray(seeds[self.output_type], dtype=np.int64)))
+        model = self.model
+        return model.head(model.dropout(model.bn(states[pos.to(states.device)])))
+
+    def _state(self, layer: int, node_type: str, ids: np.ndarray, changed: Changed) -> torch.Tensor:
+        """Layer-``layer`` states of ``ids``: recomputed where changed, cached otherwise."""
+        base = self.states[layer][node_type]
+        out = torch.empty((ids.shape[0], base.shape[1]), dtype=base.dtype, device=base.device)
+        hit = np.zeros(ids.shape[0], dtype=bool)
+        if node_type in changed:
+            ch_ids, ch_states = changed[node_type]
+            pos = np.minimum(np.searchsorted(ch_ids, ids), max(ch_ids.shape[0] - 1, 0))
+            hit = ch_ids[pos] == ids if ch_ids.size else hit
+            if hit.any():
+                out[torch.from_numpy(np.flatnonzero(hit))] = ch_states[torch.from_numpy(pos[hit])]
+        miss = ids[~hit]
+        if (miss >= self.overlay.num_nodes[node_type]).any():
+            raise ValueError(f"No state for virtual {node_type} nodes at layer {layer}")
+        if miss.size:
+            out[torch.from_numpy(np.flatnonzero(~hit))] = base[torch.from_numpy(miss)]
+        return out
+
+    def _mean(
+        self,
+        layer: int,
+        et: EdgeType,
+        nodes: np.ndarray,
+        changed: Changed,
+        virtual_in: Optional[AdjacencyIndex],
+    ) -> torch.Tensor:
+        """Mean incoming ``et`` state of ``nodes``: the cached sum, corrected for changed
+        base sources and extended with virtual edges."""
+        src_type, _, dst_type = et
+        cached = self.means[layer][et]
+        sums = torch.zeros((nodes.shape[0], cached.shape[1]), dtype=cached.dtype, device=cached.device)
+        counts = torch.zeros(nodes.shape[0], dtype=cached.dtype, device=cached.device)
+        base_pos = np.flatnonzero(nodes < self.overlay.num_nodes[dst_type])
+        if base_pos.size:
+            base = torch.from_numpy(nodes[base_pos])
+            deg = self.degrees[et][base]
+            sums[torch.from_numpy(base_pos)] = cached[base] * deg.unsqueeze(1)
+            counts[torch.from_numpy(base_pos)] = deg
+
+        # Base edges from sources whose state changed: swap the cached state for the new one.
+        if src_type in changed:
+            ch_ids, ch_states = changed[src_type]
+            dst, src = self.overlay.outgoing[et].lookup(ch_ids[ch_ids < self.overlay.num_nodes[src_type]])
+            keep = np.isin(dst, nodes)
+            if keep.any():
+                dst, src = dst[keep], src[keep]
+                delta = ch_states[torch.from_numpy(np.searchsorted(ch_ids, src))]
+                delta = delta - self.states[layer][src_type][torch.from_numpy(src)]
+                sums.index_add_(0, torch.from_numpy(np.searchsorted(nodes, dst)), delta)
+
+        if virtual_in is not None:
+            src, dst = virtual_in.lookup(nodes)
+            if src.size:
+                pos = torch.from_numpy(np.searchsorted(nodes, dst))
+                sums.index_add_(0, pos, self._state(layer, src_type, src, changed))
+                counts.index_add_(0, pos, torch.ones(src.size, dtype=counts.dtype, device=counts.device))
+        return sums / counts.clamp(min=1.0).unsqueeze(1)
+
+    # ------------------------------------------------------------ persistence
+
+    def save(self, cache_path: str, graph_path: str, model_path: str) -> None:
+        """Store the states next to the graph and weight files' fingerprints."""
+        arrays: Dict[str, np.ndarray] = {}
+        layers = []
+        for layer, (states, means) in enumerate(zip(self.states, self.means)):
+            for t, h in states.items():
+                arrays[f"state{layer}.{t}"] = h.detach().cpu().numpy()
+            for et, mean in means.items():
+                arrays[f"mean{layer}.{_key(et)}"] = mean.detach().cpu().numpy()
+            layers.append({"node_types": list(states), "edge_types": [list(et) for et in means]})
+        for et, deg in self.degrees.items():
+            arrays[f"degree.{_key(et)}"] = deg.detach().cpu().numpy()
+        meta = {
+            "model": graph_store.source_fingerprint(os.fspath(model_path)),
+            "num_nodes": dict(self.overlay.num_nodes),
+            "layers": layers,
+            "degree_edge_types": [list(et) for et in self.degrees],
+        }
+        graph_store.save_arrays(
+            os.fspath(cache_path),
+            os.fspath(graph_path),
+            EMBEDDING_CACHE_KIND,
+            EMBEDDING_CACHE_SCHEMA_VERSION,
+            arrays,
+            meta,
+        )
+
+    @classmethod
+    def load(
+        cls,
+        cache_path: str,
+        graph_path: str,
+        model_path: str,
+        overlay: GraphOverlay,
+        model: torch.nn.Module,
+        activation: Callable[[torch.Tensor], torch.Tensor] = F.elu,
+        output_type: str = "place",
+    ) -> Optional["StaticEmbeddings"]:
+        """States stored by ``save``, or None when missing or stale for the graph or weights."""
+        cache_path = os.fspath(cache_path)
+        if not graph_store.cache_is_valid(
+            cache_path, os.fspath(graph_path), EMBEDDING_CACHE_KIND, EMBEDDING_CACHE_SCHEMA_VERSION
+        ):
+            return None
+        try:
+            arrays, meta = graph_store.load_arrays(cache_path, mmap=False)
+            if not graph_store.source_matches(meta.get("model") or {}, os.fspath(model_path)):
+                return None
+            if meta.get("num_nodes") != overlay.num_nodes or len(meta["layers"]) != len(model.convs):
+                return None
+            device = overlay.device
+            states, means = [], []
+            for layer, info in enumerate(meta["layers"]):
+                states.append({t: torch.from_numpy(arrays[f"state{layer}.{t}"]).to(device) for t in info["node_types"]})
+                means.append(
+                    {
+                        tuple(et): torch.from_numpy(arrays[f"mean{layer}.{_key(tuple(et))}"]).to(device)
+                        for et in info["edge_types"]
+                    }
+                )
+            degrees = {
+                tuple(et): torch.from_numpy(arrays[f"degree.{_key(tuple(et))}"]).to(device)
+                for et in meta["degree_edge_types"]
+            }
+        except (KeyError, TypeError, ValueError, OSError):
+            return None
+        return cls(overlay, model, states, means, degrees, activation, output_type)
@@ -0,0 +1,160 @@
+"""
+overlay.py — Per-request virtual nodes on an immutable heterogeneous graph.
+
+Scoring a new site means adding a place node (and its edges) to the trained
+graph and running the GNN. Doing that by editing the shared ``HeteroData``
+races between concurrent requests and copies whole feature matrices per call.
+
+``GraphOverlay`` keeps the base graph read-only. For the virtual nodes of one
+request it gathers the k-hop computation subgraph around the seed nodes
+(PyG ``k_hop_subgraph``-style, per edge type):
+
+  nodes   everything within k incoming hops of a seed
+  edges   every edge into a node less than k hops away
+
+A k-layer model that aggregates over incoming edges and is otherwise per-node
+(eval-mode BatchNorm / Dropout) gives the seeds the same outputs on this
+subgraph as on the full graph with the virtual nodes appended.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import torch
+
+EdgeType = Tuple[str, str, str]
+
+
+class AdjacencyIndex:
+    """``values`` grouped by ``keys`` (e.g. edge sources by destination), in edge order."""
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray, num_keys: int) -> None:
+        keys = np.asarray(keys, dtype=np.int64).reshape(-1)
+        values = np.asarray(values, dtype=np.int64).reshape(-1)
+        order = np.argsort(keys, kind="stable")
+        self.values = values[order]
+        self.ptr = np.zeros(int(num_keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=int(num_keys)), out=self.ptr[1:])
+
+    def lookup(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(values, keys) of every entry whose key is in ``nodes``."""
+        nodes = np.asarray(nodes, dtype=np.int64).reshape(-1)
+        starts = self.ptr[nodes]
+        counts = self.ptr[nodes + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return self.values[offsets], np.repeat(nodes, counts)
+
+
+@dataclass(frozen=True)
+class VirtualNodes:
+    """Nodes added for one request.
+
+    Virtual node ``i`` of type ``t`` has id ``num_nodes[t] + i``; ``edges`` hold
+    (2, e) index arrays in that extended id space, for edge types of the base graph.
+    """
+
+    x: Dict[str, torch.Tensor] = field(default_factory=dict)
+    edges: Dict[EdgeType, np.ndarray] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Subgraph:
+    x_dict: Dict[str, torch.Tensor]
+    edge_index_dict: Dict[EdgeType, torch.Tensor]
+    # Position of each requested seed in the subgraph's node list, per node type.
+    seeds: Dict[str, np.ndarray]
+    # Ids (extended id space) of the subgraph's nodes, per node type.
+    nodes: Dict[str, np.ndarray]
+
+
+class GraphOverlay:
+    """Read-only view of a ``HeteroData`` graph that builds per-request computation subgraphs."""
+
+    def __init__(self, data, device: torch.device | None = None) -> None:
+        self.device = device or torch.device("cpu")
+        self.node_types: List[str] = list(data.node_types)
+        self.edge_types: List[EdgeType] = list(data.edge_types)
+        self.num_nodes: Dict[str, int] = {t: int(data[t].num_nodes) for t in self.node_types}
+        self.x: Dict[str, torch.Tensor] = {t: data[t].x for t in self.node_types if "x" in data[t]}
+        # Edge sources grouped by destination, and destinations grouped by source.
+        self.incoming: Dict[EdgeType, AdjacencyIndex] = {}
+        self.outgoing: Dict[EdgeType, AdjacencyIndex] = {}
+        for edge_type, edge_index in data.edge_index_dict.items():
+            ei = edge_index.detach().cpu().numpy()
+            self.incoming[edge_type] = AdjacencyIndex(ei[1], ei[0], self.num_nodes[edge_type[2]])
+            self.outgoing[edge_type] = AdjacencyIndex(ei[0], ei[1], self.num_nodes[edge_type[0]])
+
+    def computation_subgraph(
+        self,
+        virtual: VirtualNodes,
+        seeds: Dict[str, Sequence[int]],
+        num_hops: int,
+    ) -> Subgraph:
+        """The ``num_hops`` computation subgraph of ``seeds`` in the base graph plus ``virtual``."""
+        n_virtual = {t: int(x.shape[0]) for t, x in virtual.x.items()}
+        virtual_in: Dict[EdgeType, AdjacencyIndex] = {}
+        for edge_type, edges in virtual.edges.items():
+            if edge_type not in self.incoming:
+                raise ValueError(f"Unknown edge type {edge_type}")
+            edges = np.asarray(edges, dtype=np.int64).reshape(2, -1)
+            dst_type = edge_type[2]
+            virtual_in[edge_type] = AdjacencyIndex(
+                edges[1], edges[0], self.num_nodes[dst_type] + n_virtual.get(dst_type, 0)
+            )
+
+        empty = np.empty(0, dtype=np.int64)
+        seen = {t: np.unique(np.asarray(seeds.get(t, empty), dtype=np.int64)) for t in self.node_types}
+        frontier = dict(seen)
+        kept: Dict[EdgeType, List[Tuple[np.ndarray, np.ndarray]]] = {et: [] for et in self.edge_types}
+        for _ in range(int(num_hops)):
+            found: Dict[str, List[np.ndarray]] = {t: [] for t in self.node_types}
+            for edge_type in self.edge_types:
+                src_type, _, dst_type = edge_type
+                nodes = frontier[dst_type]
+                if nodes.size == 0:
+                    continue
+                src, dst = self.incoming[edge_type].lookup(nodes[nodes < self.num_nodes[dst_type]])
+                if edge_type in virtual_in:
+                    v_src, v_dst = virtual_in[edge_type].lookup(nodes)
+                    src = np.concatenate((src, v_src))
+                    dst = np.concatenate((dst, v_dst))
+                kept[edge_type].append((src, dst))
+                found[src_type].append(src)
+            for t in self.node_types:
+                if not found[t]:
+                    frontier[t] = empty
+                    continue
+                new = np.setdiff1d(np.concatenate(found[t]), seen[t])
+                seen[t] = np.union1d(seen[t], new)
+                frontier[t] = new
+
+        x_dict: Dict[str, torch.Tensor] = {}
+        for t in self.node_types:
+            if t not in self.x:
+                continue
+            nodes = seen[t]
+            base = nodes[nodes < self.num_nodes[t]]
+            parts = [self.x[t].index_select(0, torch.from_numpy(base).to(self.x[t].device))]
+            if base.size < nodes.size:
+                extra = torch.from_numpy(nodes[base.size :] - self.num_nodes[t])
+                parts.append(virtual.x[t].to(self.x[t].device).index_select(0, extra.to(self.x[t].device)))
+            x_dict[t] = torch.cat(parts, dim=0).to(self.device) if len(parts) > 1 else parts[0].to(self.device)
+
+        edge_index_dict: Dict[EdgeType, torch.Tensor] = {}
+        for edge_type, pairs in kept.items():
+            src_type, _, dst_type = edge_type
+            src = np.concatenate([p[0] for p in pairs]) if pairs else empty
+            dst = np.concatenate([p[1] for p in pairs]) if pairs else empty
+            local = np.stack((np.searchsorted(seen[src_type], src), np.searchsorted(seen[dst_type], dst)))
+            edge_index_dict[edge_type] = torch.from_numpy(local).to(self.device)
+
+        seed_pos = {
+            t: np.searchsorted(seen[t], np.asarray(ids, dtype=np.int64)) for t, ids in seeds.items()
+        }
+        return Subgraph(x_dict, edge_index_dict, seed_pos, seen)
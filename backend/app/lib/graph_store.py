@@ -0,0 +1,140 @@
+"""Versioned on-disk array store for road graph caches.
+
+A cache is a directory of raw ``.npy`` files plus a ``manifest.json``. Arrays are
+loaded with ``np.load(mmap_mode="r")`` so every worker process maps the same pages
+from the OS cache instead of un-pickling a private copy of the graph.
+
+The manifest records the source file's size, mtime and SHA-256. A cache is valid
+when the size matches and either the mtime matches or (after a touch/copy) the
+content hash still matches.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {
+        "size": int(stat.st_size),
+        "mtime": float(stat.st_mtime),
+        "sha256": file_sha256(path),
+    }
+
+
+def read_manifest(cache_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_NAME), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_is_valid(cache_dir: str, source_path: str, kind: str, schema_version: int) -> bool:
+    manifest = read_manifest(cache_dir)
+    if not manifest:
+        return False
+    if manifest.get("format_version") != FORMAT_VERSION:
+        return False
+    if manifest.get("kind") != kind or manifest.get("schema_version") != schema_version:
+        return False
+    for name in manifest.get("arrays", {}):
+        if not os.path.exists(os.path.join(cache_dir, f"{name}.npy")):
+            return False
+    return source_matches(manifest.get("source") or {}, source_path)
+
+
+def source_matches(fingerprint: Mapping[str, Any], path: str) -> bool:
+    """Whether ``path`` still matches a ``source_fingerprint`` taken earlier."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if int(fingerprint.get("size", -1)) != int(stat.st_size):
+        return False
+    if float(fingerprint.get("mtime", -1.0)) == float(stat.st_mtime):
+        return True
+    try:
+        return fingerprint.get("sha256") == file_sha256(path)
+    except OSError:
+        return False
+
+
+def save_arrays(
+    cache_dir: str,
+    source_path: str,
+    kind: str,
+    schema_version: int,
+    arrays: Mapping[str, np.ndarray],
+    meta: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Write ``arrays`` and a manifest to ``cache_dir``, replacing any previous cache.
+
+    Files are written to a sibling temp directory and swapped in with renames, so
+    readers never observe a half-written cache and processes that already mapped
+    the old files keep valid mappings.
+    """
+    cache_dir = os.path.abspath(cache_dir)
+    parent = os.path.dirname(cache_dir)
+    os.makedirs(parent, exist_ok=True)
+    token = uuid.uuid4().hex[:8]
+    tmp_dir = f"{cache_dir}.tmp-{token}"
+    os.makedirs(tmp_dir)
+    try:
+        array_info: Dict[str, Dict[str, Any]] = {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arr, allow_pickle=False)
+            array_info[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape)}
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "kind": kind,
+            "schema_version": schema_version,
+            "source": source_fingerprint(source_path),
+            "arrays": array_info,
+            "meta": meta or {},
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=2)
+
+        old_dir = None
+        if os.path.isdir(cache_dir):
+            old_dir = f"{cache_dir}.old-{token}"
+            os.replace(cache_dir, old_dir)
+        elif os.path.exists(cache_dir):
+            os.remove(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_arrays(cache_dir: str, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Return (arrays, manifest meta) from ``cache_dir``; arrays are read-only memory maps."""
+    manifest = read_manifest(cache_dir)
+    if not manifest:
+        raise ValueError(f"No graph cache manifest in {cache_dir}")
+    mmap_mode = "r" if mmap else None
+    arrays: Dict[str, np.ndarray] = {}
+    for name in manifest.get("arrays", {}):
+        arrays[name] = np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+    return arrays, manifest.get("meta") or {}
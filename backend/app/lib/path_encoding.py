@@ -0,0 +1,200 @@
+"""Compact encodings for route geometry.
+
+* ``polyline``: Google's encoded polyline algorithm format (precision 5), one string per path.
+* ``delta-int32``: coordinates as fixed-point integers (``DELTA_SCALE`` units per degree),
+  flattened ``[lat0, lon0, dlat1, dlon1, ...]`` with every pair after the first stored
+  as the difference from the previous one.
+* A route tree (``route_tree``) returns the shortest-path tree edges once, so paths that
+  share a prefix do not repeat it; each path is then identified by its end node.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.lib.csr_graph import NO_PREDECESSOR
+
+POLYLINE_PRECISION = 5
+DELTA_SCALE = 1_000_000
+
+# Upper bound on 5-bit chunks per zig-zag value; 7 chunks cover 35 bits.
+_MAX_CHUNKS = 7
+
+
+def _fixed_point(values: np.ndarray, scale: float) -> np.ndarray:
+    return np.round(np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+
+
+def _path_deltas(lats: Sequence[float], lons: Sequence[float], starts: Sequence[int], scale: float) -> np.ndarray:
+    """(N, 2) fixed-point deltas, restarting from zero at each path start."""
+    pts = np.column_stack((_fixed_point(lats, scale), _fixed_point(lons, scale)))
+    deltas = np.diff(pts, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    starts = np.asarray(starts, dtype=np.int64)
+    deltas[starts] = pts[starts]
+    return deltas
+
+
+def _split_bounds(starts: Sequence[int], total: int) -> List[Tuple[int, int]]:
+    bounds = np.append(np.asarray(starts, dtype=np.int64), total).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def encode_polylines(
+    lats: Sequence[float],
+    lons: Sequence[float],
+    starts: Sequence[int],
+    precision: int = POLYLINE_PRECISION,
+) -> List[str]:
+    """Encode many paths, stored back to back, as Google polyline strings in one pass.
+
+    ``starts`` holds the index of each path's first point (ascending, the first is 0).
+    """
+    if len(starts) == 0:
+        return []
+    deltas = _path_deltas(lats, lons, starts, 10**precision).reshape(-1)
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    shifts = 5 * np.arange(_MAX_CHUNKS, dtype=np.int64)
+    shifted = zigzag[:, None] >> shifts[None, :]
+    # A value uses chunks up to its highest non-zero one (always at least one).
+    used = np.maximum((shifted > 0).sum(axis=1), 1)
+    k = np.arange(_MAX_CHUNKS)[None, :]
+    chars = (shifted & 0x1F) | np.where(k < used[:, None] - 1, 0x20, 0)
+    text = (chars + 63)[k < used[:, None]].astype(np.uint8).tobytes().decode("ascii")
+
+    # Character offset of each path: two values (lat, lon) per point.
+    char_ends = np.concatenate(([0], np.cumsum(used.reshape(-1, 2).sum(axis=1))))
+    bounds = _split_bounds(starts, len(lats))
+    return [text[char_ends[a]:char_ends[b]] for a, b in bounds]
+
+
+def encode_polyline(lats: Sequence[float], lons: Sequence[float], precision: int = POLYLINE_PRECISION) -> str:
+    """Encode coordinates as a Google polyline string."""
+    if len(lats) == 0:
+        return ""
+    return encode_polylines(lats, lons, [0], precision)[0]
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of ``encode_polyline``; returns (lats, lons)."""
+    values: List[int] = []
+    result = shift = 0
+    for ch in encoded.encode("ascii"):
+        b = ch - 63
+        result |= (b & 0x1F) << shift
+        shift += 5
+        if b < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            result = shift = 0
+    pts = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / float(10**precision)
+    return pts[:, 0], pts[:, 1]
+
+
+def encode_delta_int32_many(
+    lats: Sequence[float],
+    lons: Sequence[float],
+    starts: Sequence[int],
+    scale: int = DELTA_SCALE,
+) -> List[List[int]]:
+    """``encode_delta_int32`` for many back-to-back paths (see ``encode_polylines``)."""
+    if len(starts) == 0:
+        return []
+    flat = _path_deltas(lats, lons, starts, scale).astype(np.int32).reshape(-1).tolist()
+    return [flat[2 * a:2 * b] for a, b in _split_bounds(starts, len(lats))]
+
+
+def encode_delta_int32(lats: Sequence[float], lons: Sequence[float], scale: int = DELTA_SCALE) -> List[int]:
+    """Fixed-point, delta-encoded ``[lat0, lon0, dlat1, dlon1, ...]``."""
+    if len(lats) == 0:
+        return []
+    return encode_delta_int32_many(lats, lons, [0], scale)[0]
+
+
+def decode_delta_int32(values: Sequence[int], scale: int = DELTA_SCALE) -> Tuple[np.ndarray, np.ndarray]:
+    pts = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / float(scale)
+    return pts[:, 0], pts[:, 1]
+
+
+@dataclass(frozen=True)
+class RouteTree:
+    """The part of a shortest-path tree that reaches a set of end nodes.
+
+    ``nodes`` are graph node ids ordered so every node comes after its parent;
+    ``parents`` holds each node's position in ``nodes`` (-1 for the root, the search
+    source). ``index`` maps each requested end node to its position.
+    """
+
+    nodes: np.ndarray
+    parents: np.ndarray
+    index: Dict[int, int]
+
+    def path(self, end: int) -> List[int]:
+        """Graph node ids from the root to ``end``."""
+        out = []
+        pos = self.index[int(end)]
+        while pos >= 0:
+            out.append(int(self.nodes[pos]))
+            pos = int(self.parents[pos])
+        return out[::-1]
+
+    def to_json(self, node_coords: np.ndarray, scale: int = DELTA_SCALE) -> Dict[str, object]:
+        coords = np.asarray(node_coords, dtype=np.float64)[self.nodes]
+        return {
+            "parent": self.parents.tolist(),
+            "coords": encode_delta_int32(coords[:, 0], coords[:, 1], scale),
+            "scale": scale,
+        }
+
+
+def route_tree(tree, ends: Sequence[int]) -> RouteTree:
+    """Collect the edges of ``tree`` (a ``ShortestPathTree``) leading to every reached end node.
+
+    All ends walk back through the predecessor array together, one hop per
+    iteration, and stop at nodes already collected, so each tree node is looked
+    up once. Ends the tree did not reach are left out of ``index``.
+    """
+    end_ids = np.fromiter(dict.fromkeys(int(e) for e in ends), dtype=np.int64)
+    end_pos = tree.positions(end_ids) if end_ids.size else np.empty(0, dtype=np.int64)
+
+    # 1. Tree positions on the paths to all ends.
+    seen = np.zeros(len(tree), dtype=bool)
+    frontier = np.unique(end_pos[end_pos >= 0])
+    while frontier.size:
+        seen[frontier] = True
+        preds = tree.predecessors[frontier].astype(np.int64)
+        preds = preds[preds != NO_PREDECESSOR]
+        pred_pos = tree.positions(preds)
+        pred_pos = pred_pos[pred_pos >= 0]
+        frontier = np.unique(pred_pos[~seen[pred_pos]])
+    kept = np.flatnonzero(seen)
+
+    # 2. Parent of each kept node as a local index (-1 at a root).
+    preds = tree.predecessors[kept].astype(np.int64)
+    pred_pos = tree.positions(np.where(preds != NO_PREDECESSOR, preds, tree.source))
+    pred_pos = np.where(preds != NO_PREDECESSOR, pred_pos, -1)
+    local = np.searchsorted(kept, np.maximum(pred_pos, 0))
+    parent = np.where(pred_pos >= 0, local, -1) if kept.size else np.empty(0, dtype=np.int64)
+
+    # 3. Depth and root of every node by pointer jumping; drop chains not rooted at the source.
+    jump = np.where(parent >= 0, parent, np.arange(kept.size))
+    depth = (parent >= 0).astype(np.int64)
+    while kept.size and np.any(jump != jump[jump]):
+        depth = depth + depth[jump]
+        jump = jump[jump]
+    valid = tree.nodes[kept[jump]] == tree.source if kept.size else np.empty(0, dtype=bool)
+
+    # 4. Order parents before children and renumber.
+    order = np.flatnonzero(valid)
+    order = order[np.argsort(depth[order], kind="stable")]
+    renumber = np.full(kept.size, -1, dtype=np.int64)
+    renumber[order] = np.arange(order.size)
+    parents = np.where(parent[order] >= 0, renumber[np.maximum(parent[order], 0)], -1)
+    nodes = tree.nodes[kept[order]].astype(np.int64)
+
+    index: Dict[int, int] = {}
+    end_local = np.searchsorted(kept, np.maximum(end_pos, 0))
+    for end, pos, loc in zip(end_ids.tolist(), end_pos.tolist(), end_local.tolist()):
+        if pos >= 0 and renumber[loc] >= 0:
+            index[end] = int(renumber[loc])
+    return RouteTree(nodes, parents.astype(np.int64), index)
@@ -1,17 +1,22 @@
 import json
 import math
 import os
-import pickle
-from collections import OrderedDict
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
 
 import networkx as nx
 import numpy as np
 
+from app.lib import graph_store
+from app.lib.csr_graph import NO_PREDECESSOR, CSRGraph, csr_routing_available
+from app.lib.spatial_index import LocalProjection, PointIndex, SegmentIndex
+from app.lib.tree_cache import DEFAULT_TREE_CACHE_BYTES, ShortestPathTreeCache
+
 try:
-    from scipy.spatial import cKDTree
+    import osmnx as ox
 except ImportError:  # pragma: no cover
-    cKDTree = None
+    ox = None
 
 
 def _haversine_pair(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -26,30 +31,208 @@ def _haversine_pair(lat1: float, lon1: float, lat2: float, lon2: float) -> float
     return R * c
 
 
-def _haversine_vec(
-    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
-) -> np.ndarray:
-    """Vectorized haversine distance in meters for arrays."""
-    r = 6371000.0
-    phi1 = np.radians(lat1)
-    phi2 = np.radians(lat2)
-    dphi = phi2 - phi1
-    dlambda = np.radians(lon2 - lon1)
-    a = np.sin(dphi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.0) ** 2
-    c = 2.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
-    return r * c
+# Default snapping cascade: on-road tolerance, a wider retry, then nearest node.
+DEFAULT_SNAP_TIERS_M: Tuple[float, ...] = (120.0, 300.0, float("inf"))
+
+# Cells held at once by all multi-source search blocks of one ``RoadNetwork.distance_matrix``
+# call (~128 MB of float64), split evenly across its worker threads.
+_MATRIX_BLOCK_CELLS = 16_000_000
+
+# Cells expanded at once when ``distance_matrix`` builds a sparse result.
+_SPARSE_EXPAND_CELLS = 1_000_000
+
+
+def snap_points_tiered(
+    index: PointIndex,
+    lats: Sequence[float],
+    lons: Sequence[float],
+    tolerances: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Snap many points with a cascade of tolerances using one nearest-node query.
+
+    Every tier looks at the same nearest node, so a point lands in the first tier
+    whose tolerance covers its offset. Non-finite or missing coordinates never snap.
+    A tolerance <= 0 means "no limit", like ``RoadNetwork.snap_point``.
+
+    Returns ``(nodes, offsets_m, tiers)`` arrays: ``nodes`` is -1 and ``offsets_m``
+    is ``inf`` for unsnapped points; ``tiers`` is the index into ``tolerances``
+    that accepted the point, or -1.
+    """
+    lat_arr = np.array([np.nan if v is None else v for v in lats], dtype=np.float64).reshape(-1)
+    lon_arr = np.array([np.nan if v is None else v for v in lons], dtype=np.float64).reshape(-1)
+    tiers = np.full(lat_arr.shape[0], -1, dtype=np.int8)
+    if len(tolerances) == 0:
+        return np.full(lat_arr.shape[0], -1, dtype=np.int64), np.full(lat_arr.shape[0], np.inf), tiers
+
+    limits = np.array([t if t > 0.0 else np.inf for t in tolerances], dtype=np.float64)
+    # The widest tier bounds the tree search, so far points are rejected inside it.
+    nodes, offsets = index.nearest(lat_arr, lon_arr, max_dist_m=float(limits.max()))
+    snapped = np.flatnonzero(nodes >= 0)
+    # First tier whose limit covers the offset; tiers need not be sorted.
+    accepted = offsets[snapped, None] <= limits[None, :]
+    tiers[snapped] = np.argmax(accepted, axis=1)
+    return nodes, offsets, tiers
+
+
+def snap_point_tiered(
+    index: PointIndex,
+    lat: float,
+    lon: float,
+    tolerances: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+) -> Tuple[Optional[int], Optional[float], int]:
+    nodes, offsets, tiers = snap_points_tiered(index, [lat], [lon], tolerances)
+    if nodes[0] < 0:
+        return None, None, -1
+    return int(nodes[0]), float(offsets[0]), int(tiers[0])
+
+
+@dataclass(frozen=True)
+class ShortestPathTree:
+    """Result of one Dijkstra search: every reached node with its distance and predecessor.
+
+    ``nodes`` (int32) is sorted ascending; ``dists`` (float32 metres) and
+    ``predecessors`` (int32) are aligned with it. The source's predecessor is
+    ``NO_PREDECESSOR``.
+    """
+
+    source: int
+    cutoff: Optional[float]
+    nodes: np.ndarray
+    dists: np.ndarray
+    predecessors: np.ndarray
+
+    @classmethod
+    def compact(
+        cls,
+        source: int,
+        cutoff: Optional[float],
+        nodes: np.ndarray,
+        dists: np.ndarray,
+        predecessors: np.ndarray,
+    ) -> "ShortestPathTree":
+        return cls(
+            int(source),
+            cutoff,
+            np.ascontiguousarray(nodes, dtype=np.int32),
+            np.ascontiguousarray(dists, dtype=np.float32),
+            np.ascontiguousarray(predecessors, dtype=np.int32),
+        )
+
+    def __len__(self) -> int:
+        return int(self.nodes.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.nodes.nbytes + self.dists.nbytes + self.predecessors.nbytes)
+
+    def restrict(self, cutoff: Optional[float]) -> "ShortestPathTree":
+        """Return the sub-tree within ``cutoff``; it equals a search bounded at ``cutoff``.
+
+        Every predecessor of a kept node is closer than the node, so it is kept too.
+        """
+        if cutoff is None or (self.cutoff is not None and float(cutoff) >= self.cutoff):
+            return self
+        keep = self.dists <= np.float32(cutoff)
+        return ShortestPathTree(
+            self.source, float(cutoff), self.nodes[keep], self.dists[keep], self.predecessors[keep]
+        )
+
+    def positions(self, node_ids: Sequence[int]) -> np.ndarray:
+        """Return the index of each node in ``nodes``, or -1 where it was not reached."""
+        ids = np.asarray(node_ids, dtype=np.int64).reshape(-1)
+        if self.nodes.shape[0] == 0:
+            return np.full(ids.shape[0], -1, dtype=np.int64)
+        pos = np.searchsorted(self.nodes, ids)
+        pos_clipped = np.minimum(pos, self.nodes.shape[0] - 1)
+        found = (pos < self.nodes.shape[0]) & (self.nodes[pos_clipped] == ids)
+        return np.where(found, pos_clipped, -1)
+
+    def distance_to(self, node_id: int) -> Optional[float]:
+        pos = int(self.positions([node_id])[0])
+        if pos < 0:
+            return None
+        return float(self.dists[pos])
+
+    def as_dict(self) -> Dict[int, float]:
+        return dict(zip(self.nodes.tolist(), self.dists.tolist()))
+
+    def path_to(self, node_id: int) -> Optional[List[int]]:
+        return self.paths_to([node_id]).get(int(node_id))
+
+    def paths_to(self, targets: Iterable[int]) -> Dict[int, List[int]]:
+        """Return source-to-target node paths for every reached target.
+
+        All targets are walked back through the predecessor array together, one
+        hop per iteration, so the cost is bounded by the deepest path rather than
+        the number of targets.
+        """
+        target_ids = np.unique(np.fromiter((int(t) for t in targets), dtype=np.int64))
+        if target_ids.size == 0:
+            return {}
+        pos = self.positions(target_ids)
+        reached = pos >= 0
+        target_ids = target_ids[reached]
+        pos = pos[reached]
+        if target_ids.size == 0:
+            return {}
+
+        hops = [self.nodes[pos].astype(np.int64)]
+        current = pos
+        active = np.ones(current.shape[0], dtype=bool)
+        while True:
+            preds = np.where(active, self.predecessors[current], NO_PREDECESSOR).astype(np.int64)
+            active = preds != NO_PREDECESSOR
+            if not np.any(active):
+                break
+            step = np.where(active, preds, -1)
+            hops.append(step)
+            next_pos = self.positions(np.where(active, preds, self.source))
+            # A predecessor outside the tree cannot happen for a consistent search; stop walking it.
+            active &= next_pos >= 0
+            current = np.where(active, next_pos, 0)
+
+        layers = np.stack(hops, axis=0)
+        paths: Dict[int, List[int]] = {}
+        for col, target in enumerate(target_ids.tolist()):
+            column = layers[:, col]
+            paths[target] = column[column >= 0][::-1].tolist()
+        return paths
 
 
 class RoadNetwork:
-    """Light-weight road graph that supports snapping points and shortest-path queries."""
+    """Light-weight road graph that supports snapping points and shortest-path queries.
+
+    The graph is held as CSR arrays (possibly memory-mapped from the on-disk cache);
+    the networkx view in ``graph`` is only materialised on demand.
+    """
 
-    def __init__(self, graph: nx.Graph, node_coords: np.ndarray, snap_tolerance_m: float = 120.0):
-        self.graph = graph
-        self.node_coords = node_coords.astype(np.float64)
+    _CACHE_KIND = "road_network"
+    _CACHE_SCHEMA_VERSION = 1
+
+    def __init__(
+        self,
+        graph: Optional[nx.Graph],
+        node_coords: np.ndarray,
+        snap_tolerance_m: float = 120.0,
+        csr: Optional[CSRGraph] = None,
+        tree_cache_bytes: int = DEFAULT_TREE_CACHE_BYTES,
+    ):
+        self._graph = graph
+        self.node_coords = np.asarray(node_coords, dtype=np.float64)
         self.snap_tolerance_m = max(float(snap_tolerance_m), 0.0)
-        self._tree = self._build_tree()
-        self._paths_cache: "OrderedDict[Tuple[int, Optional[float]], Dict[int, float]]" = OrderedDict()
-        self._paths_cache_size = 8
+        # KD-tree over node positions projected to metres; see app.lib.spatial_index.
+        self._index = PointIndex(self.node_coords)
+        # Segment index for edge snapping, built on first use: (index, u, v, length_m).
+        self._segments: Optional[Tuple[SegmentIndex, np.ndarray, np.ndarray, np.ndarray]] = None
+        # CSR adjacency used for routing; when it is None (or scipy is missing)
+        # searches fall back to networkx.
+        self.csr = csr
+        if self.csr is None and graph is not None:
+            self.csr = CSRGraph.from_networkx(graph, self.node_count)
+        if graph is None and self.csr is None:
+            raise ValueError("RoadNetwork needs a graph or CSR arrays")
+        # Shortest-path trees by source node; a wider tree serves narrower cutoffs.
+        self._paths_cache = ShortestPathTreeCache(tree_cache_bytes)
 
     @classmethod
     def from_geojson(
@@ -61,33 +244,49 @@ class RoadNetwork:
         source_path = os.fspath(geojson_path)
         cache_path = os.fspath(cache_path) if cache_path else None
         if cache_path and cls._cache_is_valid(cache_path, source_path):
-            return cls._load_cache(cache_path, snap_tolerance_m)
+            try:
+                return cls._load_cache(cache_path, snap_tolerance_m)
+            except Exception as exc:
+                print(f"Warning: Failed to load road network cache ({exc}); rebuilding")
         graph, coords = cls._build_graph_from_geojson(source_path)
         instance = cls(graph, coords, snap_tolerance_m)
         if cache_path:
-            instance._save_cache(cache_path)
+            instance._save_cache(cache_path, source_path)
         return instance
 
+    @property
+    def graph(self) -> nx.Graph:
+        if self._graph is None:
+            self._graph = self.csr.to_networkx()
+        return self._graph
+
+    @graph.setter
+    def graph(self, value: nx.Graph) -> None:
+        self._graph = value
+
     @property
     def node_count(self) -> int:
         return int(self.node_coords.shape[0])
 
     @property
     def edge_count(self) -> int:
+        if self._graph is None and self.csr is not None:
+            return self.csr.nnz // 2
         return int(self.graph.number_of_edges())
 
+    @property
+    def projection(self) -> LocalProjection:
+        """Local metric projection shared by the node and segment indexes."""
+        return self._index.projection
+
+    def has_node(self, node_id: int) -> bool:
+        if self._graph is None:
+            return 0 <= int(node_id) < self.node_count
+        return node_id in self._graph
+
     def snap_point(self, lat: float, lon: float, max_snap_m: Optional[float] = None) -> Tuple[Optional[int], Optional[float]]:
-        if self.node_count == 0:
-            return None, None
-        idx = self._nearest_node_index(lat, lon)
-        if idx is None:
-            return None, None
-        node_lat, node_lon = self.node_coords[idx]
-        dist = _haversine_pair(lat, lon, float(node_lat), float(node_lon))
-        threshold = max_snap_m if max_snap_m is not None else self.snap_tolerance_m
-        if threshold <= 0.0 or dist <= threshold:
-            return int(idx), float(dist)
-        return None, None
+        nodes, offsets = self.snap_points([lat], [lon], max_snap_m=max_snap_m)
+        return nodes[0], (offsets[0] if nodes[0] is not None else None)
 
     def snap_points(
         self,
@@ -95,62 +294,230 @@ class RoadNetwork:
         lons: Sequence[float],
         max_snap_m: Optional[float] = None,
     ) -> Tuple[List[Optional[int]], List[float]]:
-        nodes: List[Optional[int]] = [None] * len(lats)
-        offsets: List[float] = [float("inf")] * len(lats)
-        if self.node_count == 0:
-            return nodes, offsets
+        threshold = max_snap_m if max_snap_m is not None else self.snap_tolerance_m
+        lat_arr = np.array([np.nan if v is None else v for v in lats], dtype=np.float64).reshape(-1)
+        lon_arr = np.array([np.nan if v is None else v for v in lons], dtype=np.float64).reshape(-1)
+        idxs, dists = self._index.nearest(lat_arr, lon_arr, max_dist_m=threshold)
+        nodes: List[Optional[int]] = [int(i) if i >= 0 else None for i in idxs.tolist()]
+        return nodes, dists.tolist()
+
+    def snap_points_tiered(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        tolerances: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Snap many points with a cascade of tolerances; see ``snap_points_tiered``."""
+        return snap_points_tiered(self._index, lats, lons, tolerances)
+
+    def snap_point_tiered(
+        self,
+        lat: float,
+        lon: float,
+        tolerances: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+    ) -> Tuple[Optional[int], Optional[float], int]:
+        """Single-point form of ``snap_points_tiered``: (node, offset_m, tier) or (None, None, -1)."""
+        return snap_point_tiered(self._index, lat, lon, tolerances)
+
+    def snap_points_to_edges(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        max_snap_m: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Snap many points onto the nearest road segment.
 
+        Returns ``(u, v, t, dist_m)`` arrays where the projected point lies a
+        fraction ``t`` of the way from node ``u`` to node ``v``. Unsnapped points
+        have ``u == v == -1``, ``t`` nan and ``dist_m`` inf.
+        """
         threshold = max_snap_m if max_snap_m is not None else self.snap_tolerance_m
+        lat_arr = np.array([np.nan if x is None else x for x in lats], dtype=np.float64).reshape(-1)
+        lon_arr = np.array([np.nan if x is None else x for x in lons], dtype=np.float64).reshape(-1)
+        index, seg_u, seg_v, _ = self._segment_index()
+        seg, t, dist = index.nearest(lat_arr, lon_arr, max_dist_m=threshold)
+        hit = seg >= 0
+        u = np.full(seg.shape[0], -1, dtype=np.int64)
+        v = np.full(seg.shape[0], -1, dtype=np.int64)
+        u[hit] = seg_u[seg[hit]]
+        v[hit] = seg_v[seg[hit]]
+        return u, v, t, dist
 
-        if self._tree is not None:
-            lat_arr = np.array(lats, dtype=np.float64)
-            lon_arr = np.array(lons, dtype=np.float64)
-            valid_mask = np.isfinite(lat_arr) & np.isfinite(lon_arr)
-            if np.any(valid_mask):
-                query_pts = np.stack((lat_arr[valid_mask], lon_arr[valid_mask]), axis=1)
-                _, idxs = self._tree.query(query_pts, k=1)
-                idxs = np.asarray(idxs, dtype=np.int64)
-                node_latlon = self.node_coords[idxs]
-                dists = _haversine_vec(
-                    lat_arr[valid_mask],
-                    lon_arr[valid_mask],
-                    node_latlon[:, 0],
-                    node_latlon[:, 1],
-                )
-                valid_idx_list = np.nonzero(valid_mask)[0]
-                for out_i, node_idx, dist in zip(valid_idx_list, idxs, dists):
-                    if threshold <= 0.0 or dist <= threshold:
-                        nodes[out_i] = int(node_idx)
-                        offsets[out_i] = float(dist)
-            return nodes, offsets
-
-        for i, (lat, lon) in enumerate(zip(lats, lons)):
-            if lat is None or lon is None:
-                continue
-            try:
-                lat_val = float(lat)
-                lon_val = float(lon)
-            except (TypeError, ValueError):
-                continue
-            node_id, offset = self.snap_point(lat_val, lon_val, max_snap_m=max_snap_m)
-            if node_id is not None:
-                nodes[i] = node_id
-                offsets[i] = float(offset) if offset is not None else float("inf")
-        return nodes, offsets
+    def snap_to_edge(
+        self,
+        lat: float,
+        lon: float,
+        max_snap_m: Optional[float] = None,
+    ) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+        """Snap a point to the nearest road segment; return (u, v, perpendicular distance m).
+
+        Returns (None, None, None) when no segment lies within ``max_snap_m``.
+        """
+        if getattr(self, "csr", None) is None and ox is not None and self._graph_has_xy():
+            return self._snap_to_edge_osmnx(lat, lon, max_snap_m)
+        u, v, _, dist = self.snap_points_to_edges([lat], [lon], max_snap_m=max_snap_m)
+        if u[0] < 0:
+            return None, None, None
+        return int(u[0]), int(v[0]), float(dist[0])
+
+    def edge_length(self, u: int, v: int) -> Optional[float]:
+        csr = getattr(self, "csr", None)
+        if csr is not None:
+            nbrs, weights = csr.neighbors(int(u))
+            match = np.flatnonzero(nbrs == int(v))
+            return float(weights[match].min()) if match.size else None
+        data = self.graph.get_edge_data(u, v)
+        if not data:
+            return None
+        if self.graph.is_multigraph():
+            data = min(data.values(), key=lambda d: d.get("weight", d.get("length", 0.0)))
+        return float(data.get("weight", data.get("length", 0.0)))
+
+    def shortest_paths_from_edge(
+        self,
+        u: int,
+        v: int,
+        t: float,
+        cutoff: Optional[float] = None,
+    ) -> Dict[int, float]:
+        """Distances from a point a fraction ``t`` along edge (u, v) to every reached node."""
+        row = self.shortest_paths_from_edges([u], [v], [t], cutoff=cutoff)[0]
+        reached = np.flatnonzero(np.isfinite(row))
+        return dict(zip(reached.tolist(), row[reached].tolist()))
+
+    def shortest_paths_from_edges(
+        self,
+        u: Sequence[int],
+        v: Sequence[int],
+        t: Sequence[float],
+        cutoff: Optional[float] = None,
+        targets: Optional[Sequence[int]] = None,
+        workers: Optional[int] = None,
+    ) -> np.ndarray:
+        """Distances from many points on edges to ``targets`` (every node by default).
+
+        Row ``i`` starts a fraction ``t[i]`` of the way from ``u[i]`` to ``v[i]``; its
+        search is seeded at ``u`` with ``t * w`` and at ``v`` with ``(1 - t) * w``, so
+        no point is charged a detour through the nearer vertex. With CSR routing the
+        points run as multi-source searches in blocks. Entries are ``inf`` when
+        unreached, beyond ``cutoff`` or when ``(u, v)`` is not an edge (such as the
+        ``-1`` of an unsnapped point from ``snap_points_to_edges``).
+        """
+        u = np.asarray(u, dtype=np.int64).reshape(-1)
+        v = np.asarray(v, dtype=np.int64).reshape(-1)
+        t = np.clip(np.asarray(t, dtype=np.float64).reshape(-1), 0.0, 1.0)
+        cols = np.arange(self.node_count) if targets is None else np.asarray(targets, dtype=np.int64).reshape(-1)
+        out = np.full((u.size, cols.size), np.inf, dtype=np.float64)
+        lengths = self._edge_lengths(u, v)
+        rows = np.flatnonzero(np.isfinite(lengths))
+        if rows.size == 0:
+            return out
+        leg_u = t[rows] * lengths[rows]
+        leg_v = (1.0 - t[rows]) * lengths[rows]
+
+        if self.csr is None or not csr_routing_available():
+            for k, row in enumerate(rows.tolist()):
+                for node, leg in ((u[row], leg_u[k]), (v[row], leg_v[k])):
+                    if cutoff is not None and leg > cutoff:
+                        continue
+                    tree = self._search(int(node), None if cutoff is None else float(cutoff) - leg)
+                    pos = tree.positions(cols)
+                    hit = pos >= 0
+                    out[row, hit] = np.minimum(out[row, hit], tree.dists[pos[hit]] + leg)
+            return out
+
+        def run(start: int, stop: int) -> None:
+            block = slice(start, stop)
+            dist = self.csr.dijkstra_from_edges(u[rows[block]], v[rows[block]], leg_u[block], leg_v[block], cutoff)
+            out[rows[block]] = dist[:, cols]
+
+        self._run_blocks(rows.size, workers, run)
+        return out
+
+    def _edge_lengths(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """Length of each edge (u, v) in metres, nan where it does not exist."""
+        if self.csr is not None:
+            return self.csr.edge_lengths(u, v)
+        lengths = np.full(u.shape[0], np.nan)
+        for i, (a, b) in enumerate(zip(u.tolist(), v.tolist())):
+            if a >= 0 and b >= 0 and self.graph.has_edge(a, b):
+                lengths[i] = self.edge_length(a, b)
+        return lengths
+
+    def _segment_index(self) -> Tuple[SegmentIndex, np.ndarray, np.ndarray, np.ndarray]:
+        segments = getattr(self, "_segments", None)
+        if segments is not None:
+            return segments
+        csr = getattr(self, "csr", None)
+        if csr is not None and getattr(self, "node_coords", None) is not None:
+            src = csr.edge_sources()
+            keep = src < csr.indices
+            seg_u = src[keep].astype(np.int64)
+            seg_v = csr.indices[keep].astype(np.int64)
+            lengths = csr.weights[keep].astype(np.float64)
+            projection = self._index.projection
+            a = projection.forward_coords(self.node_coords[seg_u])
+            b = projection.forward_coords(self.node_coords[seg_v])
+        else:
+            # Graph-only instances (e.g. osmnx graphs) carry coordinates as node y/x.
+            edges = [(a, b) for a, b in self.graph.edges() if a != b]
+            ys = nx.get_node_attributes(self.graph, "y")
+            xs = nx.get_node_attributes(self.graph, "x")
+            seg_u = np.array([a for a, _ in edges], dtype=np.int64)
+            seg_v = np.array([b for _, b in edges], dtype=np.int64)
+            coords_u = np.array([(ys[a], xs[a]) for a, _ in edges], dtype=np.float64).reshape(-1, 2)
+            coords_v = np.array([(ys[b], xs[b]) for _, b in edges], dtype=np.float64).reshape(-1, 2)
+            projection = LocalProjection.for_coords(np.vstack((coords_u, coords_v)))
+            a = projection.forward_coords(coords_u)
+            b = projection.forward_coords(coords_v)
+            lengths = np.hypot(b[:, 0] - a[:, 0], b[:, 1] - a[:, 1])
+        index = SegmentIndex(a[:, 0], a[:, 1], b[:, 0], b[:, 1], projection)
+        self._segments = (index, seg_u, seg_v, lengths)
+        return self._segments
+
+    def _graph_has_xy(self) -> bool:
+        graph = getattr(self, "_graph", None)
+        if graph is None or graph.number_of_nodes() == 0:
+            return False
+        _, data = next(iter(graph.nodes(data=True)))
+        return "x" in data and "y" in data
+
+    def _snap_to_edge_osmnx(
+        self, lat: float, lon: float, max_snap_m: Optional[float]
+    ) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+        edge = ox.distance.nearest_edges(self.graph, X=lon, Y=lat)
+        u, v = edge[0], edge[1]
+        nodes = self.graph.nodes
+        projection = LocalProjection(lat, lon)
+        ends = projection.forward([nodes[u]["y"], nodes[v]["y"]], [nodes[u]["x"], nodes[v]["x"]])
+        seg = SegmentIndex(ends[:1, 0], ends[:1, 1], ends[1:, 0], ends[1:, 1], projection)
+        _, dist = seg.project(np.zeros((1, 2)), np.zeros(1, dtype=np.int64))
+        threshold = max_snap_m if max_snap_m is not None else self.snap_tolerance_m
+        if threshold > 0.0 and float(dist[0]) > threshold:
+            return None, None, None
+        return u, v, float(dist[0])
 
     def shortest_paths_from(self, node_id: int, cutoff: float) -> Dict[int, float]:
-        if node_id not in self.graph:
+        if not self.has_node(node_id):
             return {}
-        key = (int(node_id), float(cutoff) if cutoff is not None else None)
-        cached = self._paths_cache.get(key)
-        if cached is not None:
-            self._paths_cache.move_to_end(key)
-            return cached
-        lengths = nx.single_source_dijkstra_path_length(self.graph, node_id, cutoff=cutoff, weight="weight")
-        self._paths_cache[key] = lengths
-        if len(self._paths_cache) > self._paths_cache_size:
-            self._paths_cache.popitem(last=False)
-        return lengths
+        return self._search(int(node_id), cutoff).as_dict()
+
+    def shortest_path_tree(self, node_id: int, cutoff: Optional[float] = None) -> Optional[ShortestPathTree]:
+        """Run one search from ``node_id`` and return distances plus predecessors.
+
+        Use ``ShortestPathTree.paths_to`` to reconstruct routes to any number of
+        targets without searching again.
+        """
+        if not self.has_node(node_id):
+            return None
+        return self._search(int(node_id), cutoff)
+
+    def path_coords(self, node_path: Sequence[int]) -> List[Dict[str, float]]:
+        """Convert a node path to a list of ``{"lat", "lon"}`` points."""
+        if len(node_path) == 0:
+            return []
+        coords = self.node_coords[np.asarray(node_path, dtype=np.int64)]
+        return [{"lat": lat, "lon": lon} for lat, lon in coords.tolist()]
 
     def distance_between(
         self,
@@ -166,67 +533,221 @@ class RoadNetwork:
             return None
         if source_node == target_node:
             return float((source_offset or 0.0) + (target_offset or 0.0))
-        cache_key = (int(source_node), None)
-        cached = self._paths_cache.get(cache_key)
-        if cached is not None:
-            self._paths_cache.move_to_end(cache_key)
-            path_len = cached.get(int(target_node))
-            if path_len is None:
-                return None
-            return float(path_len + (source_offset or 0.0) + (target_offset or 0.0))
         try:
-            lengths = nx.single_source_dijkstra_path_length(self.graph, source_node, weight="weight")
+            tree = self._search(int(source_node), None)
         except (nx.NetworkXNoPath, nx.NodeNotFound):
             return None
-        self._paths_cache[cache_key] = lengths
-        if len(self._paths_cache) > self._paths_cache_size:
-            self._paths_cache.popitem(last=False)
-        path_len = lengths.get(int(target_node))
-        if path_len is None:
+        path_dist = tree.distance_to(int(target_node))
+        if path_dist is None:
             return None
-        return float(path_len + (source_offset or 0.0) + (target_offset or 0.0))
+        return float(path_dist + (source_offset or 0.0) + (target_offset or 0.0))
 
-    @staticmethod
-    def _cache_is_valid(cache_path: str, source_path: str) -> bool:
+    def distance_matrix(
+        self,
+        sources: Sequence[Sequence[float]],
+        targets: Sequence[Sequence[float]],
+        cutoff: Optional[float] = None,
+        max_snap_m: Optional[float] = None,
+        sparse: bool = False,
+        workers: Optional[int] = None,
+        max_searches: Optional[int] = None,
+        snap: Literal["node", "edge"] = "node",
+    ):
+        """Network distances in metres between every ``(lat, lon)`` source and target.
+
+        Points are snapped once (to the nearest node, or with ``snap="edge"`` onto
+        the nearest road segment, see ``shortest_paths_from_edges``) and duplicate
+        snapped points are searched only once. The graph is undirected, so the
+        searches start from whichever side has fewer unique points; they run as
+        bounded multi-source searches in blocks on a thread pool sharing the CSR
+        matrix. ``ValueError`` is raised when that side exceeds ``max_searches``.
+        Entries include both snap offsets and
+        are ``inf`` for unsnapped, unreachable or beyond-``cutoff`` pairs. With
+        ``sparse=True`` a ``scipy.sparse.csr_matrix`` of the finite entries is
+        returned instead (zero distances are stored explicitly).
+        """
+        src = np.asarray(sources, dtype=np.float64).reshape(-1, 2)
+        dst = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        threshold = max_snap_m if max_snap_m is not None else self.snap_tolerance_m
+        if snap == "edge":
+            src_points, src_offsets = self._edge_points(src, threshold)
+            dst_points, dst_offsets = self._edge_points(dst, threshold)
+            search = self._edge_distance_matrix
+        else:
+            src_points, src_offsets = self._index.nearest(src[:, 0], src[:, 1], max_dist_m=threshold)
+            dst_points, dst_offsets = self._index.nearest(dst[:, 0], dst[:, 1], max_dist_m=threshold)
+            search = self._node_distance_matrix
+        src_rows = np.flatnonzero(np.isfinite(src_offsets))
+        dst_cols = np.flatnonzero(np.isfinite(dst_offsets))
+        shape = (src.shape[0], dst.shape[0])
+        node_dist = None
+        if src_rows.size and dst_cols.size:
+            unique_src, src_inv = np.unique(src_points[src_rows], axis=0, return_inverse=True)
+            unique_dst, dst_inv = np.unique(dst_points[dst_cols], axis=0, return_inverse=True)
+            src_inv, dst_inv = src_inv.reshape(-1), dst_inv.reshape(-1)
+            searches = min(unique_src.shape[0], unique_dst.shape[0])
+            if max_searches is not None and searches > max_searches:
+                raise ValueError(f"Matrix needs {searches} network searches; limit is {max_searches}")
+            if unique_dst.shape[0] < unique_src.shape[0]:
+                node_dist = search(unique_dst, unique_src, cutoff, workers).T
+            else:
+                node_dist = search(unique_src, unique_dst, cutoff, workers)
+
+        def expand(rows: slice) -> np.ndarray:
+            """Point distances for ``src_rows[rows]`` x ``dst_cols`` from the unique-point matrix."""
+            block = node_dist[np.ix_(src_inv[rows], dst_inv)]
+            block += src_offsets[src_rows[rows]][:, None]
+            block += dst_offsets[dst_cols][None, :]
+            if cutoff is not None:
+                block[block > float(cutoff)] = np.inf
+            return block
+
+        if not sparse:
+            result = np.full(shape, np.inf, dtype=np.float64)
+            if node_dist is not None:
+                result[np.ix_(src_rows, dst_cols)] = expand(slice(None))
+            return result
         try:
-            return os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
-        except OSError:
-            return False
+            from scipy.sparse import csr_matrix
+        except ImportError as exc:  # pragma: no cover
+            raise RuntimeError("scipy is required for sparse distance matrices") from exc
+        # Expand a bounded number of rows at a time so the dense matrix never exists.
+        rows_out, cols_out, values = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        if node_dist is not None:
+            chunk = max(1, _SPARSE_EXPAND_CELLS // dst_cols.size)
+            for start in range(0, src_rows.size, chunk):
+                rows = slice(start, start + chunk)
+                block = expand(rows)
+                r, c = np.nonzero(np.isfinite(block))
+                rows_out.append(src_rows[rows][r])
+                cols_out.append(dst_cols[c])
+                values.append(block[r, c])
+        return csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows_out), np.concatenate(cols_out))), shape=shape
+        )
+
+    def _edge_points(self, points: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Edge snaps of ``(lat, lon)`` rows as ``(N, 3)`` ``[u, v, t]`` with ``u < v``, and their offsets."""
+        u, v, t, dist = self.snap_points_to_edges(points[:, 0], points[:, 1], max_snap_m=threshold)
+        flip = v < u
+        return np.column_stack((np.where(flip, v, u), np.where(flip, u, v), np.where(flip, 1.0 - t, t))), dist
+
+    def _edge_distance_matrix(
+        self,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        cutoff: Optional[float],
+        workers: Optional[int],
+    ) -> np.ndarray:
+        """Distances between unique edge points (``[u, v, t]`` rows, see ``_edge_points``)."""
+        su, sv, st = sources[:, 0].astype(np.int64), sources[:, 1].astype(np.int64), sources[:, 2]
+        tu, tv, tt = targets[:, 0].astype(np.int64), targets[:, 1].astype(np.int64), targets[:, 2]
+        ends, inv = np.unique(np.concatenate((tu, tv)), return_inverse=True)
+        inv = inv.reshape(-1)
+        dist = self.shortest_paths_from_edges(su, sv, st, cutoff=cutoff, targets=ends, workers=workers)
+        lengths = self._edge_lengths(tu, tv)
+        out = np.minimum(dist[:, inv[:tu.size]] + tt * lengths, dist[:, inv[tu.size:]] + (1.0 - tt) * lengths)
+        # Two points on one edge can also meet along it without passing a vertex.
+        same = (su[:, None] == tu[None, :]) & (sv[:, None] == tv[None, :])
+        along = np.abs(st[:, None] - tt[None, :]) * lengths[None, :]
+        return np.where(same, np.minimum(out, along), out)
+
+    def _node_distance_matrix(
+        self,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        cutoff: Optional[float],
+        workers: Optional[int],
+    ) -> np.ndarray:
+        """Node-to-node distances for unique ``sources`` x ``targets`` (``inf`` when unreached)."""
+        out = np.full((sources.size, targets.size), np.inf, dtype=np.float64)
+        if self.csr is None or not csr_routing_available():
+            for i, node in enumerate(sources.tolist()):
+                tree = self._search(int(node), cutoff)
+                pos = tree.positions(targets)
+                hit = pos >= 0
+                out[i, hit] = tree.dists[pos[hit]]
+            return out
+
+        def run(start: int, stop: int) -> None:
+            dist = self.csr.dijkstra(sources[start:stop], cutoff=cutoff)
+            out[start:stop] = np.atleast_2d(dist)[:, targets]
+
+        self._run_blocks(sources.size, workers, run)
+        return out
+
+    def _run_blocks(self, count: int, workers: Optional[int], run: Callable[[int, int], None]) -> None:
+        """Call ``run(start, stop)`` over ``count`` search rows in blocks on a thread pool sharing the CSR matrix."""
+        # Each block materialises a (block, node_count) float64 array and every
+        # worker holds one at a time, so the budget is shared between them.
+        max_workers = max(1, workers if workers is not None else min(os.cpu_count() or 1, 8))
+        block = max(1, min(count, _MATRIX_BLOCK_CELLS // (max(self.node_count, 1) * max_workers)))
+        starts = list(range(0, count, block))
+        max_workers = min(max_workers, len(starts))
 
-    def _save_cache(self, cache_path: str) -> None:
-        data = {
-            "graph": self.graph,
-            "node_coords": self.node_coords,
-        }
-        with open(cache_path, "wb") as fh:
-            pickle.dump(data, fh)
+        def run_block(start: int) -> None:
+            run(start, min(start + block, count))
+
+        self.csr.matrix()  # build the shared scipy matrix before fanning out
+        if max_workers <= 1:
+            for start in starts:
+                run_block(start)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(run_block, starts))
+
+    def _search(self, node_id: int, cutoff: Optional[float]) -> ShortestPathTree:
+        """Run (or reuse) a bounded search from ``node_id``."""
+        cutoff = float(cutoff) if cutoff is not None and math.isfinite(float(cutoff)) else None
+        cached = self._paths_cache.get(node_id, cutoff)
+        if cached is not None:
+            return cached
+        if self.csr is not None and csr_routing_available():
+            dist, pred = self.csr.dijkstra(int(node_id), cutoff=cutoff, return_predecessors=True)
+            nodes = np.flatnonzero(np.isfinite(dist))
+            result = ShortestPathTree.compact(node_id, cutoff, nodes, dist[nodes], pred[nodes])
+        else:
+            pred_lists, lengths = nx.dijkstra_predecessor_and_distance(
+                self.graph, node_id, cutoff=cutoff, weight="weight"
+            )
+            nodes = np.fromiter(lengths.keys(), dtype=np.int64, count=len(lengths))
+            dists = np.fromiter(lengths.values(), dtype=np.float64, count=len(lengths))
+            preds = np.fromiter(
+                (pred_lists[n][0] if pred_lists.get(n) else NO_PREDECESSOR for n in lengths),
+                dtype=np.int32,
+                count=len(lengths),
+            )
+            order = np.argsort(nodes, kind="stable")
+            result = ShortestPathTree.compact(node_id, cutoff, nodes[order], dists[order], preds[order])
+        self._paths_cache.put(node_id, result)
+        return result
+
+    def tree_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and memory use of the shortest-path tree cache."""
+        return self._paths_cache.stats()
 
     @classmethod
-    def _load_cache(cls, cache_path: str, snap_tolerance_m: float) -> "RoadNetwork":
-        with open(cache_path, "rb") as fh:
-            data = pickle.load(fh)
-        graph = data.get("graph")
-        coords = data.get("node_coords")
-        if graph is None or coords is None:
-            raise ValueError("Invalid road network cache contents")
-        if not isinstance(coords, np.ndarray):
-            coords = np.array(coords, dtype=np.float64)
-        return cls(graph, coords, snap_tolerance_m)
+    def _cache_is_valid(cls, cache_path: str, source_path: str) -> bool:
+        return graph_store.cache_is_valid(cache_path, source_path, cls._CACHE_KIND, cls._CACHE_SCHEMA_VERSION)
 
-    def _build_tree(self):
-        if self.node_count == 0 or cKDTree is None:
-            return None
-        return cKDTree(self.node_coords)
+    def _save_cache(self, cache_path: str, source_path: str) -> None:
+        csr = self.csr if self.csr is not None else CSRGraph.from_networkx(self.graph, self.node_count)
+        if csr is None:
+            print("Warning: road network cache skipped (graph nodes are not 0..n-1)")
+            return
+        arrays = {"node_coords": self.node_coords, **csr.to_arrays()}
+        try:
+            graph_store.save_arrays(cache_path, source_path, self._CACHE_KIND, self._CACHE_SCHEMA_VERSION, arrays)
+        except OSError as exc:
+            print(f"Warning: Failed to write road network cache ({exc})")
 
-    def _nearest_node_index(self, lat: float, lon: float) -> Optional[int]:
-        if self.node_count == 0:
-            return None
-        if self._tree is not None:
-            _, idx = self._tree.query([lat, lon], k=1)
-            return int(idx)
-        diffs = self.node_coords - np.array([lat, lon], dtype=np.float64)
-        sq = np.sum(diffs * diffs, axis=1)
-        return int(np.argmin(sq))
+    @classmethod
+    def _load_cache(cls, cache_path: str, snap_tolerance_m: float) -> "RoadNetwork":
+        arrays, _ = graph_store.load_arrays(cache_path)
+        coords = arrays.get("node_coords")
+        if coords is None or "indptr" not in arrays:
+            raise ValueError("Invalid road network cache contents")
+        return cls(None, coords, snap_tolerance_m, csr=CSRGraph.from_arrays(arrays))
 
     @staticmethod
     def _build_graph_from_geojson(path: str) -> Tuple[nx.Graph, np.ndarray]:
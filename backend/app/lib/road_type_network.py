@@ -1,16 +1,16 @@
 import json
 import math
 import os
-import pickle
+from dataclasses import dataclass
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import networkx as nx
 import numpy as np
 
-try:
-    from scipy.spatial import cKDTree
-except ImportError:  # pragma: no cover
-    cKDTree = None
+from app.lib import graph_store
+from app.lib.csr_graph import CSRGraph, csr_routing_available
+from app.lib.road_network import DEFAULT_SNAP_TIERS_M, snap_point_tiered, snap_points_tiered
+from app.lib.spatial_index import PointIndex
 
 
 ROAD_TYPE_WEIGHTS: Dict[str, float] = {
@@ -33,6 +33,10 @@ ROAD_TYPE_WEIGHTS: Dict[str, float] = {
     "construction": 1.1,
 }
 
+# Largest search radius answered from the precomputed accessibility table; larger
+# radii fall back to a per-request Dijkstra.
+DEFAULT_ACCESSIBILITY_RADIUS_M = float(os.getenv("SITEX_ACCESSIBILITY_RADIUS_M", "2000"))
+
 
 def _haversine_pair(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Return haversine distance in meters between two points."""
@@ -46,20 +50,6 @@ def _haversine_pair(lat1: float, lon1: float, lat2: float, lon2: float) -> float
     return r * c
 
 
-def _haversine_vec(
-    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
-) -> np.ndarray:
-    """Vectorized haversine distance in meters for arrays."""
-    r = 6371000.0
-    phi1 = np.radians(lat1)
-    phi2 = np.radians(lat2)
-    dphi = phi2 - phi1
-    dlambda = np.radians(lon2 - lon1)
-    a = np.sin(dphi / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.0) ** 2
-    c = 2.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
-    return r * c
-
-
 def _normalize_road_type(value: Any) -> Optional[str]:
     if value is None:
         return None
@@ -73,21 +63,63 @@ def _normalize_road_type(value: Any) -> Optional[str]:
     return value or None
 
 
+@dataclass(frozen=True)
+class AccessibilityTable:
+    """Weighted distance from every node to the nearest node of each road type.
+
+    ``dist_m`` (float32) and ``nearest`` (int32 node ids) are (n_nodes, n_types),
+    indexed by road type code. Entries farther than ``max_radius_m`` are ``inf`` / -1.
+    """
+
+    max_radius_m: float
+    dist_m: np.ndarray
+    nearest: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.dist_m.nbytes + self.nearest.nbytes)
+
+
 class RoadTypeNetwork:
-    """Road network graph that tracks road types and weighted travel distances."""
+    """Road network graph that tracks road types and weighted travel distances.
+
+    Road types are interned into ``road_type_names``; edges carry a type code in
+    ``csr.codes`` and each node's set of types is stored CSR-style in
+    ``node_type_ptr`` / ``node_type_codes``.
 
-    _CACHE_SCHEMA_VERSION = 1
+    ``accessibility`` optionally holds a precomputed ``AccessibilityTable`` (see
+    ``load_accessibility``) that answers ``road_type_distance_map`` with a row lookup.
+    """
+
+    _CACHE_KIND = "road_type_network"
+    _CACHE_SCHEMA_VERSION = 2
+    _ACCESS_CACHE_KIND = "road_type_accessibility"
+    _ACCESS_CACHE_SCHEMA_VERSION = 1
 
     def __init__(
         self,
-        graph: nx.Graph,
+        graph: Optional[nx.Graph],
         node_coords: np.ndarray,
         snap_tolerance_m: float = 120.0,
+        csr: Optional[CSRGraph] = None,
+        road_type_names: Optional[Sequence[str]] = None,
+        node_type_ptr: Optional[np.ndarray] = None,
+        node_type_codes: Optional[np.ndarray] = None,
     ) -> None:
-        self.graph = graph
-        self.node_coords = node_coords.astype(np.float64)
+        self._graph = graph
+        self.node_coords = np.asarray(node_coords, dtype=np.float64)
         self.snap_tolerance_m = max(float(snap_tolerance_m), 0.0)
-        self._tree = self._build_tree()
+        if csr is None:
+            if graph is None:
+                raise ValueError("RoadTypeNetwork needs a graph or CSR arrays")
+            csr, road_type_names, node_type_ptr, node_type_codes = self._arrays_from_graph(graph, self.node_count)
+        self.csr = csr
+        self.road_type_names: List[str] = list(road_type_names or [])
+        self.node_type_ptr = np.asarray(node_type_ptr, dtype=np.int32)
+        self.node_type_codes = np.asarray(node_type_codes, dtype=np.int16)
+        self._weighted_csr: Optional[CSRGraph] = None
+        self._index = PointIndex(self.node_coords)
+        self.accessibility: Optional[AccessibilityTable] = None
 
     @classmethod
     def from_geojson(
@@ -106,38 +138,59 @@ class RoadTypeNetwork:
         graph, coords = cls._build_graph_from_geojson(source_path)
         instance = cls(graph, coords, snap_tolerance_m)
         if cache_path:
-            instance._save_cache(cache_path)
+            instance._save_cache(cache_path, source_path)
         return instance
 
+    @property
+    def graph(self) -> nx.Graph:
+        if self._graph is None:
+            self._graph = self._graph_from_arrays()
+        return self._graph
+
     @property
     def node_count(self) -> int:
         return int(self.node_coords.shape[0])
 
     def snap_point(self, lat: float, lon: float, max_snap_m: Optional[float] = None) -> Tuple[Optional[int], Optional[float]]:
-        if self.node_count == 0:
-            return None, None
-        idx = self._nearest_node_index(lat, lon)
-        if idx is None:
-            return None, None
-        node_lat, node_lon = self.node_coords[idx]
-        dist = _haversine_pair(lat, lon, float(node_lat), float(node_lon))
         threshold = max_snap_m if max_snap_m is not None else self.snap_tolerance_m
-        if threshold <= 0.0 or dist <= threshold:
-            return int(idx), float(dist)
-        return None, None
+        idxs, dists = self._index.nearest([lat], [lon], max_dist_m=threshold)
+        if idxs[0] < 0:
+            return None, None
+        return int(idxs[0]), float(dists[0])
+
+    def snap_points_tiered(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        tolerances: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return snap_points_tiered(self._index, lats, lons, tolerances)
+
+    def snap_point_tiered(
+        self,
+        lat: float,
+        lon: float,
+        tolerances: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+    ) -> Tuple[Optional[int], Optional[float], int]:
+        return snap_point_tiered(self._index, lat, lon, tolerances)
 
     def road_types_for_node(self, node_id: int) -> List[str]:
-        data = self.graph.nodes.get(int(node_id))
-        if not data:
+        node_id = int(node_id)
+        if not 0 <= node_id < self.node_count:
             return []
-        types = data.get("road_types")
-        if isinstance(types, set):
-            return sorted(types)
-        if isinstance(types, (list, tuple)):
-            return sorted(set(types))
-        if isinstance(types, str):
-            return [types]
-        return []
+        start, end = int(self.node_type_ptr[node_id]), int(self.node_type_ptr[node_id + 1])
+        return sorted({self.road_type_names[int(code)] for code in self.node_type_codes[start:end]})
+
+    def weighted_csr(self) -> CSRGraph:
+        """CSR graph whose edge weights are scaled by ``ROAD_TYPE_WEIGHTS`` for the edge's type."""
+        if self._weighted_csr is None:
+            factors = np.array(
+                [ROAD_TYPE_WEIGHTS.get(name, 1.0) for name in self.road_type_names] or [1.0],
+                dtype=np.float32,
+            )
+            codes = self.csr.codes if self.csr.codes is not None else np.zeros(self.csr.nnz, dtype=np.int16)
+            self._weighted_csr = self.csr.with_weights(self.csr.weights * factors[codes])
+        return self._weighted_csr
 
     def road_type_distance_map(
         self,
@@ -146,37 +199,74 @@ class RoadTypeNetwork:
         radius_m: float,
         secondary_snap_tolerance_m: float = 300.0,
     ) -> Optional[Dict[str, Any]]:
-        center_node, center_offset = self.snap_point(
+        center_node, center_offset, _ = self.snap_point_tiered(
             center_lat,
             center_lon,
-            max_snap_m=self.snap_tolerance_m,
+            (self.snap_tolerance_m, secondary_snap_tolerance_m, float("inf")),
         )
-        if center_node is None:
-            center_node, center_offset = self.snap_point(
-                center_lat, center_lon, max_snap_m=secondary_snap_tolerance_m
-            )
-        if center_node is None:
-            center_node, center_offset = self.snap_point(
-                center_lat, center_lon, max_snap_m=float("inf")
-            )
         if center_node is None:
             return None
 
         start_types = self.road_types_for_node(center_node)
-
-        def edge_weight(_u: int, _v: int, data: Dict[str, Any]) -> float:
-            base = float(data.get("weight", 0.0))
-            road_type = _normalize_road_type(data.get("road_type"))
-            factor = ROAD_TYPE_WEIGHTS.get(road_type or "", 1.0)
-            return base * factor
-
-        lengths = nx.single_source_dijkstra_path_length(
-            self.graph,
-            center_node,
-            cutoff=radius_m,
-            weight=edge_weight,
-        )
         offset_m = float(center_offset or 0.0)
+        table = self.accessibility
+        if table is not None and float(radius_m) <= table.max_radius_m:
+            distances, points = self._table_distances(table, int(center_node), float(radius_m), offset_m)
+        else:
+            distances, points = self._search_distances(int(center_node), radius_m, offset_m)
+
+        return {
+            "node_id": int(center_node),
+            "snap_distance_m": offset_m,
+            "start_types": start_types,
+            "distances": distances,
+            "points": points,
+        }
+
+    def _point(self, node_id: int) -> Dict[str, float]:
+        lat_val, lon_val = self.node_coords[int(node_id)]
+        return {"node_id": int(node_id), "lat": float(lat_val), "lon": float(lon_val)}
+
+    def _table_distances(
+        self,
+        table: AccessibilityTable,
+        center_node: int,
+        radius_m: float,
+        offset_m: float,
+    ) -> Tuple[Dict[str, float], Dict[str, Dict[str, float]]]:
+        dist_row = np.asarray(table.dist_m[center_node], dtype=np.float64)
+        nearest_row = table.nearest[center_node]
+        distances: Dict[str, float] = {}
+        points: Dict[str, Dict[str, float]] = {}
+        for code in np.flatnonzero(dist_row <= radius_m).tolist():
+            road_type = self.road_type_names[code]
+            distances[road_type] = float(dist_row[code]) + offset_m
+            points[road_type] = self._point(int(nearest_row[code]))
+        return distances, points
+
+    def _search_distances(
+        self,
+        center_node: int,
+        radius_m: float,
+        offset_m: float,
+    ) -> Tuple[Dict[str, float], Dict[str, Dict[str, float]]]:
+        if csr_routing_available():
+            dist = self.weighted_csr().dijkstra(int(center_node), cutoff=radius_m)
+            reached = np.flatnonzero(np.isfinite(dist))
+            lengths = dict(zip(reached.tolist(), dist[reached].tolist()))
+        else:
+            def edge_weight(_u: int, _v: int, data: Dict[str, Any]) -> float:
+                base = float(data.get("weight", 0.0))
+                road_type = _normalize_road_type(data.get("road_type"))
+                factor = ROAD_TYPE_WEIGHTS.get(road_type or "", 1.0)
+                return base * factor
+
+            lengths = nx.single_source_dijkstra_path_length(
+                self.graph,
+                center_node,
+                cutoff=radius_m,
+                weight=edge_weight,
+            )
         distances: Dict[str, float] = {}
         points: Dict[str, Dict[str, float]] = {}
         for node_id, dist_m in lengths.items():
@@ -188,65 +278,151 @@ class RoadTypeNetwork:
                 current = distances.get(road_type)
                 if current is None or total_m < current:
                     distances[road_type] = total_m
-                    lat_val, lon_val = self.node_coords[int(node_id)]
-                    points[road_type] = {
-                        "node_id": int(node_id),
-                        "lat": float(lat_val),
-                        "lon": float(lon_val),
-                    }
-
-        return {
-            "node_id": int(center_node),
-            "snap_distance_m": offset_m,
-            "start_types": start_types,
-            "distances": distances,
-            "points": points,
-        }
+                    points[road_type] = self._point(node_id)
+        return distances, points
+
+    def build_accessibility(self, max_radius_m: float = DEFAULT_ACCESSIBILITY_RADIUS_M) -> AccessibilityTable:
+        """Compute the ``AccessibilityTable`` with one multi-source search per road type."""
+        n_types = len(self.road_type_names)
+        dist_m = np.full((self.node_count, n_types), np.inf, dtype=np.float32)
+        nearest = np.full((self.node_count, n_types), -1, dtype=np.int32)
+        counts = np.diff(self.node_type_ptr.astype(np.int64))
+        owners = np.repeat(np.arange(self.node_count, dtype=np.int64), counts)
+        codes = self.node_type_codes.astype(np.int64)
+        weighted = self.weighted_csr()
+        for code in range(n_types):
+            dist, source = weighted.nearest_source(owners[codes == code], cutoff=max_radius_m)
+            dist_m[:, code] = dist
+            nearest[:, code] = source
+        return AccessibilityTable(float(max_radius_m), dist_m, nearest)
+
+    def load_accessibility(
+        self,
+        cache_path: str,
+        source_path: str,
+        max_radius_m: float = DEFAULT_ACCESSIBILITY_RADIUS_M,
+    ) -> Optional[AccessibilityTable]:
+        """Attach the accessibility table from ``cache_path``, building and saving it if the
+        cache is missing, stale or was built for another radius or type list.
+
+        Returns None (and keeps per-request searches) when scipy is not installed.
+        """
+        if not csr_routing_available():
+            return None
+        cache_path = os.fspath(cache_path)
+        source_path = os.fspath(source_path)
+        table: Optional[AccessibilityTable] = None
+        if graph_store.cache_is_valid(
+            cache_path, source_path, self._ACCESS_CACHE_KIND, self._ACCESS_CACHE_SCHEMA_VERSION
+        ):
+            try:
+                arrays, meta = graph_store.load_arrays(cache_path)
+                if (
+                    float(meta.get("max_radius_m", -1.0)) == float(max_radius_m)
+                    and meta.get("road_type_names") == self.road_type_names
+                    and arrays["dist_m"].shape == (self.node_count, len(self.road_type_names))
+                ):
+                    table = AccessibilityTable(float(max_radius_m), arrays["dist_m"], arrays["nearest"])
+            except (KeyError, ValueError, OSError):
+                table = None
+        if table is None:
+            table = self.build_accessibility(max_radius_m)
+            meta = {"max_radius_m": float(max_radius_m), "road_type_names": self.road_type_names}
+            try:
+                graph_store.save_arrays(
+                    cache_path,
+                    source_path,
+                    self._ACCESS_CACHE_KIND,
+                    self._ACCESS_CACHE_SCHEMA_VERSION,
+                    {"dist_m": table.dist_m, "nearest": table.nearest},
+                    meta,
+                )
+            except OSError as exc:
+                print(f"Warning: Failed to write road accessibility table ({exc})")
+        self.accessibility = table
+        return table
 
     @staticmethod
-    def _cache_is_valid(cache_path: str, source_path: str) -> bool:
-        try:
-            return os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
-        except OSError:
-            return False
-
-    def _save_cache(self, cache_path: str) -> None:
-        data = {
-            "schema_version": self._CACHE_SCHEMA_VERSION,
-            "graph": self.graph,
+    def _arrays_from_graph(
+        graph: nx.Graph, node_count: int
+    ) -> Tuple[CSRGraph, List[str], np.ndarray, np.ndarray]:
+        names = set()
+        for _, data in graph.nodes(data=True):
+            names.update(data.get("road_types") or ())
+        for _, _, road_type in graph.edges(data="road_type"):
+            if road_type:
+                names.add(road_type)
+        road_type_names = sorted(names)
+        code_of = {name: i for i, name in enumerate(road_type_names)}
+
+        edge_count = graph.number_of_edges()
+        src = np.empty(edge_count, dtype=np.int64)
+        dst = np.empty(edge_count, dtype=np.int64)
+        weights = np.empty(edge_count, dtype=np.float32)
+        codes = np.empty(edge_count, dtype=np.int16)
+        for i, (u, v, data) in enumerate(graph.edges(data=True)):
+            src[i] = u
+            dst[i] = v
+            weights[i] = float(data.get("weight", 0.0))
+            codes[i] = code_of.get(data.get("road_type"), 0)
+        csr = CSRGraph.from_edges(node_count, src, dst, weights, codes=codes)
+
+        node_type_ptr = np.zeros(node_count + 1, dtype=np.int64)
+        node_type_codes: List[int] = []
+        for node_id in range(node_count):
+            data = graph.nodes[node_id] if node_id in graph else {}
+            node_codes = sorted(code_of[t] for t in (data.get("road_types") or ()))
+            node_type_codes.extend(node_codes)
+            node_type_ptr[node_id + 1] = len(node_type_codes)
+        return csr, road_type_names, node_type_ptr, np.array(node_type_codes, dtype=np.int16)
+
+    def _graph_from_arrays(self) -> nx.Graph:
+        graph = nx.Graph()
+        for node_id in range(self.node_count):
+            graph.add_node(node_id, road_types=set(self.road_types_for_node(node_id)))
+        codes = self.csr.codes if self.csr.codes is not None else np.zeros(self.csr.nnz, dtype=np.int16)
+        for u, v, w, code in zip(
+            self.csr.edge_sources().tolist(),
+            self.csr.indices.tolist(),
+            self.csr.weights.tolist(),
+            codes.tolist(),
+        ):
+            if u < v:
+                graph.add_edge(u, v, weight=float(w), road_type=self.road_type_names[code] if self.road_type_names else None)
+        return graph
+
+    @classmethod
+    def _cache_is_valid(cls, cache_path: str, source_path: str) -> bool:
+        return graph_store.cache_is_valid(cache_path, source_path, cls._CACHE_KIND, cls._CACHE_SCHEMA_VERSION)
+
+    def _save_cache(self, cache_path: str, source_path: str) -> None:
+        arrays = {
             "node_coords": self.node_coords,
+            **self.csr.to_arrays(),
+            "node_type_ptr": self.node_type_ptr,
+            "node_type_codes": self.node_type_codes,
         }
-        with open(cache_path, "wb") as fh:
-            pickle.dump(data, fh)
+        meta = {"road_type_names": self.road_type_names}
+        try:
+            graph_store.save_arrays(cache_path, source_path, self._CACHE_KIND, self._CACHE_SCHEMA_VERSION, arrays, meta)
+        except OSError as exc:
+            print(f"Warning: Failed to write road type network cache ({exc})")
 
     @classmethod
     def _load_cache(cls, cache_path: str, snap_tolerance_m: float) -> "RoadTypeNetwork":
-        with open(cache_path, "rb") as fh:
-            data = pickle.load(fh)
-        if data.get("schema_version") != cls._CACHE_SCHEMA_VERSION:
-            raise ValueError("Road type network cache schema version mismatch")
-        graph = data.get("graph")
-        coords = data.get("node_coords")
-        if graph is None or coords is None:
+        arrays, meta = graph_store.load_arrays(cache_path)
+        required = ("node_coords", "indptr", "indices", "weights", "node_type_ptr", "node_type_codes")
+        if any(name not in arrays for name in required):
             raise ValueError("Invalid road type network cache contents")
-        if not isinstance(coords, np.ndarray):
-            coords = np.array(coords, dtype=np.float64)
-        return cls(graph, coords, snap_tolerance_m)
-
-    def _build_tree(self):
-        if self.node_count == 0 or cKDTree is None:
-            return None
-        return cKDTree(self.node_coords)
-
-    def _nearest_node_index(self, lat: float, lon: float) -> Optional[int]:
-        if self.node_count == 0:
-            return None
-        if self._tree is not None:
-            _, idx = self._tree.query([lat, lon], k=1)
-            return int(idx)
-        diffs = self.node_coords - np.array([lat, lon], dtype=np.float64)
-        sq = np.sum(diffs * diffs, axis=1)
-        return int(np.argmin(sq))
+        return cls(
+            None,
+            arrays["node_coords"],
+            snap_tolerance_m,
+            csr=CSRGraph.from_arrays(arrays),
+            road_type_names=meta.get("road_type_names") or [],
+            node_type_ptr=arrays["node_type_ptr"],
+            node_type_codes=arrays["node_type_codes"],
+        )
 
     @staticmethod
     def _build_graph_from_geojson(path: str) -> Tuple[nx.Graph, np.ndarray]:
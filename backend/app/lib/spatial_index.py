@@ -0,0 +1,406 @@
+"""Metric spatial indexing for lat/lon points.
+
+Coordinates are projected onto a local equirectangular plane (metres east/north of
+a reference point) so a KD-tree over them answers nearest-neighbour and radius
+queries directly in metres. East-west distances use one ``cos(lat0)`` scale, so
+their relative error grows as about ``tan(lat0) * dlat``: at the valley's ~27.7 N
+that is roughly 1.2-1.4 m per km for points 15 km north or south of the reference.
+That is far under the snapping tolerances used here; where radius results must be
+exact, ``PointIndex.within_haversine`` re-checks them with the haversine distance.
+"""
+
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # pragma: no cover
+    cKDTree = None
+
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in metres from (lat, lon) to each of ``lats``/``lons``."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    a = np.sin(dphi / 2.0) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2.0) ** 2
+    return EARTH_RADIUS_M * 2.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+
+
+class LocalProjection:
+    """Equirectangular projection centred on (lat0, lon0), in metres."""
+
+    def __init__(self, lat0: float, lon0: float) -> None:
+        self.lat0 = float(lat0)
+        self.lon0 = float(lon0)
+        self._ky = math.radians(1.0) * EARTH_RADIUS_M
+        self._kx = self._ky * math.cos(math.radians(self.lat0))
+
+    @classmethod
+    def for_coords(cls, coords: np.ndarray) -> "LocalProjection":
+        """Projection centred on the middle of ``coords`` (an (N, 2) lat/lon array)."""
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        finite = coords[np.isfinite(coords).all(axis=1)]
+        if finite.shape[0] == 0:
+            return cls(0.0, 0.0)
+        lat_min, lon_min = finite.min(axis=0)
+        lat_max, lon_max = finite.max(axis=0)
+        return cls((lat_min + lat_max) / 2.0, (lon_min + lon_max) / 2.0)
+
+    def forward(self, lats, lons) -> np.ndarray:
+        """Project latitudes/longitudes to an (N, 2) array of (x, y) metres."""
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        xy = np.empty((lats.shape[0], 2), dtype=np.float64)
+        xy[:, 0] = (lons - self.lon0) * self._kx
+        xy[:, 1] = (lats - self.lat0) * self._ky
+        return xy
+
+    def forward_coords(self, coords: np.ndarray) -> np.ndarray:
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        return self.forward(coords[:, 0], coords[:, 1])
+
+    def inverse(self, xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        return xy[:, 1] / self._ky + self.lat0, xy[:, 0] / self._kx + self.lon0
+
+    def radius_scale(self, lat: float, radius_m: float) -> float:
+        """Factor by which a true ``radius_m`` around ``lat`` can stretch once projected.
+
+        East-west distances are scaled by cos(lat0)/cos(lat); the worst case is the
+        latitude in the query band farthest from the equator.
+        """
+        band = math.degrees(float(radius_m) / EARTH_RADIUS_M)
+        extreme = min(abs(float(lat)) + band, 89.9)
+        stretch = math.cos(math.radians(self.lat0)) / math.cos(math.radians(extreme))
+        return max(1.0, stretch) * (1.0 + 1e-6)
+
+
+class PointIndex:
+    """KD-tree over projected points answering queries in metres.
+
+    Falls back to chunked brute force when scipy is not installed.
+    """
+
+    def __init__(self, coords: np.ndarray, projection: Optional[LocalProjection] = None) -> None:
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.projection = projection or LocalProjection.for_coords(coords)
+        self._set_xy(self.projection.forward_coords(coords))
+
+    @classmethod
+    def from_xy(cls, xy: np.ndarray, projection: LocalProjection) -> "PointIndex":
+        """Index points that are already projected with ``projection``."""
+        index = cls.__new__(cls)
+        index.projection = projection
+        index._set_xy(np.asarray(xy, dtype=np.float64).reshape(-1, 2))
+        return index
+
+    def _set_xy(self, xy: np.ndarray) -> None:
+        self.xy = xy
+        self.tree = cKDTree(self.xy) if cKDTree is not None and self.xy.shape[0] > 0 else None
+
+    def __len__(self) -> int:
+        return int(self.xy.shape[0])
+
+    def nearest(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        max_dist_m: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, distances_m) of the nearest point for each query.
+
+        Queries that are non-finite or farther than ``max_dist_m`` (None or <= 0
+        means unlimited) get index -1 and distance ``inf``; with a tree the bound
+        is applied inside the search.
+        """
+        return self.nearest_xy(self.projection.forward(lats, lons), max_dist_m)
+
+    def nearest_xy(self, q: np.ndarray, max_dist_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """``nearest`` for query points already in projected metres."""
+        count = q.shape[0]
+        idxs = np.full(count, -1, dtype=np.int64)
+        dists = np.full(count, np.inf, dtype=np.float64)
+        if count == 0 or len(self) == 0:
+            return idxs, dists
+        valid = np.flatnonzero(np.isfinite(q).all(axis=1))
+        if valid.size == 0:
+            return idxs, dists
+        bound = np.inf if max_dist_m is None or max_dist_m <= 0 else float(max_dist_m)
+        if self.tree is not None:
+            d, i = self.tree.query(q[valid], k=1, distance_upper_bound=bound)
+            d = np.asarray(d, dtype=np.float64)
+            i = np.asarray(i, dtype=np.int64)
+        else:
+            i, d = self._brute_nearest(q[valid])
+        found = np.isfinite(d) & (d <= bound)
+        idxs[valid[found]] = i[found]
+        dists[valid[found]] = d[found]
+        return idxs, dists
+
+    def nearest_k(self, lats: Sequence[float], lons: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, distances_m), each (N, k), of the ``k`` nearest points per query.
+
+        Neighbours are ordered closest first and ``k`` is capped at the number of
+        points. Queries with non-finite coordinates get index -1 and distance ``inf``.
+        """
+        q = self.projection.forward(lats, lons)
+        k = max(0, min(int(k), len(self)))
+        idxs = np.full((q.shape[0], k), -1, dtype=np.int64)
+        dists = np.full((q.shape[0], k), np.inf, dtype=np.float64)
+        valid = np.flatnonzero(np.isfinite(q).all(axis=1))
+        if k == 0 or valid.size == 0:
+            return idxs, dists
+        if self.tree is not None:
+            d, i = self.tree.query(q[valid], k=k)
+            idxs[valid] = np.asarray(i, dtype=np.int64).reshape(-1, k)
+            dists[valid] = np.asarray(d, dtype=np.float64).reshape(-1, k)
+            return idxs, dists
+        sq = (self.xy[None, :, 0] - q[valid, None, 0]) ** 2 + (self.xy[None, :, 1] - q[valid, None, 1]) ** 2
+        part = np.argpartition(sq, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(sq, part, axis=1).argsort(axis=1, kind="stable")
+        best = np.take_along_axis(part, order, axis=1)
+        idxs[valid] = best
+        dists[valid] = np.sqrt(np.take_along_axis(sq, best, axis=1))
+        return idxs, dists
+
+    def within(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        """Sorted indices of points within ``radius_m`` metres of (lat, lon)."""
+        if len(self) == 0 or not (math.isfinite(lat) and math.isfinite(lon)):
+            return np.empty(0, dtype=np.int64)
+        q = self.projection.forward([lat], [lon])[0]
+        if self.tree is not None:
+            hits = self.tree.query_ball_point(q, r=float(radius_m))
+            return np.sort(np.asarray(hits, dtype=np.int64))
+        d = np.hypot(self.xy[:, 0] - q[0], self.xy[:, 1] - q[1])
+        return np.flatnonzero(d <= float(radius_m))
+
+    def within_haversine(self, lat: float, lon: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted indices and great-circle distances (m) of points within ``radius_m``.
+
+        The tree is queried with a radius widened by the projection's scale error,
+        then only those candidates are checked with the exact haversine distance.
+        """
+        cand = self.within(lat, lon, float(radius_m) * self.projection.radius_scale(lat, radius_m))
+        if cand.size == 0:
+            return cand, np.empty(0, dtype=np.float64)
+        lats, lons = self.projection.inverse(self.xy[cand])
+        dists = haversine_m(float(lat), float(lon), lats, lons)
+        keep = dists <= float(radius_m)
+        return cand[keep], dists[keep]
+
+    def _brute_nearest(self, q: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        out_i = np.empty(q.shape[0], dtype=np.int64)
+        out_d = np.empty(q.shape[0], dtype=np.float64)
+        # Chunks of about four million query/point pairs.
+        chunk = max(1, 4_000_000 // max(len(self), 1))
+        for start in range(0, q.shape[0], chunk):
+            dx = self.xy[None, :, 0] - q[start:start + chunk, None, 0]
+            dy = self.xy[None, :, 1] - q[start:start + chunk, None, 1]
+            sq = dx * dx + dy * dy
+            best = np.argmin(sq, axis=1)
+            out_i[start:start + chunk] = best
+            out_d[start:start + chunk] = np.sqrt(sq[np.arange(best.shape[0]), best])
+        return out_i, out_d
+
+
+class SegmentIndex:
+    """Uniform-grid index over straight segments, in projected metres.
+
+    Each segment is registered in every grid cell its bounding box touches, and
+    cells are stored CSR-style (sorted cell keys plus offsets). A query first finds
+    the distance to the nearest segment endpoint, which bounds the distance to the
+    nearest segment, then scans one square window of cells of that half-width (capped
+    by ``max_dist_m``) around each point and projects the point onto every segment
+    in it with vectorized arithmetic, so batches of thousands of points are handled
+    in a few NumPy passes.
+    """
+
+    def __init__(
+        self,
+        ax: np.ndarray,
+        ay: np.ndarray,
+        bx: np.ndarray,
+        by: np.ndarray,
+        projection: LocalProjection,
+        cell_size_m: Optional[float] = None,
+    ) -> None:
+        self.ax = np.asarray(ax, dtype=np.float64)
+        self.ay = np.asarray(ay, dtype=np.float64)
+        self.bx = np.asarray(bx, dtype=np.float64)
+        self.by = np.asarray(by, dtype=np.float64)
+        self.projection = projection
+        self._endpoints: Optional[PointIndex] = None
+        count = self.ax.shape[0]
+        if cell_size_m is None:
+            lengths = np.hypot(self.bx - self.ax, self.by - self.ay)
+            median = float(np.median(lengths)) if count else 50.0
+            cell_size_m = min(max(2.0 * median, 25.0), 250.0)
+        self.cell_size = float(cell_size_m)
+
+        if count == 0:
+            self.origin = np.zeros(2)
+            self.n_cols = self.n_rows = 1
+            self.cell_keys = np.empty(0, dtype=np.int64)
+            self.cell_ptr = np.zeros(1, dtype=np.int64)
+            self.cell_segments = np.empty(0, dtype=np.int64)
+            return
+
+        min_x = np.minimum(self.ax, self.bx)
+        max_x = np.maximum(self.ax, self.bx)
+        min_y = np.minimum(self.ay, self.by)
+        max_y = np.maximum(self.ay, self.by)
+        self.origin = np.array([min_x.min(), min_y.min()])
+        cx0 = self._cell(min_x, 0)
+        cx1 = self._cell(max_x, 0)
+        cy0 = self._cell(min_y, 1)
+        cy1 = self._cell(max_y, 1)
+        self.n_cols = int(cx1.max()) + 1
+        self.n_rows = int(cy1.max()) + 1
+
+        span_x = cx1 - cx0 + 1
+        per_seg = span_x * (cy1 - cy0 + 1)
+        seg_rep = np.repeat(np.arange(count, dtype=np.int64), per_seg)
+        local = np.arange(seg_rep.shape[0], dtype=np.int64) - np.repeat(np.cumsum(per_seg) - per_seg, per_seg)
+        cx = cx0[seg_rep] + local % span_x[seg_rep]
+        cy = cy0[seg_rep] + local // span_x[seg_rep]
+        keys = cy * self.n_cols + cx
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        self.cell_segments = seg_rep[order]
+        self.cell_keys, starts = np.unique(keys, return_index=True)
+        self.cell_ptr = np.append(starts, keys.shape[0]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return int(self.ax.shape[0])
+
+    def _cell(self, values: np.ndarray, axis: int) -> np.ndarray:
+        return np.floor((values - self.origin[axis]) / self.cell_size).astype(np.int64)
+
+    def nearest(
+        self,
+        lats: Sequence[float],
+        lons: Sequence[float],
+        max_dist_m: Optional[float] = None,
+        max_pairs: int = 4_000_000,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (segment index, fraction along the segment, distance_m) per point.
+
+        Points with no segment within ``max_dist_m`` (None or <= 0 means unlimited),
+        or with non-finite coordinates, get index -1, fraction ``nan`` and ``inf``.
+        """
+        q = self.projection.forward(lats, lons)
+        count = q.shape[0]
+        seg = np.full(count, -1, dtype=np.int64)
+        frac = np.full(count, np.nan, dtype=np.float64)
+        dist = np.full(count, np.inf, dtype=np.float64)
+        if count == 0 or len(self) == 0:
+            return seg, frac, dist
+        bound = np.inf if max_dist_m is None or max_dist_m <= 0 else float(max_dist_m)
+        valid = np.flatnonzero(np.isfinite(q).all(axis=1))
+        if valid.size == 0:
+            return seg, frac, dist
+
+        # The nearest segment endpoint bounds the nearest segment distance, which
+        # limits each point's search window to cells that could hold a closer one.
+        # A millimetre of slack keeps endpoints lying exactly on a cell boundary inside.
+        radius = np.minimum(self._endpoint_distance(q[valid]), bound) + 1e-3
+        x0, x1, y0, y1 = self._windows(q[valid], radius)
+        cells = (x1 - x0 + 1).clip(min=0) * (y1 - y0 + 1).clip(min=0)
+
+        start = 0
+        while start < valid.shape[0]:
+            # Chunk so that at most ``max_pairs`` cells are enumerated at once.
+            end = start + max(1, int(np.searchsorted(np.cumsum(cells[start:]), max_pairs)))
+            rows = slice(start, end)
+            s, f, d = self._scan(q[valid[rows]], radius[rows], x0[rows], x1[rows], y0[rows], y1[rows])
+            keep = d <= bound
+            out = valid[rows][keep]
+            seg[out], frac[out], dist[out] = s[keep], f[keep], d[keep]
+            start = end
+        return seg, frac, dist
+
+    def _endpoint_distance(self, q: np.ndarray) -> np.ndarray:
+        if self._endpoints is None:
+            ends = np.concatenate((np.column_stack((self.ax, self.ay)), np.column_stack((self.bx, self.by))))
+            self._endpoints = PointIndex.from_xy(ends, self.projection)
+        return self._endpoints.nearest_xy(q)[1]
+
+    def _windows(self, q: np.ndarray, radius: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Cell ranges (clipped to the grid) covering a square of ``radius`` around each point."""
+        x0 = np.maximum(self._cell(q[:, 0] - radius, 0), 0)
+        x1 = np.minimum(self._cell(q[:, 0] + radius, 0), self.n_cols - 1)
+        y0 = np.maximum(self._cell(q[:, 1] - radius, 1), 0)
+        y1 = np.minimum(self._cell(q[:, 1] + radius, 1), self.n_rows - 1)
+        return x0, x1, y0, y1
+
+    def _scan(
+        self,
+        q: np.ndarray,
+        radius: np.ndarray,
+        x0: np.ndarray,
+        x1: np.ndarray,
+        y0: np.ndarray,
+        y1: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Best segment per point among the cells of its window within ``radius``."""
+        m = q.shape[0]
+        seg = np.full(m, -1, dtype=np.int64)
+        frac = np.full(m, np.nan, dtype=np.float64)
+        dist = np.full(m, np.inf, dtype=np.float64)
+
+        span_x = (x1 - x0 + 1).clip(min=0)
+        per_point = span_x * (y1 - y0 + 1).clip(min=0)
+        point_of = np.repeat(np.arange(m, dtype=np.int64), per_point)
+        if point_of.size == 0:
+            return seg, frac, dist
+        local = np.arange(point_of.shape[0], dtype=np.int64) - np.repeat(np.cumsum(per_point) - per_point, per_point)
+        cx = x0[point_of] + local % span_x[point_of]
+        cy = y0[point_of] + local // span_x[point_of]
+
+        # Drop cells whose rectangle lies farther than the point's search radius.
+        px, py = q[point_of, 0], q[point_of, 1]
+        left = self.origin[0] + cx * self.cell_size
+        bottom = self.origin[1] + cy * self.cell_size
+        gap_x = np.maximum(np.maximum(left - px, px - (left + self.cell_size)), 0.0)
+        gap_y = np.maximum(np.maximum(bottom - py, py - (bottom + self.cell_size)), 0.0)
+        near = gap_x * gap_x + gap_y * gap_y <= radius[point_of] ** 2
+        point_of = point_of[near]
+        keys = (cy * self.n_cols + cx)[near]
+
+        pos = np.searchsorted(self.cell_keys, keys)
+        pos_c = np.minimum(pos, self.cell_keys.shape[0] - 1)
+        hit = (pos < self.cell_keys.shape[0]) & (self.cell_keys[pos_c] == keys)
+        point_of, pos_c = point_of[hit], pos_c[hit]
+        if point_of.size == 0:
+            return seg, frac, dist
+
+        starts = self.cell_ptr[pos_c]
+        counts = self.cell_ptr[pos_c + 1] - starts
+        pair_point = np.repeat(point_of, counts)
+        offsets = np.arange(pair_point.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_seg = self.cell_segments[np.repeat(starts, counts) + offsets]
+
+        t, d = self.project(q[pair_point], pair_seg)
+        order = np.lexsort((d, pair_point))
+        first = np.unique(pair_point[order], return_index=True)[1]
+        chosen = order[first]
+        pts = pair_point[chosen]
+        seg[pts], frac[pts], dist[pts] = pair_seg[chosen], t[chosen], d[chosen]
+        return seg, frac, dist
+
+    def project(self, q: np.ndarray, segs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Project points ``q`` (projected metres) onto segments; return (fraction, distance_m)."""
+        ax, ay = self.ax[segs], self.ay[segs]
+        dx, dy = self.bx[segs] - ax, self.by[segs] - ay
+        len_sq = dx * dx + dy * dy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = ((q[:, 0] - ax) * dx + (q[:, 1] - ay) * dy) / len_sq
+        t = np.clip(np.nan_to_num(t, nan=0.0), 0.0, 1.0)
+        return t, np.hypot(ax + t * dx - q[:, 0], ay + t * dy - q[:, 1])
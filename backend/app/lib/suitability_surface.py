@@ -0,0 +1,219 @@
+"""Suitability surface: model scores precomputed on a regular lat/lon grid.
+
+The grid covers a bounding box with cells of about ``cell_m`` metres (the
+longitude step is stretched by 1/cos(latitude) at the box centre, so cells are
+square on the ground). Values are float32 scores at cell centres, row 0 being the
+southern edge. Surfaces are stored with ``graph_store`` so every worker maps the
+same pages, and points inside the grid are answered by bilinear interpolation
+instead of a neighbour search and a model call.
+"""
+
+import math
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.lib import graph_store
+from app.lib.spatial_index import EARTH_RADIUS_M
+
+DEFAULT_SURFACE_CELL_M = float(os.getenv("SITEX_SURFACE_CELL_M", "50"))
+
+SURFACE_CACHE_KIND = "suitability_surface"
+SURFACE_CACHE_SCHEMA_VERSION = 1
+
+_METRES_PER_DEG_LAT = math.radians(1.0) * EARTH_RADIUS_M
+
+
+def grid_axes(
+    south: float, west: float, north: float, east: float, cell_m: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Cell-centre latitudes and longitudes of a grid starting at (south, west) and
+    reaching at least (north, east)."""
+    if not (cell_m > 0 and north >= south and east >= west):
+        raise ValueError("Grid needs cell_m > 0 and south <= north, west <= east")
+    dlat = cell_m / _METRES_PER_DEG_LAT
+    dlon = dlat / max(math.cos(math.radians((south + north) / 2.0)), 1e-6)
+    rows = int(math.ceil((north - south) / dlat - 1e-9)) + 1
+    cols = int(math.ceil((east - west) / dlon - 1e-9)) + 1
+    return south + np.arange(rows) * dlat, west + np.arange(cols) * dlon
+
+
+@dataclass(frozen=True)
+class SuitabilityRaster:
+    """Scores at the centres of a regular grid; ``values[i, j]`` is at
+    (``lat0 + i * dlat``, ``lon0 + j * dlon``)."""
+
+    values: np.ndarray
+    lat0: float
+    lon0: float
+    dlat: float
+    dlon: float
+    cell_m: float
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes)
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(south, west, north, east) of the outermost cell centres."""
+        rows, cols = self.values.shape
+        return (
+            self.lat0,
+            self.lon0,
+            self.lat0 + (rows - 1) * self.dlat,
+            self.lon0 + (cols - 1) * self.dlon,
+        )
+
+    def georef(self) -> Dict[str, Any]:
+        return {
+            "crs": "EPSG:4326",
+            "origin": [self.lat0, self.lon0],
+            "step": [self.dlat, self.dlon],
+            "shape": list(self.values.shape),
+            "cell_m": self.cell_m,
+            "bounds": list(self.bounds),
+        }
+
+    def sample(self, lats, lons) -> np.ndarray:
+        """Bilinear scores at the given points; NaN outside the grid (or next to a NaN cell)."""
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        rows, cols = self.values.shape
+        out = np.full(lats.shape[0], np.nan)
+        fy = (lats - self.lat0) / self.dlat
+        fx = (lons - self.lon0) / self.dlon
+        inside = (fy >= 0) & (fy <= rows - 1) & (fx >= 0) & (fx <= cols - 1)
+        if not inside.any():
+            return out
+        fy = fy[inside]
+        fx = fx[inside]
+        r0 = np.minimum(np.floor(fy).astype(np.intp), max(rows - 2, 0))
+        c0 = np.minimum(np.floor(fx).astype(np.intp), max(cols - 2, 0))
+        r1 = np.minimum(r0 + 1, rows - 1)
+        c1 = np.minimum(c0 + 1, cols - 1)
+        ty = fy - r0
+        tx = fx - c0
+        v = self.values
+        south = v[r0, c0] * (1.0 - tx) + v[r0, c1] * tx
+        north = v[r1, c0] * (1.0 - tx) + v[r1, c1] * tx
+        out[inside] = south * (1.0 - ty) + north * ty
+        return out
+
+    def resample(
+        self, south: float, west: float, north: float, east: float, resolution_m: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(values, lat axis, lon axis) for a ``resolution_m`` grid over the given box."""
+        lat_axis, lon_axis = grid_axes(south, west, north, east, resolution_m)
+        lat_grid, lon_grid = np.meshgrid(lat_axis, lon_axis, indexing="ij")
+        values = self.sample(lat_grid, lon_grid).reshape(lat_grid.shape)
+        return values, lat_axis, lon_axis
+
+
+def grid_cell_count(south: float, west: float, north: float, east: float, cell_m: float) -> int:
+    lat_axis, lon_axis = grid_axes(south, west, north, east, cell_m)
+    return int(lat_axis.shape[0] * lon_axis.shape[0])
+
+
+def build_surface(
+    score_fn: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    cell_m: float = DEFAULT_SURFACE_CELL_M,
+    chunk_size: int = 50_000,
+) -> SuitabilityRaster:
+    """Evaluate ``score_fn(lats, lons)`` over the grid, ``chunk_size`` cells per call."""
+    lat_axis, lon_axis = grid_axes(south, west, north, east, cell_m)
+    lat_grid, lon_grid = np.meshgrid(lat_axis, lon_axis, indexing="ij")
+    flat_lats = lat_grid.reshape(-1)
+    flat_lons = lon_grid.reshape(-1)
+    values = np.empty(flat_lats.shape[0], dtype=np.float32)
+    for start in range(0, values.shape[0], max(int(chunk_size), 1)):
+        stop = start + max(int(chunk_size), 1)
+        values[start:stop] = score_fn(flat_lats[start:stop], flat_lons[start:stop])
+    dlat = float(lat_axis[1] - lat_axis[0]) if lat_axis.shape[0] > 1 else cell_m / _METRES_PER_DEG_LAT
+    dlon = float(lon_axis[1] - lon_axis[0]) if lon_axis.shape[0] > 1 else dlat
+    return SuitabilityRaster(
+        values.reshape(lat_grid.shape), float(south), float(west), dlat, dlon, float(cell_m)
+    )
+
+
+def save_surface(
+    cache_path: str, source_path: str, raster: SuitabilityRaster, meta: Optional[Dict[str, Any]] = None
+) -> None:
+    """Write ``raster`` and its georeferencing (plus ``meta``) next to ``source_path``'s fingerprint."""
+    graph_store.save_arrays(
+        os.fspath(cache_path),
+        os.fspath(source_path),
+        SURFACE_CACHE_KIND,
+        SURFACE_CACHE_SCHEMA_VERSION,
+        {"values": raster.values},
+        {**(meta or {}), "georef": raster.georef()},
+    )
+
+
+def load_surface(cache_path: str, source_path: str) -> Optional[Tuple[SuitabilityRaster, Dict[str, Any]]]:
+    """(memory-mapped raster, meta) from ``cache_path``, or None if missing or stale for ``source_path``."""
+    cache_path = os.fspath(cache_path)
+    if not graph_store.cache_is_valid(
+        cache_path, os.fspath(source_path), SURFACE_CACHE_KIND, SURFACE_CACHE_SCHEMA_VERSION
+    ):
+        return None
+    try:
+        arrays, meta = graph_store.load_arrays(cache_path)
+        georef = meta["georef"]
+        lat0, lon0 = georef["origin"]
+        dlat, dlon = georef["step"]
+        raster = SuitabilityRaster(
+            arrays["values"], float(lat0), float(lon0), float(dlat), float(dlon), float(georef["cell_m"])
+        )
+    except (KeyError, TypeError, ValueError, OSError):
+        return None
+    if list(raster.values.shape) != list(georef.get("shape", [])):
+        return None
+    return raster, meta
+
+
+# Red (low score, high risk) -> yellow -> green (high score, low risk).
+_COLOR_STOPS = np.array([[215, 48, 39], [254, 224, 139], [26, 152, 80]], dtype=np.float64)
+
+
+def to_png(values: np.ndarray, vmin: float, vmax: float) -> bytes:
+    """Render a (rows, cols) south-up array as a north-up RGBA PNG; NaN cells are transparent."""
+    values = np.asarray(values, dtype=np.float64)[::-1]
+    span = (vmax - vmin) or 1.0
+    t = np.clip((np.nan_to_num(values, nan=vmin) - vmin) / span, 0.0, 1.0) * (len(_COLOR_STOPS) - 1)
+    lo = np.minimum(np.floor(t).astype(np.intp), len(_COLOR_STOPS) - 2)
+    frac = (t - lo)[..., None]
+    rgb = _COLOR_STOPS[lo] * (1.0 - frac) + _COLOR_STOPS[lo + 1] * frac
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = np.rint(rgb).astype(np.uint8)
+    rgba[..., 3] = np.where(np.isnan(values), 0, 255)
+    return encode_png(rgba)
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal PNG encoder for an (height, width, 4) uint8 array."""
+    height, width = rgba.shape[:2]
+    scanlines = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = np.asarray(rgba, dtype=np.uint8).reshape(height, width * 4)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
@@ -0,0 +1,89 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+DEFAULT_TREE_CACHE_BYTES = int(float(os.getenv("SITEX_TREE_CACHE_MB", "64")) * 1024 * 1024)
+
+
+def _cutoff_key(cutoff: Optional[float]) -> float:
+    return math.inf if cutoff is None else float(cutoff)
+
+
+class ShortestPathTreeCache:
+    """Thread-safe LRU of shortest-path trees keyed by source node, bounded in bytes.
+
+    Each source keeps only its widest tree: a lookup with a smaller cutoff is served
+    by filtering that tree (``tree.restrict(cutoff)``) instead of searching again.
+    Trees must expose ``cutoff`` (None for unbounded), ``nbytes`` and ``restrict``.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_TREE_CACHE_BYTES) -> None:
+        self.max_bytes = max(int(max_bytes), 0)
+        self._entries: "OrderedDict[int, Any]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, source: int, cutoff: Optional[float]) -> Optional[Any]:
+        """Return a tree from ``source`` covering ``cutoff``, or None on a miss."""
+        wanted = _cutoff_key(cutoff)
+        with self._lock:
+            tree = self._entries.get(int(source))
+            if tree is None or _cutoff_key(tree.cutoff) < wanted:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(int(source))
+            self.hits += 1
+        if _cutoff_key(tree.cutoff) == wanted:
+            return tree
+        return tree.restrict(cutoff)
+
+    def put(self, source: int, tree: Any) -> None:
+        """Cache ``tree`` unless a wider tree from ``source`` is already held."""
+        size = int(tree.nbytes)
+        if size > self.max_bytes:
+            return
+        key = int(source)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None:
+                if _cutoff_key(current.cutoff) >= _cutoff_key(tree.cutoff):
+                    return
+                self._bytes -= int(current.nbytes)
+            self._entries[key] = tree
+            self._entries.move_to_end(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= int(evicted.nbytes)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+            }
@@ -1,4 +1,6 @@
 # app/main.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import cafe_processing
@@ -7,10 +9,23 @@ from app.api.endpoints import explain
 from app.api.endpoints import pois
 from app.api.endpoints import predict
 from app.api.endpoints import road_types
+from app.services.registry import get_registry
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Load the road graph and POI data once so the first requests don't pay for it.
+    try:
+        get_registry().warm_up()
+    except Exception as exc:
+        print(f"Warning: service warm-up failed; resources will load on first use ({exc})")
+    yield
+
 
 app = FastAPI(
     title="Cafe Location Intelligence API",
-    description="API for processing and predicting cafe suitability."
+    description="API for processing and predicting cafe suitability.",
+    lifespan=lifespan,
 )
 
 # CORS: allow frontend dev servers to call this API during development
@@ -4,9 +4,13 @@ import torch.nn.functional as F
 from scipy.spatial import cKDTree
 import numpy as np
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 import sys
 
+from app.lib import graph_store
+from app.lib.gnn.embedding_cache import StaticEmbeddings
+from app.lib.gnn.overlay import AdjacencyIndex, GraphOverlay, VirtualNodes
+
 # Ensure backend directory is in path to import MachineLearning modules
 backend_root = str(Path(__file__).resolve().parent.parent.parent)
 if backend_root not in sys.path:
@@ -15,6 +19,13 @@ if backend_root not in sys.path:
 # Import the model architecture
 from MachineLearning.train_gnn import HeteroGNN
 
+def _file_version(path: Path) -> Optional[Tuple[int, float, str]]:
+    if not path.exists():
+        return None
+    fingerprint = graph_store.source_fingerprint(os.fspath(path))
+    return fingerprint["size"], fingerprint["mtime"], fingerprint["sha256"]
+
+
 class GNNPredictionService:
     _instance = None
     
@@ -29,6 +40,19 @@ class GNNPredictionService:
         self.road_graph = None
         self.road_nodes_list = None
         self.hidden_dim = 64
+        self.num_layers = 2
+        # Read-only views of self.data built at load; predict() never modifies the graph.
+        self.overlay = None
+        self.place_x_mean = None
+        self.place_kdtree = None
+        self.place_lats = None
+        self.place_lngs = None
+        self.place_categories = None
+        # Cached layer-wise states of the static graph (see embedding_cache.py)
+        self.embeddings = None
+        self.embeddings_path = self.ml_dir / "hetero_gnn.states"
+        # Fingerprints of the graph and weight files that were loaded (see data_version)
+        self._source_version: Tuple[Any, ...] = (None, None)
         
         self._load_resources()
 
@@ -73,7 +97,7 @@ class GNNPredictionService:
             metadata=self.data.metadata(),
             hidden_channels=self.hidden_dim,
             out_channels=1, 
-            num_layers=2
+            num_layers=self.num_layers
         ).to(self.device)
         
         if model_path.exists():
@@ -101,7 +125,60 @@ class GNNPredictionService:
             road_coords = np.column_stack((road_lats, road_lngs))
             self.kdtree = cKDTree(road_coords)
 
+        # Place lookups used to wire up new sites, built once instead of per request
+        place_x = self.data['place'].x
+        self.place_x_mean = place_x.mean(dim=0, keepdim=True)
+        place_x_np = place_x.cpu().numpy()
+        self.place_lats = (place_x_np[:, 0] * 0.1) + 27.7
+        self.place_lngs = (place_x_np[:, 1] * 0.1) + 85.3
+        self.place_kdtree = cKDTree(np.column_stack((self.place_lats, self.place_lngs)))
+        place_cat_edges = self.data['place', 'has_category', 'category'].edge_index.cpu().numpy()
+        self.place_categories = AdjacencyIndex(place_cat_edges[0], place_cat_edges[1], place_x.size(0))
+
+        self.overlay = GraphOverlay(self.data, self.device)
+        self._source_version = (_file_version(graph_path), _file_version(model_path))
+        self._warm_up()
+        self._load_embeddings(graph_path, model_path)
+
+    def data_version(self) -> Tuple[Any, ...]:
+        """Fingerprints of the loaded graph and weight files, the ones the embedding cache is checked against."""
+        return self._source_version
+
+    def _warm_up(self) -> None:
+        """Run one forward pass so lazily sized layers are materialised before requests run concurrently."""
+        try:
+            sub = self.overlay.computation_subgraph(VirtualNodes(), {'place': [0]}, self.num_layers)
+            with torch.no_grad():
+                self.model(sub.x_dict, sub.edge_index_dict)
+        except Exception as e:
+            print(f"Warning: GNN warm-up failed: {e}")
+
+    def _load_embeddings(self, graph_path: Path, model_path: Path) -> None:
+        """Load the static graph's cached hidden states, rebuilding them when the graph or
+        weights file changed. Without them predict() runs the model on a subgraph."""
+        if not StaticEmbeddings.supports(self.model):
+            return
+        try:
+            if model_path.exists():
+                self.embeddings = StaticEmbeddings.load(
+                    self.embeddings_path, graph_path, model_path, self.overlay, self.model
+                )
+            if self.embeddings is None:
+                print("Building HeteroGNN embedding cache...")
+                self.embeddings = StaticEmbeddings.build(self.overlay, self.model)
+                if model_path.exists():
+                    try:
+                        self.embeddings.save(self.embeddings_path, graph_path, model_path)
+                    except OSError as e:
+                        print(f"Warning: could not save GNN embedding cache: {e}")
+            print(f"HeteroGNN embedding cache ready ({self.embeddings.nbytes / 1e6:.1f} MB).")
+        except Exception as e:
+            print(f"Warning: GNN embedding cache unavailable: {e}")
+            self.embeddings = None
+
     def predict(self, lat: float, lng: float) -> Dict[str, Any]:
+        """Score a new site as a virtual place node; the shared graph is only read, so calls
+        may run in parallel threads."""
         if self.model is None or self.data is None:
             raise RuntimeError("Model or graph not loaded properly.")
             
@@ -109,35 +186,19 @@ class GNNPredictionService:
         lat_norm = (lat - 27.7) / 0.1
         lng_norm = (lng - 85.3) / 0.1
         
-        orig_place_x = self.data['place'].x
-        
-        # Dynamically create new_place_x using the mean of existing places to handle N dimensions safely
-        new_place_x = orig_place_x.mean(dim=0, keepdim=True).to(self.device)
+        # New place features: the mean of existing places (handles N dimensions safely)
+        new_place_x = self.place_x_mean.clone()
         # Override lat and lng (assuming they are at index 0 and 1)
         new_place_x[0, 0] = lat_norm
         new_place_x[0, 1] = lng_norm
         
-        # 2. Add node temporarily to graph
-        self.data['place'].x = torch.cat([orig_place_x, new_place_x], dim=0)
+        # 2. The new place is a virtual node after the existing ones
+        new_place_idx = self.overlay.num_nodes['place']
+        edges = {}
+        log_lines = []
         
-        new_place_idx = self.data['place'].x.size(0) - 1
-        
-        orig_near_edges = None
-        orig_rev_near_edges = None
-        
-        # 3. Find 3 nearest road nodes and add temporary edges
-        if ('place', 'near', 'road_node') in self.data.edge_types:
-            orig_near_edges = self.data['place', 'near', 'road_node'].edge_index
-            orig_rev_near_edges = self.data['road_node', 'rev_near', 'place'].edge_index
-        else:
-            # Handle case where user also renamed or removed near edges
-            orig_near_edges = torch.empty((2, 0), dtype=torch.long)
-            orig_rev_near_edges = torch.empty((2, 0), dtype=torch.long)
-            
-        orig_place_cat_edges = self.data['place', 'has_category', 'category'].edge_index
-        orig_rev_place_cat_edges = self.data['category', 'rev_has_category', 'place'].edge_index
-        
-        if self.kdtree is not None:
+        # 3. Find nearest road nodes and add virtual edges
+        if self.kdtree is not None and ('place', 'near', 'road_node') in self.overlay.incoming:
             distances, indices = self.kdtree.query([[lat, lng]], k=100)
             
             MAX_ROAD_DIST_DEG = 0.005
@@ -150,7 +211,7 @@ class GNNPredictionService:
             
             # --- LOGGING ROAD NEIGHBORS ---
             if self.road_graph is not None and self.road_nodes_list is not None:
-                print(f"\n[{lat:.6f}, {lng:.6f}] Connecting to {len(valid_indices)} nearest road nodes (dist <= {MAX_ROAD_DIST_DEG}):")
+                log_lines.append(f"\n[{lat:.6f}, {lng:.6f}] Connecting to {len(valid_indices)} nearest road nodes (dist <= {MAX_ROAD_DIST_DEG}):")
                 for i, r_idx in enumerate(valid_indices):
                     node_id, node_data = self.road_nodes_list[r_idx]
                     street_count = node_data.get('street_count', 0)
@@ -163,31 +224,16 @@ class GNNPredictionService:
                         else:
                             highway_types.add(hw)
                     dist_deg = valid_dists[i]
-                    print(f"  -> Road Node {i+1}: Intersections: {street_count}, Distance: {dist_deg:.5f} deg, Types: {', '.join(highway_types)}")
+                    log_lines.append(f"  -> Road Node {i+1}: Intersections: {street_count}, Distance: {dist_deg:.5f} deg, Types: {', '.join(highway_types)}")
             # ------------------------------
             
-            place_idx_list = [new_place_idx] * len(valid_indices)
             road_idx_list = valid_indices.tolist() if hasattr(valid_indices, 'tolist') else list(valid_indices)
-            
-            new_edges = torch.tensor([place_idx_list, road_idx_list], dtype=torch.long).to(self.device)
-            
-            self.data['place', 'near', 'road_node'].edge_index = torch.cat(
-                [orig_near_edges, new_edges], dim=1
-            )
-            
-            new_rev_edges = torch.tensor([road_idx_list, place_idx_list], dtype=torch.long).to(self.device)
-            self.data['road_node', 'rev_near', 'place'].edge_index = torch.cat(
-                [orig_rev_near_edges, new_rev_edges], dim=1
-            )
+            near_edges = np.array([[new_place_idx] * len(road_idx_list), road_idx_list], dtype=np.int64)
+            edges[('place', 'near', 'road_node')] = near_edges
+            edges[('road_node', 'rev_near', 'place')] = near_edges[::-1]
             
         # 4. Also link the new node to the most common categories from its nearest existing places
-        # Find the 5 nearest existing places using the place KDTree
-        place_x_np = orig_place_x.numpy()
-        place_lats = (place_x_np[:, 0] * 0.1) + 27.7
-        place_lngs = (place_x_np[:, 1] * 0.1) + 85.3
-        place_coords_np = np.column_stack((place_lats, place_lngs))
-        place_kdtree = cKDTree(place_coords_np)
-        distances_place, nearest_place_indices = place_kdtree.query([[lat, lng]], k=100)
+        distances_place, nearest_place_indices = self.place_kdtree.query([[lat, lng]], k=100)
         
         MAX_PLACE_DIST_DEG = 0.01
         valid_place_mask = distances_place[0] <= MAX_PLACE_DIST_DEG
@@ -201,72 +247,49 @@ class GNNPredictionService:
         valid_place_dists = valid_place_dists.tolist() if hasattr(valid_place_dists, 'tolist') else list(valid_place_dists)
         
         # Find all categories connected to these nearby places
-        edge_src = orig_place_cat_edges[0]  # place indices
-        edge_dst = orig_place_cat_edges[1]  # category indices
-        
-        print(f"\n[{lat:.6f}, {lng:.6f}] Connecting to {len(nearest_place_indices)} nearest place nodes (dist <= {MAX_PLACE_DIST_DEG}):")
+        log_lines.append(f"\n[{lat:.6f}, {lng:.6f}] Connecting to {len(nearest_place_indices)} nearest place nodes (dist <= {MAX_PLACE_DIST_DEG}):")
         nearby_cats_all = []
         for i, pi in enumerate(nearest_place_indices):
-            mask = (edge_src == pi)
-            cats_for_place = edge_dst[mask].tolist()
+            cats_for_place = self.place_categories.lookup([pi])[0].tolist()
             nearby_cats_all.extend(cats_for_place)
             
-            p_lat = place_lats[pi]
-            p_lng = place_lngs[pi]
+            p_lat = self.place_lats[pi]
+            p_lng = self.place_lngs[pi]
             dist_deg = valid_place_dists[i]
             
             place_id = self.idx_to_place_id.get(pi, f"Unknown_{pi}")
             cat_names = [self.idx_to_cat.get(c, str(c)) for c in cats_for_place]
             
-            print(f"  -> Place Node {i+1} (ID: {place_id}) at [{p_lat:.5f}, {p_lng:.5f}]:")
-            print(f"       Distance: {dist_deg:.5f} deg")
-            print(f"       Categories ({len(cat_names)}): {', '.join(cat_names)}")
+            log_lines.append(f"  -> Place Node {i+1} (ID: {place_id}) at [{p_lat:.5f}, {p_lng:.5f}]:")
+            log_lines.append(f"       Distance: {dist_deg:.5f} deg")
+            log_lines.append(f"       Categories ({len(cat_names)}): {', '.join(cat_names)}")
             
         nearby_cats = list(set(nearby_cats_all))[:20]  # unique, up to 20
         inherited_cat_names = [self.idx_to_cat.get(c, str(c)) for c in nearby_cats]
-        print(f"  => Inheriting {len(nearby_cats)} unique categories: {', '.join(inherited_cat_names)}\n")
+        log_lines.append(f"  => Inheriting {len(nearby_cats)} unique categories: {', '.join(inherited_cat_names)}\n")
+        # One print per request so concurrent predictions don't interleave their logs
+        print("\n".join(log_lines))
         
         if nearby_cats:
-            new_place_cat_src = [new_place_idx] * len(nearby_cats)
-            new_cat_place_src = nearby_cats
-            new_place_cat_edges = torch.tensor([new_place_cat_src, new_cat_place_src], dtype=torch.long).to(self.device)
-            self.data['place', 'has_category', 'category'].edge_index = torch.cat(
-                [orig_place_cat_edges, new_place_cat_edges], dim=1
-            )
-            new_rev_cat_edges = torch.tensor([new_cat_place_src, new_place_cat_src], dtype=torch.long).to(self.device)
-            self.data['category', 'rev_has_category', 'place'].edge_index = torch.cat(
-                [orig_rev_place_cat_edges, new_rev_cat_edges], dim=1
-            )
+            cat_edges = np.array([[new_place_idx] * len(nearby_cats), nearby_cats], dtype=np.int64)
+            edges[('place', 'has_category', 'category')] = cat_edges
+            edges[('category', 'rev_has_category', 'place')] = cat_edges[::-1]
             
-        # 4. Prepare node features dict for forward pass
-        x_dict = {
-            'place': self.data['place'].x.to(self.device),
-        }
-        if 'road_node' in self.data.node_types:
-            x_dict['road_node'] = self.data['road_node'].x.to(self.device)
-            
-        # The new HeteroGNN class handles category embeddings internally inside its input_proj ModuleDict
-        # We just need to pass the raw index tensor
-        if 'category' in self.data.node_types:
-            x_dict['category'] = self.data['category'].x.to(self.device)
-        
-        # 5. Forward Pass
-        with torch.no_grad():
-            out = self.model(x_dict, self.data.edge_index_dict)
+        # 5. Only the new place's states are computed: from its neighbours' cached states,
+        # or by a forward pass over its computation subgraph when there is no cache
+        virtual = VirtualNodes({'place': new_place_x}, edges)
+        if self.embeddings is not None:
+            out = self.embeddings.predict(virtual, {'place': [new_place_idx]})[0]
+        else:
+            sub = self.overlay.computation_subgraph(virtual, {'place': [new_place_idx]}, self.num_layers)
+            with torch.no_grad():
+                out = self.model(sub.x_dict, sub.edge_index_dict)[int(sub.seeds['place'][0])]
             
         # The predicted score for the new place
         # The model output was divided by 100 during training (target was y/100.0)
         # So we multiply by 100 to get it back to 0-100 scale. We also clamp to [0, 100].
-        predicted_score = float(out[-1].item()) * 100.0
+        predicted_score = float(out.item()) * 100.0
         predicted_score = max(0.0, min(100.0, predicted_score))
-        
-        # Restore graph to original state (cleanup)
-        self.data['place'].x = orig_place_x
-        if orig_near_edges is not None:
-            self.data['place', 'near', 'road_node'].edge_index = orig_near_edges
-            self.data['road_node', 'rev_near', 'place'].edge_index = orig_rev_near_edges
-        self.data['place', 'has_category', 'category'].edge_index = orig_place_cat_edges
-        self.data['category', 'rev_has_category', 'place'].edge_index = orig_rev_place_cat_edges
             
         # 6. Risk assessment
         if predicted_score < 40.0:
@@ -0,0 +1,285 @@
+"""Columnar, in-memory POI data shared by every endpoint.
+
+Each category CSV is parsed once into contiguous NumPy arrays (coordinates, weight,
+subcategory codes and a packed name buffer) and snapped to the road network once,
+so request handlers only slice arrays. A category is re-read when its CSV's mtime
+changes.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.lib.road_network import DEFAULT_SNAP_TIERS_M, RoadNetwork
+from app.lib.spatial_index import PointIndex, haversine_m
+
+LAT_COLUMNS = ("lat", "latitude", "y")
+LON_COLUMNS = ("lon", "lng", "longitude", "x")
+NAME_COLUMNS = ("name", "title")
+SUBCATEGORY_COLUMNS = ("subcategory", "sub_category", "type")
+WEIGHT_COLUMNS = ("final_weight", "weight", "_computed_weight", "combined_score")
+
+
+def find_category_csv(data_dir: Path, expected_name: str) -> Optional[Path]:
+    """Return ``data_dir/expected_name`` or the first CSV whose name resembles it."""
+    fpath = data_dir / expected_name
+    if fpath.exists():
+        return fpath
+    base = expected_name[:-4].lower()
+    for p in sorted(data_dir.glob("*.csv")):
+        pn = p.name.lower()
+        if base in pn or (base.endswith("s") and base[:-1] in pn) or (base.endswith("es") and base[:-2] in pn):
+            return p
+    return None
+
+
+def _pick_column(df: pd.DataFrame, candidates: Sequence[str]) -> Optional[str]:
+    lowered = {str(c).lower(): c for c in reversed(list(df.columns))}
+    for cand in candidates:
+        if cand in lowered:
+            return lowered[cand]
+    return None
+
+
+@dataclass(frozen=True)
+class PoiCategory:
+    """One category's POIs as aligned arrays; rows without valid coordinates are dropped.
+
+    ``rows`` holds each POI's row number in the source CSV. ``nodes`` is -1 (and
+    ``snap_offsets_m`` inf) when there is no road network.
+    """
+
+    category: str
+    path: Optional[Path]
+    mtime: float
+    rows: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    weight: np.ndarray
+    subcategory_codes: np.ndarray
+    subcategory_labels: Tuple[str, ...]
+    name_offsets: np.ndarray
+    name_data: str
+    name_present: np.ndarray
+    nodes: np.ndarray
+    snap_offsets_m: np.ndarray
+    snap_tiers: np.ndarray
+    # Metric KD-tree over (lat, lon) for radius queries.
+    index: PointIndex = field(repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return int(self.lat.shape[0])
+
+    @classmethod
+    def empty(cls, category: str, path: Optional[Path] = None, mtime: float = -1.0) -> "PoiCategory":
+        return cls.from_frame(category, pd.DataFrame(), path=path, mtime=mtime)
+
+    @classmethod
+    def from_frame(
+        cls,
+        category: str,
+        df: pd.DataFrame,
+        *,
+        path: Optional[Path] = None,
+        mtime: float = -1.0,
+        road_network: Optional[RoadNetwork] = None,
+        snap_tiers: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+    ) -> "PoiCategory":
+        df = df.reset_index(drop=True)
+        lat_col = _pick_column(df, LAT_COLUMNS)
+        lon_col = _pick_column(df, LON_COLUMNS)
+        if lat_col is None or lon_col is None:
+            num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+            if len(num_cols) >= 2:
+                lat_col, lon_col = num_cols[0], num_cols[1]
+        if lat_col is None or lon_col is None:
+            df = df.iloc[0:0]
+            lats = lons = np.empty(0, dtype=np.float64)
+        else:
+            lats = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+            lons = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+        rows = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        kept = df.iloc[rows]
+
+        weight_col = _pick_column(kept, WEIGHT_COLUMNS)
+        if weight_col is not None:
+            weight = pd.to_numeric(kept[weight_col], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            weight = np.full(rows.shape[0], np.nan, dtype=np.float64)
+
+        sub_col = _pick_column(kept, SUBCATEGORY_COLUMNS)
+        if sub_col is not None:
+            codes, labels = pd.factorize(kept[sub_col].astype("string"), use_na_sentinel=True)
+            sub_codes = codes.astype(np.int32)
+            sub_labels = tuple(str(v) for v in labels)
+        else:
+            sub_codes = np.full(rows.shape[0], -1, dtype=np.int32)
+            sub_labels = ()
+
+        name_col = _pick_column(kept, NAME_COLUMNS)
+        names: List[Optional[str]] = [None] * rows.shape[0]
+        if name_col is not None:
+            names = [None if pd.isna(v) else str(v) for v in kept[name_col].tolist()]
+        present = np.array([n is not None for n in names], dtype=bool)
+        lengths = np.fromiter((len(n) if n is not None else 0 for n in names), dtype=np.int64, count=len(names))
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        lat_arr = np.ascontiguousarray(lats[rows])
+        lon_arr = np.ascontiguousarray(lons[rows])
+        if road_network is not None and rows.size:
+            nodes, snap_offsets, tiers = road_network.snap_points_tiered(lat_arr, lon_arr, snap_tiers)
+            nodes = np.asarray(nodes, dtype=np.int64)
+            snap_offsets = np.asarray(snap_offsets, dtype=np.float64)
+            tiers = np.asarray(tiers, dtype=np.int8)
+        else:
+            nodes = np.full(rows.shape[0], -1, dtype=np.int64)
+            snap_offsets = np.full(rows.shape[0], np.inf, dtype=np.float64)
+            tiers = np.full(rows.shape[0], -1, dtype=np.int8)
+
+        return cls(
+            category=category,
+            path=path,
+            mtime=float(mtime),
+            rows=rows.astype(np.int64),
+            lat=lat_arr,
+            lon=lon_arr,
+            weight=weight,
+            subcategory_codes=sub_codes,
+            subcategory_labels=sub_labels,
+            name_offsets=offsets,
+            name_data="".join(n for n in names if n is not None),
+            name_present=present,
+            nodes=nodes,
+            snap_offsets_m=snap_offsets,
+            snap_tiers=tiers,
+            index=PointIndex(np.column_stack((lat_arr, lon_arr))),
+        )
+
+    def name(self, i: int) -> Optional[str]:
+        if not self.name_present[i]:
+            return None
+        return self.name_data[int(self.name_offsets[i]):int(self.name_offsets[i + 1])]
+
+    def names(self, idx: Sequence[int]) -> List[Optional[str]]:
+        return [self.name(i) for i in np.asarray(idx, dtype=np.int64).tolist()]
+
+    def subcategories(self, idx: Sequence[int]) -> List[Optional[str]]:
+        codes = self.subcategory_codes[np.asarray(idx, dtype=np.int64)]
+        return [self.subcategory_labels[c] if c >= 0 else None for c in codes.tolist()]
+
+    def haversine_km(self, lat: float, lon: float) -> np.ndarray:
+        return haversine_m(float(lat), float(lon), self.lat, self.lon) / 1000.0
+
+    def within_km(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices (ascending) and haversine km of POIs within ``radius_km`` of (lat, lon).
+
+        Candidates come from the KD-tree, so the cost follows the number of nearby POIs.
+        """
+        idx, dists_m = self.index.within_haversine(float(lat), float(lon), float(radius_km) * 1000.0)
+        return idx, dists_m / 1000.0
+
+    def to_frame(self) -> pd.DataFrame:
+        """``lat, lon, name, subcategory`` frame indexed by source CSV row."""
+        idx = np.arange(len(self))
+        return pd.DataFrame(
+            {
+                "lat": self.lat,
+                "lon": self.lon,
+                "name": self.names(idx),
+                "subcategory": self.subcategories(idx),
+            },
+            index=pd.Index(self.rows, name=None),
+        )
+
+
+class PoiStore:
+    """Lazily loaded, mtime-refreshed ``PoiCategory`` per configured category."""
+
+    def __init__(
+        self,
+        resolve_data_dir: Callable[[], Path],
+        files: Dict[str, str],
+        road_network: Callable[[], Optional[RoadNetwork]] = lambda: None,
+        snap_tiers: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+    ) -> None:
+        self._resolve_data_dir = resolve_data_dir
+        self.files = dict(files)
+        self._road_network = road_network
+        self.snap_tiers = tuple(snap_tiers)
+        self._categories: Dict[str, PoiCategory] = {}
+        # One lock per category so different categories can load concurrently.
+        self._locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in self.files}
+
+    @property
+    def categories(self) -> List[str]:
+        return list(self.files.keys())
+
+    def data_dir(self) -> Path:
+        """The POI CSV folder; raises RuntimeError when it cannot be found."""
+        return self._resolve_data_dir()
+
+    def category(self, name: str) -> PoiCategory:
+        """Return the arrays for ``name``, re-reading the CSV if it changed on disk.
+
+        Raises RuntimeError when the POI data folder cannot be found.
+        """
+        expected = self.files.get(name)
+        if not expected:
+            return PoiCategory.empty(name)
+        fpath = find_category_csv(self.data_dir(), expected)
+        mtime = _mtime(fpath)
+        cached = self._categories.get(name)
+        if cached is not None and cached.path == fpath and cached.mtime == mtime:
+            return cached
+        with self._locks[name]:
+            cached = self._categories.get(name)
+            if cached is not None and cached.path == fpath and cached.mtime == mtime:
+                return cached
+            loaded = self._load(name, fpath, mtime)
+            self._categories[name] = loaded
+            return loaded
+
+    def version(self, names: Optional[Sequence[str]] = None) -> Tuple[float, ...]:
+        """Source file mtimes of ``names`` (default all); changes whenever a category would be re-read.
+
+        Raises RuntimeError when the POI data folder cannot be found.
+        """
+        data_dir = self.data_dir()
+        names = self.categories if names is None else names
+        out = []
+        for name in names:
+            expected = self.files.get(name)
+            out.append(_mtime(find_category_csv(data_dir, expected)) if expected else -1.0)
+        return tuple(out)
+
+    def load_all(self) -> Dict[str, PoiCategory]:
+        return {name: self.category(name) for name in self.files}
+
+    def _load(self, name: str, fpath: Optional[Path], mtime: float) -> PoiCategory:
+        if fpath is None:
+            return PoiCategory.empty(name)
+        df = pd.read_csv(fpath)
+        return PoiCategory.from_frame(
+            name,
+            df,
+            path=fpath,
+            mtime=mtime,
+            road_network=self._road_network(),
+            snap_tiers=self.snap_tiers,
+        )
+
+
+def _mtime(path: Optional[Path]) -> float:
+    if path is None:
+        return -1.0
+    try:
+        return float(os.stat(path).st_mtime_ns)
+    except OSError:
+        return -1.0
@@ -1,11 +1,38 @@
 import os
+import threading
 import joblib
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-from scipy.spatial import distance
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from app.lib import graph_store
+from app.lib.spatial_index import PointIndex
+from app.lib.suitability_surface import (
+    DEFAULT_SURFACE_CELL_M,
+    SuitabilityRaster,
+    build_surface,
+    load_surface,
+    save_surface,
+)
+
+EPSILON = 1e-6
+# POI groups summed by the engineered totals (must match the training notebook).
+POI_GROUPS = ("banks", "education", "health", "temples", "other")
+# Engineered ratio column -> POI group whose count it divides by the total.
+POI_RATIOS = {
+    "bank_ratio": "banks",
+    "education_ratio": "education",
+    "temple_ratio": "temples",
+    "health_ratio": "health",
+}
+# Neighbour count the suitability surface is computed with (predict's default).
+SURFACE_K_NEIGHBORS = 5
+# Threads per booster call: the CPUs left to each uvicorn worker process (WEB_CONCURRENCY).
+XGB_NTHREAD = int(os.getenv("SITEX_XGB_NTHREAD", "0")) or max(
+    1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+)
 
 class PredictionService:
     _instance = None
@@ -14,11 +41,27 @@ class PredictionService:
         self.model = None
         self.feature_names = None
         self.reference_df = None
+        # Native booster, its feature order and per-thread input buffers (see _prepare_model).
+        self.booster: Optional[xgb.Booster] = None
+        self.model_columns: List[str] = []
+        self._iteration_range: Tuple[int, int] = (0, 0)
+        self._buffers = threading.local()
+        # Built from reference_df at load time (see _prepare_reference).
+        self.neighbor_index: Optional[PointIndex] = None
+        self.neighbor_feature_names: List[str] = []
+        self.neighbor_features: Optional[np.ndarray] = None
+        # Precomputed scores for predict(); None until loaded or built (see load_surface).
+        self.surface: Optional[SuitabilityRaster] = None
         # Paths relative to this file: backend/app/services/prediction_service.py
         self.backend_root = Path(__file__).resolve().parent.parent.parent
         self.model_dir = self.backend_root / "models"
         self.data_dir = self._resolve_data_dir()
+        self.model_path = self.model_dir / "xgb_baseline.pkl"
+        self.reference_path = self.data_dir / "master_cafes_minimal.csv"
+        self.surface_path = self.model_dir / "xgb_baseline.surface"
         self._load_resources()
+        self._warm_up()
+        self._start_surface_load()
 
     @classmethod
     def get_instance(cls):
@@ -57,7 +100,7 @@ class PredictionService:
 
     def _load_resources(self):
         # Load Model
-        model_path = self.model_dir / "xgb_baseline.pkl"
+        model_path = self.model_path
         if model_path.exists():
             try:
                 loaded_obj = joblib.load(model_path)
@@ -107,9 +150,10 @@ class PredictionService:
                 print(f"Error loading feature names: {e}")
         else:
             print(f"Warning: Feature names not found at {features_path}")
+        self._prepare_model()
 
         # Load Reference Data for k-NN
-        data_path = self.data_dir / "master_cafes_minimal.csv"
+        data_path = self.reference_path
         if data_path.exists():
             try:
                 self.reference_df = pd.read_csv(data_path)
@@ -118,6 +162,7 @@ class PredictionService:
                 if not all(col in self.reference_df.columns for col in required_cols):
                      print("Warning: Reference data missing lat/lng columns")
                 print(f"Loaded reference data from {data_path} with {len(self.reference_df)} rows")
+                self._prepare_reference()
             except Exception as e:
                 print(f"Error loading reference data: {e}")
         else:
@@ -144,108 +189,266 @@ class PredictionService:
             return list(self.model.feature_names)
         return None
 
+    def _prepare_model(self) -> None:
+        """Resolve the native booster and its feature order once, for ``_predict_native``.
+
+        Regressors (``XGBRegressor`` or a bare ``Booster``) get the fast path; any other
+        model keeps going through its own ``predict`` on a DataFrame.
+        """
+        self.booster = None
+        self.model_columns = []
+        self._iteration_range = (0, 0)
+        self._buffers = threading.local()
+        model = self.model
+        if isinstance(model, xgb.Booster):
+            booster = model
+        elif isinstance(model, xgb.XGBModel) and not isinstance(model, xgb.XGBClassifier):
+            booster = model.get_booster()
+            try:
+                # The sklearn wrapper predicts with the best iteration after early stopping.
+                self._iteration_range = (0, int(model.best_iteration) + 1)
+            except AttributeError:
+                pass
+        else:
+            return
+        columns = list(booster.feature_names or self._resolve_model_feature_names() or [])
+        if not columns or booster.num_features() != len(columns):
+            return
+        booster.set_param({"nthread": XGB_NTHREAD})
+        self.booster = booster
+        self.model_columns = columns
+
+    def _warm_up(self) -> None:
+        """Score one reference location so the first request doesn't pay for lazy setup."""
+        if self.model is None or self.neighbor_index is None or len(self.neighbor_index) == 0:
+            return
+        lats, lngs = self.neighbor_index.projection.inverse(self.neighbor_index.xy[:1])
+        try:
+            self._score_batch(lats, lngs)
+        except Exception as e:
+            print(f"Warning: prediction warm-up failed: {e}")
+
+    def _prepare_reference(self) -> None:
+        """Index reference rows by location (metres) and gather their POI features as one array."""
+        df = self.reference_df
+        cols = [c for c in df.columns if c.endswith('_count_1km')]
+        cols += [c for c in df.columns if c.endswith('_weight_1km')]
+        if 'cafe_weight' in df.columns:
+            cols.append('cafe_weight')
+        coords = df[['lat', 'lng']].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        rows = np.flatnonzero(np.isfinite(coords).all(axis=1))
+        self.neighbor_index = PointIndex(coords[rows])
+        self.neighbor_feature_names = cols
+        self.neighbor_features = df[cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)[rows]
+
+    def _start_surface_load(self) -> None:
+        """Attach a current stored surface, or rebuild it in the background (SITEX_SURFACE_AUTOBUILD=0 disables)."""
+        if self.model is None or self.neighbor_index is None:
+            return
+        if self.load_surface(build=False) is not None:
+            print(f"Loaded suitability surface from {self.surface_path}")
+            return
+        if os.getenv("SITEX_SURFACE_AUTOBUILD", "1").strip().lower() in {"0", "false", "no"}:
+            print("Warning: suitability surface missing or stale; predict() uses the model directly.")
+            return
+        threading.Thread(target=self.load_surface, name="suitability-surface", daemon=True).start()
+
+    def _surface_meta(self) -> Dict[str, Any]:
+        return {
+            "k_neighbors": SURFACE_K_NEIGHBORS,
+            "feature_names": self._resolve_model_feature_names(),
+            "model": graph_store.source_fingerprint(os.fspath(self.model_path)),
+        }
+
+    def _surface_is_current(self, meta: Dict[str, Any]) -> bool:
+        return (
+            meta.get("k_neighbors") == SURFACE_K_NEIGHBORS
+            and meta.get("feature_names") == self._resolve_model_feature_names()
+            and graph_store.source_matches(meta.get("model") or {}, os.fspath(self.model_path))
+        )
+
+    def load_surface(
+        self,
+        cell_m: Optional[float] = None,
+        build: bool = True,
+        force: bool = False,
+    ) -> Optional[SuitabilityRaster]:
+        """Attach the suitability surface stored at ``surface_path``.
+
+        The stored surface is used while the reference CSV, the model file, its
+        feature list and (if given) ``cell_m`` match what it was computed from.
+        Otherwise, or with ``force``, it is rebuilt and saved when ``build`` is set.
+        """
+        if self.model is None or self.neighbor_index is None:
+            return None
+        surface: Optional[SuitabilityRaster] = None
+        if not force:
+            loaded = load_surface(self.surface_path, self.reference_path)
+            if loaded is not None and self._surface_is_current(loaded[1]):
+                if cell_m is None or loaded[0].cell_m == float(cell_m):
+                    surface = loaded[0]
+        if surface is None and build:
+            surface = self.build_surface(DEFAULT_SURFACE_CELL_M if cell_m is None else cell_m)
+            try:
+                save_surface(self.surface_path, self.reference_path, surface, self._surface_meta())
+            except OSError as e:
+                print(f"Warning: could not save suitability surface: {e}")
+        if surface is not None:
+            self.surface = surface
+        return surface
+
+    def build_surface(self, cell_m: float = DEFAULT_SURFACE_CELL_M) -> SuitabilityRaster:
+        """Score a ``cell_m`` grid over the reference cafes' bounding box with batched inference."""
+        lats, lngs = self.neighbor_index.projection.inverse(self.neighbor_index.xy)
+        if lats.size == 0:
+            raise RuntimeError("Reference data not loaded. Cannot build the suitability surface.")
+        return build_surface(
+            lambda la, lo: self._score_batch(la, lo, SURFACE_K_NEIGHBORS)[0],
+            float(lats.min()),
+            float(lngs.min()),
+            float(lats.max()),
+            float(lngs.max()),
+            cell_m,
+        )
+
     def predict(self, lat: float, lng: float, k_neighbors: int = 5) -> Dict[str, Any]:
+        surface = self.surface
+        if surface is not None and k_neighbors == SURFACE_K_NEIGHBORS:
+            score = float(surface.sample([lat], [lng])[0])
+            if np.isfinite(score):
+                return {
+                    "predicted_score": score,
+                    "risk_level": self.risk_level(score),
+                    "estimated_features": {"lat": lat, "lng": lng, "interpolated": True},
+                }
+        return self.predict_batch([lat], [lng], k_neighbors)[0]
+
+    def predict_batch(
+        self,
+        lats: Sequence[float],
+        lngs: Sequence[float],
+        k_neighbors: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Predict scores for many locations with one neighbour query and one model call.
+
+        POI features of each location are estimated as the mean over its
+        ``k_neighbors`` nearest reference cafes (metric distance), then engineered
+        and scored together. Returns one ``predict``-style dict per location.
+        """
+        scores, raw = self._score_batch(lats, lngs, k_neighbors)
+        if scores.size == 0:
+            return []
+        feature_keys = list(raw)
+        feature_rows = np.column_stack([raw[name] for name in feature_keys]).tolist()
+        return [
+            {
+                "predicted_score": float(score),
+                "risk_level": self.risk_level(float(score)),
+                "estimated_features": dict(zip(feature_keys, row)),
+            }
+            for score, row in zip(scores.tolist(), feature_rows)
+        ]
+
+    def _score_batch(
+        self,
+        lats: Sequence[float],
+        lngs: Sequence[float],
+        k_neighbors: int = 5,
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """(scores, estimated raw feature columns) for the given locations."""
         if self.model is None:
             raise RuntimeError("Model not loaded. Please check server logs.")
-        if self.reference_df is None:
+        columns, raw = self._feature_columns(lats, lngs, k_neighbors)
+        if not raw:
+            return np.empty(0), raw
+
+        # 3. One model call for all rows
+        rows = raw['lat'].shape[0]
+        if self.booster is not None:
+            scores = self._predict_native(columns, rows)
+        else:
+            scores = self._predict_frame(columns, rows)
+        return scores, raw
+
+    def _feature_columns(
+        self,
+        lats: Sequence[float],
+        lngs: Sequence[float],
+        k_neighbors: int = 5,
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """(model input columns, estimated raw feature columns) for the given locations."""
+        if self.reference_df is None or self.neighbor_index is None:
             raise RuntimeError("Reference data not loaded. Cannot perform feature estimation.")
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lngs = np.asarray(lngs, dtype=np.float64).reshape(-1)
+        if lats.size == 0:
+            return {}, {}
 
-        # 1. Find k-nearest neighbors
-        existing_coords = self.reference_df[['lat', 'lng']].values
-        new_coord = np.array([[lat, lng]])
-        
-        # Calculate Euclidean distances
-        distances = distance.cdist(new_coord, existing_coords, 'euclidean')[0]
-        
-        # Get k-nearest neighbors
-        nearest_indices = np.argsort(distances)[:k_neighbors]
-        nearest_cafes = self.reference_df.iloc[nearest_indices]
-        
-        # 2. Estimate POI features by averaging nearest neighbors
-        poi_count_cols = [c for c in self.reference_df.columns if c.endswith('_count_1km')]
-        poi_weight_cols = [c for c in self.reference_df.columns if c.endswith('_weight_1km')]
-        
-        new_features = {}
-        
-        # Copy raw POI features (averaged from neighbors)
-        for col in poi_count_cols + poi_weight_cols:
-            new_features[col] = nearest_cafes[col].mean()
-
-        # Include cafe_weight if present in the reference data
-        if 'cafe_weight' in self.reference_df.columns:
-            new_features['cafe_weight'] = nearest_cafes['cafe_weight'].mean()
-        
-        # Add lat/lng
-        new_features['lat'] = lat
-        new_features['lng'] = lng
-        
-        # Create a temporary dataframe for feature engineering
-        temp_df = pd.DataFrame([new_features])
-        
-        # 3. Feature Engineering (Must match notebook logic)
-        eng_new = pd.DataFrame(index=temp_df.index)
-        EPSILON = 1e-6
-        
-        # Helper to safely get column or 0
-        def get_col(df, col_name):
-            return df[col_name].fillna(0) if col_name in df.columns else 0
-
-        # Total POI Count
-        eng_new['total_poi_count_1km'] = (
-            get_col(temp_df, 'banks_count_1km') +
-            get_col(temp_df, 'education_count_1km') +
-            get_col(temp_df, 'health_count_1km') +
-            get_col(temp_df, 'temples_count_1km') +
-            get_col(temp_df, 'other_count_1km')
-        )
-        
-        # Category Ratios
-        total_poi = eng_new['total_poi_count_1km'] + EPSILON
-        eng_new['bank_ratio'] = get_col(temp_df, 'banks_count_1km') / total_poi
-        eng_new['education_ratio'] = get_col(temp_df, 'education_count_1km') / total_poi
-        eng_new['temple_ratio'] = get_col(temp_df, 'temples_count_1km') / total_poi
-        eng_new['health_ratio'] = get_col(temp_df, 'health_count_1km') / total_poi
-        
-        # Weighted POI Strength
-        eng_new['weighted_POI_strength'] = (
-            get_col(temp_df, 'banks_weight_1km') +
-            get_col(temp_df, 'education_weight_1km') +
-            get_col(temp_df, 'health_weight_1km') +
-            get_col(temp_df, 'temples_weight_1km') +
-            get_col(temp_df, 'other_weight_1km')
-        )
-        
-        # Combine with raw features
-        sample_full = pd.concat([temp_df.reset_index(drop=True), eng_new.reset_index(drop=True)], axis=1)
+        # 1. k nearest reference cafes -> (N, k, F) features, averaged ignoring NaN
+        idx, _ = self.neighbor_index.nearest_k(lats, lngs, k_neighbors)
+        if idx.shape[1] == 0 or (idx < 0).any():
+            raise ValueError("Cannot find neighbours for non-finite coordinates or empty reference data.")
+        neighbor = self.neighbor_features[idx]
+        counts = np.isfinite(neighbor).sum(axis=1)
+        with np.errstate(invalid='ignore'):
+            estimated = np.where(counts > 0, np.nansum(neighbor, axis=1) / np.maximum(counts, 1), np.nan)
+
+        raw: Dict[str, np.ndarray] = dict(zip(self.neighbor_feature_names, estimated.T))
+        raw['lat'] = lats
+        raw['lng'] = lngs
+
+        # 2. Feature engineering (must match notebook logic); missing values count as 0
+        zeros = np.zeros(lats.shape[0])
+
+        def filled(name: str) -> np.ndarray:
+            values = raw.get(name)
+            return zeros if values is None else np.nan_to_num(values, nan=0.0)
 
+        engineered: Dict[str, np.ndarray] = {}
+        engineered['total_poi_count_1km'] = sum(filled(f'{g}_count_1km') for g in POI_GROUPS)
+        total_poi = engineered['total_poi_count_1km'] + EPSILON
+        for ratio, group in POI_RATIOS.items():
+            engineered[ratio] = filled(f'{group}_count_1km') / total_poi
+        engineered['weighted_POI_strength'] = sum(filled(f'{g}_weight_1km') for g in POI_GROUPS)
+
+        return {**raw, **engineered}, raw
+
+    def _input_buffer(self, rows: int) -> np.ndarray:
+        """This thread's float32 model input, grown to a power of two and reused across calls."""
+        buf = getattr(self._buffers, "matrix", None)
+        if buf is None or buf.shape[0] < rows or buf.shape[1] != len(self.model_columns):
+            capacity = 1 << max(int(rows) - 1, 63).bit_length()
+            buf = np.empty((capacity, len(self.model_columns)), dtype=np.float32)
+            self._buffers.matrix = buf
+        return buf[:rows]
+
+    def _predict_native(self, columns: Dict[str, np.ndarray], rows: int) -> np.ndarray:
+        """Scores from ``Booster.inplace_predict`` on the cached column order (absent columns are 0)."""
+        matrix = self._input_buffer(rows)
+        for j, name in enumerate(self.model_columns):
+            matrix[:, j] = columns.get(name, 0.0)
+        scores = self.booster.inplace_predict(matrix, iteration_range=self._iteration_range)
+        return np.asarray(scores, dtype=np.float64).reshape(-1)
+
+    def _predict_frame(self, columns: Dict[str, np.ndarray], rows: int) -> np.ndarray:
+        """Scores from the model's own ``predict`` on a DataFrame in model feature order."""
         model_feature_names = self._resolve_model_feature_names()
-        if model_feature_names:
-            for col in model_feature_names:
-                if col not in sample_full.columns:
-                    sample_full[col] = 0.0
-            sample_df = sample_full[model_feature_names]
-        else:
+        if not model_feature_names:
             # Fallback if feature names not loaded (risky)
             print("Warning: No feature names available. Using all engineered features.")
-            sample_df = sample_full
-
-        # Make prediction
+            model_feature_names = list(columns)
+        zeros = np.zeros(rows)
+        matrix = np.column_stack([columns.get(name, zeros) for name in model_feature_names])
+        sample_df = pd.DataFrame(matrix, columns=model_feature_names)
         if isinstance(self.model, xgb.Booster):
             dtest = xgb.DMatrix(sample_df, feature_names=list(sample_df.columns))
-            predicted_score = float(self.model.predict(dtest)[0])
-        else:
-            predicted_score = float(self.model.predict(sample_df)[0])
-        
-        # Risk assessment
+            return np.asarray(self.model.predict(dtest), dtype=np.float64).reshape(-1)
+        return np.asarray(self.model.predict(sample_df), dtype=np.float64).reshape(-1)
+
+    @staticmethod
+    def risk_level(predicted_score: float) -> str:
         if predicted_score < 1.0:
-            risk_level = 'High'
-        elif predicted_score < 2.0:
-            risk_level = 'Medium'
-        else:
-            risk_level = 'Low'
-            
-        return {
-            "predicted_score": predicted_score,
-            "risk_level": risk_level,
-            "estimated_features": new_features
-        }
+            return 'High'
+        if predicted_score < 2.0:
+            return 'Medium'
+        return 'Low'
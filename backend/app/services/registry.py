@@ -0,0 +1,243 @@
+"""Process-wide registry of the heavy, read-mostly objects the API shares across requests.
+
+The registry owns one ``ServiceBundle`` — a ``SiteAnalysisService`` wired to a single
+``RoadNetwork``, the ``RoadTypeNetwork`` and the ``PoiStore``. Endpoints obtain
+these through the FastAPI dependencies at the bottom of this module instead of
+constructing services per request.
+
+The bundle is immutable. When the road GeoJSON changes, a replacement bundle is
+built in a background thread and swapped in with a single reference assignment,
+so in-flight requests keep using the bundle they started with. POI CSVs are
+refreshed by the ``PoiStore`` itself, which re-reads a category when its file changes.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from app.lib.road_network import RoadNetwork
+from app.lib.road_type_network import RoadTypeNetwork
+from app.services.poi_store import PoiStore
+from app.services.site_analysis_service import SiteAnalysisService
+
+ROAD_SNAP_TOLERANCE_M = 120.0
+SECONDARY_SNAP_TOLERANCE_M = 300.0
+DEFAULT_CHECK_INTERVAL_S = float(os.getenv("SITEX_REGISTRY_CHECK_INTERVAL_S", "30"))
+
+
+@dataclass(frozen=True)
+class ServiceBundle:
+    site_analysis: SiteAnalysisService
+    road_network: Optional[RoadNetwork]
+    road_type_network: Optional[RoadTypeNetwork]
+    poi_store: PoiStore
+    # Watched file path -> mtime at load time; used to detect stale data.
+    fingerprint: Dict[str, float]
+    loaded_at: float
+    errors: Dict[str, str] = field(default_factory=dict)
+    version: int = 0
+
+
+class ServiceRegistry:
+    def __init__(self, data_root: Optional[Path] = None, check_interval_s: float = DEFAULT_CHECK_INTERVAL_S) -> None:
+        self.data_root = data_root or Path(__file__).resolve().parents[2]
+        self.road_geojson = self.data_root / "Data" / "Roadway.geojson"
+        self.road_cache = self.road_geojson.with_suffix(".graph")
+        self.road_type_cache = self.road_geojson.with_suffix(".roadtypes")
+        self.road_access_cache = self.road_geojson.with_suffix(".access")
+        self.check_interval_s = float(check_interval_s)
+
+        self._bundle: Optional[ServiceBundle] = None
+        self._lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._last_check = 0.0
+        self._version = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def warm_up(self) -> ServiceBundle:
+        """Load every shared resource now (call from application startup)."""
+        return self._install(self._build_bundle())
+
+    def current(self) -> ServiceBundle:
+        """Return the active bundle, loading it on first use and scheduling a reload if stale."""
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                if self._bundle is None:
+                    self._install_locked(self._build_bundle())
+                bundle = self._bundle
+        else:
+            self._maybe_schedule_reload(bundle)
+        return bundle
+
+    def reload(self) -> ServiceBundle:
+        """Synchronously rebuild and swap in a new bundle."""
+        return self._install(self._build_bundle())
+
+    def is_stale(self, bundle: Optional[ServiceBundle] = None) -> bool:
+        bundle = bundle or self._bundle
+        if bundle is None:
+            return True
+        return self._fingerprint() != bundle.fingerprint
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _install(self, bundle: ServiceBundle) -> ServiceBundle:
+        with self._lock:
+            return self._install_locked(bundle)
+
+    def _install_locked(self, bundle: ServiceBundle) -> ServiceBundle:
+        """Swap in a copy of ``bundle`` stamped with the next version and return it."""
+        self._version += 1
+        installed = replace(bundle, version=self._version)
+        self._bundle = installed
+        self._last_check = time.monotonic()
+        return installed
+
+    def _maybe_schedule_reload(self, bundle: ServiceBundle) -> None:
+        now = time.monotonic()
+        if self.check_interval_s <= 0 or now - self._last_check < self.check_interval_s:
+            return
+        self._last_check = now
+        if self._reload_thread is not None and self._reload_thread.is_alive():
+            return
+        if not self.is_stale(bundle):
+            return
+        thread = threading.Thread(target=self._background_reload, name="sitex-registry-reload", daemon=True)
+        self._reload_thread = thread
+        thread.start()
+
+    def _background_reload(self) -> None:
+        try:
+            self.reload()
+            print("Info: reloaded shared road network and POI data after source files changed")
+        except Exception as exc:
+            print(f"Warning: background reload failed; keeping previous data ({exc})")
+
+    def _build_bundle(self) -> ServiceBundle:
+        errors: Dict[str, str] = {}
+        # Capture mtimes before reading so a write racing the load is picked up next check.
+        fingerprint = self._fingerprint()
+        road_network = self._load_road_network(errors)
+        road_type_network = self._load_road_type_network(errors)
+        svc = SiteAnalysisService(
+            data_root=self.data_root,
+            road_snap_tolerance_m=ROAD_SNAP_TOLERANCE_M,
+            secondary_snap_tolerance_m=SECONDARY_SNAP_TOLERANCE_M,
+            road_network=road_network,
+        )
+        for cat in svc.poi_store.categories:
+            try:
+                svc.poi_store.category(cat)
+            except Exception as exc:
+                errors[f"poi:{cat}"] = str(exc)
+        return ServiceBundle(
+            site_analysis=svc,
+            road_network=road_network,
+            road_type_network=road_type_network,
+            poi_store=svc.poi_store,
+            fingerprint=fingerprint,
+            loaded_at=time.time(),
+            errors=errors,
+        )
+
+    def _load_road_network(self, errors: Dict[str, str]) -> Optional[RoadNetwork]:
+        if not self.road_geojson.exists():
+            errors["road_network"] = f"Roadway GeoJSON not found at {self.road_geojson}"
+            return None
+        try:
+            return RoadNetwork.from_geojson(
+                self.road_geojson,
+                cache_path=self.road_cache,
+                snap_tolerance_m=ROAD_SNAP_TOLERANCE_M,
+            )
+        except Exception as exc:
+            print(f"Warning: Failed to load road network ({exc})")
+            errors["road_network"] = str(exc)
+            return None
+
+    def _load_road_type_network(self, errors: Dict[str, str]) -> Optional[RoadTypeNetwork]:
+        if not self.road_geojson.exists():
+            errors["road_type_network"] = f"Roadway GeoJSON not found at {self.road_geojson}"
+            return None
+        try:
+            network = RoadTypeNetwork.from_geojson(
+                self.road_geojson,
+                cache_path=self.road_type_cache,
+                snap_tolerance_m=ROAD_SNAP_TOLERANCE_M,
+            )
+        except Exception as exc:
+            print(f"Warning: Failed to load road type network ({exc})")
+            errors["road_type_network"] = str(exc)
+            return None
+        try:
+            network.load_accessibility(self.road_access_cache, self.road_geojson)
+        except Exception as exc:
+            print(f"Warning: road accessibility table unavailable; searching per request ({exc})")
+            errors["road_accessibility"] = str(exc)
+        return network
+
+    def _fingerprint(self) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for p in (self.road_geojson,):
+            try:
+                out[os.fspath(p)] = float(p.stat().st_mtime)
+            except OSError:
+                out[os.fspath(p)] = -1.0
+        return out
+
+
+_registry: Optional[ServiceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ServiceRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ServiceRegistry()
+    return _registry
+
+
+def set_registry(registry: Optional[ServiceRegistry]) -> None:
+    """Replace the process-wide registry (used by tests and scripts)."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
+
+
+def data_version(categories: Optional[Sequence[str]] = None) -> Tuple[Any, ...]:
+    """Changes whenever the shared bundle is replaced or a POI CSV in ``categories``
+    (default all) changes on disk; used to invalidate cached responses."""
+    bundle = get_registry().current()
+    return bundle.version, bundle.poi_store.version(categories)
+
+
+# ----------------------------------------------------------------------
+# FastAPI dependencies
+# ----------------------------------------------------------------------
+
+def get_site_analysis_service() -> SiteAnalysisService:
+    return get_registry().current().site_analysis
+
+
+def get_road_network() -> Optional[RoadNetwork]:
+    return get_registry().current().road_network
+
+
+def get_road_type_network() -> Optional[RoadTypeNetwork]:
+    return get_registry().current().road_type_network
+
+
+def get_poi_store() -> PoiStore:
+    return get_registry().current().poi_store
@@ -0,0 +1,60 @@
+"""Bulk assembly of POI result items from aligned NumPy columns.
+
+Endpoints compute distances and weights for a whole category as arrays, then turn
+the columns into either a list of records (the default JSON shape) or parallel
+lists (``format=columns``) in one pass, instead of building each item field by
+field.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Literal, Mapping, Optional, Sequence
+
+import numpy as np
+
+ResultFormat = Literal["records", "columns"]
+
+
+def decay_weights(dist_km: np.ndarray, radius_km: float, decay_scale_km: Optional[float]) -> np.ndarray:
+    """``max(0, 1 - d / radius) * exp(-d / decay)`` per distance; no decay when the scale is <= 0."""
+    d = np.asarray(dist_km, dtype=np.float64)
+    if radius_km <= 0:
+        return np.zeros_like(d)
+    base = np.maximum(0.0, 1.0 - d / float(radius_km))
+    if decay_scale_km is None or decay_scale_km <= 0:
+        return base
+    return base * np.exp(-d / float(decay_scale_km))
+
+
+def rounded(values: np.ndarray, ndigits: int = 4) -> np.ndarray:
+    return np.round(np.asarray(values, dtype=np.float64), ndigits)
+
+
+def _as_list(values: Any) -> List[Any]:
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return list(values)
+
+
+def to_columns(columns: Mapping[str, Any]) -> Dict[str, List[Any]]:
+    """Parallel JSON-ready lists, one per column."""
+    return {key: _as_list(values) for key, values in columns.items()}
+
+
+def to_records(columns: Mapping[str, Any], sparse: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """One dict per row. Keys listed in ``sparse`` are left out of a row whose value is None."""
+    lists = to_columns(columns)
+    dense_keys = [k for k in lists if k not in sparse]
+    sparse_keys = [k for k in lists if k in sparse]
+    records = [dict(zip(dense_keys, row)) for row in zip(*(lists[k] for k in dense_keys))]
+    for key in sparse_keys:
+        for record, value in zip(records, lists[key]):
+            if value is not None:
+                record[key] = value
+    return records
+
+
+def render(columns: Mapping[str, Any], fmt: ResultFormat = "records", sparse: Sequence[str] = ()) -> Any:
+    """``to_records`` or ``to_columns`` depending on ``fmt``."""
+    if fmt == "columns":
+        return to_columns(columns)
+    return to_records(columns, sparse)
@@ -3,27 +3,21 @@ from __future__ import annotations
 import csv
 import math
 import os
-import time
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from functools import lru_cache
 from io import StringIO
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
-import networkx as nx
 
+from app.lib.isochrone import DEFAULT_BUFFER_M, Catchment, build_catchment, isochrones_available
 from app.lib.road_network import RoadNetwork
-
-
-def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+from app.services.poi_store import PoiStore
+from app.services.result_builder import ResultFormat, decay_weights, render, rounded
+from app.services.site_context import SiteContext, build_site_context
 
 
 def _weight(distance_km: float, radius_km: float, decay_scale_km: float) -> float:
@@ -41,6 +35,32 @@ def _weight(distance_km: float, radius_km: float, decay_scale_km: float) -> floa
         return float(base_weight)
 
 
+def _ring_profile(
+    dists_km: np.ndarray,
+    radii_km: Sequence[float],
+    decay_scale_km: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Per-radius count, sum of ``_weight``, mean and min of ``dists_km`` within each radius.
+
+    The distances are sorted once; each radius is then a ``searchsorted`` lookup into
+    prefix sums. Within a radius ``_weight(d, r, s) = e(d) - d * e(d) / r`` with
+    ``e(d) = exp(-d / s)``, so the weight sum needs only prefix sums of ``e`` and ``d * e``.
+    """
+    d = np.sort(np.asarray(dists_km, dtype=np.float64))
+    radii = np.asarray(radii_km, dtype=np.float64)
+    decay = np.exp(-d / float(decay_scale_km)) if decay_scale_km > 0 else np.ones_like(d)
+    cum_d = np.concatenate(([0.0], np.cumsum(d)))
+    cum_e = np.concatenate(([0.0], np.cumsum(decay)))
+    cum_de = np.concatenate(([0.0], np.cumsum(d * decay)))
+
+    counts = np.searchsorted(d, radii, side="right")
+    safe_r = np.where(radii > 0, radii, np.inf)
+    sum_w = np.where(radii > 0, np.maximum(cum_e[counts] - cum_de[counts] / safe_r, 0.0), 0.0)
+    avg = np.divide(cum_d[counts], counts, out=np.zeros_like(radii), where=counts > 0)
+    min_d = np.full(radii.shape, d[0] if d.size else np.nan)
+    return counts, sum_w, avg, min_d
+
+
 @dataclass(frozen=True)
 class PoiItem:
     name: str | None
@@ -69,14 +89,30 @@ class SiteAnalysisService:
         data_root: Optional[Path] = None,
         road_snap_tolerance_m: float = 120.0,
         secondary_snap_tolerance_m: float = 300.0,
+        road_network: Optional[RoadNetwork] = None,
     ) -> None:
         self.data_root = data_root or Path(__file__).resolve().parents[2]
         self.road_geojson = self.data_root / "Data" / "Roadway.geojson"
-        self.road_cache = self.road_geojson.with_suffix(".graph.pkl")
+        self.road_cache = self.road_geojson.with_suffix(".graph")
         self.road_snap_tolerance_m = float(road_snap_tolerance_m)
         self.secondary_snap_tolerance_m = float(secondary_snap_tolerance_m)
 
-        self._df_cache: Dict[str, Tuple[float, pd.DataFrame]] = {}
+        # A road network injected by the service registry is shared across requests;
+        # otherwise it is loaded lazily on first use.
+        self._road_network = road_network
+        self._road_network_loaded = road_network is not None
+        # Columnar POI arrays with precomputed road snaps, refreshed on CSV mtime change.
+        self.poi_store = PoiStore(
+            self.resolve_poi_data_dir,
+            self.POI_FILES,
+            road_network=self.get_road_network,
+            snap_tiers=self.snap_tiers_m,
+        )
+        # Isochrone polygons per (snapped node, budgets, buffer); they depend only on
+        # the road network, so they live as long as this service.
+        self._catchments: "OrderedDict[Tuple[int, Tuple[float, ...], float], Catchment]" = OrderedDict()
+        self._catchments_size = 256
+        self._catchments_lock = threading.Lock()
 
     def resolve_poi_data_dir(self) -> Path:
         """Locate the POI CSV directory.
@@ -101,8 +137,13 @@ class SiteAnalysisService:
 
         raise RuntimeError(f"POI data folder not found at {primary} or {fallback}")
 
-    @lru_cache(maxsize=1)
     def get_road_network(self) -> Optional[RoadNetwork]:
+        if not self._road_network_loaded:
+            self._road_network = self._load_road_network()
+            self._road_network_loaded = True
+        return self._road_network
+
+    def _load_road_network(self) -> Optional[RoadNetwork]:
         if not self.road_geojson.exists():
             return None
         try:
@@ -115,73 +156,12 @@ class SiteAnalysisService:
             print(f"Warning: Failed to load road network ({exc})")
             return None
 
-    def _find_csv(self, data_dir: Path, expected_name: str) -> Optional[Path]:
-        fpath = data_dir / expected_name
-        if fpath.exists():
-            return fpath
-        # attempt fuzzy match (mirrors existing /pois endpoint behavior)
-        base = expected_name[:-4].lower()
-        for p in data_dir.glob("*.csv"):
-            pn = p.name.lower()
-            if base in pn or (base.endswith("s") and base[:-1] in pn) or (base.endswith("es") and base[:-2] in pn):
-                return p
-        return None
-
-    def _normalize_poi_df(self, df: pd.DataFrame) -> pd.DataFrame:
-        lat_col: Optional[str] = None
-        lon_col: Optional[str] = None
-        name_col: Optional[str] = None
-        subcat_col: Optional[str] = None
-
-        for c in df.columns:
-            cl = str(c).lower()
-            if cl in ("lat", "latitude", "y"):
-                lat_col = c
-            if cl in ("lon", "lng", "longitude", "x"):
-                lon_col = c
-            if cl in ("name", "title"):
-                name_col = c
-            if cl in ("subcategory", "sub_category", "type"):
-                subcat_col = c
-
-        if lat_col is None or lon_col is None:
-            num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-            if len(num_cols) >= 2:
-                lat_col, lon_col = num_cols[0], num_cols[1]
-
-        if lat_col is None or lon_col is None:
-            return pd.DataFrame(columns=["lat", "lon", "name", "subcategory"])
-
-        out = pd.DataFrame()
-        out["lat"] = pd.to_numeric(df[lat_col], errors="coerce")
-        out["lon"] = pd.to_numeric(df[lon_col], errors="coerce")
-        out["name"] = df[name_col] if name_col and name_col in df.columns else None
-        out["subcategory"] = df[subcat_col] if subcat_col and subcat_col in df.columns else None
-        return out
-
     def load_category_df(self, category: str) -> pd.DataFrame:
-        data_dir = self.resolve_poi_data_dir()
-        expected = self.POI_FILES.get(category)
-        if not expected:
-            return pd.DataFrame(columns=["lat", "lon", "name", "subcategory"])
-        fpath = self._find_csv(data_dir, expected)
-        if fpath is None:
-            return pd.DataFrame(columns=["lat", "lon", "name", "subcategory"])
-
-        mtime = 0.0
-        try:
-            mtime = float(fpath.stat().st_mtime)
-        except Exception:
-            mtime = time.time()
+        """``lat, lon, name, subcategory`` frame of a category, indexed by CSV row.
 
-        cached = self._df_cache.get(os.fspath(fpath))
-        if cached and cached[0] >= mtime:
-            return cached[1]
-
-        df_raw = pd.read_csv(fpath).reset_index(drop=True)
-        df = self._normalize_poi_df(df_raw)
-        self._df_cache[os.fspath(fpath)] = (mtime, df)
-        return df
+        Kept for scripts and notebooks; request paths read ``poi_store`` arrays directly.
+        """
+        return self.poi_store.category(category).to_frame()
 
     def _network_distance_map(
         self,
@@ -192,61 +172,27 @@ class SiteAnalysisService:
         poi_lats: pd.Series,
         poi_lons: pd.Series,
         radius_m: float,
+        poi_snaps: Optional[Tuple[np.ndarray, np.ndarray]] = None,
     ) -> Dict[int, float]:
+        """Map ``poi_indices`` entries to network km for POIs reachable within ``radius_m``.
+
+        ``poi_snaps`` (nodes, offsets) reuses snaps precomputed by the ``PoiStore``.
+        """
         idx_list = [int(i) for i in list(poi_indices)]
-        center_node, center_offset = road_net.snap_point(
-            center_lat,
-            center_lon,
-            max_snap_m=self.road_snap_tolerance_m,
-        )
-        if center_node is None:
-            center_node, center_offset = road_net.snap_point(
-                center_lat, center_lon, max_snap_m=self.secondary_snap_tolerance_m
-            )
-        if center_node is None:
-            center_node, center_offset = road_net.snap_point(center_lat, center_lon, max_snap_m=float("inf"))
+        center_node, center_offset = self._resolve_center_node(road_net, center_lat, center_lon)
         if center_node is None:
             return {}
 
-        safe_lats: List[Optional[float]] = []
-        safe_lons: List[Optional[float]] = []
-        for a, b in zip(poi_lats, poi_lons):
-            try:
-                av = float(a)
-                bv = float(b)
-                if not math.isfinite(av) or not math.isfinite(bv):
-                    safe_lats.append(None)
-                    safe_lons.append(None)
-                else:
-                    safe_lats.append(av)
-                    safe_lons.append(bv)
-            except Exception:
-                safe_lats.append(None)
-                safe_lons.append(None)
-
-        poi_nodes, poi_offsets = road_net.snap_points(safe_lats, safe_lons, max_snap_m=self.road_snap_tolerance_m)
-        if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-            sec_nodes, sec_offsets = road_net.snap_points(
-                safe_lats, safe_lons, max_snap_m=self.secondary_snap_tolerance_m
-            )
-            for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-                if (n is None or not math.isfinite(o)) and (sec_nodes[i] is not None and math.isfinite(sec_offsets[i])):
-                    poi_nodes[i] = sec_nodes[i]
-                    poi_offsets[i] = sec_offsets[i]
-        if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-            inf_nodes, inf_offsets = road_net.snap_points(safe_lats, safe_lons, max_snap_m=float("inf"))
-            for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-                if (n is None or not math.isfinite(o)) and (inf_nodes[i] is not None and math.isfinite(inf_offsets[i])):
-                    poi_nodes[i] = inf_nodes[i]
-                    poi_offsets[i] = inf_offsets[i]
+        if poi_snaps is not None:
+            poi_nodes, poi_offsets = poi_snaps
+        else:
+            lat_arr = pd.to_numeric(pd.Series(poi_lats), errors="coerce").to_numpy(dtype=float)
+            lon_arr = pd.to_numeric(pd.Series(poi_lons), errors="coerce").to_numpy(dtype=float)
+            poi_nodes, poi_offsets, _ = road_net.snap_points_tiered(lat_arr, lon_arr, self.snap_tiers_m)
 
         node_to_indices: Dict[int, List[int]] = {}
-        for idx, node_id in enumerate(poi_nodes):
-            if node_id is None:
-                continue
-            if not math.isfinite(poi_offsets[idx]):
-                continue
-            node_to_indices.setdefault(int(node_id), []).append(idx)
+        for idx in (poi_nodes >= 0).nonzero()[0].tolist():
+            node_to_indices.setdefault(int(poi_nodes[idx]), []).append(idx)
         if not node_to_indices:
             return {}
 
@@ -262,27 +208,75 @@ class SiteAnalysisService:
             for poi_idx in indices:
                 total_m = float(path_dist) + center_offset_val + float(poi_offsets[poi_idx])
                 if total_m <= radius_m:
-                    # Map back to the original DataFrame index so callers can look up
-                    # by `original_idx` from `df2.iterrows()`.
+                    # Key by the caller's index (e.g. PoiStore position) rather than position
+                    # in this candidate list.
                     if 0 <= int(poi_idx) < len(idx_list):
                         results[int(idx_list[int(poi_idx)])] = total_m / 1000.0
         return results
 
+    @property
+    def snap_tiers_m(self) -> Tuple[float, float, float]:
+        return (self.road_snap_tolerance_m, self.secondary_snap_tolerance_m, float("inf"))
+
     def _resolve_center_node(self, road_net: RoadNetwork, lat: float, lon: float) -> Tuple[Optional[int], float]:
-        node, offset = road_net.snap_point(lat, lon, max_snap_m=self.road_snap_tolerance_m)
-        if node is None:
-            node, offset = road_net.snap_point(lat, lon, max_snap_m=self.secondary_snap_tolerance_m)
-        if node is None:
-            node, offset = road_net.snap_point(lat, lon, max_snap_m=float("inf"))
-        return (int(node) if node is not None else None), float(offset or 0.0)
+        node, offset, _ = road_net.snap_point_tiered(lat, lon, self.snap_tiers_m)
+        return node, float(offset or 0.0)
 
     def _resolve_poi_node(self, road_net: RoadNetwork, lat: float, lon: float) -> Tuple[Optional[int], float]:
-        node, offset = road_net.snap_point(lat, lon, max_snap_m=self.road_snap_tolerance_m)
-        if node is None:
-            node, offset = road_net.snap_point(lat, lon, max_snap_m=self.secondary_snap_tolerance_m)
+        node, offset, _ = road_net.snap_point_tiered(lat, lon, self.snap_tiers_m)
+        return node, float(offset or 0.0)
+
+    def catchment_for_node(
+        self,
+        road_net: RoadNetwork,
+        node: int,
+        budgets_m: Sequence[float],
+        buffer_m: float = DEFAULT_BUFFER_M,
+    ) -> Optional[Catchment]:
+        key = (int(node), tuple(sorted({float(b) for b in budgets_m})), float(buffer_m))
+        with self._catchments_lock:
+            cached = self._catchments.get(key)
+            if cached is not None:
+                self._catchments.move_to_end(key)
+                return cached
+        catchment = build_catchment(road_net, int(node), key[1], buffer_m=key[2])
+        if catchment is not None:
+            with self._catchments_lock:
+                self._catchments[key] = catchment
+                if len(self._catchments) > self._catchments_size:
+                    self._catchments.popitem(last=False)
+        return catchment
+
+    def isochrones(
+        self,
+        lat: float,
+        lon: float,
+        *,
+        budgets_m: Sequence[float] = (250.0, 500.0, 1000.0),
+        buffer_m: float = DEFAULT_BUFFER_M,
+    ) -> Dict[str, Any]:
+        """Walkable-area polygons around the road node nearest to (lat, lon).
+
+        Budgets are measured from the snapped node so polygons can be shared by every
+        center that snaps to it; ``snap_offset_m`` reports the gap.
+        """
+        road_net = self.get_road_network()
+        if road_net is None:
+            raise RuntimeError("Road network is not available")
+        node, offset = self._resolve_center_node(road_net, float(lat), float(lon))
         if node is None:
-            node, offset = road_net.snap_point(lat, lon, max_snap_m=float("inf"))
-        return (int(node) if node is not None else None), float(offset or 0.0)
+            raise RuntimeError("Could not snap the center to the road network")
+        catchment = self.catchment_for_node(road_net, node, budgets_m, buffer_m)
+        if catchment is None:
+            raise RuntimeError("No positive distance budgets given")
+        snapped_lat, snapped_lon = road_net.node_coords[int(node)].tolist()
+        return {
+            "center": {"lat": float(lat), "lon": float(lon)},
+            "snapped": {"lat": snapped_lat, "lon": snapped_lon, "snap_offset_m": round(offset, 2)},
+            "budgets_m": list(catchment.budgets_m),
+            "buffer_m": catchment.buffer_m,
+            "isochrones": catchment.to_geojson(),
+        }
 
     def path_between(
         self,
@@ -306,27 +300,71 @@ class SiteAnalysisService:
         if center_node is None or poi_node is None:
             return None
 
-        try:
-            if int(center_node) == int(poi_node):
-                node_path = [int(center_node)]
-            else:
-                node_path = nx.shortest_path(
-                    road_net.graph,
-                    source=int(center_node),
-                    target=int(poi_node),
-                    weight="weight",
-                )
-        except Exception:
+        # One tree search over the CSR arrays; road_net.graph would rebuild networkx per worker.
+        tree = road_net.shortest_path_tree(int(center_node))
+        node_path = tree.path_to(int(poi_node)) if tree is not None else None
+        if not node_path:
             return None
 
-        coords: List[Dict[str, float]] = []
-        coords.append({"lat": float(center_lat), "lon": float(center_lon)})
-        for n in node_path:
-            lat_val, lon_val = road_net.node_coords[int(n)]
-            coords.append({"lat": float(lat_val), "lon": float(lon_val)})
+        coords: List[Dict[str, float]] = [{"lat": float(center_lat), "lon": float(center_lon)}]
+        coords.extend(road_net.path_coords(node_path))
         coords.append({"lat": float(poi_lat), "lon": float(poi_lon)})
         return coords
 
+    def site_context(
+        self,
+        lat: float,
+        lon: float,
+        *,
+        radius_km: float,
+        categories: Optional[Sequence[str]] = None,
+        include_network: bool = True,
+        network_radius_km: Optional[float] = None,
+    ) -> SiteContext:
+        """Snap the center, search the network and collect candidates once for (lat, lon).
+
+        Pass the result as ``context`` to ``nearby``, ``ring_summary`` and
+        ``competition_index`` to derive all of them from the same work.
+        """
+        cats = list(categories) if categories else list(self.POI_FILES.keys())
+        return build_site_context(
+            self.poi_store,
+            lat,
+            lon,
+            radius_km=radius_km,
+            categories=cats,
+            road_network=self.get_road_network() if include_network else None,
+            network_radius_km=network_radius_km,
+            snap_tiers=self.snap_tiers_m,
+        )
+
+    def _context_for(
+        self,
+        context: Optional[SiteContext],
+        lat: float,
+        lon: float,
+        radius_km: float,
+        cats: Sequence[str],
+        include_network: bool,
+        network_radius_km: Optional[float] = None,
+    ) -> SiteContext:
+        if (
+            context is not None
+            and context.lat == float(lat)
+            and context.lon == float(lon)
+            and (context.road_network is not None) == bool(include_network and self.get_road_network() is not None)
+            and context.covers(radius_km, cats, network_radius_km)
+        ):
+            return context
+        return self.site_context(
+            lat,
+            lon,
+            radius_km=radius_km,
+            categories=cats,
+            include_network=include_network,
+            network_radius_km=network_radius_km,
+        )
+
     def nearby(
         self,
         lat: float,
@@ -338,89 +376,43 @@ class SiteAnalysisService:
         decay_scale_km: float = 1.0,
         include_network: bool = True,
         sort_by: Literal["auto", "haversine", "network"] = "auto",
-    ) -> Dict[str, List[Dict[str, Any]]]:
+        context: Optional[SiteContext] = None,
+        fmt: ResultFormat = "records",
+    ) -> Dict[str, Any]:
+        """Closest POIs per category, as item lists or (``fmt="columns"``) parallel arrays."""
         cats = list(categories) if categories else list(self.POI_FILES.keys())
-        out: Dict[str, List[Dict[str, Any]]] = {}
-
-        road_net = self.get_road_network() if include_network else None
-        max_radius_m = float(radius_km) * 1000.0
+        ctx = self._context_for(context, lat, lon, radius_km, cats, include_network)
+        out: Dict[str, Any] = {}
 
         for cat in cats:
-            df = self.load_category_df(cat)
-            if df.empty:
-                continue
-            # filter obvious invalids
-            df2 = df.dropna(subset=["lat", "lon"]).copy()
-            df2 = df2[df2["lat"].map(lambda v: math.isfinite(float(v)) if v is not None else False)]
-            df2 = df2[df2["lon"].map(lambda v: math.isfinite(float(v)) if v is not None else False)]
-            if df2.empty:
+            cands = ctx.categories.get(cat)
+            if cands is None:
                 continue
-
-            # compute haversine for all
-            dists = []
-            for plat, plon in zip(df2["lat"].tolist(), df2["lon"].tolist()):
-                dists.append(_haversine_km(float(lat), float(lon), float(plat), float(plon)))
-            df2["_haversine_km"] = dists
-            df2 = df2[df2["_haversine_km"] <= float(radius_km)]
-            if df2.empty:
+            cands = cands.within(float(radius_km))
+            if len(cands) == 0:
                 continue
 
-            network_map: Dict[int, float] = {}
-            if road_net is not None:
-                try:
-                    # Important: indices in df2 refer to original indices in df; keep them by using df2.index
-                    network_map = self._network_distance_map(
-                        road_net,
-                        float(lat),
-                        float(lon),
-                        df2.index.tolist(),
-                        df.loc[df2.index, "lat"],
-                        df.loc[df2.index, "lon"],
-                        max_radius_m,
-                    )
-                except Exception as exc:
-                    print(f"Warning: network distance failed for {cat}: {exc}")
-                    network_map = {}
-
-            items: List[Dict[str, Any]] = []
-            for original_idx, row in df2.iterrows():
-                hav_km = float(row["_haversine_km"])
-                net_km = network_map.get(int(original_idx))
+            chosen = cands.chosen_km(sort_by)
+            chosen_rounded = rounded(chosen)
+            order = np.argsort(chosen_rounded, kind="stable")[: max(1, int(limit))]
+            idx = cands.idx[order]
+            pois = cands.pois
+            columns: Dict[str, Any] = {
+                "name": pois.names(idx),
+                "lat": pois.lat[idx],
+                "lon": pois.lon[idx],
+                "distance_km": rounded(cands.hav_km[order]),
                 # Network distances can be unavailable for a subset of POIs if the road graph
                 # is disconnected or no valid path exists. When include_network=True, we still
                 # return a numeric value by falling back to haversine.
-                net_km_out: Optional[float]
-                if include_network:
-                    net_km_out = float(net_km) if net_km is not None else hav_km
-                else:
-                    net_km_out = None
-
-                if sort_by == "network":
-                    chosen_km = float(net_km_out) if net_km_out is not None else hav_km
-                elif sort_by == "haversine":
-                    chosen_km = hav_km
-                else:
-                    # auto: prefer network when available
-                    chosen_km = float(net_km_out) if net_km_out is not None else hav_km
-
-                weight_val = _weight(chosen_km, float(radius_km), float(decay_scale_km))
-
-                items.append(
-                    {
-                        "name": row.get("name"),
-                        "lat": float(row["lat"]),
-                        "lon": float(row["lon"]),
-                        "distance_km": round(hav_km, 4),
-                        "network_distance_km": round(float(net_km_out), 4) if net_km_out is not None else None,
-                        "chosen_distance_km": round(float(chosen_km), 4),
-                        "weight": round(float(weight_val), 4),
-                        "subcategory": row.get("subcategory"),
-                    }
-                )
-
-            # sort and limit
-            items.sort(key=lambda it: float(it.get("chosen_distance_km") or 1e9))
-            out[cat] = items[: max(1, int(limit))]
+                "network_distance_km": rounded(cands.chosen_km("network")[order])
+                if include_network
+                else [None] * idx.size,
+                "chosen_distance_km": chosen_rounded[order],
+                "weight": rounded(decay_weights(chosen[order], float(radius_km), float(decay_scale_km))),
+                "subcategory": pois.subcategories(idx),
+            }
+            out[cat] = render(columns, fmt)
 
         return out
 
@@ -434,7 +426,15 @@ class SiteAnalysisService:
         decay_scale_km: float = 1.0,
         include_network: bool = True,
         sort_by: Literal["auto", "haversine", "network"] = "auto",
+        catchment: Literal["distance", "isochrone"] = "distance",
+        context: Optional[SiteContext] = None,
     ) -> Dict[str, Any]:
+        """Count and weight POIs per ring around (lat, lon).
+
+        With ``catchment="isochrone"`` a POI belongs to a ring when it lies inside the
+        ring's network isochrone (one point-in-polygon pass per category and ring)
+        instead of when its own snapped network distance is within the radius.
+        """
         radii = [float(r) for r in radii_km if r and float(r) > 0]
         radii = sorted(set(round(r, 6) for r in radii))
         if not radii:
@@ -443,82 +443,65 @@ class SiteAnalysisService:
         cats = list(categories) if categories else list(self.POI_FILES.keys())
         road_net = self.get_road_network() if include_network else None
         max_radius_km = max(radii)
-        max_radius_m = float(max_radius_km) * 1000.0
 
-        # Precompute distances per category at max radius.
-        per_cat_points: Dict[str, Dict[str, Any]] = {}
+        iso: Optional[Catchment] = None
+        buffer_km = 0.0
+        if catchment == "isochrone" and road_net is not None and isochrones_available():
+            # Polygons reach up to two buffer cells past the last reachable road piece.
+            buffer_km = 2.0 * DEFAULT_BUFFER_M / 1000.0
+        prefilter_km = max_radius_km + buffer_km
+        ctx = self._context_for(context, lat, lon, prefilter_km, cats, include_network, max_radius_km)
+        if buffer_km and ctx.center_node is not None:
+            iso = self.catchment_for_node(road_net, ctx.center_node, [r * 1000.0 for r in radii])
+
+        # One chosen-distance array per category; every ring is then read off prefix sums.
+        profiles: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {}
         for cat in cats:
-            df = self.load_category_df(cat)
-            if df.empty:
+            cands = ctx.categories.get(cat)
+            if cands is None:
                 continue
-            df2 = df.dropna(subset=["lat", "lon"]).copy()
-            if df2.empty:
+            cands = cands.within(prefilter_km if iso is not None else max_radius_km, max_radius_km)
+            if len(cands) == 0:
                 continue
+            chosen = cands.chosen_km(sort_by)
+            pois, idx = cands.pois, cands.idx
 
-            hav = []
-            for plat, plon in zip(df2["lat"].tolist(), df2["lon"].tolist()):
-                try:
-                    hav.append(_haversine_km(float(lat), float(lon), float(plat), float(plon)))
-                except Exception:
-                    hav.append(float("inf"))
-            df2["_haversine_km"] = hav
-            df2 = df2[df2["_haversine_km"] <= float(max_radius_km)]
-            if df2.empty:
+            if iso is None:
+                profiles[cat] = _ring_profile(chosen, radii, float(decay_scale_km))
                 continue
-
-            net_map: Dict[int, float] = {}
-            if road_net is not None:
-                try:
-                    net_map = self._network_distance_map(
-                        road_net,
-                        float(lat),
-                        float(lon),
-                        df2.index.tolist(),
-                        df.loc[df2.index, "lat"],
-                        df.loc[df2.index, "lon"],
-                        max_radius_m,
-                    )
-                except Exception as exc:
-                    print(f"Warning: network distance failed for {cat}: {exc}")
-                    net_map = {}
-
-            per_cat_points[cat] = {"df": df2, "net": net_map}
+            # Isochrone membership is not a distance threshold: each ring counts every POI
+            # inside its polygon, while only those within the radius carry weight.
+            counts = np.zeros(len(radii), dtype=np.int64)
+            sum_w = np.zeros(len(radii), dtype=np.float64)
+            avg = np.zeros(len(radii), dtype=np.float64)
+            min_d = np.full(len(radii), np.nan, dtype=np.float64)
+            for i, r in enumerate(radii):
+                inside = chosen[iso.contains(i, pois.lat[idx], pois.lon[idx])]
+                if inside.size == 0:
+                    continue
+                counts[i] = inside.size
+                sum_w[i] = _ring_profile(inside, [r], float(decay_scale_km))[1][0]
+                avg[i] = inside.mean()
+                min_d[i] = inside.min()
+            profiles[cat] = (counts, sum_w, avg, min_d)
 
         rings: List[Dict[str, Any]] = []
-        for r in radii:
+        for ring_idx, r in enumerate(radii):
             ring: Dict[str, Any] = {"radius_km": float(r), "categories": {}, "totals": {}}
             total_count = 0
             total_weight = 0.0
-            for cat, payload in per_cat_points.items():
-                df2 = payload["df"]
-                net_map = payload["net"]
-                items = []
-                for original_idx, row in df2.iterrows():
-                    hav_km = float(row["_haversine_km"])
-                    net_km = net_map.get(int(original_idx))
-                    if sort_by == "network":
-                        chosen_km = float(net_km) if net_km is not None else hav_km
-                    elif sort_by == "haversine":
-                        chosen_km = hav_km
-                    else:
-                        chosen_km = float(net_km) if net_km is not None else hav_km
-
-                    if chosen_km <= float(r):
-                        items.append(chosen_km)
-                count = int(len(items))
+            for cat, (counts, sum_w, avg, min_d) in profiles.items():
+                count = int(counts[ring_idx])
                 if count == 0:
                     continue
-                weights = [_weight(d, float(r), float(decay_scale_km)) for d in items]
-                sum_w = float(sum(weights))
-
                 ring["categories"][cat] = {
                     "count": count,
-                    "sum_weight": round(sum_w, 4),
-                    "avg_distance_km": round(float(sum(items)) / float(count), 4),
-                    "min_distance_km": round(float(min(items)), 4),
+                    "sum_weight": round(float(sum_w[ring_idx]), 4),
+                    "avg_distance_km": round(float(avg[ring_idx]), 4),
+                    "min_distance_km": round(float(min_d[ring_idx]), 4),
                 }
                 total_count += count
-                total_weight += sum_w
+                total_weight += float(sum_w[ring_idx])
 
             ring["totals"] = {
                 "total_poi_count": int(total_count),
@@ -543,6 +526,7 @@ class SiteAnalysisService:
         decay_scale_km: float = 1.0,
         include_network: bool = True,
         sort_by: Literal["auto", "haversine", "network"] = "auto",
+        context: Optional[SiteContext] = None,
     ) -> Dict[str, Any]:
         summary = self.ring_summary(
             lat,
@@ -551,6 +535,7 @@ class SiteAnalysisService:
             decay_scale_km=decay_scale_km,
             include_network=include_network,
             sort_by=sort_by,
+            context=context,
         )
         ring = (summary.get("rings") or [{}])[0]
         cats = ring.get("categories") or {}
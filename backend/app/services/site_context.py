@@ -0,0 +1,155 @@
+"""Per-center intermediate results shared by the nearby, summary and competition analyses.
+
+A ``SiteContext`` is built once for (center, radius, categories): the center is
+snapped once, one bounded shortest-path search is run from it, and every category's
+candidate POIs get their haversine and network distances as arrays. Each analysis
+then narrows the context to its own radius instead of repeating that work.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from typing import Dict, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.lib.road_network import DEFAULT_SNAP_TIERS_M, RoadNetwork, ShortestPathTree
+from app.services.poi_store import PoiCategory, PoiStore
+
+
+@dataclass(frozen=True)
+class CategoryCandidates:
+    """One category's POIs near the center, aligned by position.
+
+    ``idx`` indexes into ``pois``. ``net_km`` is NaN where the POI is not reachable
+    within the context's network radius, and None when no road network was used.
+    """
+
+    pois: PoiCategory = field(repr=False)
+    idx: np.ndarray
+    hav_km: np.ndarray
+    net_km: Optional[np.ndarray]
+
+    def __len__(self) -> int:
+        return int(self.idx.shape[0])
+
+    def chosen_km(self, sort_by: Literal["auto", "haversine", "network"] = "auto") -> np.ndarray:
+        """Distance used for ranking and weights: network where known, else haversine."""
+        if sort_by == "haversine" or self.net_km is None:
+            return self.hav_km
+        return np.where(np.isnan(self.net_km), self.hav_km, self.net_km)
+
+    def within(self, radius_km: float, network_km: Optional[float] = None) -> "CategoryCandidates":
+        """Candidates within ``radius_km`` (haversine), with network distances past
+        ``network_km`` (default ``radius_km``) treated as unreachable."""
+        keep = self.hav_km <= float(radius_km)
+        net_km = self.net_km
+        if net_km is not None:
+            limit = float(radius_km if network_km is None else network_km)
+            net_km = np.where(net_km <= limit, net_km, np.nan)[keep]
+        return replace(self, idx=self.idx[keep], hav_km=self.hav_km[keep], net_km=net_km)
+
+
+@dataclass(frozen=True)
+class SiteContext:
+    """Snapped center, shortest-path tree and per-category candidates around (lat, lon)."""
+
+    lat: float
+    lon: float
+    radius_km: float
+    network_radius_km: float
+    road_network: Optional[RoadNetwork] = field(repr=False)
+    center_node: Optional[int]
+    center_offset_m: float
+    tree: Optional[ShortestPathTree] = field(repr=False)
+    requested: Tuple[str, ...]
+    categories: Dict[str, CategoryCandidates]
+
+    def covers(
+        self,
+        radius_km: float,
+        categories: Sequence[str],
+        network_km: Optional[float] = None,
+    ) -> bool:
+        """Whether narrowing this context answers a query at ``radius_km`` for ``categories``."""
+        network_km = radius_km if network_km is None else network_km
+        return (
+            float(radius_km) <= self.radius_km
+            and float(network_km) <= self.network_radius_km
+            and set(categories) <= set(self.requested)
+        )
+
+
+
+def build_site_context(
+    store: PoiStore,
+    lat: float,
+    lon: float,
+    *,
+    radius_km: float,
+    categories: Sequence[str],
+    road_network: Optional[RoadNetwork] = None,
+    network_radius_km: Optional[float] = None,
+    snap_tiers: Sequence[float] = DEFAULT_SNAP_TIERS_M,
+) -> SiteContext:
+    """Collect candidates within ``radius_km`` and network distances within
+    ``network_radius_km`` (default ``radius_km``) from a single search."""
+    lat = float(lat)
+    lon = float(lon)
+    radius_km = float(radius_km)
+    net_radius_km = radius_km if network_radius_km is None else float(network_radius_km)
+    net_radius_m = net_radius_km * 1000.0
+
+    center_node: Optional[int] = None
+    center_offset = 0.0
+    tree: Optional[ShortestPathTree] = None
+    if road_network is not None:
+        try:
+            center_node, offset, _ = road_network.snap_point_tiered(lat, lon, snap_tiers)
+            center_offset = float(offset or 0.0)
+            if center_node is not None:
+                tree = road_network.shortest_path_tree(int(center_node), cutoff=net_radius_m)
+        except Exception as exc:
+            print(f"Warning: network search failed around ({lat}, {lon}): {exc}")
+            center_node, tree = None, None
+
+    cats: Dict[str, CategoryCandidates] = {}
+    for cat in categories:
+        pois = store.category(cat)
+        idx, hav = pois.within_km(lat, lon, radius_km)
+        if idx.size == 0:
+            continue
+        net_km: Optional[np.ndarray] = None
+        if road_network is not None:
+            net_km = _network_km(tree, pois.nodes[idx], pois.snap_offsets_m[idx], center_offset, net_radius_m)
+        cats[cat] = CategoryCandidates(pois=pois, idx=idx, hav_km=hav, net_km=net_km)
+
+    return SiteContext(
+        lat=lat,
+        lon=lon,
+        radius_km=radius_km,
+        network_radius_km=net_radius_km,
+        road_network=road_network,
+        center_node=center_node,
+        center_offset_m=center_offset,
+        tree=tree,
+        requested=tuple(categories),
+        categories=cats,
+    )
+
+
+def _network_km(
+    tree: Optional[ShortestPathTree],
+    nodes: np.ndarray,
+    offsets_m: np.ndarray,
+    center_offset_m: float,
+    radius_m: float,
+) -> np.ndarray:
+    out = np.full(nodes.shape[0], np.nan, dtype=np.float64)
+    if tree is None or nodes.size == 0:
+        return out
+    pos = np.where(nodes >= 0, tree.positions(np.maximum(nodes, 0)), -1)
+    reached = pos >= 0
+    total_m = tree.dists[pos[reached]].astype(np.float64) + center_offset_m + offsets_m[reached]
+    out[reached] = np.where(total_m <= radius_m, total_m / 1000.0, np.nan)
+    return out
+
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of PredictionService model calls: DataFrame + model.predict vs Booster.inplace_predict.
+
+Both paths score the same engineered feature columns, so the timings cover only the
+model call (frame/buffer construction included). Uses the service's own model and
+reference data, or a synthetic stand-in with ``--synthetic`` (or when they are
+missing).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Ensure backend package dir is on sys.path so we can import app modules.
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, os.fspath(BACKEND_DIR))
+
+# Benchmark the model call only; don't build the suitability surface.
+os.environ["SITEX_SURFACE_AUTOBUILD"] = "0"
+
+import xgboost as xgb  # noqa: E402
+
+from app.services.prediction_service import POI_GROUPS, XGB_NTHREAD, PredictionService  # noqa: E402
+
+
+def synthetic_service(rows: int = 3000, trees: int = 300) -> PredictionService:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"lat": 27.6 + rng.random(rows) * 0.15, "lng": 85.25 + rng.random(rows) * 0.2})
+    for group in POI_GROUPS:
+        df[f"{group}_count_1km"] = rng.integers(0, 20, rows).astype(float)
+        df[f"{group}_weight_1km"] = rng.random(rows) * 5
+    df["cafe_weight"] = rng.random(rows)
+    features = [c for c in df.columns] + ["total_poi_count_1km", "bank_ratio", "weighted_POI_strength"]
+    X = pd.DataFrame(rng.random((2000, len(features))), columns=features)
+    model = xgb.XGBRegressor(n_estimators=trees, max_depth=6).fit(X, rng.random(2000) * 3)
+
+    svc = PredictionService.__new__(PredictionService)
+    svc.model = model
+    svc.feature_names = features
+    svc.reference_df = df
+    svc.surface = None
+    svc._prepare_model()
+    svc._prepare_reference()
+    return svc
+
+
+def engineered_columns(svc: PredictionService, rows: int):
+    """Feature columns for ``rows`` random reference-area points, as passed to the model paths."""
+    rng = np.random.default_rng(1)
+    lats, lngs = svc.neighbor_index.projection.inverse(svc.neighbor_index.xy)
+    q_lat = lats.min() + rng.random(rows) * (lats.max() - lats.min())
+    q_lng = lngs.min() + rng.random(rows) * (lngs.max() - lngs.min())
+    columns, _ = svc._feature_columns(q_lat, q_lng)
+    return columns
+
+
+def timed(fn, repeat: int) -> float:
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1e3
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 64, 4096], help="Batch sizes")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed calls per size (median reported)")
+    parser.add_argument("--synthetic", action="store_true", help="Use a synthetic model and reference data")
+    args = parser.parse_args()
+
+    svc = None if args.synthetic else PredictionService.get_instance()
+    if svc is None or svc.model is None or svc.neighbor_index is None:
+        if svc is not None:
+            print("Model or reference data not loaded; using a synthetic stand-in")
+        svc = synthetic_service()
+    if svc.booster is None:
+        print(f"No native booster for model {type(svc.model).__name__}; nothing to compare")
+        return 1
+
+    print(f"model {type(svc.model).__name__}, {len(svc.model_columns)} features, nthread={XGB_NTHREAD}")
+    print(f"{'rows':>6} {'frame ms':>10} {'inplace ms':>11} {'speedup':>8} {'max |diff|':>11}")
+    for rows in args.sizes:
+        columns = engineered_columns(svc, rows)
+        old = svc._predict_frame(columns, rows)
+        new = svc._predict_native(columns, rows)
+        t_old = timed(lambda: svc._predict_frame(columns, rows), args.repeat)
+        t_new = timed(lambda: svc._predict_native(columns, rows), args.repeat)
+        diff = float(np.max(np.abs(old - new)))
+        print(f"{rows:>6} {t_old:>10.3f} {t_new:>11.3f} {t_old / t_new:>7.1f}x {diff:>11.2e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
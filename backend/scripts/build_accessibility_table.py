@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Precompute the road-type accessibility table used by /road-types endpoints.
+
+For every road node it stores the weighted distance to the nearest node of each
+road type (and which node that is) within ``--max-radius-m``, next to the road
+type graph cache. The API builds the table on first load when it is missing;
+running this ahead of a deploy keeps that work out of startup.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Ensure backend package dir is on sys.path so we can import app modules.
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, os.fspath(BACKEND_DIR))
+
+from app.lib.road_type_network import DEFAULT_ACCESSIBILITY_RADIUS_M, RoadTypeNetwork  # noqa: E402
+from app.services.registry import ROAD_SNAP_TOLERANCE_M, ServiceRegistry  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-root", type=Path, default=None, help="Folder containing Data/Roadway.geojson")
+    parser.add_argument(
+        "--max-radius-m",
+        type=float,
+        default=DEFAULT_ACCESSIBILITY_RADIUS_M,
+        help="Largest radius served from the table (SITEX_ACCESSIBILITY_RADIUS_M at runtime)",
+    )
+    args = parser.parse_args()
+
+    registry = ServiceRegistry(data_root=args.data_root)
+    if not registry.road_geojson.exists():
+        print(f"Roadway GeoJSON not found at {registry.road_geojson}")
+        return 1
+    network = RoadTypeNetwork.from_geojson(
+        registry.road_geojson,
+        cache_path=registry.road_type_cache,
+        snap_tolerance_m=ROAD_SNAP_TOLERANCE_M,
+    )
+    started = time.perf_counter()
+    table = network.load_accessibility(registry.road_access_cache, registry.road_geojson, args.max_radius_m)
+    if table is None:
+        print("scipy is not installed; the table cannot be built")
+        return 1
+    print(
+        f"Accessibility table: {network.node_count} nodes x {len(network.road_type_names)} road types, "
+        f"{table.nbytes / 1e6:.1f} MB, radius {table.max_radius_m:.0f} m "
+        f"({time.perf_counter() - started:.1f}s) -> {registry.road_access_cache}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
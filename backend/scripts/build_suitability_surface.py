@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Precompute the suitability surface used by PredictionService.predict and /analysis/surface.
+
+Scores a regular grid over the reference cafes' bounding box with batched model
+inference and stores it as a memory-mapped float32 raster next to the model. The
+API rebuilds it in the background when the model or reference CSV changes;
+running this ahead of a deploy keeps that work out of the server.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Ensure backend package dir is on sys.path so we can import app modules.
+SCRIPT_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, os.fspath(BACKEND_DIR))
+
+# Build here, not in a background thread of the service constructor.
+os.environ["SITEX_SURFACE_AUTOBUILD"] = "0"
+
+from app.lib.suitability_surface import DEFAULT_SURFACE_CELL_M  # noqa: E402
+from app.services.prediction_service import PredictionService  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--cell-m",
+        type=float,
+        default=DEFAULT_SURFACE_CELL_M,
+        help="Grid cell size in metres (SITEX_SURFACE_CELL_M at runtime)",
+    )
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the stored surface is current")
+    args = parser.parse_args()
+
+    svc = PredictionService.get_instance()
+    if svc.model is None or svc.neighbor_index is None:
+        print("Model or reference data not loaded; the surface cannot be built")
+        return 1
+    started = time.perf_counter()
+    surface = svc.load_surface(cell_m=args.cell_m, force=args.force)
+    rows, cols = surface.shape
+    south, west, north, east = surface.bounds
+    print(
+        f"Suitability surface: {rows} x {cols} cells of {surface.cell_m:.0f} m, "
+        f"{surface.nbytes / 1e6:.1f} MB, bounds ({south:.5f}, {west:.5f}) - ({north:.5f}, {east:.5f}) "
+        f"({time.perf_counter() - started:.1f}s) -> {svc.surface_path}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,8 +19,7 @@ sys.path.insert(0, os.fspath(BACKEND_DIR))
 
 from app.api.endpoints.pois import (
     _get_road_network,
-    _network_distance_map,
-    _network_path_map,
+    _network_routes,
 )
 
 
@@ -659,10 +658,7 @@ def _build_features_for_cafe(
         paths_map: Dict[int, List[Dict[str, float]]] = {}
         if road_net is not None:
             try:
-                network_dist_map = _network_distance_map(
-                    road_net, cafe_lat, cafe_lon, subset[lat_col], subset[lon_col], radius_m
-                )
-                paths_map = _network_path_map(
+                network_dist_map, paths_map = _network_routes(
                     road_net, cafe_lat, cafe_lon, subset[lat_col], subset[lon_col], radius_m
                 )
             except Exception:
@@ -32,6 +32,7 @@ except Exception:
 
 ROAD_SNAP_TOLERANCE_M = 120.0
 SECONDARY_SNAP_TOLERANCE_M = 300.0
+SNAP_TIERS_M = (ROAD_SNAP_TOLERANCE_M, SECONDARY_SNAP_TOLERANCE_M, float("inf"))
 
 
 def haversine_km(aLat: float, aLon: float, bLat: float, bLon: float) -> float:
@@ -71,57 +72,21 @@ def compute_road_distances(
     radius_m: float,
 ) -> Dict[int, float]:
     # mirrors the POIs endpoint behavior: snap and compute shortest paths
-    center_node, center_offset = road_network.snap_point(center_lat, center_lon, max_snap_m=ROAD_SNAP_TOLERANCE_M)
-    if center_node is None:
-        center_node, center_offset = road_network.snap_point(center_lat, center_lon, max_snap_m=SECONDARY_SNAP_TOLERANCE_M)
-    if center_node is None:
-        center_node, center_offset = road_network.snap_point(center_lat, center_lon, max_snap_m=float("inf"))
-        if center_node is not None:
-            print("Info: using nearest-node fallback for center snapping to improve coverage")
+    center_node, center_offset, center_tier = road_network.snap_point_tiered(center_lat, center_lon, SNAP_TIERS_M)
     if center_node is None:
         return {}
+    if center_tier == len(SNAP_TIERS_M) - 1:
+        print("Info: using nearest-node fallback for center snapping to improve coverage")
 
-    safe_lats: List[Optional[float]] = []
-    safe_lons: List[Optional[float]] = []
-    for a, b in zip(poi_lats, poi_lons):
-        try:
-            av = float(a)
-            bv = float(b)
-            if not math.isfinite(av) or not math.isfinite(bv):
-                safe_lats.append(None)
-                safe_lons.append(None)
-            else:
-                safe_lats.append(av)
-                safe_lons.append(bv)
-        except Exception:
-            safe_lats.append(None)
-            safe_lons.append(None)
-
-    poi_nodes, poi_offsets = road_network.snap_points(safe_lats, safe_lons, max_snap_m=ROAD_SNAP_TOLERANCE_M)
-    if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-        sec_nodes, sec_offsets = road_network.snap_points(safe_lats, safe_lons, max_snap_m=SECONDARY_SNAP_TOLERANCE_M)
-        for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-            if (n is None or not math.isfinite(o)) and (sec_nodes[i] is not None and math.isfinite(sec_offsets[i])):
-                poi_nodes[i] = sec_nodes[i]
-                poi_offsets[i] = sec_offsets[i]
+    lat_arr = np.array([np.nan if v is None else v for v in poi_lats], dtype=np.float64)
+    lon_arr = np.array([np.nan if v is None else v for v in poi_lons], dtype=np.float64)
+    poi_nodes, poi_offsets, poi_tiers = road_network.snap_points_tiered(lat_arr, lon_arr, SNAP_TIERS_M)
+    if np.any(poi_tiers == len(SNAP_TIERS_M) - 1):
+        print("Info: using nearest-node fallback for POI snapping to improve coverage")
 
     node_to_indices: Dict[int, List[int]] = defaultdict(list)
-    for idx, node_id in enumerate(poi_nodes):
-        if node_id is not None and math.isfinite(poi_offsets[idx]):
-            node_to_indices[int(node_id)].append(idx)
-
-    if any(n is None or not math.isfinite(o) for n, o in zip(poi_nodes, poi_offsets)):
-        inf_nodes, inf_offsets = road_network.snap_points(safe_lats, safe_lons, max_snap_m=float("inf"))
-        for i, (n, o) in enumerate(zip(poi_nodes, poi_offsets)):
-            if (n is None or not math.isfinite(o)) and (inf_nodes[i] is not None and math.isfinite(inf_offsets[i])):
-                poi_nodes[i] = inf_nodes[i]
-                poi_offsets[i] = inf_offsets[i]
-        node_to_indices = defaultdict(list)
-        for idx, node_id in enumerate(poi_nodes):
-            if node_id is not None and math.isfinite(poi_offsets[idx]):
-                node_to_indices[int(node_id)].append(idx)
-        if node_to_indices:
-            print("Info: using nearest-node fallback for POI snapping to improve coverage")
+    for idx in np.flatnonzero(poi_nodes >= 0).tolist():
+        node_to_indices[int(poi_nodes[idx])].append(idx)
 
     if not node_to_indices:
         return {}
@@ -136,24 +101,26 @@ def compute_road_distances(
         if not poi_indices:
             continue
         for poi_idx in poi_indices:
-            total_m = path_dist + center_offset_val + poi_offsets[poi_idx]
+            total_m = path_dist + center_offset_val + float(poi_offsets[poi_idx])
             if total_m <= radius_m:
                 results[poi_idx] = total_m / 1000.0
     return results
 
 
-def road_distance_km_with_fallback(
+def road_distances_km_with_fallback(
     road_network: RoadNetwork,
     center_lat: float,
     center_lon: float,
-    poi_lat: float,
-    poi_lon: float,
-) -> Optional[float]:
-    for snap_m in (ROAD_SNAP_TOLERANCE_M, SECONDARY_SNAP_TOLERANCE_M, float("inf")):
-        dist_m = road_network.distance_between(center_lat, center_lon, poi_lat, poi_lon, max_snap_m=snap_m)
-        if dist_m is not None and math.isfinite(dist_m):
-            return float(dist_m) / 1000.0
-    return None
+    poi_lats: np.ndarray,
+    poi_lons: np.ndarray,
+    indices: List[int],
+) -> Dict[int, float]:
+    # One distance-matrix row for all POIs instead of a search per pair.
+    if not indices:
+        return {}
+    targets = np.column_stack((poi_lats[indices], poi_lons[indices]))
+    row = road_network.distance_matrix([(center_lat, center_lon)], targets, max_snap_m=SNAP_TIERS_M[-1])[0]
+    return {idx: float(d) / 1000.0 for idx, d in zip(indices, row.tolist()) if math.isfinite(d)}
 
 
 def main(argv: Optional[List[str]] = None) -> None:
@@ -193,7 +160,7 @@ def main(argv: Optional[List[str]] = None) -> None:
         if cand.exists():
             road_geojson = cand
     if road_geojson and RoadNetwork is not None:
-        cache_path = road_geojson.with_suffix(".graph.pkl")
+        cache_path = road_geojson.with_suffix(".graph")
         try:
             road_network = RoadNetwork.from_geojson(road_geojson, cache_path=cache_path, snap_tolerance_m=ROAD_SNAP_TOLERANCE_M)
         except Exception as exc:
@@ -248,12 +215,9 @@ def main(argv: Optional[List[str]] = None) -> None:
                 i for i, h in enumerate(hav_km)
                 if h is not None and math.isfinite(h) and h <= args.radius_km
             ]
-            for idx in in_radius_indices:
-                plat = float(poi_lats[idx])
-                plon = float(poi_lons[idx])
-                road_km = road_distance_km_with_fallback(road_network, args.lat, args.lon, plat, plon)
-                if road_km is not None:
-                    road_km_map[idx] = road_km
+            road_km_map = road_distances_km_with_fallback(
+                road_network, args.lat, args.lon, poi_lats, poi_lons, in_radius_indices
+            )
 
         items: List[Dict[str, Any]] = []
         for idx, row in df.iterrows():
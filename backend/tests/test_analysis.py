@@ -3,6 +3,7 @@ from __future__ import annotations
 import sys
 from pathlib import Path
 
+import pytest
 from fastapi.testclient import TestClient
 
 
@@ -101,8 +102,44 @@ def test_analysis_path_endpoint_shape() -> None:
 		assert isinstance(data["path"], list)
 
 
+def test_analysis_distance_matrix_shape() -> None:
+	payload = {
+		"sources": [{"lat": 27.671, "lon": 85.429}, {"lat": 27.672, "lon": 85.43}],
+		"targets": [{"lat": 27.673, "lon": 85.431}],
+	}
+	resp = client.post("/api/v1/analysis/distance-matrix", json=payload)
+	# Needs the road network; without it the endpoint reports it as unavailable
+	if resp.status_code != 200:
+		assert resp.status_code == 503
+		return
+	data = resp.json()
+	assert len(data["distances_m"]) == 2
+	assert all(len(row) == 1 for row in data["distances_m"])
+
+	resp = client.post("/api/v1/analysis/distance-matrix", json={**payload, "format": "sparse"})
+	assert resp.status_code == 200
+	for i, j, d in resp.json()["entries"]:
+		assert d == data["distances_m"][i][j]
+
+	resp = client.post("/api/v1/analysis/distance-matrix", json={"sources": [], "targets": payload["targets"]})
+	assert resp.status_code == 400
+
+
+def test_analysis_isochrone_returns_polygons() -> None:
+	resp = client.get("/api/v1/analysis/isochrone?lat=27.671&lon=85.429&budgets_m=250,500")
+	# Needs the road network (and shapely); without them the endpoint reports 503
+	if resp.status_code != 200:
+		assert resp.status_code == 503
+		return
+	data = resp.json()
+	assert data["budgets_m"] == [250.0, 500.0]
+	features = data["isochrones"]["features"]
+	assert [f["properties"]["budget_m"] for f in features] == [250.0, 500.0]
+
+
 def test_network_distance_map_uses_original_indices() -> None:
 	from app.services.site_analysis_service import SiteAnalysisService
+	import numpy as np
 	import pandas as pd
 
 	class _RoadNetStub:
@@ -113,6 +150,12 @@ def test_network_distance_map_uses_original_indices() -> None:
 			# Two POIs snap to nodes 2 and 3
 			return [2, 3], [0.0, 0.0]
 
+		def snap_point_tiered(self, lat, lon, tolerances):
+			return 1, 0.0, 0
+
+		def snap_points_tiered(self, lats, lons, tolerances):
+			return np.array([2, 3]), np.array([0.0, 0.0]), np.array([0, 0])
+
 		def shortest_paths_from(self, node_id, cutoff):
 			# Distances in meters from center node to nodes 2 and 3
 			return {2: 100.0, 3: 200.0}
@@ -133,3 +176,43 @@ def test_network_distance_map_uses_original_indices() -> None:
 	)
 	assert out[10] == 0.1
 	assert out[20] == 0.2
+
+
+def test_ring_profile_matches_per_ring_weights() -> None:
+	import numpy as np
+
+	from app.services.site_analysis_service import _ring_profile, _weight
+
+	rng = np.random.default_rng(3)
+	dists = rng.uniform(0.0, 2.0, 500)
+	radii = [0.1 * k for k in range(1, 21)]
+	for decay in (1.0, 0.0):
+		counts, sum_w, avg, min_d = _ring_profile(dists, radii, decay)
+		for i, r in enumerate(radii):
+			items = dists[dists <= r]
+			assert counts[i] == items.size
+			assert sum_w[i] == pytest.approx(sum(_weight(d, r, decay) for d in items), abs=1e-9)
+			assert avg[i] == pytest.approx(items.mean())
+			assert min_d[i] == pytest.approx(items.min())
+
+	counts, sum_w, _, _ = _ring_profile(np.empty(0), [0.5, 1.0], 1.0)
+	assert counts.tolist() == [0, 0] and sum_w.tolist() == [0.0, 0.0]
+
+
+def test_analysis_batch_streams_ndjson() -> None:
+	import json
+
+	payload = {
+		"centers": [{"lat": 27.671, "lon": 85.429}, {"lat": 27.672, "lon": 85.430}],
+		"radii_km": [0.25, 0.5],
+		"include_prediction": False,
+	}
+	resp = client.post("/api/v1/analysis/batch", json=payload)
+	assert resp.status_code == 200
+	assert resp.headers["content-type"].startswith("application/x-ndjson")
+	lines = [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+	assert sorted(line["index"] for line in lines) == [0, 1]
+	for line in lines:
+		assert "result" in line or "error" in line
+
+	assert client.post("/api/v1/analysis/batch", json={"centers": []}).status_code == 400
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torch_geometric")
+
+from app.lib.gnn.embedding_cache import StaticEmbeddings  # noqa: E402
+from app.lib.gnn.overlay import GraphOverlay, VirtualNodes  # noqa: E402
+from tests.test_gnn_overlay import _appended_score, _graph, _virtual_site  # noqa: E402
+
+
+def test_cached_states_match_the_full_forward_pass() -> None:
+    data, model = _graph()
+    overlay = GraphOverlay(data)
+    assert StaticEmbeddings.supports(model)
+    embeddings = StaticEmbeddings.build(overlay, model)
+
+    # Existing places: the cached states alone.
+    with torch.no_grad():
+        full = model(data.x_dict, data.edge_index_dict)
+    out = embeddings.predict(VirtualNodes(), {"place": [5, 9, 0]})
+    np.testing.assert_allclose(out.numpy(), full[[5, 9, 0]].numpy(), atol=1e-5)
+
+    # New sites: the new place and its neighbours' states are recomputed, nothing else.
+    rng = np.random.default_rng(3)
+    new_id = overlay.num_nodes["place"]
+    for _ in range(8):
+        virtual = _virtual_site(data, roads=rng.choice(80, 3, replace=False), cats=rng.choice(10, 2, replace=False))
+        score = float(embeddings.predict(virtual, {"place": [new_id]})[0])
+        assert score == pytest.approx(_appended_score(data, model, virtual), abs=1e-5)
+
+
+def test_cache_round_trip_and_invalidation(tmp_path) -> None:
+    data, model = _graph(seed=1)
+    overlay = GraphOverlay(data)
+    graph_path, model_path = tmp_path / "graph.pt", tmp_path / "model.pth"
+    torch.save(data, graph_path)
+    torch.save(model.state_dict(), model_path)
+    cache_path = tmp_path / "model.states"
+
+    built = StaticEmbeddings.build(overlay, model)
+    built.save(cache_path, graph_path, model_path)
+    loaded = StaticEmbeddings.load(cache_path, graph_path, model_path, overlay, model)
+    assert loaded is not None
+    virtual = _virtual_site(data, roads=[3, 17, 40], cats=[1, 4])
+    seeds = {"place": [overlay.num_nodes["place"], 2]}
+    np.testing.assert_allclose(loaded.predict(virtual, seeds).numpy(), built.predict(virtual, seeds).numpy())
+
+    # New weights invalidate the cache.
+    with torch.no_grad():
+        model.head.bias.add_(1.0)
+    torch.save(model.state_dict(), model_path)
+    os.utime(model_path, ns=(0, 0))
+    assert StaticEmbeddings.load(cache_path, graph_path, model_path, overlay, model) is None
+
+    # So does a new graph.
+    built.save(cache_path, graph_path, model_path)
+    assert StaticEmbeddings.load(cache_path, graph_path, model_path, overlay, model) is not None
+    graph_path.write_bytes(graph_path.read_bytes() + b"\0")
+    assert StaticEmbeddings.load(cache_path, graph_path, model_path, overlay, model) is None
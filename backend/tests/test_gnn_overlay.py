@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+torch = pytest.importorskip("torch")
+pyg_data = pytest.importorskip("torch_geometric.data")
+pyg_nn = pytest.importorskip("torch_geometric.nn")
+
+from app.lib.gnn.overlay import AdjacencyIndex, GraphOverlay, VirtualNodes  # noqa: E402
+
+NEAR = ("place", "near", "road_node")
+REV_NEAR = ("road_node", "rev_near", "place")
+HAS_CAT = ("place", "has_category", "category")
+REV_HAS_CAT = ("category", "rev_has_category", "place")
+ROAD = ("road_node", "connected_to", "road_node")
+
+
+class _SageModel(torch.nn.Module):
+    """Two SAGEConv layers per edge type, shaped like the served HeteroGNN."""
+
+    def __init__(self, edge_types, hidden: int = 8) -> None:
+        super().__init__()
+        self.input_proj = torch.nn.ModuleDict(
+            {
+                "place": pyg_nn.Linear(-1, hidden),
+                "road_node": pyg_nn.Linear(-1, hidden),
+                "category": torch.nn.Embedding(10, hidden),
+            }
+        )
+        self.convs = torch.nn.ModuleList(
+            pyg_nn.HeteroConv({et: pyg_nn.SAGEConv((-1, -1), hidden) for et in edge_types}, aggr="sum")
+            for _ in range(2)
+        )
+        self.bn = torch.nn.BatchNorm1d(hidden)
+        self.dropout = torch.nn.Dropout(p=0.2)
+        self.head = pyg_nn.Linear(hidden, 1)
+
+    def forward(self, x_dict, edge_index_dict):
+        h = {
+            t: self.input_proj[t](x.squeeze(-1) if t == "category" else x)
+            for t, x in x_dict.items()
+        }
+        for conv in self.convs:
+            h = {t: torch.nn.functional.elu(v) for t, v in conv(h, edge_index_dict).items()}
+        return self.head(self.dropout(self.bn(h["place"])))
+
+
+def _graph(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    n_place, n_road, n_cat = 60, 80, 10
+    data = pyg_data.HeteroData()
+    data["place"].x = torch.tensor(rng.random((n_place, 4)), dtype=torch.float32)
+    data["road_node"].x = torch.tensor(rng.random((n_road, 2)), dtype=torch.float32)
+    data["category"].x = torch.arange(n_cat).view(-1, 1)
+    near = np.stack((rng.integers(0, n_place, 150), rng.integers(0, n_road, 150)))
+    cats = np.stack((rng.integers(0, n_place, 90), rng.integers(0, n_cat, 90)))
+    road = np.stack((rng.integers(0, n_road, 120), rng.integers(0, n_road, 120)))
+    road = np.concatenate((road, road[::-1]), axis=1)
+    data[NEAR].edge_index = torch.from_numpy(near)
+    data[REV_NEAR].edge_index = torch.from_numpy(near[::-1].copy())
+    data[HAS_CAT].edge_index = torch.from_numpy(cats)
+    data[REV_HAS_CAT].edge_index = torch.from_numpy(cats[::-1].copy())
+    data[ROAD].edge_index = torch.from_numpy(road)
+    model = _SageModel(data.edge_types)
+    with torch.no_grad():
+        model(data.x_dict, data.edge_index_dict)  # materialise lazy layers
+        model.bn.running_mean.uniform_(-0.5, 0.5)
+        model.bn.running_var.uniform_(0.5, 2.0)
+    return data, model.eval()
+
+
+def _virtual_site(data, roads, cats):
+    new_id = data["place"].num_nodes
+    x = data["place"].x.mean(dim=0, keepdim=True)
+    x[0, :2] = torch.tensor([0.3, 0.7])
+    near = np.array([[new_id] * len(roads), roads])
+    has_cat = np.array([[new_id] * len(cats), cats])
+    edges = {NEAR: near, REV_NEAR: near[::-1], HAS_CAT: has_cat, REV_HAS_CAT: has_cat[::-1]}
+    return VirtualNodes({"place": x}, edges)
+
+
+def _appended_score(data, model, virtual) -> float:
+    """The old approach: score the site on the whole graph with the node appended."""
+    x_dict = dict(data.x_dict)
+    x_dict["place"] = torch.cat([x_dict["place"], virtual.x["place"]])
+    edge_index_dict = dict(data.edge_index_dict)
+    for et, edges in virtual.edges.items():
+        edge_index_dict[et] = torch.cat([edge_index_dict[et], torch.from_numpy(np.ascontiguousarray(edges))], dim=1)
+    with torch.no_grad():
+        return float(model(x_dict, edge_index_dict)[-1])
+
+
+def _overlay_score(overlay, model, virtual) -> float:
+    new_id = overlay.num_nodes["place"]
+    sub = overlay.computation_subgraph(virtual, {"place": [new_id]}, num_hops=2)
+    with torch.no_grad():
+        return float(model(sub.x_dict, sub.edge_index_dict)[sub.seeds["place"][0]])
+
+
+def test_adjacency_index_groups_in_edge_order() -> None:
+    index = AdjacencyIndex(keys=[2, 0, 2, 1, 2], values=[10, 11, 12, 13, 14], num_keys=4)
+    values, keys = index.lookup(np.array([2, 3, 0]))
+    assert values.tolist() == [10, 12, 14, 11]
+    assert keys.tolist() == [2, 2, 2, 0]
+
+
+def test_overlay_matches_appending_to_the_full_graph() -> None:
+    data, model = _graph()
+    before = {t: data[t].x.clone() for t in data.node_types}
+    edges_before = {et: ei.clone() for et, ei in data.edge_index_dict.items()}
+    overlay = GraphOverlay(data)
+
+    virtual = _virtual_site(data, roads=[3, 17, 40], cats=[1, 4])
+    sub = overlay.computation_subgraph(virtual, {"place": [overlay.num_nodes["place"]]}, num_hops=2)
+    # Only the neighbourhood is gathered, not the whole graph.
+    assert len(sub.nodes["place"]) < data["place"].num_nodes
+    assert _overlay_score(overlay, model, virtual) == pytest.approx(_appended_score(data, model, virtual), abs=1e-5)
+
+    # Existing places score the same through the overlay as on the base graph.
+    with torch.no_grad():
+        full = model(data.x_dict, data.edge_index_dict)
+    base = overlay.computation_subgraph(VirtualNodes(), {"place": [5, 9]}, num_hops=2)
+    with torch.no_grad():
+        out = model(base.x_dict, base.edge_index_dict)[base.seeds["place"]]
+    np.testing.assert_allclose(out.numpy(), full[[5, 9]].numpy(), atol=1e-5)
+
+    for t, x in before.items():
+        assert torch.equal(data[t].x, x)
+    for et, ei in edges_before.items():
+        assert torch.equal(data[et].edge_index, ei)
+
+
+def test_overlay_predictions_run_in_parallel_threads() -> None:
+    data, model = _graph(seed=1)
+    overlay = GraphOverlay(data)
+    rng = np.random.default_rng(2)
+    sites = [
+        _virtual_site(data, roads=rng.choice(80, 3, replace=False), cats=rng.choice(10, 2, replace=False))
+        for _ in range(24)
+    ]
+    expected = [_appended_score(data, model, v) for v in sites]
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        got = list(pool.map(lambda v: _overlay_score(overlay, model, v), sites))
+    np.testing.assert_allclose(got, expected, atol=1e-5)
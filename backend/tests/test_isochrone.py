@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+pytest.importorskip("shapely")
+
+from app.lib.isochrone import build_catchment  # noqa: E402
+from app.lib.road_network import RoadNetwork  # noqa: E402
+from app.services.site_analysis_service import SiteAnalysisService  # noqa: E402
+from tests.test_road_network import BASE_LAT, BASE_LON, STEP_DEG, _grid_geojson  # noqa: E402
+
+
+@pytest.fixture()
+def road_net(tmp_path: Path) -> RoadNetwork:
+    path = tmp_path / "Roadway.geojson"
+    path.write_text(json.dumps(_grid_geojson(n=8)), encoding="utf-8")
+    return RoadNetwork.from_geojson(path)
+
+
+def test_catchment_polygons_follow_network_distance(road_net: RoadNetwork) -> None:
+    center = 27  # an interior intersection
+    catchment = build_catchment(road_net, center, [500.0, 250.0], buffer_m=20.0)
+    assert catchment.budgets_m == (250.0, 500.0)
+    assert catchment.areas_m2[0] < catchment.areas_m2[1]
+
+    lengths = road_net.shortest_paths_from(center, None)
+    lats, lons = road_net.node_coords[:, 0], road_net.node_coords[:, 1]
+    for i, budget in enumerate(catchment.budgets_m):
+        inside = catchment.contains(i, lats, lons)
+        dist = np.array([lengths[n] for n in range(road_net.node_count)])
+        assert inside[dist <= budget].all()
+        # Grid spacing is ~100 m, so nodes one block past the budget stay outside.
+        assert not inside[dist > budget + 150.0].any()
+
+    feature = catchment.to_geojson()["features"][0]
+    assert feature["properties"]["budget_m"] == 250.0
+    assert feature["geometry"]["type"] in ("Polygon", "MultiPolygon")
+
+
+def test_ring_summary_isochrone_catchment(road_net: RoadNetwork, tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.delenv("SITEX_POI_DATA_DIR", raising=False)
+    csv_dir = tmp_path / "Data" / "CSV"
+    csv_dir.mkdir(parents=True)
+    # Two cafes at intersections ~200 m and ~225 m away in a straight line; the
+    # second is ~310 m away by road, so only the first is inside the isochrone.
+    near = (BASE_LAT + 3 * STEP_DEG, BASE_LON + 5 * STEP_DEG)
+    around_block = (BASE_LAT + 4 * STEP_DEG, BASE_LON + 5 * STEP_DEG)
+    (csv_dir / "cafes.csv").write_text(
+        f"name,lat,lon\nA,{near[0]},{near[1]}\nB,{around_block[0]},{around_block[1]}\n", encoding="utf-8"
+    )
+    svc = SiteAnalysisService(data_root=tmp_path, road_network=road_net)
+    center = (BASE_LAT + 3 * STEP_DEG, BASE_LON + 3 * STEP_DEG)
+
+    data = svc.ring_summary(*center, radii_km=(0.23,), categories=["cafes"], catchment="isochrone")
+    assert data["rings"][0]["categories"]["cafes"]["count"] == 1
+    plain = svc.ring_summary(*center, radii_km=(0.23,), categories=["cafes"], include_network=False)
+    assert plain["rings"][0]["categories"]["cafes"]["count"] == 2
+
+    iso = svc.isochrones(*center, budgets_m=(230.0,))
+    assert iso["snapped"]["snap_offset_m"] == pytest.approx(0.0, abs=0.01)
+    assert len(iso["isochrones"]["features"]) == 1
+    # The polygon is cached per snapped node.
+    assert len(svc._catchments) == 1
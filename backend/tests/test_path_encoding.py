@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.lib.path_encoding import (  # noqa: E402
+    decode_delta_int32,
+    decode_polyline,
+    encode_delta_int32,
+    encode_delta_int32_many,
+    encode_polyline,
+    encode_polylines,
+    route_tree,
+)
+from app.lib.road_network import RoadNetwork  # noqa: E402
+from tests.test_road_network import _grid_geojson  # noqa: E402
+
+
+@pytest.fixture()
+def road_net(tmp_path: Path) -> RoadNetwork:
+    path = tmp_path / "Roadway.geojson"
+    path.write_text(json.dumps(_grid_geojson(n=6)), encoding="utf-8")
+    return RoadNetwork.from_geojson(path)
+
+
+def test_polyline_matches_reference_example() -> None:
+    # The worked example from Google's polyline algorithm documentation.
+    encoded = encode_polyline([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453])
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    lats, lons = decode_polyline(encoded)
+    np.testing.assert_allclose(lats, [38.5, 40.7, 43.252])
+    np.testing.assert_allclose(lons, [-120.2, -120.95, -126.453])
+
+
+def test_batch_encoders_match_single_paths() -> None:
+    rng = np.random.default_rng(3)
+    lats = 27.7 + rng.random(40) * 0.05
+    lons = 85.3 - rng.random(40) * 0.05
+    starts = [0, 12, 13, 30]
+    bounds = list(zip(starts, starts[1:] + [40]))
+
+    polylines = encode_polylines(lats, lons, starts)
+    deltas = encode_delta_int32_many(lats, lons, starts)
+    for (a, b), polyline, delta in zip(bounds, polylines, deltas):
+        assert polyline == encode_polyline(lats[a:b], lons[a:b])
+        assert delta == encode_delta_int32(lats[a:b], lons[a:b])
+        dlat, dlon = decode_delta_int32(delta)
+        np.testing.assert_allclose(dlat, lats[a:b], atol=1e-6)
+        np.testing.assert_allclose(dlon, lons[a:b], atol=1e-6)
+    assert encode_polylines([], [], []) == []
+
+
+def test_route_tree_shares_prefixes(road_net: RoadNetwork) -> None:
+    tree = road_net.shortest_path_tree(0, cutoff=450.0)
+    far = road_net.node_count - 1
+    ends = [7, 14, 21, 14, far]
+    routes = route_tree(tree, ends)
+    expected = tree.paths_to([7, 14, 21])
+    for end, path in expected.items():
+        assert routes.path(end) == path
+    assert far not in routes.index
+    # Every tree node is stored once, however many paths pass through it.
+    assert len(routes.nodes) == len(set().union(*map(set, expected.values())))
+    assert (routes.parents < np.arange(len(routes.nodes))).all()
+
+    payload = routes.to_json(road_net.node_coords)
+    lats, lons = decode_delta_int32(payload["coords"], payload["scale"])
+    np.testing.assert_allclose(lats, road_net.node_coords[routes.nodes, 0], atol=1e-6)
+    assert payload["parent"] == routes.parents.tolist()
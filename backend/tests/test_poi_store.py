@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.api.endpoints import pois as pois_endpoint  # noqa: E402
+from app.lib.path_encoding import decode_delta_int32, decode_polyline  # noqa: E402
+from app.lib.road_network import RoadNetwork  # noqa: E402
+from app.services.poi_store import PoiCategory, PoiStore  # noqa: E402
+from app.services.registry import ServiceRegistry, set_registry  # noqa: E402
+from tests.test_road_network import BASE_LAT, BASE_LON, STEP_DEG, _grid_geojson  # noqa: E402
+
+FILES = {"cafes": "cafes.csv", "banks": "banks.csv", "health": "health.csv"}
+
+
+@pytest.fixture()
+def data_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.delenv("SITEX_POI_DATA_DIR", raising=False)
+    data = tmp_path / "Data"
+    csv_dir = data / "CSV"
+    csv_dir.mkdir(parents=True)
+    (data / "Roadway.geojson").write_text(json.dumps(_grid_geojson(n=6)), encoding="utf-8")
+    (csv_dir / "cafes.csv").write_text(
+        "Name,Latitude,Longitude,type,weight\n"
+        f"Alpha,{BASE_LAT + STEP_DEG},{BASE_LON + STEP_DEG},coffee,0.5\n"
+        "Broken,not-a-number,85.3,coffee,1\n"
+        f",{BASE_LAT + 2 * STEP_DEG},{BASE_LON + 0.0004},,\n"
+        f"Gamma,{BASE_LAT + 3 * STEP_DEG},{BASE_LON + 3 * STEP_DEG},bakery,2\n",
+        encoding="utf-8",
+    )
+    # Fuzzy file name match, as the endpoints have always allowed.
+    (csv_dir / "bank_branches.csv").write_text(f"name,lat,lon\nB1,{BASE_LAT},{BASE_LON}\n", encoding="utf-8")
+    return tmp_path
+
+
+def _store(data_root: Path, road_net=None) -> PoiStore:
+    return PoiStore(lambda: data_root / "Data" / "CSV", FILES, road_network=lambda: road_net)
+
+
+def test_category_arrays_and_columns(data_root: Path) -> None:
+    road_net = RoadNetwork.from_geojson(data_root / "Data" / "Roadway.geojson")
+    cafes = _store(data_root, road_net).category("cafes")
+
+    assert len(cafes) == 3
+    assert cafes.rows.tolist() == [0, 2, 3]
+    assert cafes.lat.dtype == np.float64 and cafes.lat.flags["C_CONTIGUOUS"]
+    assert cafes.names([0, 1, 2]) == ["Alpha", None, "Gamma"]
+    assert cafes.subcategories([0, 1, 2]) == ["coffee", None, "bakery"]
+    assert np.allclose(cafes.weight, [0.5, np.nan, 2.0], equal_nan=True)
+
+    expected_nodes, expected_offsets, _ = road_net.snap_points_tiered(cafes.lat, cafes.lon)
+    assert np.array_equal(cafes.nodes, expected_nodes)
+    assert np.allclose(cafes.snap_offsets_m, expected_offsets)
+    assert cafes.snap_offsets_m[1] == pytest.approx(0.0004 * 98_500, rel=0.05)
+
+    idx, dists = cafes.within_km(BASE_LAT, BASE_LON, 0.3)
+    assert idx.tolist() == [0, 1]
+    assert np.all(dists <= 0.3)
+
+
+def test_within_km_matches_full_haversine_scan() -> None:
+    import pandas as pd
+
+    rng = np.random.default_rng(7)
+    # Wide, high-latitude extent so the projection scale error is not negligible.
+    lats = 58.0 + rng.uniform(-1.5, 1.5, 4000)
+    lons = 10.0 + rng.uniform(-2.5, 2.5, 4000)
+    cafes = PoiCategory.from_frame("cafes", pd.DataFrame({"lat": lats, "lon": lons}))
+
+    for lat, lon, radius_km in [(59.4, 11.9, 25.0), (56.6, 7.6, 40.0), (58.0, 10.0, 3.0), (60.0, 13.0, 0.5)]:
+        full = cafes.haversine_km(lat, lon)
+        expected = np.flatnonzero(full <= radius_km)
+        idx, dists = cafes.within_km(lat, lon, radius_km)
+        assert idx.tolist() == expected.tolist()
+        assert np.allclose(dists, full[expected])
+
+    empty = PoiCategory.empty("cafes")
+    idx, dists = empty.within_km(58.0, 10.0, 5.0)
+    assert idx.size == 0 and dists.size == 0
+
+
+def test_missing_and_fuzzy_files(data_root: Path) -> None:
+    store = _store(data_root)
+    assert len(store.category("health")) == 0
+    banks = store.category("banks")
+    assert banks.path.name == "bank_branches.csv"
+    assert np.all(banks.nodes == -1)
+
+
+def test_category_reloads_when_csv_changes(data_root: Path) -> None:
+    store = _store(data_root)
+    first = store.category("cafes")
+    assert store.category("cafes") is first
+
+    path = data_root / "Data" / "CSV" / "cafes.csv"
+    path.write_text(f"name,lat,lon\nOnly,{BASE_LAT},{BASE_LON}\n", encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 5))
+    second = store.category("cafes")
+    assert second is not first
+    assert second.names([0]) == ["Only"]
+
+
+def test_pois_endpoint_reads_store(data_root: Path) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0)
+    registry.warm_up()
+    set_registry(registry)
+    try:
+        result = pois_endpoint.get_pois_with_paths(BASE_LAT, BASE_LON, radius_km=0.4)
+    finally:
+        set_registry(None)
+    names = [item["name"] for item in result["cafes"]]
+    assert names == ["Alpha", None]
+    alpha = result["cafes"][0]
+    # Network distance (two ~100 m blocks) replaces the ~148 m straight line.
+    assert alpha["distance_km"] == pytest.approx(0.209, abs=0.005)
+    assert alpha["path"][0] == {"lat": BASE_LAT, "lon": BASE_LON}
+    assert result["banks"][0]["name"] == "B1"
+
+
+def test_pois_endpoint_columns_format(data_root: Path) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0)
+    registry.warm_up()
+    set_registry(registry)
+    try:
+        records = pois_endpoint.get_pois(
+            BASE_LAT, BASE_LON, radius_km=0.4, decay_scale_km=None, stream=False, path_encoding="objects"
+        )
+        columns = pois_endpoint.get_pois(
+            BASE_LAT, BASE_LON, radius_km=0.4, decay_scale_km=None, stream=False, format="columns",
+            path_encoding="objects",
+        )
+    finally:
+        set_registry(None)
+    assert columns["format"] == "columns"
+    cafes = columns["pois"]["cafes"]
+    assert list(cafes) == ["name", "lat", "lon", "distance_km", "weight", "path"]
+    rebuilt = [
+        {k: v for k, v in zip(cafes, row) if k != "path" or v is not None}
+        for row in zip(*cafes.values())
+    ]
+    assert rebuilt == records["pois"]["cafes"]
+
+
+def test_pois_stream_shares_one_center_search(data_root: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0)
+    bundle = registry.warm_up()
+    road_net = bundle.road_network
+    searches = []
+    search = road_net.shortest_path_tree
+    monkeypatch.setattr(road_net, "shortest_path_tree", lambda *a, **kw: searches.append(a) or search(*a, **kw))
+    set_registry(registry)
+    try:
+        expected = pois_endpoint.get_pois_with_paths(BASE_LAT, BASE_LON, radius_km=0.4)
+        assert len(searches) == 1
+        searches.clear()
+        store = bundle.poi_store
+        lines = list(pois_endpoint._iter_category_items(store, BASE_LAT, BASE_LON, 0.4, 0.4, road_net))
+    finally:
+        set_registry(None)
+    assert len(searches) == 1
+    assert sorted(cat for cat, _, _ in lines) == sorted(store.categories)
+    assert {cat: items for cat, items, _ in lines if items} == expected
+
+
+def test_pois_path_encodings_match_object_paths(data_root: Path) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0)
+    registry.warm_up()
+    set_registry(registry)
+    try:
+        objects = pois_endpoint.get_pois(
+            BASE_LAT, BASE_LON, radius_km=0.4, decay_scale_km=None, stream=False, path_encoding="objects"
+        )
+        encoded = {
+            enc: pois_endpoint.get_pois(
+                BASE_LAT, BASE_LON, radius_km=0.4, decay_scale_km=None, stream=False, path_encoding=enc
+            )
+            for enc in ("polyline", "delta-int32", "tree", "none")
+        }
+    finally:
+        set_registry(None)
+    alpha = objects["pois"]["cafes"][0]
+    expected = np.array([[p["lat"], p["lon"]] for p in alpha["path"]])
+
+    polyline = encoded["polyline"]["pois"]["cafes"][0]
+    np.testing.assert_allclose(np.column_stack(decode_polyline(polyline["path"])), expected, atol=1e-5)
+    delta = encoded["delta-int32"]["pois"]["cafes"][0]
+    np.testing.assert_allclose(np.column_stack(decode_delta_int32(delta["path"])), expected, atol=1e-6)
+
+    tree_payload = encoded["tree"]
+    assert tree_payload["path_encoding"] == "tree"
+    routes = tree_payload["route_trees"]["cafes"]
+    item = tree_payload["pois"]["cafes"][0]
+    parents = routes["parent"]
+    coords = np.column_stack(decode_delta_int32(routes["coords"], routes["scale"]))
+    chain = []
+    pos = item["path_node"]
+    while pos >= 0:
+        chain.append(coords[pos])
+        pos = parents[pos]
+    assert "path" not in item
+    np.testing.assert_allclose(np.array(chain[::-1]), expected[1:-1], atol=1e-6)
+
+    none_item = encoded["none"]["pois"]["cafes"][0]
+    assert "path" not in none_item and "path_node" not in none_item
+    assert none_item["distance_km"] == alpha["distance_km"]
+
+
+def test_pois_response_cache_follows_poi_data(data_root: Path) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0)
+    registry.warm_up()
+    set_registry(registry)
+    app = FastAPI()
+    app.include_router(pois_endpoint.router)
+    client = TestClient(app)
+    params = {"lat": BASE_LAT, "lon": BASE_LON, "radius_km": 0.4}
+    try:
+        first = client.get("/pois/", params=params)
+        hit = client.get("/pois/", params=params)
+        csv = data_root / "Data" / "CSV" / "cafes.csv"
+        csv.write_text(
+            "Name,Latitude,Longitude\n" f"Solo,{BASE_LAT},{BASE_LON}\n",
+            encoding="utf-8",
+        )
+        stamp = time.time() + 5
+        os.utime(csv, (stamp, stamp))
+        changed = client.get("/pois/", params=params)
+    finally:
+        set_registry(None)
+    assert first.headers["x-cache"] == "MISS" and hit.headers["x-cache"] == "HIT"
+    assert hit.content == first.content
+    assert changed.headers["x-cache"] == "MISS"
+    assert [item["name"] for item in changed.json()["pois"]["cafes"]] == ["Solo"]
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+xgb = pytest.importorskip("xgboost")
+
+from app.api.endpoints import analysis  # noqa: E402
+from app.services.prediction_service import POI_GROUPS, PredictionService  # noqa: E402
+
+FEATURES = [
+    "banks_count_1km",
+    "health_count_1km",
+    "total_poi_count_1km",
+    "bank_ratio",
+    "health_ratio",
+    "weighted_POI_strength",
+    "cafe_weight",
+    "lat",
+    "not_in_reference",
+]
+
+
+@pytest.fixture()
+def service(tmp_path: Path) -> PredictionService:
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({"lat": 27.7 + rng.random(n) * 0.05, "lng": 85.3 + rng.random(n) * 0.05})
+    for group in POI_GROUPS:
+        df[f"{group}_count_1km"] = rng.integers(0, 20, n).astype(float)
+        df[f"{group}_weight_1km"] = rng.random(n) * 5
+    df.loc[rng.random(n) < 0.2, "health_count_1km"] = np.nan
+    df["cafe_weight"] = rng.random(n)
+
+    X = pd.DataFrame(rng.random((200, len(FEATURES))), columns=FEATURES)
+    model = xgb.XGBRegressor(n_estimators=10, max_depth=3).fit(X, rng.random(200) * 3)
+
+    svc = PredictionService.__new__(PredictionService)
+    svc.model = model
+    svc.feature_names = FEATURES
+    svc.reference_df = df
+    svc.surface = None
+    svc.model_path = tmp_path / "xgb_baseline.pkl"
+    svc.reference_path = tmp_path / "master_cafes_minimal.csv"
+    svc.surface_path = tmp_path / "xgb_baseline.surface"
+    joblib.dump(model, svc.model_path)
+    df.to_csv(svc.reference_path, index=False)
+    svc._prepare_model()
+    svc._prepare_reference()
+    return svc
+
+
+def test_predict_batch_matches_single_predictions(service: PredictionService) -> None:
+    rng = np.random.default_rng(1)
+    lats = 27.7 + rng.random(25) * 0.05
+    lngs = 85.3 + rng.random(25) * 0.05
+
+    batch = service.predict_batch(lats, lngs)
+    assert len(batch) == 25
+    for lat, lng, result in zip(lats, lngs, batch):
+        single = service.predict(lat, lng)
+        assert result["predicted_score"] == pytest.approx(single["predicted_score"], abs=1e-6)
+        assert result["risk_level"] == PredictionService.risk_level(result["predicted_score"])
+        assert result["estimated_features"].keys() == single["estimated_features"].keys()
+    assert service.predict_batch([], []) == []
+
+
+def test_native_booster_path_matches_model_predict(service: PredictionService) -> None:
+    assert service.booster is not None
+    assert service.model_columns == FEATURES
+    rng = np.random.default_rng(2)
+    for rows in (1, 64, 300):
+        lats = 27.7 + rng.random(rows) * 0.05
+        lngs = 85.3 + rng.random(rows) * 0.05
+        native, _ = service._score_batch(lats, lngs)
+        booster, service.booster = service.booster, None
+        try:
+            frame, _ = service._score_batch(lats, lngs)
+        finally:
+            service.booster = booster
+        np.testing.assert_allclose(native, frame, rtol=0, atol=1e-6)
+    # The buffer is reused while it is large enough.
+    buffer = service._buffers.matrix
+    service._score_batch(lats[:10], lngs[:10])
+    assert service._buffers.matrix is buffer
+
+    # A bare Booster takes the same path.
+    service.model = service.model.get_booster()
+    service._prepare_model()
+    assert service.booster is service.model
+    np.testing.assert_allclose(service._score_batch(lats, lngs)[0], native, rtol=0, atol=1e-6)
+
+
+def test_predict_batch_estimates_features_from_nearest_rows(service: PredictionService) -> None:
+    df = service.reference_df
+    lat, lng = float(df.lat.iloc[10]), float(df.lng.iloc[10])
+    idx, _ = service.neighbor_index.nearest_k([lat], [lng], 5)
+    neighbours = df.iloc[idx[0]]
+
+    features = service.predict_batch([lat], [lng])[0]["estimated_features"]
+    assert features["banks_count_1km"] == pytest.approx(neighbours["banks_count_1km"].mean())
+    # NaN neighbours are ignored by the mean, as pandas does.
+    assert features["health_count_1km"] == pytest.approx(neighbours["health_count_1km"].mean())
+    assert features["lat"] == lat and features["lng"] == lng
+    assert "not_in_reference" not in features
+
+    with pytest.raises(ValueError):
+        service.predict_batch([np.nan], [lng])
+
+
+def test_surface_answers_predict_until_the_model_changes(service: PredictionService, monkeypatch) -> None:
+    surface = service.load_surface(cell_m=250.0)
+    rows, cols = surface.shape
+    lat = surface.lat0 + (rows // 2) * surface.dlat
+    lng = surface.lon0 + (cols // 2) * surface.dlon
+
+    fast = service.predict(lat, lng)
+    assert fast["estimated_features"]["interpolated"] is True
+    exact = service.predict_batch([lat], [lng])[0]
+    assert fast["predicted_score"] == pytest.approx(exact["predicted_score"], abs=1e-5)
+    # Other neighbour counts and points off the grid go to the model.
+    assert "interpolated" not in service.predict(lat, lng, k_neighbors=3)["estimated_features"]
+    assert "interpolated" not in service.predict(surface.lat0 - 1.0, lng)["estimated_features"]
+
+    monkeypatch.setattr(PredictionService, "_instance", service)
+    south, west, north, east = surface.bounds
+    payload = analysis.surface(
+        bbox=f"{south},{west},{north},{east}", resolution_m=500.0, format="array", vmin=0.0, vmax=3.0
+    )
+    assert payload["shape"] == [len(payload["lats"]), len(payload["lons"])]
+    assert payload["values"][0][0] == pytest.approx(float(surface.values[0, 0]), abs=1e-5)
+    png = analysis.surface(bbox=f"{south},{west},{north},{east}", resolution_m=None, format="png", vmin=0.0, vmax=3.0)
+    assert png.media_type == "image/png"
+
+    service.surface = None
+    assert service.load_surface(build=False) is not None
+    service.surface = None
+    joblib.dump(xgb.XGBRegressor(n_estimators=2).fit([[0.0] * len(FEATURES)], [1.0]), service.model_path)
+    assert service.load_surface(build=False) is None
+
+
+def test_surface_score_endpoint_and_rank_fallback(service: PredictionService, monkeypatch) -> None:
+    surface = service.load_surface(cell_m=250.0)
+    rows, cols = surface.shape
+    # Off cell centres, where interpolated and model scores differ.
+    lats = [surface.lat0 + (rows // 3 + 0.4) * surface.dlat, surface.lat0 + (rows // 2 + 0.3) * surface.dlat]
+    lng = surface.lon0 + (cols // 2 + 0.6) * surface.dlon
+    monkeypatch.setattr(PredictionService, "_instance", service)
+
+    point = analysis.surface_score(lat=str(lats[0]), lon=str(lng))
+    assert point["interpolated"] is True
+    assert point["score"] == pytest.approx(float(surface.sample([lats[0]], [lng])[0]))
+    assert analysis.surface_score(lat=str(surface.lat0 - 1.0), lon=str(lng))["interpolated"] is False
+
+    exact = [p["predicted_score"] for p in service.predict_batch(lats, [lng, lng])]
+    predict_batch = service.predict_batch
+
+    def single_only(la, lo, *args, **kwargs):
+        if len(la) > 1:
+            raise RuntimeError("batch failed")
+        return predict_batch(la, lo, *args, **kwargs)
+
+    # When the batch fails the ranking still uses model scores only, never the surface.
+    monkeypatch.setattr(service, "predict_batch", single_only)
+    monkeypatch.setattr(service, "predict", lambda *a, **kw: pytest.fail("rank used the surface"))
+    request = analysis.RankRequest(locations=[analysis.RankLocation(lat=la, lon=lng) for la in lats])
+    ranked = analysis.rank_locations(request)["ranked"]
+    assert sorted(r["score"] for r in ranked) == pytest.approx(sorted(exact), abs=1e-6)
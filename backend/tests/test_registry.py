@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.services.registry import ServiceRegistry  # noqa: E402
+from tests.test_road_network import _grid_geojson  # noqa: E402
+
+
+@pytest.fixture()
+def data_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.delenv("SITEX_POI_DATA_DIR", raising=False)
+    data = tmp_path / "Data"
+    csv_dir = data / "CSV"
+    csv_dir.mkdir(parents=True)
+    (data / "Roadway.geojson").write_text(json.dumps(_grid_geojson(n=4)), encoding="utf-8")
+    (csv_dir / "cafes.csv").write_text("name,lat,lon\nA,27.7005,85.3205\n", encoding="utf-8")
+    return tmp_path
+
+
+def test_warm_up_shares_one_road_network(data_root: Path) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0)
+    bundle = registry.warm_up()
+
+    assert bundle.road_network is not None
+    assert bundle.road_network.node_count == 16
+    assert bundle.road_type_network is not None
+    assert bundle.site_analysis.get_road_network() is bundle.road_network
+    assert bundle.poi_store is bundle.site_analysis.poi_store
+    assert len(bundle.poi_store.category("cafes")) == 1
+    assert len(bundle.poi_store.category("banks")) == 0
+    # Repeated lookups return the same objects rather than reloading.
+    assert registry.current() is bundle
+
+
+def test_reload_swaps_bundle_when_sources_change(data_root: Path) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0)
+    first = registry.warm_up()
+    assert not registry.is_stale()
+    assert registry.current() is first and first.version == 1
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first.version = 5  # type: ignore[misc]
+
+    road_path = data_root / "Data" / "Roadway.geojson"
+    road_path.write_text(json.dumps(_grid_geojson(n=5)), encoding="utf-8")
+    stat = road_path.stat()
+    os.utime(road_path, (stat.st_atime, stat.st_mtime + 5))
+    assert registry.is_stale()
+
+    second = registry.reload()
+    assert registry.current() is second
+    assert second.version > first.version
+    assert second.road_network.node_count == 25
+    # The old bundle stays usable for requests that already hold it.
+    assert first.road_network.node_count == 16
+
+
+def test_current_schedules_background_reload(data_root: Path) -> None:
+    registry = ServiceRegistry(data_root=data_root, check_interval_s=0.01)
+    first = registry.warm_up()
+
+    road_path = data_root / "Data" / "Roadway.geojson"
+    road_path.write_text(json.dumps(_grid_geojson(n=3)), encoding="utf-8")
+    stat = road_path.stat()
+    os.utime(road_path, (stat.st_atime, stat.st_mtime + 5))
+    time.sleep(0.02)
+
+    assert registry.current() is first
+    registry._reload_thread.join(timeout=30)
+    assert registry.current().road_network.node_count == 9
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.api.response_cache import ResponseCache, cache_point, cache_points, cached_json, coord_key, etag_matches  # noqa: E402
+
+
+def test_cache_evicts_by_bytes_and_invalidates_on_version() -> None:
+    cache = ResponseCache("test-lru", max_bytes=10)
+    cache.put("a", 1, b"aaaa")
+    cache.put("b", 1, b"bbbb")
+    assert cache.get("a", 1).body == b"aaaa"  # "a" is now most recent
+    cache.put("c", 1, b"cccc")
+    assert cache.get("b", 1) is None
+    assert cache.get("c", 1).etag.startswith('"')
+    assert cache.put("big", 1, b"x" * 11).body == b"x" * 11
+    assert cache.get("big", 1) is None
+
+    assert cache.get("a", 2) is None
+    stats = cache.stats()
+    assert stats["entries"] == 0
+    assert stats["evictions"] == 1 and stats["invalidations"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 3
+
+
+def test_coord_key_quantizes_to_grid() -> None:
+    assert coord_key(27.7, 85.3, grid_m=0) == (27.7, 85.3)
+    assert coord_key(27.70001, 85.30001, grid_m=25) == coord_key(27.70002, 85.30002, grid_m=25)
+    assert coord_key(27.7, 85.3, grid_m=25) != coord_key(27.7005, 85.3, grid_m=25)
+    assert etag_matches('W/"x", "y"', '"y"') and etag_matches("*", '"z"') and not etag_matches(None, '"z"')
+
+
+def test_cached_json_serves_hits_and_not_modified() -> None:
+    cache = ResponseCache("test-endpoint")
+    calls = []
+    app = FastAPI()
+
+    @app.get("/value")
+    def value(x: int, request: Request = None):
+        return cached_json(cache, request, x, lambda: 1, lambda: calls.append(x) or {"x": x})
+
+    assert value(3) == {"x": 3}  # direct calls bypass the cache
+
+    client = TestClient(app)
+    first = client.get("/value", params={"x": 5})
+    assert first.json() == {"x": 5} and first.headers["x-cache"] == "MISS"
+    second = client.get("/value", params={"x": 5})
+    assert second.headers["x-cache"] == "HIT" and second.headers["etag"] == first.headers["etag"]
+    revalidated = client.get("/value", params={"x": 5}, headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert calls == [3, 5]
+    assert cache.stats()["not_modified"] == 1
+
+
+
+def test_grid_cell_responses_echo_each_callers_coordinates() -> None:
+    cache = ResponseCache("test-grid")
+    computed = []
+    app = FastAPI()
+
+    @app.get("/site")
+    def site(lat: float, lon: float, request: Request = None):
+        point = cache_point(request, lat, lon, grid_m=50)
+
+        def build():
+            computed.append((point.at_lat, point.at_lon))
+            center = {"lat": point.at_lat, "lon": point.at_lon}
+            return {"center": center, "path": [center, {"lat": 27.71, "lon": 85.31}], "score": 1.5}
+
+        return cached_json(cache, request, point.key, lambda: 1, build, [point])
+
+    assert site(27.70001, 85.30001)["center"] == {"lat": 27.70001, "lon": 85.30001}
+
+    client = TestClient(app)
+    first = client.get("/site", params={"lat": 27.70001, "lon": 85.30001})
+    second = client.get("/site", params={"lat": 27.70002, "lon": 85.30002})
+    assert first.headers["x-cache"] == "MISS" and second.headers["x-cache"] == "HIT"
+    assert len(computed) == 2  # the direct call and one shared computation
+    assert first.json()["center"] == {"lat": 27.70001, "lon": 85.30001}
+    assert second.json()["center"] == {"lat": 27.70002, "lon": 85.30002}
+    assert second.json()["path"] == [{"lat": 27.70002, "lon": 85.30002}, {"lat": 27.71, "lon": 85.31}]
+    assert first.headers["etag"] != second.headers["etag"]
+    again = client.get(
+        "/site", params={"lat": 27.70002, "lon": 85.30002}, headers={"If-None-Match": second.headers["etag"]}
+    )
+    assert again.status_code == 304
+
+    # Two locations in one latitude row cannot be told apart after computing; key them exactly.
+    grid = cache_points(object(), [(27.70001, 85.30001), (27.70002, 85.31)], grid_m=50)
+    assert [p.key for p in grid] == [(27.70001, 85.30001), (27.70002, 85.31)]
+    assert not any(p.moved for p in grid)
+    assert cache_points(None, [(27.70001, 85.30001)], grid_m=50)[0].key == (27.70001, 85.30001)
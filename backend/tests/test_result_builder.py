@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.services.result_builder import decay_weights, render, to_columns, to_records  # noqa: E402
+from app.services.site_analysis_service import _weight  # noqa: E402
+
+
+def test_decay_weights_match_scalar_weight() -> None:
+    d = np.linspace(0.0, 1.5, 31)
+    for radius, decay in [(1.0, 1.0), (1.0, 0.0), (0.5, 2.0), (0.0, 1.0)]:
+        expected = [_weight(v, radius, decay) for v in d.tolist()]
+        assert decay_weights(d, radius, decay) == pytest.approx(expected)
+    assert decay_weights(np.array([0.2]), 1.0, None)[0] == pytest.approx(0.8)
+    assert decay_weights(np.array([0.2]), 1.0, 0.5)[0] == pytest.approx(0.8 * math.exp(-0.4))
+
+
+def test_records_and_columns_share_values() -> None:
+    columns = {
+        "name": ["a", None, "c"],
+        "distance_km": np.array([0.1, 0.2, 0.3]),
+        "path": [[{"lat": 1.0, "lon": 2.0}], None, 0],
+    }
+    records = to_records(columns, sparse=("path",))
+    assert records == [
+        {"name": "a", "distance_km": 0.1, "path": [{"lat": 1.0, "lon": 2.0}]},
+        {"name": None, "distance_km": 0.2},
+        {"name": "c", "distance_km": 0.3, "path": 0},
+    ]
+    assert type(records[0]["distance_km"]) is float
+    assert to_columns(columns) == render(columns, "columns")
+    assert render(columns, "columns")["distance_km"] == [0.1, 0.2, 0.3]
@@ -0,0 +1,465 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.lib.road_network import RoadNetwork  # noqa: E402
+
+
+BASE_LAT, BASE_LON = 27.70, 85.32
+STEP_DEG = 0.001  # ~111 m north-south, ~98 m east-west at this latitude
+
+
+def _grid_geojson(n: int = 6) -> dict:
+    """Square n x n street grid around Kathmandu, one LineString per row/column."""
+    features = []
+    for i in range(n):
+        row = [[BASE_LON + j * STEP_DEG, BASE_LAT + i * STEP_DEG] for j in range(n)]
+        col = [[BASE_LON + i * STEP_DEG, BASE_LAT + j * STEP_DEG] for j in range(n)]
+        for coords, highway in ((row, "residential"), (col, "primary" if i == 0 else "service")):
+            features.append(
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "LineString", "coordinates": coords},
+                    "properties": {"highway": highway},
+                }
+            )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _is_memory_mapped(arr: np.ndarray) -> bool:
+    import mmap
+
+    base = arr
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, "base", None)
+    return False
+
+
+@pytest.fixture()
+def grid_path(tmp_path: Path) -> Path:
+    path = tmp_path / "Roadway.geojson"
+    path.write_text(json.dumps(_grid_geojson()), encoding="utf-8")
+    return path
+
+
+@pytest.fixture()
+def road_net(grid_path: Path) -> RoadNetwork:
+    return RoadNetwork.from_geojson(grid_path)
+
+
+def test_csr_matches_networkx_bounded_search(road_net: RoadNetwork) -> None:
+    assert road_net.csr is not None
+    for source in (0, 7, road_net.node_count - 1):
+        for cutoff in (150.0, 400.0, None):
+            expected = nx.single_source_dijkstra_path_length(
+                road_net.graph, source, cutoff=cutoff, weight="weight"
+            )
+            got = road_net.shortest_paths_from(source, cutoff)
+            assert set(got) == set(expected)
+            for node, dist in expected.items():
+                assert got[node] == pytest.approx(dist, abs=0.05)
+
+
+def test_distance_between_matches_networkx(road_net: RoadNetwork) -> None:
+    lat_a, lon_a = road_net.node_coords[0]
+    lat_b, lon_b = road_net.node_coords[road_net.node_count - 1]
+    expected = nx.shortest_path_length(road_net.graph, 0, road_net.node_count - 1, weight="weight")
+    got = road_net.distance_between(float(lat_a), float(lon_a), float(lat_b), float(lon_b))
+    assert got == pytest.approx(expected, abs=0.05)
+
+
+def test_networkx_fallback_when_csr_unavailable(road_net: RoadNetwork) -> None:
+    with_csr = road_net.shortest_paths_from(3, 300.0)
+    road_net.csr = None
+    road_net._paths_cache.clear()
+    without_csr = road_net.shortest_paths_from(3, 300.0)
+    assert set(with_csr) == set(without_csr)
+    assert np.allclose(
+        [with_csr[n] for n in sorted(with_csr)],
+        [without_csr[n] for n in sorted(without_csr)],
+        atol=0.05,
+    )
+
+
+def test_binary_cache_roundtrip_is_memory_mapped(grid_path: Path, tmp_path: Path) -> None:
+    cache_dir = tmp_path / "Roadway.graph"
+    built = RoadNetwork.from_geojson(grid_path, cache_path=cache_dir)
+    assert (cache_dir / "manifest.json").exists()
+
+    loaded = RoadNetwork.from_geojson(grid_path, cache_path=cache_dir)
+    assert _is_memory_mapped(loaded.node_coords)
+    assert _is_memory_mapped(loaded.csr.indices)
+    assert loaded._graph is None
+    assert loaded.node_count == built.node_count
+    assert loaded.edge_count == built.edge_count
+    assert loaded.shortest_paths_from(0, 300.0) == pytest.approx(built.shortest_paths_from(0, 300.0))
+
+
+def test_binary_cache_validates_source_mtime_and_hash(grid_path: Path, tmp_path: Path) -> None:
+    import os
+
+    cache_dir = tmp_path / "Roadway.graph"
+    RoadNetwork.from_geojson(grid_path, cache_path=cache_dir)
+    assert RoadNetwork._cache_is_valid(str(cache_dir), str(grid_path))
+
+    # Touching the source without changing content keeps the cache (hash still matches).
+    stat = grid_path.stat()
+    os.utime(grid_path, (stat.st_atime, stat.st_mtime + 10))
+    assert RoadNetwork._cache_is_valid(str(cache_dir), str(grid_path))
+
+    # Changing the content invalidates it.
+    data = _grid_geojson(n=4)
+    grid_path.write_text(json.dumps(data), encoding="utf-8")
+    assert not RoadNetwork._cache_is_valid(str(cache_dir), str(grid_path))
+    rebuilt = RoadNetwork.from_geojson(grid_path, cache_path=cache_dir)
+    assert rebuilt.node_count == 16
+
+
+def test_road_type_network_cache_roundtrip(grid_path: Path, tmp_path: Path) -> None:
+    from app.lib.road_type_network import RoadTypeNetwork
+
+    cache_dir = tmp_path / "Roadway.roadtypes"
+    built = RoadTypeNetwork.from_geojson(grid_path, cache_path=cache_dir)
+    loaded = RoadTypeNetwork.from_geojson(grid_path, cache_path=cache_dir)
+    assert _is_memory_mapped(loaded.node_type_codes)
+    assert loaded.road_type_names == built.road_type_names
+    assert loaded.road_types_for_node(0) == ["primary", "residential"]
+
+    lat, lon = built.node_coords[7]
+    expected = built.road_type_distance_map(float(lat), float(lon), 500.0)
+    got = loaded.road_type_distance_map(float(lat), float(lon), 500.0)
+    assert got["start_types"] == expected["start_types"]
+    assert got["distances"] == pytest.approx(expected["distances"])
+
+
+def test_accessibility_table_matches_per_request_search(grid_path: Path, tmp_path: Path) -> None:
+    from app.lib.road_type_network import RoadTypeNetwork
+
+    network = RoadTypeNetwork.from_geojson(grid_path)
+    searched = [network.road_type_distance_map(float(lat), float(lon), 350.0) for lat, lon in network.node_coords]
+
+    cache_dir = tmp_path / "Roadway.access"
+    table = network.load_accessibility(cache_dir, grid_path, max_radius_m=400.0)
+    assert table.dist_m.shape == (network.node_count, len(network.road_type_names))
+    for (lat, lon), expected in zip(network.node_coords, searched):
+        got = network.road_type_distance_map(float(lat), float(lon), 350.0)
+        assert got["start_types"] == expected["start_types"]
+        assert got["distances"] == pytest.approx(expected["distances"], abs=1e-3)
+        for road_type, point in got["points"].items():
+            assert road_type in network.road_types_for_node(point["node_id"])
+
+    # The saved table is memory-mapped on reload; another radius rebuilds it.
+    reloaded = RoadTypeNetwork.from_geojson(grid_path)
+    assert _is_memory_mapped(reloaded.load_accessibility(cache_dir, grid_path, max_radius_m=400.0).dist_m)
+    assert not _is_memory_mapped(reloaded.load_accessibility(cache_dir, grid_path, max_radius_m=200.0).dist_m)
+
+    # Radii beyond the table fall back to a search.
+    lat, lon = network.node_coords[0]
+    wide = network.road_type_distance_map(float(lat), float(lon), 5000.0)
+    network.accessibility = None
+    assert wide["distances"] == pytest.approx(network.road_type_distance_map(float(lat), float(lon), 5000.0)["distances"])
+
+
+def test_shortest_path_tree_reconstructs_paths(road_net: RoadNetwork) -> None:
+    tree = road_net.shortest_path_tree(0)
+    assert tree is not None
+    targets = list(range(road_net.node_count))
+    paths = tree.paths_to(targets)
+    assert set(paths) == set(targets)
+    for target, path in paths.items():
+        assert path[0] == 0 and path[-1] == target
+        length = sum(road_net.graph[a][b]["weight"] for a, b in zip(path, path[1:]))
+        expected = nx.shortest_path_length(road_net.graph, 0, target, weight="weight")
+        assert length == pytest.approx(expected, abs=0.05)
+        assert tree.distance_to(target) == pytest.approx(expected, abs=0.05)
+
+    bounded = road_net.shortest_path_tree(0, cutoff=150.0)
+    far = road_net.node_count - 1
+    assert bounded.path_to(far) is None
+    assert bounded.distance_to(far) is None
+
+
+def test_shortest_path_tree_networkx_fallback_matches(road_net: RoadNetwork) -> None:
+    csr_paths = road_net.shortest_path_tree(5).paths_to(range(road_net.node_count))
+    road_net.csr = None
+    road_net._paths_cache.clear()
+    nx_tree = road_net.shortest_path_tree(5)
+    for target, path in nx_tree.paths_to(range(road_net.node_count)).items():
+        assert path[0] == 5 and path[-1] == target
+        assert len(path) == len(csr_paths[target])
+
+
+def test_pois_network_routes_share_one_tree(road_net: RoadNetwork) -> None:
+    import pandas as pd
+
+    from app.api.endpoints.pois import _network_routes
+
+    lat0, lon0 = (float(v) for v in road_net.node_coords[0])
+    poi_lats = pd.Series([float(road_net.node_coords[i][0]) + 1e-5 for i in (7, 14, 35)])
+    poi_lons = pd.Series([float(road_net.node_coords[i][1]) for i in (7, 14, 35)])
+    distances, paths = _network_routes(road_net, lat0, lon0, poi_lats, poi_lons, radius_m=500.0)
+
+    assert len(road_net._paths_cache) == 1
+    assert set(paths) == {0, 1, 2}
+    for idx, path in paths.items():
+        assert path[0] == {"lat": lat0, "lon": lon0}
+        assert path[-1] == {"lat": poi_lats[idx], "lon": poi_lons[idx]}
+    lengths = road_net.shortest_paths_from(0, None)
+    expected = {
+        idx for idx, node in enumerate((7, 14, 35)) if lengths[node] + 1.1 <= 500.0
+    }
+    assert expected and expected != {0, 1, 2}
+    assert set(distances) == expected
+    for idx in expected:
+        node = (7, 14, 35)[idx]
+        assert distances[idx] * 1000.0 == pytest.approx(lengths[node] + 1.1, abs=0.5)
+
+
+def test_snap_points_tiered_matches_cascade(road_net: RoadNetwork) -> None:
+    rng = np.random.default_rng(7)
+    lats = BASE_LAT - 0.004 + rng.random(200) * 0.013
+    lons = BASE_LON - 0.004 + rng.random(200) * 0.013
+    lats[:3] = np.nan
+    tolerances = (120.0, 300.0, float("inf"))
+
+    nodes, offsets, tiers = road_net.snap_points_tiered(lats, lons, tolerances)
+
+    assert (nodes[:3] == -1).all() and np.isinf(offsets[:3]).all() and (tiers[:3] == -1).all()
+    assert set(np.unique(tiers[3:]).tolist()) == {0, 1, 2}
+    for i in range(3, lats.shape[0]):
+        for tier, tol in enumerate(tolerances):
+            node, offset = road_net.snap_point(float(lats[i]), float(lons[i]), max_snap_m=tol)
+            if node is not None:
+                break
+        assert (nodes[i], tiers[i]) == (node, tier)
+        assert offsets[i] == pytest.approx(offset)
+
+    # Without an infinite tier far points stay unsnapped; the brute-force path agrees.
+    bounded = road_net.snap_points_tiered(lats, lons, (120.0,))
+    road_net._index.tree = None
+    brute = road_net.snap_points_tiered(lats, lons, (120.0,))
+    assert np.array_equal(bounded[0], brute[0])
+    assert (bounded[0][tiers > 0] == -1).all()
+    assert road_net.snap_point_tiered(float(lats[0]), float(lons[0])) == (None, None, -1)
+
+
+def test_point_index_distances_are_metric() -> None:
+    from app.lib.road_type_network import _haversine_pair
+    from app.lib.spatial_index import PointIndex
+
+    rng = np.random.default_rng(3)
+    coords = np.column_stack((BASE_LAT + rng.random(500) * 0.05, BASE_LON + rng.random(500) * 0.05))
+    index = PointIndex(coords)
+    q_lat, q_lon = BASE_LAT + 0.021, BASE_LON + 0.017
+
+    idxs, dists = index.nearest([q_lat, np.nan], [q_lon, BASE_LON])
+    exact = [_haversine_pair(q_lat, q_lon, float(a), float(b)) for a, b in coords]
+    assert idxs[0] == int(np.argmin(exact))
+    assert dists[0] == pytest.approx(min(exact), rel=1e-3)
+    assert idxs[1] == -1 and np.isinf(dists[1])
+
+    # The bound is applied inside the search.
+    far_idx, far_dist = index.nearest([BASE_LAT + 1.0], [BASE_LON], max_dist_m=500.0)
+    assert far_idx[0] == -1 and np.isinf(far_dist[0])
+
+    hits = index.within(q_lat, q_lon, 800.0)
+    expected = np.flatnonzero(np.array(exact) <= 800.0)
+    assert set(hits.tolist()) ^ set(expected.tolist()) <= {
+        i for i in range(len(exact)) if abs(exact[i] - 800.0) < 2.0
+    }
+
+    k_idx, k_dist = index.nearest_k([q_lat, np.nan], [q_lon, BASE_LON], 4)
+    assert k_idx.shape == (2, 4)
+    assert k_idx[0].tolist() == np.argsort(exact)[:4].tolist()
+    assert (np.diff(k_dist[0]) >= 0).all()
+    assert (k_idx[1] == -1).all() and np.isinf(k_dist[1]).all()
+
+
+def test_snap_points_to_edges_matches_brute_force(road_net: RoadNetwork) -> None:
+    index, seg_u, seg_v, _ = road_net._segment_index()
+    rng = np.random.default_rng(11)
+    lats = BASE_LAT - 0.01 + rng.random(300) * 0.025
+    lons = BASE_LON - 0.01 + rng.random(300) * 0.025
+    u, v, t, dist = road_net.snap_points_to_edges(lats, lons, max_snap_m=float("inf"))
+
+    q = index.projection.forward(lats, lons)
+    all_segs = np.arange(len(index))
+    for i in range(lats.shape[0]):
+        _, d = index.project(np.repeat(q[i:i + 1], len(index), axis=0), all_segs)
+        assert dist[i] == pytest.approx(d.min(), abs=1e-6)
+        assert (u[i], v[i]) in set(zip(seg_u[d <= d.min() + 1e-6], seg_v[d <= d.min() + 1e-6]))
+
+    bounded = road_net.snap_points_to_edges(lats, lons, max_snap_m=30.0)
+    assert ((bounded[0] >= 0) == (dist <= 30.0)).all()
+
+
+def test_snap_to_edge_projects_onto_segment(road_net: RoadNetwork) -> None:
+    # 20 m north of the midpoint of the first residential segment.
+    lat = BASE_LAT + 20.0 / 111195.0
+    lon = BASE_LON + STEP_DEG / 2
+    u, v, dist = road_net.snap_to_edge(lat, lon, max_snap_m=50.0)
+    assert dist == pytest.approx(20.0, abs=0.1)
+    node_dist = road_net.snap_point(lat, lon, max_snap_m=float("inf"))[1]
+    assert node_dist > 45.0
+    assert road_net.snap_to_edge(lat, lon, max_snap_m=10.0) == (None, None, None)
+
+    _, _, t, _ = road_net.snap_points_to_edges([lat], [lon], max_snap_m=50.0)
+    assert t[0] == pytest.approx(0.5, abs=0.01)
+    from_edge = road_net.shortest_paths_from_edge(u, v, float(t[0]), cutoff=400.0)
+    half = road_net.edge_length(u, v) / 2
+    assert from_edge[u] == pytest.approx(half, abs=0.5)
+    assert from_edge[v] == pytest.approx(half, abs=0.5)
+    from_u = road_net.shortest_paths_from(u, None)
+    from_v = road_net.shortest_paths_from(v, None)
+    for node, d in from_edge.items():
+        assert d == pytest.approx(min(from_u[node], from_v[node]) + half, abs=0.5)
+        assert d <= 400.0
+
+
+def test_shortest_paths_from_edges_batches_points(road_net: RoadNetwork) -> None:
+    rng = np.random.default_rng(3)
+    lats = BASE_LAT + rng.uniform(0, 5, 40) * STEP_DEG
+    lons = BASE_LON + rng.uniform(0, 5, 40) * STEP_DEG
+    u, v, t, _ = road_net.snap_points_to_edges(lats, lons, max_snap_m=float("inf"))
+    u[3] = v[3] = -1
+    targets = [0, 7, 21, 35]
+
+    batch = road_net.shortest_paths_from_edges(u, v, t, cutoff=400.0, targets=targets, workers=2)
+    assert batch.shape == (40, 4)
+    assert np.isinf(batch[3]).all()
+    for i in (0, 11, 39):
+        single = road_net.shortest_paths_from_edge(int(u[i]), int(v[i]), float(t[i]), cutoff=400.0)
+        expected = [single.get(n, np.inf) for n in targets]
+        np.testing.assert_allclose(batch[i], expected, atol=0.05)
+
+    road_net.csr = None
+    fallback = road_net.shortest_paths_from_edges(u, v, t, cutoff=400.0, targets=targets)
+    np.testing.assert_allclose(fallback, batch, atol=0.05)
+
+
+def test_distance_matrix_edge_snap(road_net: RoadNetwork) -> None:
+    # Two points 20 m north of the first residential segment, a quarter and
+    # three quarters along it, and one about 20 m east of node 7's column.
+    north = 20.0 / 111195.0
+    points = [
+        (BASE_LAT + north, BASE_LON + STEP_DEG / 4),
+        (BASE_LAT + north, BASE_LON + 3 * STEP_DEG / 4),
+        (road_net.node_coords[7][0] + STEP_DEG / 2, road_net.node_coords[7][1] + STEP_DEG / 5),
+    ]
+    matrix = road_net.distance_matrix(points, points, max_snap_m=50.0, snap="edge")
+    u, v, t, off = road_net.snap_points_to_edges([p[0] for p in points], [p[1] for p in points], max_snap_m=50.0)
+    assert np.allclose(np.diag(matrix), 2 * off)
+    seg = road_net.edge_length(0, 1)
+    # Along the shared edge rather than through a vertex.
+    assert matrix[0, 1] == pytest.approx(seg / 2 + 40.0, abs=0.5)
+    assert np.allclose(matrix, matrix.T, atol=1e-6)
+    nodes = road_net.distance_matrix(points, points, max_snap_m=50.0)
+    assert matrix[0, 1] < nodes[0, 1]
+
+    from_first = road_net.shortest_paths_from_edge(int(u[0]), int(v[0]), float(t[0]))
+    w = road_net.edge_length(int(u[2]), int(v[2]))
+    via = min(from_first[int(u[2])] + t[2] * w, from_first[int(v[2])] + (1 - t[2]) * w)
+    assert matrix[0, 2] == pytest.approx(via + off[0] + off[2], abs=0.05)
+
+
+def test_distance_matrix_matches_pairwise(road_net: RoadNetwork, monkeypatch: pytest.MonkeyPatch) -> None:
+    coords = road_net.node_coords
+    # Duplicate source nodes, an off-network point and a point 15 m off a node.
+    sources = [coords[0], coords[0], coords[14], (BASE_LAT - 1.0, BASE_LON)]
+    targets = [coords[35], (coords[7][0] + 15.0 / 111195.0, coords[7][1]), coords[0]]
+    pairwise = [[road_net.distance_between(a[0], a[1], b[0], b[1]) for b in targets] for a in sources]
+    expected = np.array([[np.inf if d is None else d for d in row] for row in pairwise])
+    dense = road_net.distance_matrix(sources, targets)
+    assert dense.shape == (4, 3)
+    assert np.allclose(dense, expected, atol=0.05)
+    assert np.isinf(dense[3]).all()
+    assert dense[0, 2] == 0.0
+
+    # Small blocks force several multi-source searches on the thread pool.
+    monkeypatch.setattr("app.lib.road_network._MATRIX_BLOCK_CELLS", road_net.node_count)
+    assert np.allclose(road_net.distance_matrix(sources, targets, workers=2), expected, atol=0.05)
+
+    bounded = road_net.distance_matrix(sources, targets, cutoff=300.0)
+    assert np.array_equal(np.isfinite(bounded), np.isfinite(expected) & (expected <= 300.0))
+
+    sparse = road_net.distance_matrix(sources, targets, cutoff=300.0, sparse=True)
+    assert sparse.nnz == int(np.isfinite(bounded).sum())
+    rows, cols = np.nonzero(np.isfinite(bounded))
+    assert np.allclose(np.asarray(sparse[rows, cols]).ravel(), bounded[rows, cols])
+    monkeypatch.setattr("app.lib.road_network._SPARSE_EXPAND_CELLS", 2)
+    chunked = road_net.distance_matrix(sources, targets, cutoff=300.0, sparse=True)
+    assert (chunked != sparse).nnz == 0 and chunked.nnz == sparse.nnz
+
+    road_net.csr = None
+    assert np.allclose(road_net.distance_matrix(sources, targets), expected, atol=0.05)
+
+
+def test_distance_matrix_searches_from_smaller_side(road_net: RoadNetwork, monkeypatch: pytest.MonkeyPatch) -> None:
+    coords = road_net.node_coords
+    sources = [coords[i] for i in range(0, 30)]
+    targets = [coords[35], coords[7]]
+    expected = road_net.distance_matrix(targets, sources).T
+
+    searched = []
+    node_matrix = road_net._node_distance_matrix
+    monkeypatch.setattr(
+        road_net, "_node_distance_matrix", lambda src, *a: searched.append(src.size) or node_matrix(src, *a)
+    )
+    wide = road_net.distance_matrix(sources, targets)
+    assert searched == [2]
+    assert wide.shape == (30, 2)
+    assert np.allclose(wide, expected)
+
+    with pytest.raises(ValueError):
+        road_net.distance_matrix(sources, sources, max_searches=10)
+    assert road_net.distance_matrix(sources, targets, max_searches=2).shape == (30, 2)
+
+
+def test_tree_cache_serves_smaller_cutoffs_from_wider_tree(road_net: RoadNetwork) -> None:
+    wide = road_net.shortest_path_tree(7, cutoff=1000.0)
+    assert wide.nodes.dtype == np.int32 and wide.dists.dtype == np.float32
+    stats = road_net.tree_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (0, 1, 1)
+    assert stats["bytes"] == wide.nbytes
+
+    narrow = road_net.shortest_path_tree(7, cutoff=300.0)
+    assert road_net.tree_cache_stats()["hits"] == 1
+    expected = nx.single_source_dijkstra_path_length(road_net.graph, 7, cutoff=300.0, weight="weight")
+    assert set(narrow.nodes.tolist()) == set(expected)
+    for node, path in narrow.paths_to(narrow.nodes.tolist()).items():
+        assert path[0] == 7 and path[-1] == node
+
+    # A wider request misses and replaces the narrower tree for that source.
+    road_net.shortest_path_tree(7, cutoff=None)
+    stats = road_net.tree_cache_stats()
+    assert (stats["misses"], stats["entries"]) == (2, 1)
+    road_net.shortest_paths_from(7, 1000.0)
+    assert road_net.tree_cache_stats()["hits"] == 2
+
+
+def test_tree_cache_evicts_by_bytes(grid_path: Path) -> None:
+    probe = RoadNetwork.from_geojson(grid_path)
+    tree_bytes = probe.shortest_path_tree(0).nbytes
+    road_net = RoadNetwork.from_geojson(grid_path)
+    road_net._paths_cache.max_bytes = 2 * tree_bytes
+    for source in (0, 1, 2):
+        road_net.shortest_path_tree(source)
+    stats = road_net.tree_cache_stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    road_net.shortest_path_tree(0)
+    assert road_net.tree_cache_stats()["misses"] == 4
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.services.site_analysis_service import SiteAnalysisService  # noqa: E402
+from tests.test_road_network import BASE_LAT, BASE_LON, STEP_DEG, _grid_geojson  # noqa: E402
+
+
+@pytest.fixture()
+def service(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> SiteAnalysisService:
+    monkeypatch.delenv("SITEX_POI_DATA_DIR", raising=False)
+    csv_dir = tmp_path / "Data" / "CSV"
+    csv_dir.mkdir(parents=True)
+    (tmp_path / "Data" / "Roadway.geojson").write_text(json.dumps(_grid_geojson(n=12)), encoding="utf-8")
+    rng = np.random.default_rng(5)
+    for cat in ("cafes", "banks", "health"):
+        lats = BASE_LAT + rng.uniform(-1, 12, 300) * STEP_DEG
+        lons = BASE_LON + rng.uniform(-1, 12, 300) * STEP_DEG
+        rows = "".join(f"{cat}{i},{a},{b}\n" for i, (a, b) in enumerate(zip(lats, lons)))
+        (csv_dir / f"{cat}.csv").write_text("name,lat,lon\n" + rows, encoding="utf-8")
+    return SiteAnalysisService(data_root=tmp_path)
+
+
+def test_shared_context_matches_separate_calls(service: SiteAnalysisService, monkeypatch: pytest.MonkeyPatch) -> None:
+    lat, lon = BASE_LAT + 5.5 * STEP_DEG, BASE_LON + 5 * STEP_DEG
+    radii = [0.2, 0.4, 0.6]
+    road_net = service.get_road_network()
+    searches = []
+    search = road_net.shortest_path_tree
+    monkeypatch.setattr(road_net, "shortest_path_tree", lambda *a, **kw: searches.append(a) or search(*a, **kw))
+
+    for sort_by in ("auto", "haversine"):
+        separate = (
+            service.nearby(lat, lon, radius_km=0.5, limit=50, categories=["cafes"], sort_by=sort_by),
+            service.ring_summary(lat, lon, radii_km=radii, sort_by=sort_by),
+            service.competition_index(lat, lon, radius_km=0.5, sort_by=sort_by),
+        )
+        searches.clear()
+        context = service.site_context(lat, lon, radius_km=0.6)
+        shared = (
+            service.nearby(lat, lon, radius_km=0.5, limit=50, categories=["cafes"], sort_by=sort_by, context=context),
+            service.ring_summary(lat, lon, radii_km=radii, sort_by=sort_by, context=context),
+            service.competition_index(lat, lon, radius_km=0.5, sort_by=sort_by, context=context),
+        )
+        assert shared == separate
+        assert len(searches) == 1
+
+
+def test_context_is_rebuilt_when_it_does_not_cover_the_query(service: SiteAnalysisService) -> None:
+    lat, lon = BASE_LAT + 5 * STEP_DEG, BASE_LON + 5 * STEP_DEG
+    small = service.site_context(lat, lon, radius_km=0.2, categories=["cafes"])
+    assert small.covers(0.2, ["cafes"]) and not small.covers(0.5, ["cafes"])
+    assert not small.covers(0.2, ["cafes", "banks"])
+
+    wide = service.nearby(lat, lon, radius_km=0.5, limit=200, categories=["cafes", "banks"], context=small)
+    fresh = service.nearby(lat, lon, radius_km=0.5, limit=200, categories=["cafes", "banks"])
+    assert wide == fresh
+    assert max(item["distance_km"] for item in wide["cafes"]) > 0.2
+
+
+def test_batch_streams_one_line_per_center(service: SiteAnalysisService, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.endpoints import analysis
+
+    centers = [
+        {"lat": BASE_LAT + 5 * STEP_DEG, "lon": BASE_LON + 5 * STEP_DEG},
+        {"lat": BASE_LAT + 5 * STEP_DEG + 1e-5, "lon": BASE_LON + 5 * STEP_DEG},  # same road node
+        {"lat": BASE_LAT + 2 * STEP_DEG, "lon": BASE_LON + 8 * STEP_DEG},
+        {"lat": 0.0, "lon": 0.0},
+    ]
+    request = analysis.BatchRequest(centers=centers, radii_km=[0.2, 0.4], include_prediction=False, workers=2)
+    groups = analysis._batch_groups(service, request)
+    assert sorted(len(g) for g in groups) == [1, 1, 2]
+
+    site_context = service.site_context
+
+    def failing_site_context(lat, lon, **kwargs):
+        if lat == 0.0:
+            raise RuntimeError("boom")
+        return site_context(lat, lon, **kwargs)
+
+    monkeypatch.setattr(service, "site_context", failing_site_context)
+    lines = [json.loads(chunk) for chunk in analysis._iter_batch_ndjson(service, request)]
+
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[3] == {"index": 3, "center": {"lat": 0.0, "lon": 0.0}, "error": "boom"}
+    expected = analysis._site_report(
+        service,
+        centers[2]["lat"],
+        centers[2]["lon"],
+        radius_km=1.0,
+        limit=10,
+        radii=[0.2, 0.4],
+        cats=None,
+        decay_scale_km=1.0,
+        include_network=True,
+        sort_by="auto",
+        include_prediction=False,
+    )
+    assert by_index[2]["result"] == json.loads(json.dumps(expected))
+    assert "prediction" not in by_index[0]["result"]
+    assert by_index[0]["result"]["nearby"]["data"]
+
+
+def test_path_between_routes_over_csr_without_networkx(service: SiteAnalysisService) -> None:
+    service.get_road_network()  # writes the binary cache
+    cached = SiteAnalysisService(data_root=service.data_root)
+    road_net = cached.get_road_network()
+    assert road_net._graph is None
+
+    center = (BASE_LAT + 2 * STEP_DEG, BASE_LON + 2 * STEP_DEG)
+    poi = (BASE_LAT + 7 * STEP_DEG, BASE_LON + 9 * STEP_DEG)
+    coords = cached.path_between(center_lat=center[0], center_lon=center[1], poi_lat=poi[0], poi_lon=poi[1])
+
+    assert road_net._graph is None
+    assert coords[0] == {"lat": center[0], "lon": center[1]}
+    assert coords[-1] == {"lat": poi[0], "lon": poi[1]}
+    # Inner points are grid nodes: one Manhattan route of 5 + 7 blocks.
+    assert len(coords) == 2 + 5 + 7 + 1
+
+
+def test_distance_matrix_endpoint_sparse_matches_dense(service: SiteAnalysisService, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api.endpoints import analysis
+
+    points = [analysis.RankLocation(lat=BASE_LAT + i * STEP_DEG, lon=BASE_LON + 2 * i * STEP_DEG) for i in range(5)]
+    request = analysis.DistanceMatrixRequest(sources=points, targets=points[:3], cutoff_m=500.0)
+    dense = analysis.distance_matrix(request, svc=service)["distances_m"]
+
+    road_net = service.get_road_network()
+    matrix = road_net.distance_matrix
+    # The sparse format must not ask the network for a dense matrix.
+    monkeypatch.setattr(
+        road_net, "distance_matrix", lambda *a, **kw: matrix(*a, **kw) if kw["sparse"] else pytest.fail("dense")
+    )
+    sparse = analysis.distance_matrix(request.model_copy(update={"format": "sparse"}), svc=service)["entries"]
+    expected = [[i, j, d] for i, row in enumerate(dense) for j, d in enumerate(row) if d is not None]
+    assert sparse == expected
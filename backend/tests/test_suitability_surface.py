@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+# Ensure the backend package is importable when running pytest from repo root
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.lib.suitability_surface import build_surface, load_surface, save_surface, to_png  # noqa: E402
+
+BOX = (27.66, 85.41, 27.69, 85.44)
+
+
+def _plane(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    return 100.0 * (lats - 27.66) + 50.0 * (lons - 85.41)
+
+
+def test_bilinear_sampling_is_exact_on_a_plane() -> None:
+    raster = build_surface(_plane, *BOX, cell_m=100.0, chunk_size=37)
+    south, west, north, east = raster.bounds
+    assert south == BOX[0] and west == BOX[1] and north >= BOX[2] and east >= BOX[3]
+
+    rng = np.random.default_rng(5)
+    lats = BOX[0] + rng.random(200) * (BOX[2] - BOX[0])
+    lons = BOX[1] + rng.random(200) * (BOX[3] - BOX[1])
+    np.testing.assert_allclose(raster.sample(lats, lons), _plane(lats, lons), atol=1e-5)
+
+    outside = raster.sample([BOX[0] - 0.01, np.nan, north + 0.01], [BOX[1], BOX[1], BOX[1]])
+    assert np.isnan(outside).all()
+
+    values, lat_axis, lon_axis = raster.resample(*BOX, resolution_m=250.0)
+    assert values.shape == (lat_axis.size, lon_axis.size)
+    expected = _plane(*np.meshgrid(lat_axis, lon_axis, indexing="ij"))
+    # Cells past the raster's last centre are NaN, everything else is interpolated.
+    beyond = (lat_axis[:, None] > north) | (lon_axis[None, :] > east)
+    np.testing.assert_array_equal(np.isnan(values), beyond)
+    np.testing.assert_allclose(values[~beyond], expected[~beyond], atol=1e-5)
+
+
+def test_stored_surface_follows_its_source(tmp_path: Path) -> None:
+    source = tmp_path / "reference.csv"
+    source.write_text("lat,lng\n", encoding="utf-8")
+    cache = tmp_path / "surface"
+    raster = build_surface(_plane, *BOX, cell_m=200.0)
+    save_surface(cache, source, raster, {"note": "test"})
+
+    loaded, meta = load_surface(cache, source)
+    assert isinstance(loaded.values, np.memmap)
+    np.testing.assert_array_equal(loaded.values, raster.values)
+    assert loaded.georef() == raster.georef() and meta["note"] == "test"
+
+    source.write_text("lat,lng\n1,2\n", encoding="utf-8")
+    assert load_surface(cache, source) is None
+
+
+def test_png_is_north_up_with_transparent_gaps() -> None:
+    values = np.array([[0.0, 3.0, np.nan], [1.5, 1.5, 1.5]])
+    png = to_png(values, vmin=0.0, vmax=3.0)
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    width, height = struct.unpack(">II", png[16:24])
+    assert (width, height) == (3, 2)
+
+    idat_len = struct.unpack(">I", png[33:37])[0]
+    rows = np.frombuffer(zlib.decompress(png[41 : 41 + idat_len]), dtype=np.uint8).reshape(2, 13)
+    pixels = rows[:, 1:].reshape(2, 3, 4)
+    # values row 0 (south) is the bottom image row.
+    assert pixels[1, 0].tolist() == [215, 48, 39, 255]
+    assert pixels[1, 1].tolist() == [26, 152, 80, 255]
+    assert pixels[1, 2, 3] == 0
+    assert pixels[0, 0].tolist() == [254, 224, 139, 255]